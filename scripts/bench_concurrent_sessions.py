@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""Lasttest: Runner-Durchsatz bei parallelen Sessions.
+
+Simulierter Provider mit fester Latenz (kein Netz). Jede Session schickt
+--turns Turns nacheinander, alle Sessions laufen gleichzeitig auf einem
+Event-Loop. Der Durchsatz soll mit der Session-Zahl skalieren, bis
+concurrency.max_inflight_llm_calls (--limit) greift.
+
+Aufruf: python scripts/bench_concurrent_sessions.py [--turns 5] [--latency-ms 50] [--limit 0]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import AsyncGenerator
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from core.provider import LLMProvider  # noqa: E402
+from core.runner import Runner  # noqa: E402
+
+
+class _LatencyProvider(LLMProvider):
+    def __init__(self, latency: float) -> None:
+        self._latency = latency
+
+    async def chat(self, messages, system_prompt="", model="") -> str:
+        await asyncio.sleep(self._latency)
+        return "ok"
+
+    async def stream(self, messages, system_prompt="", model="") -> AsyncGenerator[str, None]:
+        await asyncio.sleep(self._latency)
+        yield "ok"
+
+
+async def _run(sessions: int, turns: int, latency: float, limit: int, log_dir: str) -> float:
+    runner = Runner(
+        provider=_LatencyProvider(latency),
+        name="bench",
+        config={
+            "concurrency": {"max_inflight_llm_calls": limit},
+            "logging": {"log_dir": log_dir},
+        },
+    )
+    await runner.connect()
+
+    async def _session(i: int) -> None:
+        for t in range(turns):
+            await runner.chat(f"frage {t}", session_id=f"bench-{i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_session(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    await runner.disconnect()
+    return sessions * turns / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--limit", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    latency = args.latency_ms / 1000
+    print(f"{'sessions':>10} {'turns/s':>10} {'speedup':>10}")
+    with tempfile.TemporaryDirectory() as log_dir:
+        base = None
+        for n in (1, 2, 4, 8, 16, 32):
+            rate = asyncio.run(_run(n, args.turns, latency, args.limit, log_dir))
+            base = base or rate
+            print(f"{n:>10} {rate:>10.1f} {rate / base:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Microbenchmark: PipelineContext.evolve() bei wachsender Working Memory.
+
+evolve() teilt unveraenderte Felder per Referenz (copy-on-write) — die
+Kosten pro Snapshot sollen unabhaengig von len(ctx.messages) bleiben.
+
+Aufruf: python scripts/bench_context_evolve.py [--rounds 2000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from core.models import HookPoint, Message, PipelineContext  # noqa: E402
+
+
+def _make_ctx(n_messages: int) -> PipelineContext:
+    messages = tuple(
+        Message(role="user" if i % 2 == 0 else "assistant", content="x" * 200)
+        for i in range(n_messages)
+    )
+    return PipelineContext(
+        raw_input="Hallo",
+        messages=messages,
+        metadata={"hnz_tools": [{"name": "t", "input_schema": {}}]},
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'messages':>10} {'evolve us':>12}")
+    for n in (0, 10, 100, 1_000, 10_000):
+        ctx = _make_ctx(n)
+        seconds = timeit.timeit(
+            lambda: ctx.evolve(phase=HookPoint.ON_LLM_REQUEST),
+            number=args.rounds,
+        )
+        print(f"{n:>10} {seconds / args.rounds * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Microbenchmark: Dispatch-Overhead eines Turns mit 0/5/20 AddOns.
+
+Ein "Turn" sind die ~20 phase()-Aufrufe eines Pipeline-Durchlaufs
+(ohne LLM-Call und Working Memory) — gemessen wird reiner Router- und
+Phasen-Overhead. Jedes AddOn abonniert nur wenige Hooks, Phasen ohne
+Abonnenten werden uebersprungen.
+
+Aufruf: python scripts/bench_router_dispatch.py [--turns 2000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from core.addon import AddOn  # noqa: E402
+from core._pipeline import phase  # noqa: E402
+from core.models import AddOnResult, HookPoint, PipelineContext  # noqa: E402
+from core.provider import NoopProvider  # noqa: E402
+from core.runner import Runner  # noqa: E402
+
+# Typische Abos: Logger, Prompt-Builder, Skills, Tools
+_HOOK_SETS = [
+    {HookPoint.ON_INPUT, HookPoint.ON_OUTPUT},
+    {HookPoint.ON_CONTEXT_BUILD},
+    {HookPoint.ON_LLM_REQUEST, HookPoint.ON_LLM_RESPONSE},
+    {HookPoint.ON_TOOL_REQUEST, HookPoint.ON_TOOL_RESULT},
+    {HookPoint.ON_ERROR},
+]
+
+
+# Phasen-Folge eines einfachen Turns (vgl. _pipeline.run_pipeline)
+_TURN = [
+    HookPoint.ON_INPUT, HookPoint.ON_INPUT_PARSED, HookPoint.ON_MEMORY_QUERY,
+    HookPoint.ON_MEMORY_MISS, HookPoint.ON_CONTEXT_BUILD, HookPoint.ON_CONTEXT_READY,
+    HookPoint.ON_LLM_REQUEST, HookPoint.ON_LLM_RESPONSE, HookPoint.ON_LOOP_END,
+    HookPoint.ON_OUTPUT, HookPoint.ON_OUTPUT_SENT, HookPoint.ON_STORE,
+    HookPoint.ON_STORED, HookPoint.ON_SESSION_END,
+]
+
+
+def _make_addon(i: int) -> AddOn:
+    class _BenchAddOn(AddOn):
+        name = f"bench_{i}"
+
+        async def on_input(self, ctx, history=None) -> AddOnResult:
+            return AddOnResult(modified_ctx=ctx)
+
+    return _BenchAddOn()
+
+
+async def _bench(n_addons: int, turns: int, record_idle: bool) -> float:
+    config = {"history": {"record_idle_phases": record_idle}}
+    runner = Runner(provider=NoopProvider(), name="bench", config=config)
+    for i in range(n_addons):
+        runner.register_addon(_make_addon(i), hooks=_HOOK_SETS[i % len(_HOOK_SETS)])
+    start = time.perf_counter()
+    for _ in range(turns):
+        ctx = PipelineContext(raw_input="hallo")
+        history = runner._new_context_history()
+        for hook in _TURN:
+            ctx, _ = await phase(runner, hook, ctx, history)
+    return (time.perf_counter() - start) / turns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'addons':>8} {'turn us':>10} {'alle Phasen us':>16}")
+    for n in (0, 5, 20):
+        skipped = asyncio.run(_bench(n, args.turns, record_idle=False))
+        full = asyncio.run(_bench(n, args.turns, record_idle=True))
+        print(f"{n:>8} {skipped * 1e6:>10.1f} {full * 1e6:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
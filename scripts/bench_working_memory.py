@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Microbenchmark: NoopWorkingMemory pro Turn bei wachsender Turn-Zahl.
+
+Misst add_turn() + estimated_tokens() — beides wird in jedem Turn
+aufgerufen. Die Kosten sollen bis zum max_turns-Cap (10_000) flach bleiben.
+Dazu get_context_messages() (ON_MEMORY_QUERY) voll und mit Token-Budget.
+
+Aufruf: python scripts/bench_working_memory.py [--rounds 500]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from core.session import Turn  # noqa: E402
+from core.session_noop import NoopWorkingMemory  # noqa: E402
+
+
+def _turn(i: int) -> Turn:
+    return Turn(session_id="bench", raw_input=f"frage {i} " * 10, final_response="antwort " * 30)
+
+
+async def _fill(n_turns: int) -> NoopWorkingMemory:
+    wm = NoopWorkingMemory(max_tokens=10**9, max_turns=n_turns)
+    for i in range(n_turns):
+        await wm.add_turn(_turn(i))
+    return wm
+
+
+async def _per_turn(wm: NoopWorkingMemory, rounds: int) -> float:
+    turns = [_turn(i) for i in range(rounds)]
+    start = time.perf_counter()
+    for turn in turns:
+        await wm.add_turn(turn)
+        wm.estimated_tokens()
+    return (time.perf_counter() - start) / rounds
+
+
+async def _per_query(wm: NoopWorkingMemory, rounds: int, max_tokens: int | None) -> float:
+    start = time.perf_counter()
+    for i in range(rounds):
+        # Jede Runde ein neuer Turn — ein Cache allein darf nicht reichen
+        await wm.add_turn(_turn(i))
+        await wm.get_context_messages(max_tokens=max_tokens)
+    return (time.perf_counter() - start) / rounds
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'turns':>10} {'turn us':>12} {'query us':>12} {'query@2k us':>12}")
+    for n in (10, 100, 1_000, 10_000):
+        wm = await _fill(n)
+        turn = await _per_turn(wm, args.rounds)
+        query = await _per_query(wm, args.rounds, None)
+        budget = await _per_query(wm, args.rounds, 2_000)
+        print(f"{n:>10} {turn * 1e6:>12.1f} {query * 1e6:>12.1f} {budget * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
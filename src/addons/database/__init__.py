@@ -3,10 +3,12 @@
 from .base import DatabaseAddOn, SCHEMA_SQL
 from .sqlite import SQLiteAddOn
 from .postgres import PostgreSQLAddOn
+from .session_manager import SqlSessionManager
 
 __all__ = [
     "DatabaseAddOn",
     "SQLiteAddOn",
     "PostgreSQLAddOn",
+    "SqlSessionManager",
     "SCHEMA_SQL",
 ]
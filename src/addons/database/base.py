@@ -1,7 +1,7 @@
 """DatabaseAddOn — Abstrakte Basis für DB-Zugriff.
 
 Kein anderes AddOn öffnet eigene Verbindungen.
-Interface: execute(), fetch(), fetchrow(), migrate()
+Interface: execute(), execute_batch(), fetch(), fetchrow(), migrate()
 
 Zwei Implementierungen:
     SQLiteAddOn    — aiosqlite, :memory: für Tests
@@ -26,7 +26,10 @@ CREATE TABLE IF NOT EXISTS sessions (
     user_id     TEXT,
     status      TEXT DEFAULT 'active',
     created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    uid         TEXT,
+    turn_count  INTEGER DEFAULT 0,
+    metadata    TEXT
 );
 
 CREATE TABLE IF NOT EXISTS exchanges (
@@ -34,7 +37,9 @@ CREATE TABLE IF NOT EXISTS exchanges (
     session_id  INTEGER REFERENCES sessions(id) ON DELETE CASCADE,
     role        TEXT NOT NULL,
     content     TEXT NOT NULL,
-    created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    turn_id     TEXT,
+    tokens_used INTEGER DEFAULT 0
 );
 
 CREATE TABLE IF NOT EXISTS facts (
@@ -48,6 +53,23 @@ CREATE TABLE IF NOT EXISTS facts (
 );
 """
 
+# Spalten die nach dem ersten Schema dazukamen (SqlSessionManager) —
+# bestehende Datenbanken bekommen sie per ALTER TABLE nachgeruestet
+SCHEMA_COLUMNS: list[tuple[str, str, str]] = [
+    ("sessions", "uid", "TEXT"),
+    ("sessions", "turn_count", "INTEGER DEFAULT 0"),
+    ("sessions", "metadata", "TEXT"),
+    ("exchanges", "turn_id", "TEXT"),
+    ("exchanges", "tokens_used", "INTEGER DEFAULT 0"),
+]
+
+# Indizes erst nach den Spalten-Migrationen anlegen
+SCHEMA_INDEX_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_uid ON sessions(uid);
+CREATE INDEX IF NOT EXISTS idx_sessions_heinzel ON sessions(heinzel_id, id);
+CREATE INDEX IF NOT EXISTS idx_exchanges_session ON exchanges(session_id, id);
+"""
+
 
 # =============================================================================
 # DatabaseAddOn — Interface
@@ -64,11 +86,26 @@ class DatabaseAddOn(AddOn):
     version = "0.1.0"
     dependencies: list[str] = []
 
+    # Platzhalter-Stil: "qmark" (?, SQLite) oder "numeric" ($1, asyncpg)
+    paramstyle: str = "qmark"
+
     @abstractmethod
     async def execute(self, sql: str, *args: Any) -> None:
         """DDL oder DML ohne Rückgabe (INSERT, UPDATE, DELETE, CREATE)."""
         ...
 
+    async def execute_batch(
+        self, statements: list[tuple[str, list[tuple]]]
+    ) -> None:
+        """Mehrere (sql, rows)-Gruppen ausführen — ein Commit für alles.
+
+        Default: jede Zeile einzeln via execute() (ohne Transaktion).
+        Implementierungen überschreiben das mit executemany + Transaktion.
+        """
+        for sql, rows in statements:
+            for row in rows:
+                await self.execute(sql, *row)
+
     @abstractmethod
     async def fetch(self, sql: str, *args: Any) -> list[dict]:
         """SELECT → Liste von Dicts. Leer wenn keine Zeilen."""
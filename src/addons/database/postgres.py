@@ -12,7 +12,7 @@ from __future__ import annotations
 import logging
 from typing import Any
 
-from .base import DatabaseAddOn, SCHEMA_SQL
+from .base import DatabaseAddOn, SCHEMA_COLUMNS, SCHEMA_INDEX_SQL, SCHEMA_SQL
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +37,7 @@ class PostgreSQLAddOn(DatabaseAddOn):
     """
 
     name = "database"
+    paramstyle = "numeric"
 
     def __init__(
         self,
@@ -85,6 +86,17 @@ class PostgreSQLAddOn(DatabaseAddOn):
         async with self._pool.acquire() as conn:
             await conn.execute(sql, *args)
 
+    async def execute_batch(
+        self, statements: list[tuple[str, list[tuple]]]
+    ) -> None:
+        """Alle Gruppen per executemany in einer Transaktion."""
+        assert self._pool, "PostgreSQLAddOn nicht initialisiert"
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                for sql, rows in statements:
+                    if rows:
+                        await conn.executemany(sql, rows)
+
     async def fetch(self, sql: str, *args: Any) -> list[dict]:
         assert self._pool, "PostgreSQLAddOn nicht initialisiert"
         async with self._pool.acquire() as conn:
@@ -103,6 +115,11 @@ class PostgreSQLAddOn(DatabaseAddOn):
         schema = _adapt_schema_for_postgres(SCHEMA_SQL)
         async with self._pool.acquire() as conn:
             await conn.execute(schema)
+            for table, column, ddl in SCHEMA_COLUMNS:
+                await conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {ddl}"
+                )
+            await conn.execute(SCHEMA_INDEX_SQL)
         logger.debug("[PostgreSQLAddOn] Migration abgeschlossen")
 
 
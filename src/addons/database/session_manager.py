@@ -0,0 +1,555 @@
+"""SqlSessionManager — persistente Sessions auf Basis des DatabaseAddOn.
+
+Schreibt Sessions und Turns in die Tabellen sessions/exchanges
+(SQLiteAddOn oder PostgreSQLAddOn). Nach einem Neustart lassen sich
+Sessions per resume_session() fortsetzen.
+
+Latenz:
+    Der Turn-Pfad wartet nie auf die Datenbank. create_session(),
+    add_turn() und end_session() ändern nur den RAM-Stand und merken
+    die Änderung vor (Write-Behind). Ein Hintergrund-Task schreibt alle
+    vorgemerkten Änderungen gesammelt in einer Transaktion —
+    spätestens nach flush_interval_ms, früher wenn batch_size Turns
+    anstehen (Group Commit).
+
+Working Set:
+    Pro Session hält der Manager ein NoopWorkingMemory im RAM, höchstens
+    max_hot_sessions Stück (LRU). Eine Session die nicht (mehr) im RAM
+    liegt, lädt beim ersten get_working_memory() ihre letzten page_turns
+    Turns aus der Datenbank nach.
+
+Verwendung:
+    db = SQLiteAddOn(path="data/heinzel.db")
+    runner.register_addon(db, hooks={HookPoint.ON_SESSION_START})
+    runner.set_session_manager(SqlSessionManager(db))
+    await runner.connect()
+
+Konfiguration (heinzel.yaml) — HeinzelLoader verdrahtet das automatisch:
+    addons:
+      database:
+        backend: sqlite
+        path: data/heinzel.db
+        sessions:
+          enabled: true
+          flush_interval_ms: 50
+          batch_size: 100
+          max_hot_sessions: 64
+          page_turns: 200
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any
+
+from core.compaction import RollingSessionRegistry
+from core.exceptions import SessionNotFoundError
+from core.models.placeholders import HandoverContext, ResourceBudget
+from core.session import Session, SessionManager, SessionStatus, Turn, WorkingMemory
+from core.session_noop import NoopWorkingMemory
+from core.tokens import TokenEstimator
+
+from .base import DatabaseAddOn
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# SQL
+# =============================================================================
+
+_INSERT_SESSION = (
+    "INSERT INTO sessions "
+    "(uid, heinzel_id, user_id, status, turn_count, metadata, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_UPDATE_SESSION = (
+    "UPDATE sessions SET status = ?, turn_count = ?, metadata = ?, updated_at = ? "
+    "WHERE uid = ?"
+)
+_INSERT_EXCHANGE = (
+    "INSERT INTO exchanges "
+    "(session_id, turn_id, role, content, tokens_used, created_at) "
+    "VALUES ((SELECT id FROM sessions WHERE uid = ?), ?, ?, ?, ?, ?)"
+)
+_SELECT_SESSION = "SELECT * FROM sessions WHERE uid = ?"
+_SELECT_SESSIONS = (
+    "SELECT * FROM sessions WHERE heinzel_id = ? AND uid IS NOT NULL "
+    "ORDER BY id DESC LIMIT ?"
+)
+_SELECT_EXCHANGES = (
+    "SELECT turn_id, role, content, tokens_used, created_at FROM exchanges "
+    "WHERE session_id = (SELECT id FROM sessions WHERE uid = ?) "
+    "ORDER BY id DESC LIMIT ?"
+)
+
+
+def _numeric_placeholders(sql: str) -> str:
+    """? → $1, $2, ... (asyncpg)."""
+    parts = sql.split("?")
+    out = [parts[0]]
+    for i, part in enumerate(parts[1:], start=1):
+        out.append(f"${i}{part}")
+    return "".join(out)
+
+
+def _json_default(value: Any) -> Any:
+    """Pydantic-Modelle (z.B. HandoverContext) in metadata serialisierbar machen."""
+    dump = getattr(value, "model_dump", None)
+    if dump is not None:
+        return dump(mode="json")
+    return str(value)
+
+
+def _parse_ts(value: Any) -> datetime:
+    """DB-Zeitstempel (ISO-String oder naive UTC-datetime) → aware datetime."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        return datetime.now(timezone.utc)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+# =============================================================================
+# SqlSessionManager
+# =============================================================================
+
+
+class SqlSessionManager(SessionManager):
+    """Persistenter SessionManager mit Write-Behind und RAM-Working-Set.
+
+    Args:
+        db:                 verbundenes DatabaseAddOn (SQLite oder PostgreSQL)
+        max_tokens:         Token-Budget pro Working Memory
+        max_turns:          Turn-Limit pro Working Memory
+        estimator:          TokenEstimator für die Working Memories
+        flush_interval_ms:  spätester Zeitpunkt des Group Commits
+        batch_size:         so viele anstehende Turns lösen sofort einen Flush aus
+        max_hot_sessions:   Working Memories im RAM (LRU)
+        page_turns:         Turns die beim Nachladen einer Session gelesen werden
+        max_pending_turns:  Obergrenze anstehender Turns wenn die DB hängt —
+                            darüber werden die ältesten verworfen (mit Warnung)
+    """
+
+    def __init__(
+        self,
+        db: DatabaseAddOn,
+        max_tokens: int = 128_000,
+        max_turns: int = 10_000,
+        estimator: TokenEstimator | None = None,
+        flush_interval_ms: float = 50.0,
+        batch_size: int = 100,
+        max_hot_sessions: int = 64,
+        page_turns: int = 200,
+        max_pending_turns: int = 10_000,
+    ) -> None:
+        self._db = db
+        self._max_tokens = max_tokens
+        self._max_turns = max_turns
+        self._estimator = estimator
+        self._flush_interval = max(0.0, flush_interval_ms) / 1000
+        self._batch_size = max(1, batch_size)
+        self._max_hot = max(1, max_hot_sessions)
+        self._page_turns = max(1, page_turns)
+        self._max_pending = max(self._batch_size, max_pending_turns)
+        self._numeric = getattr(db, "paramstyle", "qmark") == "numeric"
+
+        self._sessions: dict[str, Session] = {}
+        self._memories: OrderedDict[str, NoopWorkingMemory] = OrderedDict()
+        self._active: Session | None = None
+
+        # Write-Behind: vorgemerkte Änderungen bis zum nächsten Flush
+        self._new_sessions: dict[str, None] = {}   # geordnetes Set neuer Sessions
+        self._pending_turns: list[Turn] = []
+        self._dirty: dict[str, None] = {}   # geordnetes Set geänderter Sessions
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+
+        self._stats: dict[str, int] = {
+            "turns_written": 0, "batches": 0, "failed_batches": 0,
+            "dropped_turns": 0, "page_ins": 0,
+        }
+
+    # -------------------------------------------------------------------------
+    # Properties
+    # -------------------------------------------------------------------------
+
+    @property
+    def active_session(self) -> Session | None:
+        return self._active
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Write-Behind- und Paging-Zähler (Kopie), inkl. pending_turns."""
+        return {**self._stats, "pending_turns": len(self._pending_turns)}
+
+    # -------------------------------------------------------------------------
+    # Sessions
+    # -------------------------------------------------------------------------
+
+    async def create_session(
+        self,
+        agent_id: str,
+        user_id: str | None = None,
+        session_id: str | None = None,
+        activate: bool = True,
+    ) -> Session:
+        """Neue Session anlegen — der INSERT läuft im nächsten Flush."""
+        kwargs: dict[str, Any] = {"agent_id": agent_id, "user_id": user_id}
+        if session_id:
+            kwargs["id"] = session_id
+        session = Session(**kwargs)
+        self._sessions[session.id] = session
+        self._new_sessions[session.id] = None
+        if activate:
+            self._active = session
+        self._schedule_flush()
+        return session
+
+    async def get_session(self, session_id: str) -> Session | None:
+        """Session aus dem RAM oder — nach Neustart — aus der Datenbank."""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            return session
+        row = await self._db.fetchrow(self._sql(_SELECT_SESSION), session_id)
+        if row is None:
+            return None
+        session = self._session_from_row(row)
+        self._sessions[session.id] = session
+        return session
+
+    async def resume_session(self, session_id: str) -> Session:
+        """Session fortsetzen. Turns werden erst bei get_working_memory() geladen.
+
+        Raises:
+            SessionNotFoundError: wenn session_id unbekannt.
+        """
+        session = await self.get_session(session_id)
+        if session is None:
+            raise SessionNotFoundError(
+                "Session nicht gefunden", session_id=session_id
+            )
+        self._active = session
+        return session
+
+    async def end_session(self, session_id: str) -> None:
+        """Session beenden: status=ended, active_session=None."""
+        session = await self.get_session(session_id)
+        if session is None:
+            return
+        self._sessions[session_id] = session.model_copy(
+            update={"status": SessionStatus.ended}
+        )
+        self._mark_dirty(session_id)
+        if self._active and self._active.id == session_id:
+            self._active = None
+
+    async def update_metadata(
+        self, session_id: str, metadata: dict[str, Any]
+    ) -> Session | None:
+        """metadata mergen — das UPDATE läuft im nächsten Flush."""
+        session = await self.get_session(session_id)
+        if session is None:
+            return None
+        session = session.model_copy(
+            update={"metadata": {**session.metadata, **metadata}}
+        )
+        self._sessions[session_id] = session
+        if self._active and self._active.id == session_id:
+            self._active = session
+        self._mark_dirty(session_id)
+        return session
+
+    async def add_turn(self, session_id: str, turn: Turn) -> None:
+        """Turn vormerken und Session-Metadaten im RAM aktualisieren.
+
+        Kein DB-Roundtrip — der Turn wird mit dem nächsten Flush geschrieben.
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = await self.get_session(session_id)
+            if session is None:
+                return
+        session = session.model_copy(update={
+            "turn_count": session.turn_count + 1,
+            "last_active_at": datetime.now(timezone.utc),
+        })
+        self._sessions[session_id] = session
+        if self._active and self._active.id == session_id:
+            self._active = session
+        self._pending_turns.append(turn)
+        if len(self._pending_turns) > self._max_pending:
+            dropped = len(self._pending_turns) - self._max_pending
+            del self._pending_turns[:dropped]
+            self._stats["dropped_turns"] += dropped
+            logger.warning(
+                f"[SqlSessionManager] Write-Behind-Puffer voll — "
+                f"{dropped} Turn(s) verworfen"
+            )
+        self._mark_dirty(session_id)
+
+    async def get_turns(self, session_id: str, limit: int = 10) -> list[Turn]:
+        """Letzte limit Turns einer Session (aus der Datenbank, nach Flush)."""
+        await self.flush()
+        return await self._load_turns(session_id, limit)
+
+    async def list_sessions(
+        self, agent_id: str, limit: int = 20
+    ) -> list[Session]:
+        """Alle Sessions eines Heinzel, neueste zuerst."""
+        await self.flush()
+        rows = await self._db.fetch(self._sql(_SELECT_SESSIONS), agent_id, limit)
+        sessions = []
+        for row in rows:
+            cached = self._sessions.get(row["uid"])
+            sessions.append(cached or self._session_from_row(row))
+        return sessions
+
+    async def get_working_memory(self, session_id: str) -> WorkingMemory:
+        """Working Memory aus dem RAM — oder aus der Datenbank nachladen."""
+        memory = self._memories.get(session_id)
+        if memory is not None:
+            self._memories.move_to_end(session_id)
+            return memory
+        memory = NoopWorkingMemory(
+            max_tokens=self._max_tokens,
+            max_turns=self._max_turns,
+            estimator=self._estimator,
+        )
+        # Noch ungeschriebene Turns zuerst flushen — auch bei neuen Sessions,
+        # deren Memory vor dem ersten Flush aus dem Hot-Set verdraengt wurde
+        if any(t.session_id == session_id for t in self._pending_turns):
+            await self.flush()
+        if session_id not in self._new_sessions:
+            turns = await self._load_turns(session_id, self._page_turns)
+            if turns:
+                self._stats["page_ins"] += 1
+        else:
+            # Flush fehlgeschlagen: der Puffer ist die einzige Quelle
+            turns = [t for t in self._pending_turns if t.session_id == session_id]
+            turns = turns[-self._page_turns:]
+        for turn in turns:
+            await memory.add_turn(turn)
+        self._memories[session_id] = memory
+        while len(self._memories) > self._max_hot:
+            self._memories.popitem(last=False)
+        return memory
+
+    async def maybe_roll(
+        self,
+        budget: ResourceBudget,
+    ) -> HandoverContext | None:
+        """Prüft ob die aktive Session gerollt werden soll.
+
+        Nutzt RollingSessionRegistry.get_default() als Policy.
+        Gibt HandoverContext zurück wenn gerollt, sonst None.
+        """
+        session = self._active
+        if session is None:
+            return None
+
+        policy = RollingSessionRegistry.get_default()
+        if not policy.should_roll(session, budget):
+            return None
+
+        wm = await self.get_working_memory(session.id)
+        turns = await wm.get_recent_turns(await wm.turn_count())
+        compaction_result = await wm.compaction_strategy.compact(
+            turns, budget, estimator=wm.estimator
+        )
+        handover = await policy.create_handover(session, compaction_result)
+
+        await self.end_session(session.id)
+        new_session = await self.create_session(
+            agent_id=session.agent_id,
+            user_id=session.user_id,
+        )
+        await self.update_metadata(new_session.id, {"handover": handover})
+        return handover
+
+    # -------------------------------------------------------------------------
+    # Write-Behind
+    # -------------------------------------------------------------------------
+
+    async def flush(self) -> None:
+        """Alle vorgemerkten Änderungen in einer Transaktion schreiben.
+
+        Schlägt der Batch fehl, bleiben die Änderungen vorgemerkt und
+        werden beim nächsten Flush erneut versucht.
+        """
+        async with self._flush_lock:
+            if not (self._new_sessions or self._pending_turns or self._dirty):
+                return
+            new_sessions, self._new_sessions = self._new_sessions, {}
+            turns, self._pending_turns = self._pending_turns, []
+            dirty, self._dirty = self._dirty, {}
+            try:
+                await self._db.execute_batch(
+                    self._build_batch(new_sessions, turns, dirty)
+                )
+            except Exception as exc:
+                # Zurücklegen — neuere Vormerkungen bleiben hinten
+                self._new_sessions = {**new_sessions, **self._new_sessions}
+                self._pending_turns[:0] = turns
+                self._dirty = {**dirty, **self._dirty}
+                self._stats["failed_batches"] += 1
+                logger.error(
+                    f"[SqlSessionManager] Flush fehlgeschlagen "
+                    f"({len(turns)} Turn(s) bleiben vorgemerkt): {exc}"
+                )
+                return
+            self._stats["batches"] += 1
+            self._stats["turns_written"] += len(turns)
+
+    async def aclose(self) -> None:
+        """Hintergrund-Flush stoppen und alles Vorgemerkte schreiben."""
+        task = self._flush_task
+        self._flush_task = None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def _mark_dirty(self, session_id: str) -> None:
+        self._dirty[session_id] = None
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        """Flush-Task starten (falls keiner läuft), bei vollem Batch sofort."""
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if len(self._pending_turns) >= self._batch_size:
+            self._wake.set()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(
+                self._flush_loop(), name="sql-session-flush"
+            )
+
+    async def _flush_loop(self) -> None:
+        """Group Commit: nach flush_interval (oder vollem Batch) schreiben."""
+        assert self._wake is not None
+        while self._new_sessions or self._pending_turns or self._dirty:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            failed = self._stats["failed_batches"]
+            await self.flush()
+            if self._stats["failed_batches"] > failed:
+                # DB hängt — nicht im Leerlauf weiterversuchen,
+                # der nächste add_turn() startet den Task neu
+                return
+
+    def _build_batch(
+        self,
+        new_sessions: dict[str, None],
+        turns: list[Turn],
+        dirty: dict[str, None],
+    ) -> list[tuple[str, list[tuple]]]:
+        """(sql, rows)-Gruppen: erst neue Sessions, dann Turns, dann Updates."""
+        session_rows = []
+        for sid in new_sessions:
+            s = self._sessions[sid]
+            session_rows.append((
+                s.id, s.agent_id, s.user_id, s.status.value, s.turn_count,
+                self._dump_metadata(s), self._ts(s.started_at),
+                self._ts(s.last_active_at),
+            ))
+        exchange_rows = []
+        for t in turns:
+            ts = self._ts(t.timestamp)
+            exchange_rows.append(
+                (t.session_id, t.id, "user", t.raw_input, 0, ts)
+            )
+            exchange_rows.append(
+                (t.session_id, t.id, "assistant", t.final_response, t.tokens_used, ts)
+            )
+        update_rows = []
+        for sid in dirty:
+            s = self._sessions.get(sid)
+            if s is None:
+                continue
+            update_rows.append((
+                s.status.value, s.turn_count, self._dump_metadata(s),
+                self._ts(s.last_active_at), s.id,
+            ))
+        return [
+            (self._sql(_INSERT_SESSION), session_rows),
+            (self._sql(_INSERT_EXCHANGE), exchange_rows),
+            (self._sql(_UPDATE_SESSION), update_rows),
+        ]
+
+    # -------------------------------------------------------------------------
+    # Interna
+    # -------------------------------------------------------------------------
+
+    def _sql(self, sql: str) -> str:
+        return _numeric_placeholders(sql) if self._numeric else sql
+
+    def _ts(self, value: datetime) -> Any:
+        """SQLite: ISO-String, PostgreSQL (TIMESTAMP): naive UTC-datetime."""
+        value = value.astimezone(timezone.utc)
+        if self._numeric:
+            return value.replace(tzinfo=None)
+        return value.isoformat()
+
+    @staticmethod
+    def _dump_metadata(session: Session) -> str:
+        return json.dumps(session.metadata, default=_json_default)
+
+    @staticmethod
+    def _session_from_row(row: dict) -> Session:
+        try:
+            metadata = json.loads(row.get("metadata") or "{}")
+        except ValueError:
+            metadata = {}
+        status = row.get("status") or SessionStatus.active.value
+        return Session(
+            id=row["uid"],
+            agent_id=row["heinzel_id"],
+            user_id=row.get("user_id"),
+            status=SessionStatus(status),
+            started_at=_parse_ts(row.get("created_at")),
+            last_active_at=_parse_ts(row.get("updated_at")),
+            turn_count=row.get("turn_count") or 0,
+            metadata=metadata,
+        )
+
+    async def _load_turns(self, session_id: str, limit: int) -> list[Turn]:
+        """Letzte limit Turns aus exchanges rekonstruieren (chronologisch)."""
+        rows = await self._db.fetch(
+            self._sql(_SELECT_EXCHANGES), session_id, 2 * limit
+        )
+        rows.reverse()
+        turns: list[Turn] = []
+        pending_user: dict | None = None
+        for row in rows:
+            if row["role"] == "user":
+                pending_user = row
+                continue
+            if pending_user is None or pending_user["turn_id"] != row["turn_id"]:
+                # Antwort ohne zugehörige Frage (Fenster-Anfang) — überspringen
+                pending_user = None
+                continue
+            extra = {"id": row["turn_id"]} if row["turn_id"] else {}
+            turns.append(Turn(
+                **extra,
+                session_id=session_id,
+                timestamp=_parse_ts(row["created_at"]),
+                raw_input=pending_user["content"],
+                final_response=row["content"],
+                tokens_used=row["tokens_used"] or 0,
+            ))
+            pending_user = None
+        return turns[-limit:] if limit < len(turns) else turns
@@ -6,12 +6,13 @@ Identisches Interface wie PostgreSQLAddOn.
 
 from __future__ import annotations
 
+import asyncio
 import logging
 from typing import Any
 
 import aiosqlite
 
-from .base import DatabaseAddOn, SCHEMA_SQL
+from .base import DatabaseAddOn, SCHEMA_COLUMNS, SCHEMA_INDEX_SQL, SCHEMA_SQL
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +34,9 @@ class SQLiteAddOn(DatabaseAddOn):
     def __init__(self, path: str = ":memory:") -> None:
         self._path = path
         self._conn: aiosqlite.Connection | None = None
+        # Eine Verbindung = eine Transaktion: execute() und execute_batch()
+        # dürfen sich zwischen ihren awaits nicht in die Commits fahren
+        self._write_lock = asyncio.Lock()
 
     # -------------------------------------------------------------------------
     # Lifecycle
@@ -58,8 +62,28 @@ class SQLiteAddOn(DatabaseAddOn):
 
     async def execute(self, sql: str, *args: Any) -> None:
         assert self._conn, "SQLiteAddOn nicht initialisiert"
-        await self._conn.execute(sql, args)
-        await self._conn.commit()
+        async with self._write_lock:
+            await self._conn.execute(sql, args)
+            await self._conn.commit()
+
+    async def execute_batch(
+        self, statements: list[tuple[str, list[tuple]]]
+    ) -> None:
+        """Alle Gruppen per executemany, ein Commit — Rollback bei Fehler.
+
+        Läuft unter demselben Lock wie execute(), damit kein fremdes
+        Statement mitcommittet oder mit zurückgerollt wird.
+        """
+        assert self._conn, "SQLiteAddOn nicht initialisiert"
+        async with self._write_lock:
+            try:
+                for sql, rows in statements:
+                    if rows:
+                        await self._conn.executemany(sql, rows)
+                await self._conn.commit()
+            except Exception:
+                await self._conn.rollback()
+                raise
 
     async def fetch(self, sql: str, *args: Any) -> list[dict]:
         assert self._conn, "SQLiteAddOn nicht initialisiert"
@@ -101,5 +125,12 @@ async def migrate_sqlite(conn: aiosqlite.Connection) -> None:
         "INTEGER",  # FK-Enforcement via PRAGMA foreign_keys
     )
     await conn.executescript(schema)
+    # Spalten nachruesten die aeltere Datenbanken noch nicht haben
+    for table, column, ddl in SCHEMA_COLUMNS:
+        async with conn.execute(f"PRAGMA table_info({table})") as cur:
+            existing = {row[1] for row in await cur.fetchall()}
+        if column not in existing:
+            await conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    await conn.executescript(SCHEMA_INDEX_SQL)
     await conn.commit()
     logger.debug("[SQLiteAddOn] Migration abgeschlossen")
@@ -38,7 +38,7 @@ from pathlib import Path
 from typing import Any
 
 from core.addon import AddOn
-from core.models import AddOnResult, PipelineContext, ContextHistory
+from core.models import AddOnResult, ContextHistory, HookPoint, PipelineContext
 
 logger = logging.getLogger(__name__)
 
@@ -67,6 +67,14 @@ class DialogLoggerAddOn(AddOn):
     name = "dialog_logger"
     version = "0.1.0"
     dependencies: list[str] = []
+    observe_only = frozenset({
+        HookPoint.ON_INPUT,
+        HookPoint.ON_OUTPUT,
+        HookPoint.ON_THINKING_STEP,
+        HookPoint.ON_TOOL_REQUEST,
+        HookPoint.ON_TOOL_RESULT,
+        HookPoint.ON_ERROR,
+    })
 
     def __init__(
         self,
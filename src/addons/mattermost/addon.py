@@ -13,6 +13,10 @@ Konfiguration (heinzel.yaml):
         mention_only: true        # nur auf @heinzel-name reagieren
         reply_in_thread: true     # Antwort als Thread-Reply (empfohlen)
 
+Jeder Channel bekommt eine eigene Runner-Session (session_id
+"mattermost:<channel_id>") — parallele Channels laufen nebenläufig und
+teilen sich weder Working Memory noch die interaktive Session.
+
 Importpfad:
     from addons.mattermost import MattermostAddOn
 
@@ -41,7 +45,7 @@ class MattermostAddOn(AddOn):
 
     Message-Flow:
         WS Event → _handle_message() → mention/channel Filter
-                 → runner.chat(text) → _post_reply(channel, text, root_id)
+                 → runner.chat(text, session_id) → _post_reply(channel, text, root_id)
     """
 
     name = "mattermost"
@@ -214,7 +218,9 @@ class MattermostAddOn(AddOn):
         clean_text = self._strip_mention(msg.text)
 
         try:
-            response = await self._runner.chat(clean_text)
+            response = await self._runner.chat(
+                clean_text, session_id=self._session_id(msg)
+            )
         except Exception as exc:
             logger.error(f"[MattermostAddOn] runner.chat() Fehler: {exc}")
             response = f"Fehler bei der Verarbeitung: {exc}"
@@ -229,6 +235,11 @@ class MattermostAddOn(AddOn):
             root_id=root_id,
         ))
 
+    @staticmethod
+    def _session_id(msg: MattermostMessage) -> str:
+        """Runner-Session pro Channel."""
+        return f"mattermost:{msg.channel_id}"
+
     async def _post_reply(self, reply: MattermostReply) -> None:
         """Antwort in Mattermost posten."""
         try:
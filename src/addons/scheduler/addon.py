@@ -142,7 +142,10 @@ class SchedulerAddOn(AddOn):
         logger.info(f"[SchedulerAddOn] Job '{job.name}' startet")
         try:
             runner = getattr(self._heinzel, "runner", self._heinzel)
-            response = await runner.chat(job.prompt)
+            # Eigene Session pro Job — laeuft parallel zur interaktiven Session
+            response = await runner.chat(
+                job.prompt, session_id=f"scheduler:{job.name}"
+            )
 
             if job.channel:
                 await self._post_to_channel(job.channel, response)
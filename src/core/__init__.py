@@ -43,7 +43,7 @@ from .exceptions import (
 from .provider import HttpLLMProvider
 from .provider_registry import ProviderRegistry
 from .addon_extension import BaseAddOnExtension, PromptBase, SkillBase
-from .router import AddOnRouter
+from .router import AddOnRouter, ObserverMode
 from .session import (
     MemoryGateInterface,
     Session,
@@ -53,6 +53,14 @@ from .session import (
     WorkingMemory,
 )
 from .session_noop import NoopMemoryGate, NoopSessionManager, NoopWorkingMemory
+from .tokens import (
+    BpeApproxEstimator,
+    CachedTokenEstimator,
+    CalibratedTokenEstimator,
+    CharRatioEstimator,
+    TokenEstimator,
+    TokenEstimatorRegistry,
+)
 
 __all__ = [
     # Compaction
@@ -84,6 +92,7 @@ __all__ = [
     "PromptBase",
     # Core
     "AddOnRouter",
+    "ObserverMode",
     "Runner",
     "HttpLLMProvider",
     "LLMProvider",
@@ -99,6 +108,13 @@ __all__ = [
     "SessionStatus",
     "Turn",
     "WorkingMemory",
+    # Tokens
+    "BpeApproxEstimator",
+    "CachedTokenEstimator",
+    "CalibratedTokenEstimator",
+    "CharRatioEstimator",
+    "TokenEstimator",
+    "TokenEstimatorRegistry",
     # Exceptions
     "ContextLengthExceededError",
     "HeinzelError",
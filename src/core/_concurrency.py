@@ -0,0 +1,115 @@
+"""_concurrency — Session-Locks und LLM-Call-Limit fuer Runner.
+
+Package-intern: nicht in __init__.py exportiert.
+
+SessionLocks — ein asyncio.Lock pro Session-Key. Turns derselben Session
+               laufen nacheinander, verschiedene Sessions parallel.
+               Reentrant pro Task (z.B. !redo ruft chat() aus einem Hook).
+               Eintraege verschwinden sobald niemand mehr wartet.
+CallLimiter  — begrenzt gleichzeitige LLM-Calls runnerweit (Semaphore)
+               und zaehlt laufende Calls fuer den turn-sicheren
+               Provider-Swap.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class _LockEntry:
+    __slots__ = ("lock", "users", "owner")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+        self.owner: asyncio.Task | None = None
+
+
+class SessionLocks:
+    """Ein Lock pro Session-Key, mit Referenzzaehlung.
+
+    Verwendung:
+        async with locks.hold(session_id):
+            ...   # exklusiv fuer diese Session
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[str, _LockEntry] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        """Lock fuer key halten. Wartende derselben Session reihen sich ein.
+
+        Haelt der aufrufende Task den Lock bereits, wird nicht erneut
+        gesperrt — ein verschachtelter Turn wuerde sonst auf sich selbst warten.
+        """
+        task = asyncio.current_task()
+        entry = self._entries.get(key)
+        if entry is not None and task is not None and entry.owner is task:
+            yield
+            return
+        if entry is None:
+            entry = self._entries[key] = _LockEntry()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                entry.owner = task
+                try:
+                    yield
+                finally:
+                    entry.owner = None
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                del self._entries[key]
+
+    def is_busy(self, key: str) -> bool:
+        """True wenn fuer key gerade ein Turn laeuft."""
+        entry = self._entries.get(key)
+        return entry is not None and entry.lock.locked()
+
+    def busy_count(self) -> int:
+        """Anzahl Sessions mit laufendem Turn."""
+        return sum(1 for e in self._entries.values() if e.lock.locked())
+
+
+class CallLimiter:
+    """Begrenzt gleichzeitige LLM-Calls.
+
+    Args:
+        limit: maximale Anzahl paralleler Calls (<= 0 = unbegrenzt)
+
+    in_flight zaehlt auch ohne Limit — Runner nutzt den Wert um einen
+    Provider-Wechsel erst nach dem letzten laufenden Call anzuwenden.
+    """
+
+    def __init__(self, limit: int = 0) -> None:
+        self._limit = max(0, int(limit))
+        self._sem = asyncio.Semaphore(self._limit) if self._limit else None
+        self.in_flight: int = 0
+        self.peak: int = 0
+        self.waited: int = 0
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Einen Call-Slot belegen — wartet wenn das Limit erreicht ist."""
+        sem = self._sem
+        if sem is not None:
+            if sem.locked():
+                self.waited += 1
+            await sem.acquire()
+        self.in_flight += 1
+        if self.in_flight > self.peak:
+            self.peak = self.in_flight
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if sem is not None:
+                sem.release()
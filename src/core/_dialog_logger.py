@@ -27,6 +27,7 @@ class _DialogLogger:
         self.log_addons: bool = bool(log_cfg.get("log_addons", False))
         self.log_mcp: bool = bool(log_cfg.get("log_mcp", False))
         self._turn_nr: int = 0    # Laufende Nummer: USER+HEINZEL teilen sich eine Nr.
+        self._open_turns: dict[str, int] = {}   # session_id -> Nr. des offenen Turns
         self._path: Path | None = None
         self._file = None
 
@@ -54,12 +55,15 @@ class _DialogLogger:
         except Exception as exc:
             logging.getLogger(__name__).error("DialogLogger Schreibfehler: %s", exc)
 
-    def log_user(self, message: str) -> None:
+    def log_user(self, message: str, session_id: str = "") -> None:
         self._turn_nr += 1
+        self._open_turns[session_id] = self._turn_nr
         self._write(f"#{self._turn_nr:04d} USER: {message}")
 
-    def log_heinzel(self, response: str) -> None:
-        self._write(f"#{self._turn_nr:04d} HEINZEL: {response}")
+    def log_heinzel(self, response: str, session_id: str = "") -> None:
+        # Parallele Sessions: Antwort bekommt die Nr. ihrer eigenen Frage
+        nr = self._open_turns.pop(session_id, self._turn_nr)
+        self._write(f"#{nr:04d} HEINZEL: {response}")
 
     def log_addon(self, addon_name: str, hook: str, had_changes: bool) -> None:
         if not self.log_addons:
@@ -46,7 +46,7 @@ async def run_pre_phases(
     halted=True bedeutet: Pipeline soll abgebrochen werden.
     """
     sid, working_memory = await heinzel._ensure_session(session_id)
-    ctx_history = ContextHistory()
+    ctx_history = heinzel._new_context_history()
 
     ctx = PipelineContext(
         raw_input=message,
@@ -56,7 +56,7 @@ async def run_pre_phases(
         phase=HookPoint.ON_SESSION_START,
     )
     ctx_history.push(ctx)
-    heinzel._dialog_log.log_user(message)
+    heinzel._dialog_log.log_user(message, sid)
 
     halted = False
     for pre_phase in [
@@ -73,7 +73,7 @@ async def run_pre_phases(
         if pre_phase == HookPoint.ON_MEMORY_QUERY:
             wm_messages = await working_memory.get_context_messages()
             wm_tokens = working_memory.estimated_tokens()
-            wm_turns = len(await working_memory.get_recent_turns(999))
+            wm_turns = await working_memory.turn_count()
             if wm_messages:
                 ctx = ctx.evolve(
                     messages=wm_messages + ctx.messages,
@@ -122,7 +122,7 @@ async def run_post_phases(
     ]:
         ctx, _ = await phase(heinzel, post_phase, ctx, ctx_history)
         if post_phase == HookPoint.ON_OUTPUT_SENT:
-            heinzel._dialog_log.log_heinzel(response)
+            heinzel._dialog_log.log_heinzel(response, sid)
         elif post_phase == HookPoint.ON_STORED:
             turn = Turn(
                 session_id=sid,
@@ -133,6 +133,7 @@ async def run_post_phases(
             )
             await working_memory.add_turn(turn)
             await heinzel._session_manager.add_turn(sid, turn)
+            heinzel._schedule_token_calibration(f"{message}\n{response}")
 
             # Compaction-Monitor: nach jedem Turn pruefen
             handover = await heinzel._maybe_compact(working_memory, sid)
@@ -313,7 +314,14 @@ async def phase(
     ctx: PipelineContext,
     ctx_history: ContextHistory,
 ) -> tuple[PipelineContext, bool]:
-    """Einzelne Pipeline-Phase: evolve + push + dispatch."""
+    """Einzelne Pipeline-Phase: evolve + push + dispatch.
+
+    Phasen ohne registrierte AddOns werden komplett uebersprungen —
+    kein Snapshot, kein History-Eintrag. history.record_idle_phases=true
+    stellt die vollstaendige Phasen-Spur wieder her (Debugging).
+    """
+    if not heinzel._record_idle_phases and not heinzel._router.has_subscribers(hook):
+        return ctx, False
     ctx = ctx.evolve(phase=hook)
     ctx_history.push(ctx)
     return await dispatch_and_apply(heinzel, hook, ctx, ctx_history)
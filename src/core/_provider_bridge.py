@@ -8,6 +8,7 @@ TYPE_CHECKING-Guard verhindert zirkulaeren Import zur Runtime.
 
 from __future__ import annotations
 
+import json
 import logging
 from typing import TYPE_CHECKING, Any
 
@@ -17,6 +18,7 @@ from .models.base import Message, MessageType, ToolCall
 
 if TYPE_CHECKING:
     from .runner import Runner
+    from .tokens import TokenEstimator
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +35,138 @@ def build_messages_from_ctx(ctx: PipelineContext) -> list[dict[str, Any]]:
     return history + [current]
 
 
+# =============================================================================
+# Preflight: Kontextfenster vor dem Senden pruefen
+# =============================================================================
+
+_MESSAGE_OVERHEAD = 4   # Token pro Message fuer Rolle/Rahmen (grob)
+
+
+def _content_tokens(estimator: TokenEstimator, content: Any) -> int:
+    """Tokens eines Message-Contents (Text oder Content-Block-Liste)."""
+    if isinstance(content, str):
+        return estimator.count(content)
+    return estimator.count(json.dumps(content, ensure_ascii=False, default=str))
+
+
+def estimate_request_tokens(
+    estimator: TokenEstimator,
+    messages: list[dict[str, Any]],
+    system_prompt: str = "",
+    tools: list[dict[str, Any]] | None = None,
+) -> int:
+    """Geschaetzte Eingabe-Tokens eines Requests (Messages + System + Tools)."""
+    total = estimator.count(system_prompt) if system_prompt else 0
+    if tools:
+        total += estimator.count(json.dumps(tools, ensure_ascii=False, default=str))
+    for m in messages:
+        total += _MESSAGE_OVERHEAD + _content_tokens(estimator, m["content"])
+    return total
+
+
+async def _request_budget(heinzel: Runner, model: str) -> int | None:
+    """Eingabe-Budget: Kontextfenster minus Antwort-Reserve und Sicherheitsmarge.
+
+    Fenster: per 400 entdecktes Limit (provider.context_window) hat Vorrang,
+    sonst /models/{id} des Providers (dort pro Modell gecacht).
+    """
+    provider = heinzel._provider
+    window = getattr(provider, "context_window", None)
+    if not isinstance(window, int) or window <= 0:
+        lookup = getattr(provider, "model_context_window", None)
+        window = await lookup(model) if lookup is not None else None
+    if not isinstance(window, int) or window <= 0:
+        return None
+    cfg = heinzel._config.get("preflight", {})
+    reserve = int(cfg.get("reserve_tokens", 4096))
+    margin = float(cfg.get("safety_margin", 0.05))
+    return max(0, int(window * (1.0 - margin)) - reserve)
+
+
+def _trim_memory_messages(
+    estimator: TokenEstimator,
+    messages: tuple[Message, ...],
+    excess: int,
+) -> tuple[tuple[Message, ...], int]:
+    """Aelteste MEMORY-Messages entfernen bis excess Tokens eingespart sind.
+
+    REASONING-/TOOL-Messages bleiben unangetastet. Nach dem Kuerzen beginnt
+    das Memory wieder mit einer user-Message (Paare bleiben vollstaendig).
+    Gibt (neue Messages, Anzahl entfernt) zurueck.
+    """
+    drop: set[int] = set()
+    saved = 0
+    memory_idx = [
+        i for i, m in enumerate(messages) if m.message_type == MessageType.MEMORY
+    ]
+    pos = 0
+    while pos < len(memory_idx) and saved < excess:
+        i = memory_idx[pos]
+        drop.add(i)
+        saved += _MESSAGE_OVERHEAD + _content_tokens(estimator, messages[i].content)
+        pos += 1
+    # Keine verwaiste assistant-Antwort am Anfang stehen lassen
+    while pos < len(memory_idx) and messages[memory_idx[pos]].role != "user":
+        drop.add(memory_idx[pos])
+        pos += 1
+    if not drop:
+        return messages, 0
+    kept = tuple(m for i, m in enumerate(messages) if i not in drop)
+    return kept, len(drop)
+
+
+async def preflight_ctx(heinzel: Runner, ctx: PipelineContext) -> PipelineContext:
+    """Request-Groesse vor dem Senden gegen das Kontextfenster pruefen.
+
+    Passt der Request nicht, werden die aeltesten Working-Memory-Messages
+    aus ctx.messages entfernt und das Working Memory kompaktiert — statt
+    erst nach einem ContextLengthExceededError (voller Roundtrip) zu
+    reagieren. Zaehler in heinzel.preflight_stats.
+
+    Config: preflight.enabled (Default true), preflight.reserve_tokens
+    (Antwort-Reserve, Default 4096), preflight.safety_margin (Default 0.05).
+    """
+    cfg = heinzel._config.get("preflight", {})
+    if not cfg.get("enabled", True):
+        return ctx
+    budget = await _request_budget(heinzel, ctx.model)
+    if budget is None:
+        return ctx
+    stats = heinzel._preflight_stats
+    stats["checks"] += 1
+    estimator = heinzel._token_estimator
+    tools = ctx.metadata.get("hnz_tools") or None
+    size = estimate_request_tokens(
+        estimator, build_messages_from_ctx(ctx), ctx.system_prompt, tools
+    )
+    if size <= budget:
+        return ctx
+
+    messages, dropped = _trim_memory_messages(estimator, ctx.messages, size - budget)
+    if dropped:
+        stats["trimmed"] += 1
+        stats["messages_dropped"] += dropped
+        ctx = ctx.evolve(messages=messages)
+        working_memory = await heinzel._session_manager.get_working_memory(ctx.session_id)
+        await working_memory.compact(keep_ratio=0.5)
+        logger.info(
+            "Preflight: Request ~%d Token > Budget %d — %d Memory-Messages entfernt",
+            size, budget, dropped,
+        )
+    else:
+        stats["unresolved"] += 1
+        logger.warning(
+            "Preflight: Request ~%d Token > Budget %d — nichts zu kuerzen, sende trotzdem",
+            size, budget,
+        )
+    return ctx
+
+
+# =============================================================================
+# Provider-Aufruf
+# =============================================================================
+
+
 def _parse_tool_calls(content_blocks: list[dict[str, Any]]) -> list[ToolCall]:
     """Extrahiert ToolCall-Objekte aus Anthropic content_blocks.
 
@@ -55,12 +189,51 @@ async def call_provider(heinzel: Runner, ctx: PipelineContext) -> PipelineContex
     Setzt loop_done=True als Fallback — kein LoopControl-AddOn vorhanden.
     Ein LoopControl-AddOn kann loop_done via modified_ctx auf False setzen.
 
-    Turn-Safety: _in_turn-Flag verhindert Provider-Swap waehrend des Calls.
-    Ein pending Provider wird nach dem Call aktiviert.
+    Turn-Safety: der Call belegt einen Slot im CallLimiter des Runners
+    (concurrency.max_inflight_llm_calls). Solange Calls laufen wird kein
+    Provider-Swap angewendet — ein pending Provider wird nach dem letzten
+    laufenden Call aktiviert.
+    """
+    ctx = await preflight_ctx(heinzel, ctx)
+    try:
+        async with heinzel._llm_calls.slot():
+            response, content_blocks, ctx = await _call_provider_once(heinzel, ctx)
+    finally:
+        heinzel._activate_pending_provider()
+
+    # Tool-Calls aus content_blocks extrahieren
+    tool_calls = _parse_tool_calls(content_blocks)
+
+    # tool_use-Blöcke direkt in ctx.messages schreiben (MessageType.TOOL)
+    new_messages = ctx.messages
+    if content_blocks and tool_calls:
+        tool_use_msg = Message(
+            role="assistant",
+            content=content_blocks,
+            message_type=MessageType.TOOL,
+        )
+        new_messages = ctx.messages + (tool_use_msg,)
+
+    return ctx.evolve(
+        phase=HookPoint.ON_LLM_RESPONSE,
+        response=response,
+        stream_buffer=response,
+        tool_requests=tuple(tool_calls),
+        loop_done=not bool(tool_calls),   # Tool-Calls? Loop läuft weiter.
+        messages=new_messages,
+    )
+
+
+async def _call_provider_once(
+    heinzel: Runner, ctx: PipelineContext
+) -> tuple[str, list[dict[str, Any]], PipelineContext]:
+    """Provider-Call inkl. einmaligem Retry nach Kontext-Ueberlauf.
+
+    Gibt (response, content_blocks, ctx) zurueck — ctx kann durch den
+    Preflight beim Retry gekuerzt sein.
     """
     messages = build_messages_from_ctx(ctx)
     tools: list[dict[str, Any]] | None = ctx.metadata.get("hnz_tools") or None
-    heinzel._in_turn = True
     content_blocks: list[dict[str, Any]] = []
     try:
         if tools:
@@ -83,10 +256,13 @@ async def call_provider(heinzel: Runner, ctx: PipelineContext) -> PipelineContex
             exc.tokens_sent,
             exc.limit_discovered,
         )
+        heinzel._preflight_stats["overflows"] += 1
         if exc.limit_discovered and hasattr(heinzel._provider, "context_window"):
             heinzel._provider.context_window = exc.limit_discovered
         working_memory = await heinzel._session_manager.get_working_memory(ctx.session_id)
         await working_memory.compact(keep_ratio=0.5)
+        # Mit entdecktem Limit kuerzt der Preflight jetzt auch ctx.messages
+        ctx = await preflight_ctx(heinzel, ctx)
         messages = build_messages_from_ctx(ctx)
         try:
             response = await heinzel._provider.chat(
@@ -100,32 +276,4 @@ async def call_provider(heinzel: Runner, ctx: PipelineContext) -> PipelineContex
     except Exception as exc:
         logger.error("Provider-Fehler: %s", exc, exc_info=True)
         response = f"[Provider-Fehler: {exc}]"
-    finally:
-        heinzel._in_turn = False
-        # Pending swap nach Turn-Ende anwenden
-        if heinzel._pending_provider is not None:
-            heinzel._provider = heinzel._pending_provider
-            heinzel._pending_provider = None
-            logger.info("set_provider: pending Provider aktiviert nach Turn-Ende")
-
-    # Tool-Calls aus content_blocks extrahieren
-    tool_calls = _parse_tool_calls(content_blocks)
-
-    # tool_use-Blöcke direkt in ctx.messages schreiben (MessageType.TOOL)
-    new_messages = ctx.messages
-    if content_blocks and tool_calls:
-        tool_use_msg = Message(
-            role="assistant",
-            content=content_blocks,
-            message_type=MessageType.TOOL,
-        )
-        new_messages = ctx.messages + (tool_use_msg,)
-
-    return ctx.evolve(
-        phase=HookPoint.ON_LLM_RESPONSE,
-        response=response,
-        stream_buffer=response,
-        tool_requests=tuple(tool_calls),
-        loop_done=not bool(tool_calls),   # Tool-Calls? Loop läuft weiter.
-        messages=new_messages,
-    )
+    return response, content_blocks, ctx
@@ -0,0 +1,111 @@
+"""_streaming — Stream-Akkumulator und Chunk-Fenster fuer Runner.
+
+Package-intern: nicht in __init__.py exportiert.
+
+StreamAccumulator  — sammelt Stream-Chunks in einer Liste statt per
+                     str +=. Join erst bei Bedarf, Ergebnis wird gecacht.
+StreamChunkBatcher — fasst Chunks zu Fenstern zusammen (Groesse oder Zeit)
+                     und ruft pro Fenster einen Callback auf. Damit kann
+                     ON_STREAM_CHUNK dispatcht werden ohne Kosten pro Token.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Awaitable, Callable
+
+
+class StreamAccumulator:
+    """Sammelt gestreamte Text-Chunks — lineare Kosten statt quadratischer.
+
+    append() ist O(1). text joint alle Teile einmal und legt das Ergebnis
+    als einzigen Teil ab — wiederholtes Lesen kostet nichts extra.
+    """
+
+    __slots__ = ("_parts", "_length")
+
+    def __init__(self) -> None:
+        self._parts: list[str] = []
+        self._length: int = 0
+
+    def append(self, chunk: str) -> None:
+        """Chunk anhaengen. Leere Chunks werden ignoriert."""
+        if chunk:
+            self._parts.append(chunk)
+            self._length += len(chunk)
+
+    def reset(self, text: str = "") -> None:
+        """Inhalt verwerfen und optional durch text ersetzen."""
+        self._parts = [text] if text else []
+        self._length = len(text)
+
+    @property
+    def text(self) -> str:
+        """Bisher gesammelter Text."""
+        parts = self._parts
+        if len(parts) > 1:
+            self._parts = parts = ["".join(parts)]
+        return parts[0] if parts else ""
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __str__(self) -> str:
+        return self.text
+
+
+class StreamChunkBatcher:
+    """Fasst Stream-Chunks zu Fenstern zusammen.
+
+    Ein Fenster wird abgegeben sobald max_chars Zeichen gesammelt sind oder
+    seit dem ersten Chunk des Fensters max_interval Sekunden vergangen sind.
+    Die Zeit wird nur beim Eintreffen eines Chunks geprueft — kein Timer.
+    flush() gibt den Rest ab (Stream-Ende).
+
+    Args:
+        on_window:    async Callback, bekommt den Text eines Fensters
+        max_chars:    Fenstergroesse in Zeichen (>= 1)
+        max_interval: maximale Fensterdauer in Sekunden (0 = nur Groesse)
+    """
+
+    def __init__(
+        self,
+        on_window: Callable[[str], Awaitable[None]],
+        max_chars: int = 256,
+        max_interval: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_chars < 1:
+            raise ValueError(f"max_chars muss >= 1 sein, ist {max_chars}")
+        self._on_window = on_window
+        self._max_chars = max_chars
+        self._max_interval = max_interval
+        self._clock = clock
+        self._pending: list[str] = []
+        self._pending_chars: int = 0
+        self._window_start: float = 0.0
+        self.windows_flushed: int = 0
+
+    async def feed(self, chunk: str) -> None:
+        """Chunk aufnehmen, Fenster abgeben wenn voll oder abgelaufen."""
+        if not chunk:
+            return
+        now = self._clock()
+        if not self._pending:
+            self._window_start = now
+        self._pending.append(chunk)
+        self._pending_chars += len(chunk)
+        if self._pending_chars >= self._max_chars or (
+            self._max_interval > 0 and now - self._window_start >= self._max_interval
+        ):
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Offenes Fenster abgeben (No-Op wenn leer)."""
+        if not self._pending:
+            return
+        window = "".join(self._pending)
+        self._pending = []
+        self._pending_chars = 0
+        self.windows_flushed += 1
+        await self._on_window(window)
@@ -18,6 +18,7 @@ from .exceptions import AddOnDependencyError, AddOnError, AddOnLoadError
 from .models import (
     AddOnResult,
     ContextHistory,
+    HookPoint,
     PipelineContext,
 )
 
@@ -55,6 +56,10 @@ class AddOn(ABC):
       - name:         Eindeutiger Bezeichner (snake_case, z.B. 'web_search')
       - version:      Semantic Versioning, default '0.1.0'
       - dependencies: Namen anderer AddOns die VOR diesem geladen sein müssen
+      - observe_only: HookPoints an denen das AddOn nur beobachtet — ctx wird
+                      nie verändert, nie halt. Der Router ruft Beobachter
+                      nach den mutierenden AddOns des Hooks auf (parallel
+                      oder im Hintergrund, siehe AddOnRouter observer_mode)
 
     Lifecycle:
       on_attach(heinzel) → [Hooks werden dispatched] → on_detach(heinzel)
@@ -87,6 +92,7 @@ class AddOn(ABC):
     name: str = ""
     version: str = "0.1.0"
     dependencies: list[str] = []
+    observe_only: frozenset[HookPoint] = frozenset()
 
     def __init__(self) -> None:
         if not self.name:
@@ -192,7 +198,13 @@ class AddOn(ABC):
     async def on_stream_chunk(
         self, ctx: _Ctx, history: _Hist = None
     ) -> AddOnResult:
-        """Hook: Ein gestreamter Chunk ist angekommen."""
+        """Hook: Ein Fenster gestreamter Chunks ist angekommen.
+
+        Text des Fensters in ctx.metadata["hnz_stream_chunk"]; den bisherigen
+        Gesamttext liefert ctx.metadata["hnz_stream_text"]() bei Bedarf.
+        ctx.stream_buffer ist hier leer. Rein lesend — modified_ctx wird
+        ignoriert.
+        """
         return AddOnResult(modified_ctx=ctx)
 
     async def on_thinking_step(
@@ -24,10 +24,12 @@ from .models.placeholders import (
     HandoverContext,
     ResourceBudget,
 )
+from .tokens import TokenEstimatorRegistry
 
 if TYPE_CHECKING:
     from .models.context import ContextHistory
     from .session import Session, Turn
+    from .tokens import TokenEstimator
 
 logger = logging.getLogger(__name__)
 
@@ -75,11 +77,14 @@ class CompactionStrategy(ABC):
         self,
         turns: list[Turn],
         budget: ResourceBudget,
+        estimator: TokenEstimator | None = None,
     ) -> CompactionResult:
         """Kern-Methode: verdichtet die Turn-Liste.
 
         Gibt CompactionResult zurueck — kept_turns + optional summary.
         Kritische Turns duerfen NIEMALS in dropped_turns landen.
+        estimator: TokenEstimator der Working Memory (Runner-Konfiguration),
+        damit tokens_before/after zu den Roll-Schwellen passen.
         """
 
     @abstractmethod
@@ -134,7 +139,7 @@ class RollingSessionPolicy(ABC):
 
 
 # ---------------------------------------------------------------------------
-# Hilfsfunktion: Kritikalitaet pruefen
+# Hilfsfunktionen: Kritikalitaet pruefen, Tokens schaetzen
 # ---------------------------------------------------------------------------
 
 
@@ -147,6 +152,17 @@ def _is_critical(turn: Turn) -> bool:
     return any(kw in text for kw in _CRITICAL_KEYWORDS)
 
 
+def _est_tokens(turns: list[Turn], estimator: TokenEstimator | None) -> int:
+    """Token-Schaetzung ueber den Estimator der Working Memory.
+
+    Nur direkte Aufrufe ohne Working Memory fallen auf den Registry-Default
+    zurueck.
+    """
+    if estimator is None:
+        estimator = TokenEstimatorRegistry.get_default()
+    return estimator.count_turns(turns)
+
+
 # ---------------------------------------------------------------------------
 # SummarizingCompactionStrategy — DEFAULT (Claude-Stil)
 # ---------------------------------------------------------------------------
@@ -198,6 +214,7 @@ class SummarizingCompactionStrategy(CompactionStrategy):
         self,
         turns: list[Turn],
         budget: ResourceBudget,
+        estimator: TokenEstimator | None = None,
     ) -> CompactionResult:
         if not turns:
             return CompactionResult()
@@ -215,15 +232,8 @@ class SummarizingCompactionStrategy(CompactionStrategy):
 
         summary = await self.summarize(dropped) if dropped else None
 
-        # Naive Token-Schaetzung: 4 Zeichen ~ 1 Token
-        def _est_tokens(ts: list[Turn]) -> int:
-            return sum(
-                len(t.raw_input) + len(t.final_response)
-                for t in ts
-            ) // 4
-
-        tokens_before = _est_tokens(turns)
-        tokens_after = _est_tokens(kept)
+        tokens_before = _est_tokens(turns, estimator)
+        tokens_after = _est_tokens(kept, estimator)
 
         return CompactionResult(
             kept_turns=tuple(kept),
@@ -275,6 +285,7 @@ class TruncationCompactionStrategy(CompactionStrategy):
         self,
         turns: list[Turn],
         budget: ResourceBudget,
+        estimator: TokenEstimator | None = None,
     ) -> CompactionResult:
         if not turns:
             return CompactionResult()
@@ -295,14 +306,8 @@ class TruncationCompactionStrategy(CompactionStrategy):
             len(dropped),
         )
 
-        def _est_tokens(ts: list[Turn]) -> int:
-            return sum(
-                len(t.raw_input) + len(t.final_response)
-                for t in ts
-            ) // 4
-
-        tokens_before = _est_tokens(turns)
-        tokens_after = _est_tokens(kept)
+        tokens_before = _est_tokens(turns, estimator)
+        tokens_after = _est_tokens(kept, estimator)
 
         return CompactionResult(
             kept_turns=tuple(kept),
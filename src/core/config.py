@@ -32,6 +32,10 @@ class ProviderDefaults(BaseModel):
     default: str = "anthropic"
     timeout: int = 60
     retries: int = 3
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    http2: bool = False
 
 
 class ProviderEntry(BaseModel):
@@ -29,6 +29,7 @@ from .context import (
     PipelineContext,
     ContextDiff,
     ContextHistory,
+    HistoryRetention,
 )
 
 __all__ = [
@@ -52,4 +53,5 @@ __all__ = [
     "PipelineContext",
     "ContextDiff",
     "ContextHistory",
+    "HistoryRetention",
 ]
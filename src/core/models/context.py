@@ -7,8 +7,10 @@ Denkgeschichte des Heinzel für einen Turn.
 
 from __future__ import annotations
 
+import enum
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Iterator
 from uuid import uuid4
 
 from pydantic import BaseModel, Field
@@ -82,13 +84,40 @@ class PipelineContext(BaseModel, frozen=True):
         previous wird automatisch auf self gesetzt.
         snapshot_id und timestamp werden neu generiert.
         phase muss in changes angegeben werden.
+
+        Copy-on-write: nur die Felder in changes werden validiert,
+        alle anderen Feld-Objekte (messages, metadata, ...) werden per
+        Referenz übernommen. Die Kosten hängen damit nicht von der Länge
+        der History ab. Sicher, weil alle Snapshots frozen sind.
         """
-        data = self.model_dump(exclude={"previous", "snapshot_id", "timestamp"})
-        data.update(changes)
-        data["previous"] = self
-        data["snapshot_id"] = str(uuid4())
-        data["timestamp"] = datetime.now(timezone.utc)
-        return PipelineContext(**data)
+        update = _validate_changes(changes)
+        update["previous"] = self
+        update["snapshot_id"] = str(uuid4())
+        update["timestamp"] = datetime.now(timezone.utc)
+        return self.model_copy(update=update)
+
+
+# Felder die evolve() selbst setzt — werden nie aus changes übernommen
+_EVOLVE_MANAGED = frozenset({"previous", "snapshot_id", "timestamp"})
+
+
+def _validate_changes(changes: dict[str, Any]) -> dict[str, Any]:
+    """Validiert nur die geänderten Felder eines evolve()-Aufrufs.
+
+    Unbekannte Keys werden ignoriert (wie beim Konstruktor).
+    Gibt die validierten Werte als neues dict zurück.
+    """
+    relevant = {
+        key: value
+        for key, value in changes.items()
+        if key in PipelineContext.model_fields and key not in _EVOLVE_MANAGED
+    }
+    if not relevant:
+        return {}
+    # Teil-Validierung: nicht übergebene Felder erhalten Defaults und
+    # werden verworfen — bestehende Objekte werden nicht neu geprüft.
+    validated = PipelineContext.model_validate(relevant)
+    return {key: getattr(validated, key) for key in relevant}
 
 
 class ContextDiff(BaseModel, frozen=True):
@@ -101,19 +130,186 @@ class ContextDiff(BaseModel, frozen=True):
     phases_between: list[HookPoint] = Field(default_factory=list)
 
 
+class HistoryRetention(str, enum.Enum):
+    """Aufbewahrungsmodus der ContextHistory.
+
+    FULL   — alle Snapshots voll halten (Default, vollständige Denkgeschichte)
+    PHASES — nur den letzten Snapshot pro HookPoint halten (max. 24)
+    RING   — die letzten N Snapshots voll, ältere als Feld-Deltas
+    """
+
+    FULL = "full"
+    PHASES = "phases"
+    RING = "ring"
+
+
+@dataclass(frozen=True, slots=True)
+class _TupleAppend:
+    """Delta-Wert: Tuple-Feld wurde nur hinten erweitert (z.B. messages)."""
+
+    tail: tuple
+
+
+def _snapshot_fields(snap: PipelineContext) -> dict[str, Any]:
+    """Feldwerte eines Snapshots ohne previous (nur Referenzen, keine Kopie)."""
+    fields = dict(snap.__dict__)
+    fields.pop("previous", None)
+    return fields
+
+
+def _field_delta(base: dict[str, Any], fields: dict[str, Any]) -> dict[str, Any]:
+    """Feldweises Delta von base nach fields.
+
+    Dank evolve() (copy-on-write) sind unveränderte Felder dasselbe Objekt —
+    der Identitätsvergleich reicht. Tuples die nur hinten gewachsen sind
+    werden als _TupleAppend gespeichert statt als komplettes Tuple.
+    """
+    delta: dict[str, Any] = {}
+    for key, value in fields.items():
+        old = base.get(key)
+        if value is old:
+            continue
+        if (
+            isinstance(value, tuple)
+            and isinstance(old, tuple)
+            and len(value) > len(old)
+            and all(a is b for a, b in zip(old, value))
+        ):
+            delta[key] = _TupleAppend(value[len(old):])
+        else:
+            delta[key] = value
+    return delta
+
+
+def _apply_delta(base: dict[str, Any], delta: dict[str, Any]) -> dict[str, Any]:
+    """Delta auf eine Feld-Map anwenden. Gibt eine neue Map zurück."""
+    fields = dict(base)
+    for key, value in delta.items():
+        if isinstance(value, _TupleAppend):
+            fields[key] = fields[key] + value.tail
+        else:
+            fields[key] = value
+    return fields
+
+
+def _unlinked(snap: PipelineContext) -> PipelineContext:
+    """Kopie eines Snapshots ohne previous-Zeiger.
+
+    previous ist reine Navigation, kein Zustand. Ohne den Schnitt hielte die
+    previous-Kette alle verworfenen Snapshots eines Turns am Leben. Flache
+    Kopie statt Mutation — der Snapshot des Aufrufers bleibt unverändert.
+    """
+    if snap.previous is None:
+        return snap
+    return snap.model_copy(update={"previous": None})
+
+
 class ContextHistory:
     """
-    Verwaltet die vollständige Snapshot-Sequenz eines Turns.
+    Verwaltet die Snapshot-Sequenz eines Turns.
 
     Nicht frozen — ist der veränderliche Container für immutable Snapshots.
+
+    Aufbewahrung (retention):
+        FULL   — alle Snapshots voll (Default).
+        PHASES — nur der letzte Snapshot pro HookPoint. Ältere Snapshots
+                 derselben Phase (z.B. frühere Loop-Iterationen) entfallen.
+        RING   — die letzten max_snapshots voll, ältere als feldweise Deltas.
+                 at_phase(), between(), diff() und to_reasoning_trace()
+                 rekonstruieren sie bei Bedarf.
+
+    In PHASES und RING hält die History flache Kopien mit previous=None —
+    die übergebenen Snapshots bleiben unverändert, die History hält aber
+    keine previous-Kette am Leben. Rekonstruierte Snapshots haben ebenfalls
+    previous=None und sind bei jedem Zugriff neue Objekte.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        retention: HistoryRetention | str = HistoryRetention.FULL,
+        max_snapshots: int = 32,
+    ) -> None:
+        self._retention = HistoryRetention(retention)
+        if max_snapshots < 1:
+            raise ValueError(f"max_snapshots muss >= 1 sein (war {max_snapshots})")
+        self._max_snapshots = max_snapshots
+        # Voll gehaltene Snapshots, chronologisch
         self._snapshots: list[PipelineContext] = []
+        # RING: ältester verdrängter Snapshot (voll) + Deltas der Nachfolger
+        self._base: PipelineContext | None = None
+        self._deltas: list[dict[str, Any]] = []
+        # Feld-Map des zuletzt verdrängten Snapshots — Basis für das nächste Delta
+        self._tail_fields: dict[str, Any] = {}
+
+    @property
+    def retention(self) -> HistoryRetention:
+        """Aktiver Aufbewahrungsmodus."""
+        return self._retention
+
+    def __len__(self) -> int:
+        """Anzahl aller Snapshots (voll gehalten + als Delta gespeichert)."""
+        compacted = len(self._deltas) + (1 if self._base is not None else 0)
+        return compacted + len(self._snapshots)
+
+    def copy(self) -> ContextHistory:
+        """Momentaufnahme der History — spätere push()-Aufrufe ändern sie nicht.
+
+        Flach: die Snapshots sind immutable und werden geteilt, nur die
+        Listen werden kopiert.
+        """
+        clone = ContextHistory.__new__(ContextHistory)
+        clone._retention = self._retention
+        clone._max_snapshots = self._max_snapshots
+        clone._snapshots = list(self._snapshots)
+        clone._base = self._base
+        clone._deltas = list(self._deltas)
+        clone._tail_fields = self._tail_fields
+        return clone
 
     def push(self, ctx: PipelineContext) -> None:
         """Neuen Snapshot anhängen."""
-        self._snapshots.append(ctx)
+        if self._retention == HistoryRetention.PHASES:
+            self._snapshots = [s for s in self._snapshots if s.phase != ctx.phase]
+            self._snapshots.append(_unlinked(ctx))
+            return
+
+        if self._retention == HistoryRetention.FULL:
+            self._snapshots.append(ctx)
+            return
+
+        self._snapshots.append(_unlinked(ctx))
+        while len(self._snapshots) > self._max_snapshots:
+            self._compact_oldest()
+
+    def _compact_oldest(self) -> None:
+        """RING: ältesten vollen Snapshot in ein Delta überführen."""
+        oldest = self._snapshots.pop(0)
+        fields = _snapshot_fields(oldest)
+        if self._base is None:
+            self._base = oldest
+        else:
+            self._deltas.append(_field_delta(self._tail_fields, fields))
+        self._tail_fields = fields
+
+    def _iter_compacted(self) -> Iterator[PipelineContext]:
+        """RING: verdrängte Snapshots chronologisch rekonstruieren."""
+        if self._base is None:
+            return
+        yield self._base
+        fields = _snapshot_fields(self._base)
+        for delta in self._deltas:
+            fields = _apply_delta(fields, delta)
+            yield PipelineContext.model_construct(previous=None, **fields)
+
+    def _iter_snapshots(self) -> Iterator[PipelineContext]:
+        """Alle Snapshots chronologisch — verdrängte werden rekonstruiert."""
+        yield from self._iter_compacted()
+        yield from self._snapshots
+
+    @property
+    def snapshots(self) -> list[PipelineContext]:
+        """Alle Snapshots chronologisch (verdrängte rekonstruiert)."""
+        return list(self._iter_snapshots())
 
     @property
     def current(self) -> PipelineContext:
@@ -124,7 +320,9 @@ class ContextHistory:
 
     @property
     def initial(self) -> PipelineContext:
-        """Erster Snapshot (raw input)."""
+        """Erster gehaltener Snapshot (raw input)."""
+        if self._base is not None:
+            return self._base
         if not self._snapshots:
             raise RuntimeError("ContextHistory ist leer")
         return self._snapshots[0]
@@ -134,13 +332,17 @@ class ContextHistory:
         for snap in reversed(self._snapshots):
             if snap.phase == hook:
                 return snap
-        return None
+        found = None
+        for snap in self._iter_compacted():
+            if snap.phase == hook:
+                found = snap
+        return found
 
     def between(self, phase_a: HookPoint, phase_b: HookPoint) -> list[PipelineContext]:
         """Alle Snapshots zwischen zwei Phasen (beide inklusiv)."""
         result = []
         capturing = False
-        for snap in self._snapshots:
+        for snap in self._iter_snapshots():
             if snap.phase == phase_a:
                 capturing = True
             if capturing:
@@ -167,7 +369,7 @@ class ContextHistory:
         # Phasen zwischen den beiden Snapshots sammeln
         capturing = False
         phases: list[HookPoint] = []
-        for snap in self._snapshots:
+        for snap in self._iter_snapshots():
             if snap.snapshot_id == snap_a.snapshot_id:
                 capturing = True
             if capturing:
@@ -186,7 +388,7 @@ class ContextHistory:
     def to_reasoning_trace(self) -> list[str]:
         """Menschenlesbare Denkgeschichte des Turns."""
         lines = []
-        for snap in self._snapshots:
+        for snap in self._iter_snapshots():
             phase = snap.phase.value.upper()
             if snap.raw_input and snap.phase == HookPoint.ON_INPUT:
                 lines.append(f"[{phase}] Input erhalten: \"{snap.raw_input[:80]}\"")
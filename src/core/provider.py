@@ -3,12 +3,18 @@
 Implementiert LLMProvider-ABC (chat + stream) und Management-API
 (health, list_models, set_model).
 
+Verbindungen: ein langlebiger, gepoolter httpx.AsyncClient pro Provider
+(Keep-Alive, optional HTTP/2). Freigabe via aclose() — Runner.disconnect()
+ruft das automatisch auf.
+
 Kein LLM-spezifischer Code — spricht gegen unsere eigene Service-API,
 hinter der beliebige LLMs stecken koennen (OpenAI, Anthropic, Ollama, ...).
 """
 
 from __future__ import annotations
 
+import asyncio
+import importlib.util
 import json
 import logging
 from abc import ABC, abstractmethod
@@ -69,6 +75,22 @@ class LLMProvider(ABC):
     ) -> AsyncGenerator[str, None]:
         """Streaming-Call. Liefert Text-Chunks."""
 
+    async def count_tokens(
+        self,
+        messages: list[dict[str, Any]],
+        system_prompt: str = "",
+        model: str = "",
+    ) -> int | None:
+        """Exakte Token-Zaehlung durch den Provider. None = nicht unterstuetzt."""
+        return None
+
+    async def model_context_window(self, model: str = "") -> int | None:
+        """Kontextfenster des Modells in Token. None = unbekannt."""
+        return None
+
+    async def aclose(self) -> None:
+        """Ressourcen freigeben (Verbindungen, Pools). Default: No-Op."""
+
 
 class HttpLLMProvider(LLMProvider):
     """HTTP-Client gegen einen laufenden Heinzel Provider-Service.
@@ -76,10 +98,16 @@ class HttpLLMProvider(LLMProvider):
     Ein Provider-Service ist ein Container der unsere Service-API
     implementiert — unabhaengig davon welches LLM dahinter steckt.
 
+    Alle Requests laufen ueber einen gepoolten Client — Verbindungen werden
+    per Keep-Alive wiederverwendet statt pro Call neu aufgebaut.
+    connection_stats zeigt wie viele Requests eine bestehende Verbindung
+    nutzen konnten.
+
     Verwendung:
         provider = HttpLLMProvider(name="openai", base_url="http://thebrain:12101")
         ok = await provider.health()
         response = await provider.chat(messages=[{"role": "user", "content": "Hallo"}])
+        await provider.aclose()
     """
 
     def __init__(
@@ -88,12 +116,28 @@ class HttpLLMProvider(LLMProvider):
         base_url: str,
         model: str = "",
         timeout: float = 120.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
     ) -> None:
         self._name = name
         self._base_url = base_url.rstrip("/")
         self._model = model
         self._timeout = timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._http2 = http2 and _http2_available(name)
+        self._client: httpx.AsyncClient | None = None
+        self._client_loop: asyncio.AbstractEventLoop | None = None
+        self._retiring: set[asyncio.Task] = set()  # Clients frueherer Loops
+        self._requests_sent: int = 0
+        self._connections_opened: int = 0
         self._context_window: int | None = None  # lazy-discovery via ContextLengthExceededError
+        self._model_windows: dict[str, int | None] = {}  # /models/{id}, pro Modell gecacht
 
     # -------------------------------------------------------------------------
     # Properties
@@ -117,7 +161,8 @@ class HttpLLMProvider(LLMProvider):
 
         None = noch unbekannt (kein Request bisher oder nie ein 400 erhalten).
         Wird automatisch gesetzt wenn _call_provider() einen
-        ContextLengthExceededError faengt.
+        ContextLengthExceededError faengt. Vorab-Wert pro Modell liefert
+        model_context_window().
         """
         return self._context_window
 
@@ -126,6 +171,84 @@ class HttpLLMProvider(LLMProvider):
         """Setzt das Limit nach Lazy-Discovery durch einen 400-Fehler."""
         self._context_window = value
 
+    @property
+    def connection_stats(self) -> dict[str, int]:
+        """Verbindungs-Zaehler des Pools.
+
+        requests:           gesendete Requests
+        connections_opened: neu aufgebaute TCP-Verbindungen
+        connections_reused: Requests ueber eine bestehende Verbindung
+        """
+        return {
+            "requests": self._requests_sent,
+            "connections_opened": self._connections_opened,
+            "connections_reused": max(0, self._requests_sent - self._connections_opened),
+        }
+
+    # -------------------------------------------------------------------------
+    # Verbindungs-Pool
+    # -------------------------------------------------------------------------
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Gepoolten Client liefern — lazy angelegt, einer pro Event-Loop."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            if self._client is not None:
+                self._retire_client(self._client, self._client_loop)
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=self._limits,
+                http2=self._http2,
+                event_hooks={"request": [self._on_request]},
+            )
+            self._client_loop = loop
+        return self._client
+
+    def _retire_client(
+        self, client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop | None
+    ) -> None:
+        """Client eines frueheren Loops schliessen statt ihn zu verwaisen.
+
+        Laeuft dessen Loop noch (anderer Thread), schliesst er dort —
+        sonst als Task im aktuellen Loop. aclose() wartet darauf.
+        """
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+        task = asyncio.get_running_loop().create_task(client.aclose())
+        self._retiring.add(task)
+        task.add_done_callback(self._on_retired)
+
+    def _on_retired(self, task: asyncio.Task) -> None:
+        self._retiring.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(
+                "Alter Client von %s nicht sauber geschlossen: %s",
+                self._name, task.exception(),
+            )
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        """Request-Hook: zaehlt Requests und haengt den Trace-Callback an."""
+        self._requests_sent += 1
+        request.extensions["trace"] = self._on_trace
+
+    async def _on_trace(self, event_name: str, info: dict[str, Any]) -> None:
+        """httpcore-Trace: neue TCP-Verbindungen zaehlen."""
+        if event_name == "connection.connect_tcp.complete":
+            self._connections_opened += 1
+
+    async def aclose(self) -> None:
+        """Gepoolten Client schliessen. Naechster Request baut einen neuen auf."""
+        client = self._client
+        self._client = None
+        self._client_loop = None
+        loop = asyncio.get_running_loop()
+        pending = [t for t in self._retiring if t.get_loop() is loop]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        if client is not None:
+            await client.aclose()
+
     # -------------------------------------------------------------------------
     # Management
     # -------------------------------------------------------------------------
@@ -133,10 +256,9 @@ class HttpLLMProvider(LLMProvider):
     async def health(self) -> bool:
         """Pingt /health. Gibt True wenn status == 'ok', sonst False."""
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                resp = await client.get(f"{self._base_url}/health")
-                resp.raise_for_status()
-                return resp.json().get("status") == "ok"
+            resp = await self._get_client().get(f"{self._base_url}/health", timeout=5.0)
+            resp.raise_for_status()
+            return resp.json().get("status") == "ok"
         except Exception as exc:
             logger.warning("health() fehlgeschlagen fuer %s: %s", self._name, exc)
             return False
@@ -144,10 +266,9 @@ class HttpLLMProvider(LLMProvider):
     async def list_models(self) -> list[str]:
         """Gibt alle verfuegbaren Modelle des Providers zurueck."""
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                resp = await client.get(f"{self._base_url}/models")
-                resp.raise_for_status()
-                return resp.json().get("models", [])
+            resp = await self._get_client().get(f"{self._base_url}/models", timeout=10.0)
+            resp.raise_for_status()
+            return resp.json().get("models", [])
         except httpx.HTTPStatusError as exc:
             raise ProviderError(
                 f"list_models fehlgeschlagen: {self._name}",
@@ -165,6 +286,77 @@ class HttpLLMProvider(LLMProvider):
         self._model = model
         logger.debug("Provider '%s': Modell gesetzt auf '%s'", self._name, model)
 
+    async def model_context_window(self, model: str = "") -> int | None:
+        """Kontextfenster eines Modells via /models/{id}.
+
+        Antworten werden pro Modell gecacht — auch None (Service kennt das
+        Modell nicht oder liefert kein context_window), damit ein fehlender
+        Wert nicht jeden Request einen Roundtrip kostet.
+        """
+        model_id = model or self._model
+        if not model_id:
+            return None
+        if model_id in self._model_windows:
+            return self._model_windows[model_id]
+        window: int | None = None
+        try:
+            resp = await self._get_client().get(
+                f"{self._base_url}/models/{model_id}", timeout=10.0
+            )
+            if resp.status_code == 200:
+                detail = resp.json().get("model") or {}
+                window = detail.get("context_window") or None
+        except Exception as exc:
+            # Netzwerkfehler nicht cachen — naechster Request versucht es erneut
+            logger.debug(
+                "model_context_window fehlgeschlagen fuer %s/%s: %s",
+                self._name, model_id, exc,
+            )
+            return None
+        self._model_windows[model_id] = window
+        return window
+
+    async def count_tokens(
+        self,
+        messages: list[dict[str, Any]],
+        system_prompt: str = "",
+        model: str = "",
+    ) -> int | None:
+        """Exakte Token-Zaehlung via /tokens/count.
+
+        None wenn der Provider-Service nicht exakt zaehlen kann (501 oder
+        nur lokale Schaetzung, source="estimate").
+        """
+        payload: dict[str, Any] = {"messages": messages}
+        if system_prompt:
+            payload["system"] = system_prompt
+        effective_model = model or self._model
+        if effective_model:
+            payload["model"] = effective_model
+
+        try:
+            resp = await self._get_client().post(
+                f"{self._base_url}/tokens/count", json=payload, timeout=10.0
+            )
+            if resp.status_code == 501:
+                return None
+            resp.raise_for_status()
+            data = resp.json()
+            if data.get("source") == "estimate":
+                return None
+            return int(data.get("input_tokens", 0))
+        except httpx.HTTPStatusError as exc:
+            raise ProviderError(
+                f"count_tokens fehlgeschlagen: {self._name}",
+                status_code=exc.response.status_code,
+                detail=str(exc),
+            ) from exc
+        except Exception as exc:
+            raise ProviderError(
+                f"count_tokens fehlgeschlagen: {self._name}",
+                detail=str(exc),
+            ) from exc
+
     # -------------------------------------------------------------------------
     # LLMProvider-ABC
     # -------------------------------------------------------------------------
@@ -184,10 +376,9 @@ class HttpLLMProvider(LLMProvider):
             payload["model"] = effective_model
 
         try:
-            async with httpx.AsyncClient(timeout=self._timeout) as client:
-                resp = await client.post(f"{self._base_url}/chat", json=payload)
-                resp.raise_for_status()
-                return resp.json().get("content", "")
+            resp = await self._get_client().post(f"{self._base_url}/chat", json=payload)
+            resp.raise_for_status()
+            return resp.json().get("content", "")
         except httpx.HTTPStatusError as exc:
             raise ProviderError(
                 f"chat fehlgeschlagen: {self._name}",
@@ -222,13 +413,12 @@ class HttpLLMProvider(LLMProvider):
             payload["tools"] = tools
 
         try:
-            async with httpx.AsyncClient(timeout=self._timeout) as client:
-                resp = await client.post(f"{self._base_url}/chat", json=payload)
-                resp.raise_for_status()
-                data = resp.json()
-                text = data.get("content", "")
-                content_blocks = data.get("content_blocks", []) or []
-                return text, content_blocks
+            resp = await self._get_client().post(f"{self._base_url}/chat", json=payload)
+            resp.raise_for_status()
+            data = resp.json()
+            text = data.get("content", "")
+            content_blocks = data.get("content_blocks", []) or []
+            return text, content_blocks
         except httpx.HTTPStatusError as exc:
             raise ProviderError(
                 f"chat_tools fehlgeschlagen: {self._name}",
@@ -256,24 +446,23 @@ class HttpLLMProvider(LLMProvider):
             payload["model"] = effective_model
 
         try:
-            async with httpx.AsyncClient(timeout=self._timeout) as client:
-                async with client.stream(
-                    "POST", f"{self._base_url}/chat/stream", json=payload
-                ) as resp:
-                    resp.raise_for_status()
-                    async for line in resp.aiter_lines():
-                        if not line.startswith("data:"):
-                            continue
-                        data = line[5:].strip()
-                        if data == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            if chunk.get("type") == "content_delta" and chunk.get("content"):
-                                yield chunk["content"]
-                        except json.JSONDecodeError as exc:
-                            logger.debug("SSE-Chunk nicht parsebar: %s (data=%s)", exc, data[:80])
-                            continue
+            async with self._get_client().stream(
+                "POST", f"{self._base_url}/chat/stream", json=payload
+            ) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                        if chunk.get("type") == "content_delta" and chunk.get("content"):
+                            yield chunk["content"]
+                    except json.JSONDecodeError as exc:
+                        logger.debug("SSE-Chunk nicht parsebar: %s (data=%s)", exc, data[:80])
+                        continue
         except httpx.HTTPStatusError as exc:
             raise ProviderError(
                 f"stream fehlgeschlagen: {self._name}",
@@ -287,6 +476,16 @@ class HttpLLMProvider(LLMProvider):
             ) from exc
 
 
+def _http2_available(name: str) -> bool:
+    """HTTP/2 braucht das optionale Paket h2 — sonst Fallback auf HTTP/1.1."""
+    if importlib.util.find_spec("h2") is not None:
+        return True
+    logger.warning(
+        "Provider '%s': http2 angefordert, Paket 'h2' fehlt — nutze HTTP/1.1", name
+    )
+    return False
+
+
 class NoopProvider(LLMProvider):
     """Fallback-Provider — gibt immer leere Antwort zurück.
 
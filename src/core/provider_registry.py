@@ -14,6 +14,10 @@ Format providers.yaml:
       url: http://thebrain:12101
       model: ""          # optional
       timeout: 120.0     # optional
+      max_connections: 20            # optional, Pool-Groesse
+      max_keepalive_connections: 10  # optional
+      keepalive_expiry: 30.0         # optional, Sekunden
+      http2: false                   # optional, braucht Paket h2
     - name: anthropic
       url: http://thebrain:12102
 """
@@ -99,7 +103,10 @@ class ProviderRegistry:
         Behaelt aktiven Provider falls er weiterhin healthy ist.
         """
         previous_name = self._active.name if self._active else None
+        stale = self._providers
         self.load_config()
+        for provider in stale:
+            await provider.aclose()
         await self.check_all()
 
         # Frueheren aktiven Provider wiederherstellen wenn moeglich
@@ -112,6 +119,11 @@ class ProviderRegistry:
 
         self._activate_first_healthy()
 
+    async def aclose(self) -> None:
+        """Verbindungs-Pools aller Provider schliessen."""
+        for provider in self._providers:
+            await provider.aclose()
+
     # -------------------------------------------------------------------------
     # Config
     # -------------------------------------------------------------------------
@@ -156,6 +168,10 @@ class ProviderRegistry:
                     base_url=url,
                     model=entry.get("model", ""),
                     timeout=float(entry.get("timeout", 120.0)),
+                    max_connections=int(entry.get("max_connections", 20)),
+                    max_keepalive_connections=int(entry.get("max_keepalive_connections", 10)),
+                    keepalive_expiry=float(entry.get("keepalive_expiry", 30.0)),
+                    http2=bool(entry.get("http2", False)),
                 )
             )
 
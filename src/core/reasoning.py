@@ -303,7 +303,7 @@ class PassthroughStrategy(ReasoningStrategy):
         """Minimale Metriken: immer 1 Iteration."""
         return StrategyMetrics(
             iterations=1,
-            history_depth=len(history._snapshots),
+            history_depth=len(history),
         )
 
     async def on_tool_result(
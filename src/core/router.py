@@ -15,13 +15,21 @@ Design-Entscheide:
     - Fehler-Isolation: Exception → AddOnError → ON_ERROR-Dispatch (nicht rekursiv)
     - Sortierung: priority aufsteigend, dann Registrierungsreihenfolge (stabil)
     - Hot-Reload via unregister() ohne Neustart
+    - Dispatch-Tabelle: pro HookPoint vorkompilierte Liste gebundener Hooks,
+      nur bei register()/unregister() neu gebaut — dispatch() prüft nichts mehr
+    - Beobachter (AddOn.observe_only): laufen nach der mutierenden Chain mit
+      dem finalen ctx — parallel (concurrent) oder über eine begrenzte
+      Hintergrund-Queue (background). Reihenfolge der Mutierer bleibt.
 """
 
 from __future__ import annotations
 
+import asyncio
 import bisect
+import enum
+import logging
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Awaitable, Callable
 
 from .exceptions import AddOnDependencyError, AddOnError
 from .models import AddOnResult, ContextHistory, HookPoint, PipelineContext
@@ -29,6 +37,8 @@ from .models import AddOnResult, ContextHistory, HookPoint, PipelineContext
 if TYPE_CHECKING:
     from .addon import AddOn
 
+logger = logging.getLogger(__name__)
+
 
 # =============================================================================
 # Internes Datenmodell
@@ -43,6 +53,26 @@ class _RouterEntry:
     reg_order: int
     addon: AddOn = field(compare=False)
     hooks: frozenset[HookPoint] = field(compare=False)
+    # Teilmenge von hooks an denen das AddOn nur beobachtet
+    observes: frozenset[HookPoint] = field(compare=False, default=frozenset())
+
+
+# Gebundene Hook-Methode: async (ctx, history) -> AddOnResult
+_BoundHook = Callable[[PipelineContext, "ContextHistory | None"], Awaitable[AddOnResult]]
+_Subscribers = tuple[tuple["AddOn", _BoundHook], ...]
+
+
+class ObserverMode(str, enum.Enum):
+    """Wie der Router Beobachter-Hooks (AddOn.observe_only) ausführt.
+
+    SEQUENTIAL — wie mutierende AddOns in der Chain (priority-Reihenfolge)
+    CONCURRENT — nach der Chain parallel, dispatch() wartet auf alle (Default)
+    BACKGROUND — nach der Chain in eine begrenzte Queue, dispatch() wartet nicht
+    """
+
+    SEQUENTIAL = "sequential"
+    CONCURRENT = "concurrent"
+    BACKGROUND = "background"
 
 
 # =============================================================================
@@ -70,13 +100,31 @@ class AddOnRouter:
         final_ctx = results[-1].modified_ctx
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        observer_mode: ObserverMode | str = ObserverMode.CONCURRENT,
+        observer_queue_size: int = 1000,
+    ) -> None:
+        self._observer_mode = ObserverMode(observer_mode)
+        self._observer_queue_size = observer_queue_size
         # name -> _RouterEntry (für O(1)-Lookup)
         self._entries: dict[str, _RouterEntry] = {}
         # Sortierte Liste für Dispatch — bleibt via bisect.insort stabil sortiert
         self._sorted: list[_RouterEntry] = []
         # Monoton steigender Zähler für Registrierungsreihenfolge
         self._reg_counter: int = 0
+        # HookPoint -> (addon, gebundener Hook) in Dispatch-Reihenfolge.
+        # Nur HookPoints mit mindestens einem Abonnenten sind enthalten.
+        self._dispatch_table: dict[HookPoint, _Subscribers] = {}
+        # HookPoint -> Beobachter (observe_only), ohne SEQUENTIAL-Modus
+        self._observer_table: dict[HookPoint, _Subscribers] = {}
+        # BACKGROUND: Queue + Worker, lazy im laufenden Event-Loop angelegt
+        self._observer_queue: asyncio.Queue | None = None
+        self._observer_worker: asyncio.Task | None = None
+        self._observer_loop: asyncio.AbstractEventLoop | None = None
+        self._observer_stats: dict[str, int] = {
+            "enqueued": 0, "completed": 0, "errors": 0,
+        }
 
     # -------------------------------------------------------------------------
     # Abfragen
@@ -102,6 +150,24 @@ class AddOnRouter:
         """Prüft ob ein AddOn registriert ist."""
         return addon_name in self._entries
 
+    def has_subscribers(self, hook_point: HookPoint) -> bool:
+        """Prüft ob mindestens ein AddOn für diesen HookPoint registriert ist.
+
+        O(1) — Caller können Phasen ohne Abonnenten komplett überspringen.
+        """
+        return hook_point in self._dispatch_table or hook_point in self._observer_table
+
+    @property
+    def observer_mode(self) -> ObserverMode:
+        """Ausführungsmodus für Beobachter-Hooks."""
+        return self._observer_mode
+
+    @property
+    def observer_stats(self) -> dict[str, int]:
+        """Zähler der Hintergrund-Beobachter: enqueued, completed, errors, queued."""
+        queued = self._observer_queue.qsize() if self._observer_queue else 0
+        return {**self._observer_stats, "queued": queued}
+
     # -------------------------------------------------------------------------
     # Registrierung
     # -------------------------------------------------------------------------
@@ -146,11 +212,13 @@ class AddOnRouter:
             reg_order=self._reg_counter,
             addon=addon,
             hooks=frozenset(hooks),
+            observes=frozenset(hooks) & frozenset(addon.observe_only),
         )
         self._reg_counter += 1
 
         self._entries[addon.name] = entry
         bisect.insort(self._sorted, entry)
+        self._rebuild_dispatch_table()
 
     def unregister(self, addon_name: str) -> None:
         """AddOn aus dem Router entfernen (Hot-Reload).
@@ -163,6 +231,26 @@ class AddOnRouter:
             raise AddOnError("AddOn nicht registriert", addon_name=addon_name)
 
         self._sorted.remove(entry)
+        self._rebuild_dispatch_table()
+
+    def _rebuild_dispatch_table(self) -> None:
+        """Dispatch-Tabelle aus der sortierten Registry neu aufbauen.
+
+        Hook-Methoden werden hier einmal gebunden — dispatch() macht
+        weder Mitgliedschaftsprüfung noch getattr() pro Aufruf.
+        """
+        table: dict[HookPoint, list[tuple[AddOn, _BoundHook]]] = {}
+        observers: dict[HookPoint, list[tuple[AddOn, _BoundHook]]] = {}
+        split = self._observer_mode != ObserverMode.SEQUENTIAL
+        for entry in self._sorted:
+            for hook_point in entry.hooks:
+                hook = getattr(entry.addon, hook_point.value, None)
+                if hook is None:
+                    continue  # Sollte nicht vorkommen — AddOn hat immer No-Op Defaults
+                target = observers if split and hook_point in entry.observes else table
+                target.setdefault(hook_point, []).append((entry.addon, hook))
+        self._dispatch_table = {hp: tuple(hooks) for hp, hooks in table.items()}
+        self._observer_table = {hp: tuple(hooks) for hp, hooks in observers.items()}
 
     # -------------------------------------------------------------------------
     # Dispatch
@@ -198,34 +286,19 @@ class AddOnRouter:
         is_error_dispatch: bool,
     ) -> list[AddOnResult]:
         """Interne Dispatch-Logik. is_error_dispatch verhindert rekursive ON_ERROR-Kette."""
-        results: list[AddOnResult] = []
-
-        hook_name = hook_point.value  # z.B. "on_input"
+        subscribers = self._dispatch_table.get(hook_point, ())
+        observers = self._observer_table.get(hook_point, ())
+        if not subscribers and not observers:
+            return []
 
-        for entry in self._sorted:
-            if hook_point not in entry.hooks:
-                continue
-
-            addon = entry.addon
-            hook = getattr(addon, hook_name, None)
-            if hook is None:
-                continue  # Sollte nicht vorkommen — AddOn hat immer No-Op Defaults
+        results: list[AddOnResult] = []
 
+        for addon, hook in subscribers:
             try:
                 result: AddOnResult = await hook(ctx, history)
             except Exception as exc:
                 # Fehler isolieren: als AddOnError in results aufnehmen
-                error_result = AddOnResult(
-                    modified_ctx=ctx,
-                    ack=False,
-                    error=str(AddOnError(
-                        "Hook fehlgeschlagen",
-                        addon_name=addon.name,
-                        hook_point=hook_point.value,
-                        original_exception=exc,
-                    )),
-                )
-                results.append(error_result)
+                results.append(_error_result(addon, hook_point, ctx, exc))
 
                 # ON_ERROR dispatchen — aber nicht rekursiv
                 if not is_error_dispatch and hook_point != HookPoint.ON_ERROR:
@@ -243,8 +316,113 @@ class AddOnRouter:
             if result.halt:
                 break
 
+        # Beobachter sehen den finalen ctx der Chain
+        if observers:
+            if self._observer_mode == ObserverMode.BACKGROUND:
+                await self._enqueue_observers(hook_point, observers, ctx, history)
+            else:
+                results.extend(await self._run_observers(
+                    hook_point, observers, ctx, history, is_error_dispatch
+                ))
+
+        return results
+
+    # -------------------------------------------------------------------------
+    # Beobachter
+    # -------------------------------------------------------------------------
+
+    async def _run_observers(
+        self,
+        hook_point: HookPoint,
+        observers: _Subscribers,
+        ctx: PipelineContext,
+        history: ContextHistory | None,
+        is_error_dispatch: bool,
+    ) -> list[AddOnResult]:
+        """Alle Beobachter eines Hooks parallel ausführen.
+
+        Ergebnisse haben modified_ctx=None und halt=False — ein Beobachter
+        kann den Context nicht ändern. Fehler werden wie in der Chain isoliert.
+        """
+        outcomes = await asyncio.gather(
+            *(hook(ctx, history) for _, hook in observers),
+            return_exceptions=True,
+        )
+        results: list[AddOnResult] = []
+        for (addon, _), outcome in zip(observers, outcomes):
+            if isinstance(outcome, Exception):
+                results.append(_error_result(addon, hook_point, ctx, outcome))
+                if not is_error_dispatch and hook_point != HookPoint.ON_ERROR:
+                    await self._dispatch_internal(
+                        HookPoint.ON_ERROR, ctx, history, is_error_dispatch=True
+                    )
+            elif isinstance(outcome, BaseException):
+                raise outcome  # CancelledError & Co. nicht verschlucken
+            else:
+                results.append(
+                    outcome.model_copy(update={"modified_ctx": None, "halt": False})
+                )
         return results
 
+    async def _enqueue_observers(
+        self,
+        hook_point: HookPoint,
+        observers: _Subscribers,
+        ctx: PipelineContext,
+        history: ContextHistory | None,
+    ) -> None:
+        """BACKGROUND: Beobachter-Aufruf in die Queue stellen.
+
+        Wartet nur wenn die Queue voll ist (Backpressure statt Verlust).
+        Die History geht als Momentaufnahme in die Queue — die Pipeline
+        laeuft weiter, der Beobachter soll den Stand beim Dispatch sehen.
+        """
+        loop = asyncio.get_running_loop()
+        worker = self._observer_worker
+        if self._observer_loop is not loop or worker is None or worker.done():
+            self._observer_loop = loop
+            self._observer_queue = asyncio.Queue(maxsize=self._observer_queue_size)
+            self._observer_worker = loop.create_task(self._observer_loop_worker())
+        frozen = history.copy() if history is not None else None
+        await self._observer_queue.put((hook_point, observers, ctx, frozen))
+        self._observer_stats["enqueued"] += 1
+
+    async def _observer_loop_worker(self) -> None:
+        """BACKGROUND: arbeitet die Beobachter-Queue ab."""
+        queue = self._observer_queue
+        while True:
+            hook_point, observers, ctx, history = await queue.get()
+            try:
+                results = await self._run_observers(
+                    hook_point, observers, ctx, history, is_error_dispatch=False
+                )
+                self._observer_stats["errors"] += sum(1 for r in results if r.error)
+            except Exception as exc:
+                self._observer_stats["errors"] += 1
+                logger.error("Beobachter-Dispatch fehlgeschlagen bei %s: %s", hook_point, exc)
+            finally:
+                self._observer_stats["completed"] += 1
+                queue.task_done()
+
+    async def drain(self) -> None:
+        """Wartet bis alle Hintergrund-Beobachter abgearbeitet sind."""
+        if self._observer_queue is not None and self._observer_loop is asyncio.get_running_loop():
+            await self._observer_queue.join()
+
+    async def aclose(self) -> None:
+        """Queue abarbeiten und Hintergrund-Worker beenden."""
+        await self.drain()
+        worker = self._observer_worker
+        self._observer_worker = None
+        self._observer_queue = None
+        self._observer_loop = None
+        if worker is not None and not worker.done():
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+
     # -------------------------------------------------------------------------
     # Repr
     # -------------------------------------------------------------------------
@@ -254,8 +432,27 @@ class AddOnRouter:
         return f"<AddOnRouter addons={names}>"
 
 
+def _error_result(
+    addon: AddOn,
+    hook_point: HookPoint,
+    ctx: PipelineContext,
+    exc: Exception,
+) -> AddOnResult:
+    """Fehlgeschlagenen Hook als AddOnResult mit AddOnError-Text abbilden."""
+    return AddOnResult(
+        modified_ctx=ctx,
+        ack=False,
+        error=str(AddOnError(
+            "Hook fehlgeschlagen",
+            addon_name=addon.name,
+            hook_point=hook_point.value,
+            original_exception=exc,
+        )),
+    )
+
+
 # =============================================================================
 # Public API
 # =============================================================================
 
-__all__ = ["AddOnRouter"]
+__all__ = ["AddOnRouter", "ObserverMode"]
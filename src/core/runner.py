@@ -19,28 +19,38 @@ Fallbacks ohne AddOns:
 
 from __future__ import annotations
 
+import asyncio
+import inspect
 import logging
 from typing import Any, AsyncGenerator
 from uuid import uuid4
 
 from .addon import AddOn
-from .exceptions import AddOnError, SessionNotFoundError
-from .models import ContextHistory, HookPoint, PipelineContext
+from .exceptions import AddOnError
+from .models import ContextHistory, HistoryRetention, HookPoint, PipelineContext
 from .provider import LLMProvider
-from .router import AddOnRouter
+from .router import AddOnRouter, ObserverMode
 from .compaction import RollingSessionRegistry
 from .reasoning import ReasoningStrategy, StrategyRegistry
 from .models.placeholders import HandoverContext, ResourceBudget
 from .session import SessionManager, WorkingMemory
 from .session_noop import NoopSessionManager
+from .tokens import (
+    CalibratedTokenEstimator,
+    RemoteTokenCalibrator,
+    TokenEstimator,
+    build_token_estimator,
+)
 from .selector import StrategySelector, HybridSelector
 from .feedback_store import SqliteFeedbackStore
+from ._concurrency import CallLimiter, SessionLocks
 from ._dialog_logger import _DialogLogger
 from ._pipeline import (
     dispatch_and_apply, phase, run_pipeline,
     run_post_phases, run_pre_phases,
 )
-from ._provider_bridge import build_messages_from_ctx, call_provider
+from ._provider_bridge import build_messages_from_ctx, call_provider, preflight_ctx
+from ._streaming import StreamAccumulator, StreamChunkBatcher
 
 logger = logging.getLogger(__name__)
 
@@ -75,23 +85,55 @@ class Runner:
         self._name = name
         self._agent_id = agent_id or str(uuid4())
         self._config: dict[str, Any] = self._load_config(config, config_path)
-        self._router = AddOnRouter()
+        _router_cfg = self._config.get("router", {})
+        self._router = AddOnRouter(
+            observer_mode=_router_cfg.get("observer_mode", ObserverMode.CONCURRENT),
+            observer_queue_size=int(_router_cfg.get("observer_queue_size", 1000)),
+        )
         self._addons: list[AddOn] = []   # Reihenfolge fuer Lifecycle
         self._connected = False
         self._dialog_log = _DialogLogger(self._agent_id, self._config)
+        # Phasen ohne AddOns trotzdem als Snapshot aufzeichnen (Default: nein)
+        self._record_idle_phases: bool = bool(
+            self._config.get("history", {}).get("record_idle_phases", False)
+        )
         self._pending_provider: LLMProvider | None = None   # turn-safe swap
-        self._in_turn: bool = False                         # laufender LLM-Call
+        # Nebenlaeufige Sessions: ein Lock pro Session, globales Call-Limit
+        _conc_cfg = self._config.get("concurrency", {})
+        self._session_locks = SessionLocks()
+        self._active_session_lock = asyncio.Lock()
+        # Aufrufer-ID -> aktuelle Nachfolger-Session (komprimiert, eine Stufe)
+        self._session_routes: dict[str, str] = {}
+        self._session_origins: dict[str, str] = {}  # Nachfolger -> Aufrufer-ID
+        self._llm_calls = CallLimiter(int(_conc_cfg.get("max_inflight_llm_calls", 0)))
         self._provider_registry = None  # optional, gesetzt von HeinzelLoader wenn konfiguriert
         self._reasoning_strategy_name: str = "auto"  # "auto" = Selector entscheidet
         self._strategy_selector: StrategySelector = HybridSelector(
             feedback_store=SqliteFeedbackStore()
         )
+        # Token-Schaetzung fuer Working Memory und Compact/Roll-Schwellen
+        _tok_cfg = self._config.get("tokens", {})
+        self._token_estimator: TokenEstimator = build_token_estimator(_tok_cfg)
+        # Kontextfenster-Preflight vor jedem LLM-Call (siehe _provider_bridge)
+        self._preflight_stats: dict[str, int] = {
+            "checks": 0, "trimmed": 0, "messages_dropped": 0,
+            "unresolved": 0, "overflows": 0,
+        }
+        self._token_calibrator: RemoteTokenCalibrator | None = None
+        self._calibration_task: asyncio.Task | None = None
+        if isinstance(self._token_estimator, CalibratedTokenEstimator):
+            self._token_calibrator = RemoteTokenCalibrator(
+                self._token_estimator,
+                min_chars=int(_tok_cfg.get("calibration_min_chars", 400)),
+                max_samples=int(_tok_cfg.get("calibration_samples", 8)),
+            )
         _mem_cfg = self._config.get("memory", {})
         _max_tokens: int = int(_mem_cfg.get("max_tokens", 128_000))
         _max_turns: int = int(_mem_cfg.get("max_turns", 10_000))
         self._session_manager: SessionManager = NoopSessionManager(
             max_tokens=_max_tokens,
             max_turns=_max_turns,
+            estimator=self._token_estimator,
         )
 
     # -------------------------------------------------------------------------
@@ -114,6 +156,42 @@ class Runner:
     def provider(self) -> LLMProvider:
         return self._provider
 
+    @property
+    def token_estimator(self) -> TokenEstimator:
+        """TokenEstimator fuer Working Memory und Compaction-Schwellen."""
+        return self._token_estimator
+
+    @property
+    def preflight_stats(self) -> dict[str, int]:
+        """Kontextfenster-Preflight: Zaehler.
+
+        checks:           Requests mit bekanntem Fenster geprueft
+        trimmed:          Ueberlaeufe vor dem Senden verhindert (gekuerzt)
+        messages_dropped: dabei entfernte Memory-Messages
+        unresolved:       zu gross, aber nichts kuerzbar
+        overflows:        trotzdem ContextLengthExceededError vom Provider
+        """
+        return dict(self._preflight_stats)
+
+    @property
+    def concurrency_stats(self) -> dict[str, int]:
+        """Zaehler fuer nebenlaeufige Turns (Kopie).
+
+        in_flight       — laufende LLM-Calls
+        peak_in_flight  — Maximum seit Start
+        limit           — concurrency.max_inflight_llm_calls (0 = unbegrenzt)
+        waited          — Calls die auf einen freien Slot warten mussten
+        busy_sessions   — Sessions mit laufendem Turn
+        """
+        calls = self._llm_calls
+        return {
+            "in_flight": calls.in_flight,
+            "peak_in_flight": calls.peak,
+            "limit": calls.limit,
+            "waited": calls.waited,
+            "busy_sessions": self._session_locks.busy_count(),
+        }
+
     @property
     def addon_router(self) -> AddOnRouter:
         return self._router
@@ -186,20 +264,22 @@ class Runner:
 
         Gibt (session_id, working_memory) zurueck.
         Wird beim ersten Turn in _run_pipeline() aufgerufen.
+
+        Eine explizite session_id laeuft isoliert: sie wird weder aktiv
+        gesetzt noch aendert sie active_session — parallele Kanaele
+        (Mattermost, Scheduler) stoeren die interaktive Session nicht.
         """
         if session_id is not None:
-            # Explizite session_id: vorhandene Session fortsetzen
-            try:
-                session = await self._session_manager.resume_session(session_id)
-            except SessionNotFoundError:
-                # Unbekannte ID: neue Session mit dieser ID ist nicht moeglich
-                # -> neue Session anlegen, session_id ignorieren
-                logger.warning(
+            # Explizite session_id: gerollte Sessions auf Nachfolger abbilden
+            session_id = self._route_session(session_id)
+            session = await self._session_manager.get_session(session_id)
+            if session is None:
+                logger.info(
                     "_ensure_session: session_id %s unbekannt, neue Session gestartet",
                     session_id,
                 )
                 session = await self._session_manager.create_session(
-                    self._agent_id, session_id=session_id
+                    self._agent_id, session_id=session_id, activate=False
                 )
         else:
             active = self._session_manager.active_session
@@ -211,6 +291,35 @@ class Runner:
         working_memory = await self._session_manager.get_working_memory(session.id)
         return session.id, working_memory
 
+    def _route_session(self, session_id: str) -> str:
+        """Aktuelle Session-ID zu session_id — neuester Rolling-Session-Nachfolger."""
+        return self._session_routes.get(session_id, session_id)
+
+    def _record_roll(self, old_id: str, new_id: str) -> None:
+        """Roll vermerken — die Aufrufer-ID zeigt direkt auf den Nachfolger.
+
+        Pfadkompression: pro Aufrufer-ID genau ein Eintrag, Zwischen-IDs
+        frueherer Rolls fallen weg. Lookup O(1), Speicher O(Aufrufer).
+        """
+        origin = self._session_origins.pop(old_id, old_id)
+        self._session_routes[origin] = new_id
+        self._session_origins[new_id] = origin
+
+    async def _session_key(self, session_id: str | None) -> str:
+        """Session-ID fuer den Turn-Lock bestimmen.
+
+        Ohne session_id gilt die aktive Session — wird bei Bedarf hier
+        angelegt, damit gleichzeitige Aufrufer nicht je eine eigene
+        Session erzeugen.
+        """
+        if session_id is not None:
+            return self._route_session(session_id)
+        async with self._active_session_lock:
+            active = self._session_manager.active_session
+            if active is None:
+                active = await self._session_manager.create_session(self._agent_id)
+            return active.id
+
     async def set_provider(self, provider: LLMProvider) -> bool:
         """Provider wechseln — mit health-Check und turn-safem Swap.
 
@@ -232,8 +341,8 @@ class Runner:
             logger.warning("set_provider abgelehnt: Provider unhealthy")
             return False
 
-        if self._in_turn:
-            logger.info("set_provider: Turn laeuft — Provider als pending gesetzt")
+        if self._llm_calls.in_flight:
+            logger.info("set_provider: LLM-Call laeuft — Provider als pending gesetzt")
             self._pending_provider = provider
         else:
             self._provider = provider
@@ -241,6 +350,13 @@ class Runner:
 
         return True
 
+    def _activate_pending_provider(self) -> None:
+        """Pending Provider aktivieren sobald kein LLM-Call mehr laeuft."""
+        if self._pending_provider is not None and not self._llm_calls.in_flight:
+            self._provider = self._pending_provider
+            self._pending_provider = None
+            logger.info("set_provider: pending Provider aktiviert nach Turn-Ende")
+
     # -------------------------------------------------------------------------
     # Lifecycle
     # -------------------------------------------------------------------------
@@ -270,7 +386,21 @@ class Runner:
         logger.info("Runner '%s' verbunden (%d AddOns)", self._name, len(self._addons))
 
     async def disconnect(self) -> None:
-        """Alle AddOns in umgekehrter Reihenfolge stoppen."""
+        """Alle AddOns in umgekehrter Reihenfolge stoppen.
+
+        Vorher werden ausstehende Hintergrund-Beobachter abgearbeitet und
+        der SessionManager geflusht.
+        """
+        await self._router.aclose()
+        if self._calibration_task is not None and not self._calibration_task.done():
+            self._calibration_task.cancel()
+        # Persistente SessionManager flushen solange die DB-AddOns noch verbunden sind
+        try:
+            result = self._session_manager.aclose()
+            if inspect.isawaitable(result):
+                await result
+        except (OSError, RuntimeError, ValueError) as exc:
+            logger.error("SessionManager.aclose fehlgeschlagen: %s", exc)
         for addon in reversed(self._addons):
             try:
                 await addon.on_detach(self)
@@ -278,19 +408,40 @@ class Runner:
                 logger.error("on_detach fehlgeschlagen fuer %s: %s", addon, exc)
         self._connected = False
         self._dialog_log.close()
+        await self._close_providers()
         logger.info("Runner '%s' getrennt", self._name)
 
+    async def _close_providers(self) -> None:
+        """Verbindungs-Pools von Provider (und Registry) freigeben."""
+        targets = [self._provider, self._pending_provider, self._provider_registry]
+        for target in targets:
+            aclose = getattr(target, "aclose", None)
+            if aclose is None:
+                continue
+            try:
+                result = aclose()
+                if inspect.isawaitable(result):
+                    await result
+            except (OSError, RuntimeError) as exc:
+                logger.warning("aclose fehlgeschlagen fuer %s: %s", target, exc)
+
     # -------------------------------------------------------------------------
     # Public API
     # -------------------------------------------------------------------------
 
     async def chat(self, message: str, session_id: str | None = None) -> str:
-        """Chat-Runde. Gibt immer str zurueck — nie Exception nach aussen."""
+        """Chat-Runde. Gibt immer str zurueck — nie Exception nach aussen.
+
+        Turns verschiedener Sessions laufen parallel, Turns derselben
+        Session nacheinander (Session-Lock).
+        """
         try:
-            message = await self.on_before_chat(message)
-            ctx_history, final_ctx = await run_pipeline(self, message, session_id)
-            response = final_ctx.response or final_ctx.stream_buffer or ""
-            return await self.on_after_chat(response, ctx_history)
+            sid = await self._session_key(session_id)
+            async with self._session_locks.hold(sid):
+                message = await self.on_before_chat(message)
+                ctx_history, final_ctx = await run_pipeline(self, message, sid)
+                response = final_ctx.response or final_ctx.stream_buffer or ""
+                return await self.on_after_chat(response, ctx_history)
         except Exception as exc:
             logger.error("chat() Fehler: %s", exc, exc_info=True)
             return f"[Fehler: {exc}]"
@@ -309,7 +460,23 @@ class Runner:
         Damit funktioniert deep_reasoning/chain_of_thought vollstaendig
         auch im interaktiven CLI, waehrend einfache Strategien unveraendert
         bleiben.
+
+        Der Session-Lock wird bis zum Ende des Streams gehalten.
         """
+        try:
+            sid = await self._session_key(session_id)
+        except Exception as exc:
+            logger.error("chat_stream() Fehler: %s", exc, exc_info=True)
+            yield f"[Fehler: {exc}]"
+            return
+        async with self._session_locks.hold(sid):
+            async for chunk in self._chat_stream_turn(message, sid):
+                yield chunk
+
+    async def _chat_stream_turn(
+        self, message: str, session_id: str
+    ) -> AsyncGenerator[str, None]:
+        """Ein Streaming-Turn — laeuft unter dem Session-Lock (chat_stream)."""
         try:
             message = await self.on_before_chat(message)
             sid, working_memory, ctx, ctx_history, halted = await run_pre_phases(
@@ -359,25 +526,24 @@ class Runner:
                     phase_name, ctx.loop_iteration,
                 )
                 yield f"\n\n▶ [{phase_name.upper()}]\n"
-                step_buffer = ""
+                ctx = await preflight_ctx(self, ctx)
+                step_buffer = StreamAccumulator()
                 try:
-                    async for chunk in self._provider.stream(
-                        messages=build_messages_from_ctx(ctx),
-                        system_prompt=ctx.system_prompt,
-                        model=ctx.model,
+                    async for chunk in self._stream_from_provider(
+                        ctx, ctx_history, step_buffer
                     ):
-                        step_buffer += chunk
                         yield chunk
                 except Exception as exc:
                     logger.error("Reasoning-Stream-Fehler: %s", exc, exc_info=True)
-                    step_buffer = f"[Fehler: {exc}]"
-                    yield step_buffer
+                    step_buffer.reset(f"[Fehler: {exc}]")
+                    yield step_buffer.text
 
                 yield "\n"
+                step_text = step_buffer.text
                 ctx = ctx.evolve(
                     phase=HookPoint.ON_LLM_RESPONSE,
-                    response=step_buffer,
-                    stream_buffer=step_buffer,
+                    response=step_text,
+                    stream_buffer=step_text,
                     loop_done=True,
                 )
                 ctx_history.push(ctx)
@@ -422,21 +588,20 @@ class Runner:
             final_phase = ctx.metadata.get("hnz_rt_phase", "")
             if final_phase:
                 yield f"\n\n▶ [ANTWORT]\n"
-            stream_buffer = ""
+            ctx = await preflight_ctx(self, ctx)
+            final_buffer = StreamAccumulator()
             try:
-                async for chunk in self._provider.stream(
-                    messages=build_messages_from_ctx(ctx),
-                    system_prompt=ctx.system_prompt,
-                    model=ctx.model,
+                async for chunk in self._stream_from_provider(
+                    ctx, ctx_history, final_buffer
                 ):
-                    stream_buffer += chunk
                     yield chunk
             except Exception as exc:
                 logger.error("Provider-Stream-Fehler: %s", exc, exc_info=True)
                 error_chunk = f"[Fehler: {exc}]"
-                stream_buffer += error_chunk
+                final_buffer.append(error_chunk)
                 yield error_chunk
 
+            stream_buffer = final_buffer.text
             ctx = ctx.evolve(
                 phase=HookPoint.ON_LLM_RESPONSE,
                 response=stream_buffer,
@@ -459,6 +624,67 @@ class Runner:
             logger.error("chat_stream() Fehler: %s", exc, exc_info=True)
             yield f"[Fehler: {exc}]"
 
+    async def _stream_from_provider(
+        self,
+        ctx: PipelineContext,
+        ctx_history: ContextHistory,
+        buffer: StreamAccumulator,
+    ) -> AsyncGenerator[str, None]:
+        """Provider-Stream durchreichen und in buffer sammeln.
+
+        ON_STREAM_CHUNK wird nur dispatcht wenn ein AddOn den Hook
+        abonniert hat — gebuendelt in Fenstern (streaming.chunk_window_chars,
+        streaming.chunk_window_ms), nicht pro Token. Die AddOns sehen
+        metadata["hnz_stream_chunk"] (Text des Fensters) und
+        metadata["hnz_stream_text"] (Callable, liefert den Text bisher erst
+        bei Bedarf). ctx.stream_buffer wird waehrend ON_STREAM_CHUNK nicht
+        befuellt — sonst kostete jedes Fenster eine Kopie des Gesamttexts.
+        Rein lesend: modified_ctx und halt werden ignoriert, es entsteht
+        kein History-Snapshot.
+        """
+        batcher: StreamChunkBatcher | None = None
+        if self._router.has_subscribers(HookPoint.ON_STREAM_CHUNK):
+            def _stream_text() -> str:
+                return buffer.text
+
+            async def _on_window(window: str) -> None:
+                chunk_ctx = ctx.evolve(
+                    phase=HookPoint.ON_STREAM_CHUNK,
+                    metadata={
+                        **ctx.metadata,
+                        "hnz_stream_chunk": window,
+                        "hnz_stream_text": _stream_text,
+                    },
+                )
+                await self._router.dispatch(
+                    HookPoint.ON_STREAM_CHUNK, chunk_ctx, ctx_history
+                )
+
+            stream_cfg = self._config.get("streaming", {})
+            batcher = StreamChunkBatcher(
+                _on_window,
+                max_chars=int(stream_cfg.get("chunk_window_chars", 256)),
+                max_interval=float(stream_cfg.get("chunk_window_ms", 100)) / 1000,
+            )
+
+        try:
+            async with self._llm_calls.slot():
+                try:
+                    async for chunk in self._provider.stream(
+                        messages=build_messages_from_ctx(ctx),
+                        system_prompt=ctx.system_prompt,
+                        model=ctx.model,
+                    ):
+                        buffer.append(chunk)
+                        if batcher is not None:
+                            await batcher.feed(chunk)
+                        yield chunk
+                finally:
+                    if batcher is not None:
+                        await batcher.flush()
+        finally:
+            self._activate_pending_provider()
+
     async def _run_pipeline(
         self, message: str, session_id: str | None
     ) -> tuple[ContextHistory, PipelineContext]:
@@ -469,10 +695,37 @@ class Runner:
     # Subklassen-Hooks
     # -------------------------------------------------------------------------
 
+    def _new_context_history(self) -> ContextHistory:
+        """ContextHistory fuer einen Turn — Aufbewahrung aus Config.
+
+        Config-Keys: history.retention (full | phases | ring),
+        history.max_snapshots (nur ring, Default 32),
+        history.record_idle_phases (siehe _pipeline.phase()).
+        """
+        hist_cfg = self._config.get("history", {})
+        return ContextHistory(
+            retention=hist_cfg.get("retention", HistoryRetention.FULL),
+            max_snapshots=int(hist_cfg.get("max_snapshots", 32)),
+        )
+
     # -------------------------------------------------------------------------
     # Compaction + Rolling Session
     # -------------------------------------------------------------------------
 
+    def _schedule_token_calibration(self, text: str) -> None:
+        """Kalibrier-Sample im Hintergrund zaehlen lassen (tokens.calibrate).
+
+        Hoechstens ein Request gleichzeitig, nach calibration_samples Schluss.
+        """
+        calibrator = self._token_calibrator
+        if calibrator is None or calibrator.done:
+            return
+        if self._calibration_task is not None and not self._calibration_task.done():
+            return
+        self._calibration_task = asyncio.create_task(
+            calibrator.observe(self._provider, text)
+        )
+
     def _compaction_budget(self) -> ResourceBudget:
         """ResourceBudget aus Config oder Default."""
         mem_cfg = self._config.get("memory", {})
@@ -512,13 +765,14 @@ class Runner:
 
         try:
             from .models import Message
-            summary = ""
-            async for chunk in self._provider.stream(
-                messages=(Message(role="user", content=prompt),),
-                system_prompt=system,
-            ):
-                summary += chunk
-            return summary.strip() or "(kein Summary erhalten)"
+            summary = StreamAccumulator()
+            async with self._llm_calls.slot():
+                async for chunk in self._provider.stream(
+                    messages=(Message(role="user", content=prompt),),
+                    system_prompt=system,
+                ):
+                    summary.append(chunk)
+            return summary.text.strip() or "(kein Summary erhalten)"
         except Exception as exc:
             logger.warning("Handover-LLM-Call fehlgeschlagen: %s", exc)
             return f"(LLM-Handover fehlgeschlagen: {exc})"
@@ -583,27 +837,28 @@ class Runner:
             tokens_saved=tokens,
             critical_preserved=True,
         )
-        session = self._session_manager.active_session
+        session = await self._session_manager.get_session(session_id)
         if session is None:
             return None
+        active = self._session_manager.active_session
+        was_active = active is not None and active.id == session_id
 
         handover = await policy.create_handover(session, compaction_result)
         handover = handover.model_copy(update={"summary": summary})
 
-        # Rolling Session via SessionManager
+        # Rolling Session via SessionManager — nur die aktive Session
+        # vererbt den Aktiv-Status, parallele Sessions bleiben isoliert
         await self._session_manager.end_session(session_id)
         new_session = await self._session_manager.create_session(
             agent_id=self._agent_id,
             user_id=session.user_id,
+            activate=was_active,
+        )
+        self._record_roll(session_id, new_session.id)
+        # Handover in neue Session-Metadata (persistiert je nach Manager)
+        await self._session_manager.update_metadata(
+            new_session.id, {"handover": handover}
         )
-        # Handover in neue Session-Metadata
-        from .session_noop import NoopSessionManager
-        sm = self._session_manager
-        if isinstance(sm, NoopSessionManager):
-            sm._sessions[new_session.id] = new_session.model_copy(
-                update={"metadata": {"handover": handover}}
-            )
-            sm._active = sm._sessions[new_session.id]
         # Working Memory der neuen Session mit Handover-Turn befuellen
         new_wm = await self._session_manager.get_working_memory(new_session.id)
         from .session import Turn as _Turn
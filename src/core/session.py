@@ -141,6 +141,14 @@ class WorkingMemory(ABC):
     async def add_turn(self, turn: Turn) -> None:
         """Turn ins Working Memory aufnehmen."""
 
+    async def turn_count(self) -> int:
+        """Anzahl gespeicherter Turns.
+
+        Default ueber get_recent_turns(max_turns) — Implementierungen
+        mit eigenem Zaehler sollten ueberschreiben.
+        """
+        return len(await self.get_recent_turns(self.max_turns))
+
     @abstractmethod
     async def get_context_messages(
         self, max_tokens: int | None = None
@@ -159,8 +167,8 @@ class WorkingMemory(ABC):
     def estimated_tokens(self) -> int:
         """Schaetzt den Token-Verbrauch aller gespeicherten Turns.
 
-        Grobe Schaetzung (len(text) / 4) — reicht fuer Budgetentscheidungen.
-        Kein API-Call, muss synchron und schnell sein.
+        Schaetzung ueber einen TokenEstimator (core.tokens) — reicht fuer
+        Budgetentscheidungen. Kein API-Call, muss synchron und schnell sein.
         """
 
     @abstractmethod
@@ -199,11 +207,14 @@ class SessionManager(ABC):
         agent_id: str,
         user_id: str | None = None,
         session_id: str | None = None,
+        activate: bool = True,
     ) -> Session:
         """Neue Session anlegen und als aktiv setzen.
 
         session_id: optionale ID — wenn None wird eine UUID generiert.
         Wird benutzt um eine explizit uebergebene session_id zu erhalten.
+        activate: False legt die Session an ohne active_session zu aendern
+        (parallele Sessions, z.B. pro Mattermost-Channel).
         """
 
     @abstractmethod
@@ -222,6 +233,23 @@ class SessionManager(ABC):
     async def end_session(self, session_id: str) -> None:
         """Session beenden (status=ended), active_session auf None."""
 
+    async def update_metadata(
+        self, session_id: str, metadata: dict[str, Any]
+    ) -> Session | None:
+        """metadata in Session.metadata mergen.
+
+        Gibt die aktualisierte Session zurueck, None wenn unbekannt.
+        Default: nur die zurueckgegebene Kopie traegt die Metadata —
+        Manager mit eigenem Speicher (Noop, SQL) ueberschreiben, legen sie
+        ab und ziehen die aktive Session mit.
+        """
+        session = await self.get_session(session_id)
+        if session is None:
+            return None
+        return session.model_copy(
+            update={"metadata": {**session.metadata, **metadata}}
+        )
+
     @abstractmethod
     async def add_turn(self, session_id: str, turn: Turn) -> None:
         """Turn zur Session hinzufuegen, Metadaten aktualisieren."""
@@ -258,6 +286,13 @@ class SessionManager(ABC):
         Der Aufrufer ist verantwortlich fuer ON_SESSION_ROLL zu feuern.
         """
 
+    async def aclose(self) -> None:
+        """Ausstehende Schreibvorgaenge abschliessen. Default: No-Op.
+
+        Runner.disconnect() ruft das vor dem Trennen der AddOns auf —
+        persistente Manager koennen so noch ueber ihre DB-Verbindung flushen.
+        """
+
 
 class MemoryGateInterface(ABC):
     """LSTM-inspiriertes Gate-System fuer Procedural Memory.
@@ -8,13 +8,17 @@ Implementierungen ersetzt.
 
 from __future__ import annotations
 
+from bisect import bisect_left
+from collections import deque
 from datetime import datetime, timezone
-from typing import Any
+from itertools import islice
+from typing import Any, Iterable
 
 from .compaction import CompactionRegistry, RollingSessionRegistry
 from .exceptions import SessionNotFoundError
 from .models.base import Message, MessageType
 from .models.placeholders import HandoverContext, ResourceBudget
+from .tokens import TokenEstimator, TokenEstimatorRegistry
 from .session import (
     _uuid,
     MemoryGateInterface,
@@ -58,6 +62,22 @@ class NoopMemoryGate(MemoryGateInterface):
 # =============================================================================
 
 
+def _turn_messages(turn: Turn) -> tuple[Message, Message]:
+    """Turn als user/assistant Message-Paar."""
+    return (
+        Message(
+            role="user",
+            content=turn.raw_input,
+            message_type=MessageType.MEMORY,
+        ),
+        Message(
+            role="assistant",
+            content=turn.final_response,
+            message_type=MessageType.MEMORY,
+        ),
+    )
+
+
 class NoopWorkingMemory(WorkingMemory):
     """In-memory Working Memory ohne Persist.
 
@@ -65,6 +85,19 @@ class NoopWorkingMemory(WorkingMemory):
     Turns entfernt bis estimated_tokens() < max_tokens.
     max_turns ist ein Sicherheitsnetz fuer sehr kurze Turns.
 
+    Token-Schaetzung ueber einen TokenEstimator (Default: Registry-Default,
+    siehe core.tokens) — jeder Turn wird einmal beim Aufnehmen gezaehlt.
+
+    Turns liegen in einer deque, die Token-Summe ergibt sich aus den
+    Praefixsummen (s.u.) — estimated_tokens() ist O(1),
+    get_recent_turns(k) O(k), Trimmen O(1) pro Turn.
+
+    Message-Paare werden einmal pro Turn gebaut und in einer append-only
+    Liste gehalten, dazu Praefixsummen der Turn-Tokens. Ein Budget-Fenster
+    in get_context_messages() ist damit eine Binaersuche statt Neuaufbau.
+    Verdraengte Turns bleiben bis zur naechsten Bereinigung als toter
+    Praefix in den Listen (_head) — amortisiert O(1) pro Verdraengung.
+
     Defaults:
         max_tokens = 128_000  (passt zu den meisten modernen Modellen)
         max_turns  = 10_000   (praktisch unbegrenzt)
@@ -75,11 +108,17 @@ class NoopWorkingMemory(WorkingMemory):
         max_tokens: int = 128_000,
         max_turns: int = 10_000,
         gate: MemoryGateInterface | None = None,
+        estimator: TokenEstimator | None = None,
     ) -> None:
         self._max_tokens = max_tokens
         self._max_turns = max_turns
         self._gate = gate or NoopMemoryGate()
-        self._turns: list[Turn] = []
+        self._estimator = estimator or TokenEstimatorRegistry.get_default()
+        self._turns: deque[Turn] = deque()
+        self._messages: list[Message] = []   # 2 Messages pro Turn, ab _head lebend
+        self._cum_tokens: list[int] = [0]    # Praefixsummen: Tokens der Turns [0, i)
+        self._head: int = 0                  # verdraengte Turns am Listenanfang
+        self._context: tuple[Message, ...] | None = None  # Cache: volles Fenster
 
     @property
     def max_tokens(self) -> int:
@@ -89,6 +128,11 @@ class NoopWorkingMemory(WorkingMemory):
     def max_turns(self) -> int:
         return self._max_turns
 
+    @property
+    def estimator(self) -> TokenEstimator:
+        """Aktiver TokenEstimator."""
+        return self._estimator
+
     @property
     def compaction_strategy(self):
         """Aktive CompactionStrategy aus CompactionRegistry."""
@@ -98,21 +142,59 @@ class NoopWorkingMemory(WorkingMemory):
         """Turn aufnehmen wenn Gate es erlaubt, dann token-basiert trimmen."""
         if not await self._gate.store(turn, context=None):
             return
-        self._turns.append(turn)
+        self._append(turn)
+        self._context = None
         while len(self._turns) > self._max_turns:
-            self._turns.pop(0)
+            self._evict_oldest()
         while (
             len(self._turns) > 1
             and self.estimated_tokens() > self._max_tokens
         ):
-            self._turns.pop(0)
+            self._evict_oldest()
 
-    async def get_recent_turns(self, n: int) -> list[Turn]:
-        """Letzte n Turns zurueckgeben."""
-        return (
-            self._turns[-n:] if n < len(self._turns) else list(self._turns)
+    def _append(self, turn: Turn) -> None:
+        """Turn zaehlen und an alle Indizes anhaengen."""
+        self._turns.append(turn)
+        self._messages.extend(_turn_messages(turn))
+        self._cum_tokens.append(
+            self._cum_tokens[-1] + self._estimator.count_turn(turn)
         )
 
+    def _evict_oldest(self) -> None:
+        """Aeltesten Turn entfernen — rueckt nur _head weiter."""
+        self._turns.popleft()
+        self._head += 1
+        self._context = None
+        # Toten Praefix erst entfernen wenn er die Haelfte ausmacht
+        if self._head >= 64 and 2 * self._head >= len(self._cum_tokens):
+            del self._messages[: 2 * self._head]
+            del self._cum_tokens[: self._head]
+            self._head = 0
+
+    def _reset(self, turns: Iterable[Turn] = ()) -> None:
+        """Alle Indizes aus turns neu aufbauen."""
+        self._turns = deque()
+        self._messages = []
+        self._cum_tokens = [0]
+        self._head = 0
+        self._context = None
+        for turn in turns:
+            self._append(turn)
+
+    async def turn_count(self) -> int:
+        """Anzahl gespeicherter Turns, O(1)."""
+        return len(self._turns)
+
+    async def get_recent_turns(self, n: int) -> list[Turn]:
+        """Letzte n Turns zurueckgeben (chronologisch)."""
+        if n >= len(self._turns):
+            return list(self._turns)
+        if n <= 0:
+            return []
+        recent = list(islice(reversed(self._turns), n))
+        recent.reverse()
+        return recent
+
     async def get_context_messages(
         self, max_tokens: int | None = None
     ) -> tuple[Message, ...]:
@@ -120,48 +202,35 @@ class NoopWorkingMemory(WorkingMemory):
 
         Neueste zuerst einsammeln, aelteste fallen raus wenn Budget erschoepft.
         Ergebnis chronologisch (aelteste zuerst).
-        Token-Schaetzung: 1 Zeichen ~ 0.25 Tokens (grob).
-        """
-        messages: list[Message] = []
-        tokens_used = 0
-
-        for turn in reversed(self._turns):
-            user_msg = Message(
-                role="user",
-                content=turn.raw_input,
-                message_type=MessageType.MEMORY,
-            )
-            assistant_msg = Message(
-                role="assistant",
-                content=turn.final_response,
-                message_type=MessageType.MEMORY,
-            )
-            turn_tokens = (
-                len(turn.raw_input) + len(turn.final_response)
-            ) // 4
+        Token-Schaetzung pro Turn ueber den TokenEstimator.
 
-            budget_hit = max_tokens is not None and (
-                tokens_used + turn_tokens > max_tokens
+        Volles Fenster kommt aus dem Cache, ein Budget-Fenster per
+        Binaersuche ueber die Praefixsummen — O(log n) plus Slice.
+        """
+        start = self._head
+        if max_tokens is not None:
+            end = len(self._cum_tokens) - 1
+            # Kleinster Start s mit Tokens[s, end) <= max_tokens
+            start = min(
+                bisect_left(
+                    self._cum_tokens, self._cum_tokens[end] - max_tokens,
+                    self._head, end + 1,
+                ),
+                end,
             )
-            if budget_hit:
-                break
-
-            messages.insert(0, assistant_msg)
-            messages.insert(0, user_msg)
-            tokens_used += turn_tokens
-
-        return tuple(messages)
+        if start > self._head:
+            return tuple(self._messages[2 * start:])
+        if self._context is None:
+            self._context = tuple(self._messages[2 * self._head:])
+        return self._context
 
     async def clear(self) -> None:
         """Working Memory leeren."""
-        self._turns = []
+        self._reset()
 
     def estimated_tokens(self) -> int:
-        """Grobe Token-Schaetzung aller gespeicherten Turns (len/4)."""
-        return sum(
-            len(t.raw_input) + len(t.final_response)
-            for t in self._turns
-        ) // 4
+        """Token-Schaetzung aller gespeicherten Turns (TokenEstimator), O(1)."""
+        return self._cum_tokens[-1] - self._cum_tokens[self._head]
 
     async def compact(self, keep_ratio: float = 0.5) -> None:
         """Kompaktiert via CompactionStrategy (keep_ratio wird ignoriert).
@@ -171,8 +240,10 @@ class NoopWorkingMemory(WorkingMemory):
         if not self._turns:
             return
         budget = ResourceBudget(max_tokens=self._max_tokens)
-        result = await self.compaction_strategy.compact(self._turns, budget)
-        self._turns = list(result.kept_turns)
+        result = await self.compaction_strategy.compact(
+            list(self._turns), budget, estimator=self._estimator
+        )
+        self._reset(result.kept_turns)
 
 
 # =============================================================================
@@ -191,9 +262,11 @@ class NoopSessionManager(SessionManager):
         self,
         max_tokens: int = 128_000,
         max_turns: int = 10_000,
+        estimator: TokenEstimator | None = None,
     ) -> None:
         self._max_tokens = max_tokens
         self._max_turns = max_turns
+        self._estimator = estimator
         self._sessions: dict[str, Session] = {}
         self._turns: dict[str, list[Turn]] = {}
         self._working_memories: dict[str, NoopWorkingMemory] = {}
@@ -208,8 +281,9 @@ class NoopSessionManager(SessionManager):
         agent_id: str,
         user_id: str | None = None,
         session_id: str | None = None,
+        activate: bool = True,
     ) -> Session:
-        """Neue Session anlegen und als aktiv setzen."""
+        """Neue Session anlegen und (ausser activate=False) als aktiv setzen."""
         session = Session(
             id=session_id or _uuid(),
             agent_id=agent_id,
@@ -217,7 +291,8 @@ class NoopSessionManager(SessionManager):
         )
         self._sessions[session.id] = session
         self._turns[session.id] = []
-        self._active = session
+        if activate:
+            self._active = session
         return session
 
     async def get_session(self, session_id: str) -> Session | None:
@@ -249,6 +324,21 @@ class NoopSessionManager(SessionManager):
         if self._active and self._active.id == session_id:
             self._active = None
 
+    async def update_metadata(
+        self, session_id: str, metadata: dict[str, Any]
+    ) -> Session | None:
+        """metadata in Session.metadata mergen (nur RAM)."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        session = session.model_copy(
+            update={"metadata": {**session.metadata, **metadata}}
+        )
+        self._sessions[session_id] = session
+        if self._active and self._active.id == session_id:
+            self._active = session
+        return session
+
     async def add_turn(self, session_id: str, turn: Turn) -> None:
         """Turn zur Session hinzufuegen, Metadaten aktualisieren."""
         if session_id not in self._sessions:
@@ -284,6 +374,7 @@ class NoopSessionManager(SessionManager):
             self._working_memories[session_id] = NoopWorkingMemory(
                 max_tokens=self._max_tokens,
                 max_turns=self._max_turns,
+                estimator=self._estimator,
             )
         return self._working_memories[session_id]
 
@@ -310,7 +401,7 @@ class NoopSessionManager(SessionManager):
         n = len(self._turns.get(session.id, []))
         turns = await wm.get_recent_turns(n)
         compaction_result = await wm.compaction_strategy.compact(
-            turns, budget
+            turns, budget, estimator=wm.estimator
         )
 
         # HandoverContext erstellen
@@ -324,8 +415,5 @@ class NoopSessionManager(SessionManager):
             agent_id=session.agent_id,
             user_id=session.user_id,
         )
-        self._sessions[new_session.id] = new_session.model_copy(
-            update={"metadata": {"handover": handover}}
-        )
-        self._active = self._sessions[new_session.id]
+        await self.update_metadata(new_session.id, {"handover": handover})
         return handover
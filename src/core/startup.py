@@ -29,6 +29,8 @@ Config-Struktur (heinzel.yaml):
       database:
         backend: sqlite
         path: data/heinzel.db
+        sessions:
+          enabled: true          # SqlSessionManager statt RAM-Sessions
       dialog_logger:
         log_dir: logs/dialogs
         rotation_size_mb: 10
@@ -312,6 +314,30 @@ class HeinzelLoader:
         if "mattermost" in registered:
             registered["mattermost"]._runner = runner
 
+        # Persistente Sessions auf dem DatabaseAddOn
+        if "database" in registered:
+            _apply_sql_sessions(runner, registered["database"], addons_cfg["database"] or {})
+
+
+def _apply_sql_sessions(runner: Runner, db: Any, cfg: dict) -> None:
+    """SqlSessionManager setzen wenn addons.database.sessions.enabled."""
+    sess_cfg = cfg.get("sessions") or {}
+    if not sess_cfg.get("enabled", False):
+        return
+    from addons.database import SqlSessionManager
+    mem_cfg = runner.config.get("memory", {})
+    runner.set_session_manager(SqlSessionManager(
+        db,
+        max_tokens=int(mem_cfg.get("max_tokens", 128_000)),
+        max_turns=int(mem_cfg.get("max_turns", 10_000)),
+        estimator=runner.token_estimator,
+        flush_interval_ms=float(sess_cfg.get("flush_interval_ms", 50)),
+        batch_size=int(sess_cfg.get("batch_size", 100)),
+        max_hot_sessions=int(sess_cfg.get("max_hot_sessions", 64)),
+        page_turns=int(sess_cfg.get("page_turns", 200)),
+    ))
+    logger.info("[HeinzelLoader] SqlSessionManager aktiv (Write-Behind)")
+
 
 # =============================================================================
 # Provider-Builder
@@ -327,7 +353,16 @@ def _build_provider(config: AgentConfig) -> Any:
         try:
             from core.provider import HttpLLMProvider
             logger.info(f"[HeinzelLoader] Provider: '{default_name}' → {entry.url} ({entry.name})")
-            return HttpLLMProvider(name=default_name, base_url=entry.url, model=entry.name)
+            pool = config.provider
+            return HttpLLMProvider(
+                name=default_name,
+                base_url=entry.url,
+                model=entry.name,
+                max_connections=pool.max_connections,
+                max_keepalive_connections=pool.max_keepalive_connections,
+                keepalive_expiry=pool.keepalive_expiry,
+                http2=pool.http2,
+            )
         except Exception as exc:
             logger.warning(f"[HeinzelLoader] HttpLLMProvider Fehler: {exc} — Noop-Fallback")
 
@@ -0,0 +1,414 @@
+"""heinzel_core.tokens.
+
+Austauschbare Token-Schaetzung fuer Budget-Entscheidungen (Working Memory,
+Compaction, Compact/Roll-Schwellen im Runner).
+
+len(text) // 4 liegt bei deutschem Text und Code deutlich daneben — zu
+frueh kompaktiert verschenkt Kontext, zu spaet kostet einen
+ContextLengthExceededError-Retry (kompletter LLM-Roundtrip).
+
+Bausteine:
+    BpeApproxEstimator       — lokale BPE-Naeherung (Default, "bpe")
+    CharRatioEstimator       — alte Heuristik len/4 ("chars")
+    CachedTokenEstimator     — LRU-Cache ueber Content-Hash
+    CalibratedTokenEstimator — Korrekturfaktor aus echten Zaehlungen
+    RemoteTokenCalibrator    — holt Referenzwerte via /tokens/count
+
+Verwendung:
+    from core.tokens import TokenEstimatorRegistry
+    tokens = TokenEstimatorRegistry.get_default().count("Hallo Welt")
+
+Custom-Estimator registrieren::
+
+    TokenEstimatorRegistry.register(MyEstimator())
+    TokenEstimatorRegistry.set_default("my_estimator")
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import re
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Iterable
+
+from .exceptions import ProviderError
+
+if TYPE_CHECKING:
+    from .provider import LLMProvider
+    from .session import Turn
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# TokenEstimator ABC
+# ---------------------------------------------------------------------------
+
+
+class TokenEstimator(ABC):
+    """Interface fuer Token-Schaetzer.
+
+    count() muss synchron und schnell sein — wird pro Turn und bei jeder
+    Budget-Pruefung aufgerufen. Kein Netzwerk-Zugriff.
+    """
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Eindeutiger Name (fuer Registry-Lookup und Config)."""
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """Geschaetzte Token-Anzahl fuer text."""
+
+    def count_turn(self, turn: Turn) -> int:
+        """Tokens eines Turns (User-Input + Antwort)."""
+        return self.count(turn.raw_input) + self.count(turn.final_response)
+
+    def count_turns(self, turns: Iterable[Turn]) -> int:
+        """Summe ueber mehrere Turns."""
+        return sum(self.count_turn(t) for t in turns)
+
+
+# ---------------------------------------------------------------------------
+# CharRatioEstimator — alte Heuristik
+# ---------------------------------------------------------------------------
+
+
+class CharRatioEstimator(TokenEstimator):
+    """Feste Zeichen-pro-Token-Rate (Default 4 — die fruehere Heuristik).
+
+    count_turn() rechnet wie bisher ueber die Zeichensumme des Turns.
+    """
+
+    def __init__(self, chars_per_token: float = 4.0) -> None:
+        if chars_per_token <= 0:
+            raise ValueError(f"chars_per_token muss > 0 sein, ist {chars_per_token}")
+        self._chars_per_token = chars_per_token
+
+    @property
+    def name(self) -> str:
+        return "chars"
+
+    def count(self, text: str) -> int:
+        return int(len(text) // self._chars_per_token)
+
+    def count_turn(self, turn: Turn) -> int:
+        return int(
+            (len(turn.raw_input) + len(turn.final_response)) // self._chars_per_token
+        )
+
+
+# ---------------------------------------------------------------------------
+# BpeApproxEstimator — lokale BPE-Naeherung
+# ---------------------------------------------------------------------------
+
+# Vorzerlegung wie bei GPT-/Claude-Tokenizern: Leerzeichen haengt am
+# folgenden Wort, Ziffern und Satzzeichen bilden eigene Stuecke.
+_PIECE_RE = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)"    # englische Kontraktionen
+    r"| ?[^\W\d_]+"            # Woerter (Unicode-Buchstaben)
+    r"| ?\d+"                  # Zahlen
+    r"| ?[^\s\w]+"             # Satzzeichen / Operatoren
+    r"|\s+"                    # Whitespace-Laeufe
+)
+
+
+class BpeApproxEstimator(TokenEstimator):
+    """Naeherung an Byte-Pair-Encoding ohne Vokabular.
+
+    Zerlegt wie ein BPE-Pre-Tokenizer und bewertet jedes Stueck:
+        Wort:         1 Token je angefangene word_chars Buchstaben,
+                      +1 je Nicht-ASCII-Zeichen (Umlaute sind Mehrbyte)
+        Zahl:         1 Token je 3 Ziffern
+        Satzzeichen:  1 Token je 2 Zeichen ("):", "==", "->")
+        Whitespace:   1 Token je Lauf (Einrueckung, Leerzeilen)
+
+    Deutlich naeher an echten Zaehlungen als len/4 bei Komposita,
+    Umlauten und Code. Systematische Abweichungen gleicht
+    CalibratedTokenEstimator aus.
+    """
+
+    def __init__(self, word_chars: int = 6) -> None:
+        if word_chars < 1:
+            raise ValueError(f"word_chars muss >= 1 sein, ist {word_chars}")
+        self._word_chars = word_chars
+
+    @property
+    def name(self) -> str:
+        return "bpe"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        word_chars = self._word_chars
+        tokens = 0
+        for piece in _PIECE_RE.findall(text):
+            head = piece[0]
+            if head == " " and len(piece) > 1:
+                piece = piece[1:]
+                head = piece[0]
+            if head.isspace():
+                tokens += 1
+            elif head.isdigit():
+                tokens += math.ceil(len(piece) / 3)
+            elif head.isalpha() or head == "'":
+                tokens += math.ceil(len(piece) / word_chars)
+                if not piece.isascii():
+                    tokens += sum(1 for ch in piece if ord(ch) > 127)
+            else:
+                tokens += math.ceil(len(piece) / 2)
+        return tokens
+
+
+# ---------------------------------------------------------------------------
+# CachedTokenEstimator — LRU ueber Content-Hash
+# ---------------------------------------------------------------------------
+
+
+class CachedTokenEstimator(TokenEstimator):
+    """LRU-Cache vor einem anderen Estimator.
+
+    Schluessel ist ein BLAKE2b-Digest des Textes — der Cache haelt keine
+    langen Strings fest. Kurze Texte (< min_chars) werden direkt gezaehlt,
+    da Hashen dort nichts spart.
+    """
+
+    def __init__(
+        self,
+        inner: TokenEstimator,
+        max_entries: int = 4096,
+        min_chars: int = 256,
+    ) -> None:
+        self._inner = inner
+        self._max_entries = max_entries
+        self._min_chars = min_chars
+        self._cache: OrderedDict[bytes, int] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def name(self) -> str:
+        return self._inner.name
+
+    @property
+    def inner(self) -> TokenEstimator:
+        return self._inner
+
+    def count(self, text: str) -> int:
+        if len(text) < self._min_chars or self._max_entries <= 0:
+            return self._inner.count(text)
+        key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        tokens = self._inner.count(text)
+        self._cache[key] = tokens
+        if len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+        return tokens
+
+    def clear(self) -> None:
+        """Cache leeren (z.B. nach Wechsel des inneren Estimators)."""
+        self._cache.clear()
+
+
+# ---------------------------------------------------------------------------
+# Kalibrierung gegen echte Tokenizer
+# ---------------------------------------------------------------------------
+
+
+class CalibratedTokenEstimator(TokenEstimator):
+    """Multipliziert einen Estimator mit einem gelernten Korrekturfaktor.
+
+    update() nimmt Paare (lokal, remote) auf und glaettet den Faktor
+    exponentiell. Der Faktor ist auf [min_factor, max_factor] begrenzt —
+    ein Ausreisser kann die Budgets nicht kippen.
+    Bereits gezaehlte Turns behalten ihren Wert; der Faktor wirkt auf
+    neue Zaehlungen.
+    """
+
+    def __init__(
+        self,
+        inner: TokenEstimator,
+        factor: float = 1.0,
+        alpha: float = 0.3,
+        min_factor: float = 0.25,
+        max_factor: float = 4.0,
+    ) -> None:
+        self._inner = inner
+        self._factor = factor
+        self._alpha = alpha
+        self._min_factor = min_factor
+        self._max_factor = max_factor
+        self.samples: int = 0
+
+    @property
+    def name(self) -> str:
+        return self._inner.name
+
+    @property
+    def inner(self) -> TokenEstimator:
+        return self._inner
+
+    @property
+    def factor(self) -> float:
+        return self._factor
+
+    def count(self, text: str) -> int:
+        tokens = self._inner.count(text)
+        if self._factor == 1.0:
+            return tokens
+        return int(round(tokens * self._factor))
+
+    def update(self, local_tokens: int, remote_tokens: int) -> None:
+        """Referenz-Paar aufnehmen und Faktor nachfuehren."""
+        if local_tokens <= 0 or remote_tokens <= 0:
+            return
+        ratio = remote_tokens / local_tokens
+        if self.samples == 0:
+            factor = ratio
+        else:
+            factor = (1 - self._alpha) * self._factor + self._alpha * ratio
+        self._factor = min(self._max_factor, max(self._min_factor, factor))
+        self.samples += 1
+        logger.debug(
+            "Token-Kalibrierung: lokal=%d remote=%d -> Faktor %.3f",
+            local_tokens, remote_tokens, self._factor,
+        )
+
+
+class RemoteTokenCalibrator:
+    """Kalibriert einen CalibratedTokenEstimator gegen /tokens/count.
+
+    observe() schickt ausreichend lange Texte an provider.count_tokens()
+    und fuettert den Faktor — hoechstens max_samples Mal, danach kein
+    Netzwerk mehr. Der Message-Overhead des Providers (Rolle, Rahmen)
+    wird einmalig ueber eine Mini-Probe bestimmt und abgezogen.
+    Liefert der Provider keine Zaehlung (None / ProviderError), schaltet
+    sich der Kalibrierer ab.
+    """
+
+    def __init__(
+        self,
+        estimator: CalibratedTokenEstimator,
+        min_chars: int = 400,
+        max_samples: int = 8,
+    ) -> None:
+        self._estimator = estimator
+        self._min_chars = min_chars
+        self._max_samples = max_samples
+        self._overhead: int | None = None
+        self._disabled = False
+
+    @property
+    def done(self) -> bool:
+        """True wenn genug Samples gesammelt oder abgeschaltet."""
+        return self._disabled or self._estimator.samples >= self._max_samples
+
+    async def observe(self, provider: LLMProvider, text: str) -> bool:
+        """Text als Kalibrier-Sample nutzen. True wenn Faktor aktualisiert."""
+        if self.done or len(text) < self._min_chars:
+            return False
+        try:
+            if self._overhead is None:
+                probe = await self._remote_count(provider, ".")
+                if probe is None:
+                    return False
+                self._overhead = max(0, probe - 1)
+            remote = await self._remote_count(provider, text)
+        except ProviderError as exc:
+            logger.info("Token-Kalibrierung abgeschaltet: %s", exc)
+            self._disabled = True
+            return False
+        if remote is None:
+            return False
+        local = self._estimator.inner.count(text)
+        self._estimator.update(local, remote - self._overhead)
+        return True
+
+    async def _remote_count(self, provider: LLMProvider, text: str) -> int | None:
+        tokens = await provider.count_tokens(
+            messages=[{"role": "user", "content": text}]
+        )
+        if tokens is None:
+            logger.info("Token-Kalibrierung abgeschaltet: Provider zaehlt nicht")
+            self._disabled = True
+        return tokens
+
+
+# ---------------------------------------------------------------------------
+# TokenEstimatorRegistry
+# ---------------------------------------------------------------------------
+
+
+class TokenEstimatorRegistry:
+    """Singleton-Registry fuer TokenEstimator-Implementierungen."""
+
+    _estimators: dict[str, TokenEstimator] = {}
+    _default: str = "bpe"
+
+    @classmethod
+    def register(cls, estimator: TokenEstimator) -> None:
+        """Estimator registrieren."""
+        cls._estimators[estimator.name] = estimator
+
+    @classmethod
+    def get(cls, name: str) -> TokenEstimator | None:
+        """Estimator per Name holen."""
+        return cls._estimators.get(name)
+
+    @classmethod
+    def list_available(cls) -> list[str]:
+        """Alle registrierten Estimatoren."""
+        return list(cls._estimators.keys())
+
+    @classmethod
+    def set_default(cls, name: str) -> None:
+        """Standard-Estimator setzen."""
+        if name not in cls._estimators:
+            raise KeyError(f"Estimator '{name}' nicht registriert.")
+        cls._default = name
+
+    @classmethod
+    def get_default(cls) -> TokenEstimator:
+        """Standard-Estimator holen."""
+        return cls._estimators[cls._default]
+
+
+def build_token_estimator(cfg: dict[str, Any]) -> TokenEstimator:
+    """Estimator aus dem Config-Block 'tokens' bauen.
+
+    Keys:
+        estimator:   Registry-Name (Default: Registry-Default, "bpe")
+        cache_size:  LRU-Eintraege, 0 = kein Cache (Default 4096)
+        calibrate:   true = CalibratedTokenEstimator obendrauf (Default false)
+    """
+    name = cfg.get("estimator") or TokenEstimatorRegistry._default
+    base = TokenEstimatorRegistry.get(name)
+    if base is None:
+        logger.warning("Token-Estimator '%s' unbekannt — nutze Default", name)
+        base = TokenEstimatorRegistry.get_default()
+    if isinstance(base, CachedTokenEstimator):
+        base = base.inner
+    estimator: TokenEstimator = base
+    cache_size = int(cfg.get("cache_size", 4096))
+    if cache_size > 0:
+        estimator = CachedTokenEstimator(estimator, max_entries=cache_size)
+    if cfg.get("calibrate", False):
+        estimator = CalibratedTokenEstimator(estimator)
+    return estimator
+
+
+# ---------------------------------------------------------------------------
+# Defaults beim Import registrieren
+# ---------------------------------------------------------------------------
+
+TokenEstimatorRegistry.register(CachedTokenEstimator(BpeApproxEstimator()))
+TokenEstimatorRegistry.register(CharRatioEstimator())
@@ -361,13 +361,13 @@ async def status_line(runner: Runner) -> str:
     if session is None:
         return ""
     wm = await runner.session_manager.get_working_memory(session.id)
-    turns = await wm.get_recent_turns(9999)
+    n_turns = await wm.turn_count()
     tokens = wm.estimated_tokens()
     cw = runner.provider.context_window or wm.max_tokens
     pct = int(tokens / cw * 100) if cw else 0
     strategy = runner.reasoning_strategy.name
     return (
-        f"[{len(turns)} Turns | ~{tokens} Token | "
+        f"[{n_turns} Turns | ~{tokens} Token | "
         f"{pct}% | Strategie: {strategy}]"
     )
 
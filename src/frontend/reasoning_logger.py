@@ -52,6 +52,7 @@ class ReasoningLoggerAddOn(AddOn):
     """
 
     name = "reasoning_logger"
+    observe_only = frozenset({HookPoint.ON_LLM_REQUEST, HookPoint.ON_LLM_RESPONSE})
 
     def __init__(self, log_dir: str | Path = "logs/reasoning") -> None:
         super().__init__()
@@ -86,7 +87,7 @@ class ReasoningLoggerAddOn(AddOn):
         """Schritt-Start: Zeitstempel + Plan notieren."""
         plan = ctx.step_plan
         if plan is None:
-            return AddOnResult()
+            return AddOnResult(modified_ctx=ctx)
 
         entry_start = {
             "event": "step_start",
@@ -102,7 +103,7 @@ class ReasoningLoggerAddOn(AddOn):
         }
         # Pending speichern — wird bei ON_LLM_RESPONSE vervollstaendigt
         self._pending[ctx.snapshot_id] = entry_start
-        return AddOnResult()
+        return AddOnResult(modified_ctx=ctx)
 
     async def on_llm_response(
         self, ctx: PipelineContext, history: ContextHistory | None = None
@@ -110,7 +111,7 @@ class ReasoningLoggerAddOn(AddOn):
         """Schritt-Ende: Response + Reflection ergaenzen, schreiben."""
         plan = ctx.step_plan
         if plan is None:
-            return AddOnResult()
+            return AddOnResult(modified_ctx=ctx)
 
         # Passenden pending entry suchen (letzter bekannter)
         pending = self._pending.pop(ctx.snapshot_id, None)
@@ -147,7 +148,7 @@ class ReasoningLoggerAddOn(AddOn):
             "suggest_adaptation": reflection.suggest_adaptation if reflection else None,
         }
         self._write(ctx.agent_id, entry)
-        return AddOnResult()
+        return AddOnResult(modified_ctx=ctx)
 
 
 # ------------------------------------------------------------------
@@ -8,9 +8,10 @@ import json
 import os
 
 from base import BaseProvider
+from prompt_cache import _get_prompt_cache_config, choose_breakpoints, apply_breakpoints
 from models import (
     ChatRequest, ChatResponse, StreamChunk, TokenCountRequest,
-    TokenCountResponse, ModelDetail, BatchCreateRequest, BatchStatus,
+    ModelDetail, BatchCreateRequest, BatchStatus,
     BatchListResponse, BatchResultsResponse, BatchResultItem,
 )
 
@@ -61,6 +62,11 @@ class AnthropicProvider(BaseProvider):
             payload["stop_sequences"] = request.stop_sequences
         if request.tools:
             payload["tools"] = request.tools
+        # Prompt-Caching: explizit gewählte Breakpoints ohne Mindestlänge
+        cache_cfg = _get_prompt_cache_config(self.config)
+        min_tokens = 0 if request.cache_breakpoints is not None else int(cache_cfg["min_tokens"])
+        apply_breakpoints(payload, choose_breakpoints(request, cache_cfg),
+                          cache_cfg["ttl"], min_tokens)
         return payload
 
     def _anthropic_content(self, content) -> str | list:
@@ -91,16 +97,23 @@ class AnthropicProvider(BaseProvider):
                 }})
         return result
 
+    @staticmethod
+    def _usage(u: dict, output_tokens: int) -> dict:
+        """Anthropic-usage → einheitlich; Cache-Felder nur wenn gemeldet."""
+        usage = {"input_tokens": u.get("input_tokens", 0), "output_tokens": output_tokens}
+        for key in ("cache_read_input_tokens", "cache_creation_input_tokens"):
+            if u.get(key):
+                usage[key] = u[key]
+        return usage
+
     def _transform_response(self, raw: dict) -> ChatResponse:
         content_blocks = raw.get("content", [])
         text_parts = [b["text"] for b in content_blocks if b.get("type") == "text"]
+        u = raw.get("usage", {})
         return ChatResponse(
             content="".join(text_parts),
             model=raw.get("model", "unknown"),
-            usage={
-                "input_tokens": raw.get("usage", {}).get("input_tokens", 0),
-                "output_tokens": raw.get("usage", {}).get("output_tokens", 0),
-            },
+            usage=self._usage(u, u.get("output_tokens", 0)),
             provider=self.provider_name,
             stop_reason=raw.get("stop_reason"),
             content_blocks=content_blocks,
@@ -120,8 +133,7 @@ class AnthropicProvider(BaseProvider):
         if t == "message_start":
             msg = ev.get("message", {})
             u = msg.get("usage", {})
-            return StreamChunk(type="usage", model=msg.get("model"),
-                               usage={"input_tokens": u.get("input_tokens", 0), "output_tokens": 0})
+            return StreamChunk(type="usage", model=msg.get("model"), usage=self._usage(u, 0))
         if t == "content_block_delta":
             txt = ev.get("delta", {}).get("text", "")
             return StreamChunk(type="content_delta", content=txt) if txt else None
@@ -152,9 +164,8 @@ class AnthropicProvider(BaseProvider):
 
     # ─── Tier 1: Token Count ───────────────────────────────────
 
-    async def count_tokens(self, request: TokenCountRequest) -> TokenCountResponse:
+    async def _count_tokens_upstream(self, model: str, request: TokenCountRequest) -> int:
         await self._ensure_client()
-        model = request.model or self.get_default_model()
         payload = {
             "model": model,
             "messages": [{"role": m.role, "content": self._anthropic_content(m.content)} for m in request.messages],
@@ -168,10 +179,7 @@ class AnthropicProvider(BaseProvider):
             headers=self._get_headers(), json=payload,
         )
         resp.raise_for_status()
-        return TokenCountResponse(
-            input_tokens=resp.json().get("input_tokens", 0),
-            model=model, provider=self.provider_name,
-        )
+        return resp.json().get("input_tokens", 0)
 
     # ─── Tier 2: Batches ───────────────────────────────────────
 
@@ -4,8 +4,12 @@ Alle Endpoints definiert. Default = 501 Not Implemented.
 Jeder Provider überschreibt was er kann.
 """
 from abc import ABC, abstractmethod
+from collections import deque
 from collections.abc import AsyncGenerator
 from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import base64
 import httpx
 import os
 import sys
@@ -13,18 +17,28 @@ import time
 
 from models import (
     ChatRequest, ChatResponse, StreamChunk, TokenCountRequest,
-    TokenCountResponse, ModelDetail, EmbeddingRequest, EmbeddingResponse,
+    TokenCountResponse, ModelDetail, EmbeddingRequest, EmbeddingResponse, EmbeddingData,
     BatchCreateRequest, BatchStatus, BatchListResponse, BatchResultsResponse,
     ModerationRequest, ModerationResponse, AudioSpeechRequest,
     ImageGenerationRequest, ImageResponse, ImageEditRequest,
     ImageVariationRequest, AudioResponse, CapabilitiesResponse,
     CapabilityTier, HealthResponse, ConnectionStatus, RequestContext,
-    NotImplementedResponse,
+    NotImplementedResponse, TextBlock, DocumentBlock,
+    BatchResultItem, DeferredChatRequest, DeferredTicket,
 )
 from logger import RequestResponseLogger
 from database import cost_logger
 from config import instance_config
 from retry import with_retry, RetryExhausted, RateLimitHit
+from http_pool import create_client, close_when_idle, pool_stats, _get_http_config
+from rate_limit import RateLimiter
+from response_cache import ResponseCache, CACHE_HIT_STATUS, cache_key
+from single_flight import SingleFlight, COALESCED_STATUS
+from file_processor import DocumentExtractor, PROVIDER_NATIVE
+from prompt_cache import cache_usage
+from embeddings import EmbeddingBatcher
+from deferred import DeferredQueue
+from token_count import TokenCounter
 
 
 class EndpointNotAvailable(Exception):
@@ -52,16 +66,38 @@ class BaseProvider(ABC):
     _tier2_extended: list[str] = []
     _tier3_specialized: list[str] = []
     _features: dict = {}
+    _embedding_model: str = ""        # Default für /embeddings (Config: embedding_model)
+    _embedding_max_batch: int = 2048  # Texte pro Upstream-Call (Provider-Limit)
 
     def __init__(self, config: dict):
         self.config = config
         self.provider_name = config.get("name", "unknown")
         self._connected = False
         self._client: httpx.AsyncClient | None = None
+        self._closing: set[asyncio.Task] = set()   # abgegebene Clients im Drain
         log_dir = os.environ.get("LOG_DIR", "/data")
         log_requests = instance_config.log_requests()
-        self.logger = RequestResponseLogger(self.provider_name, log_dir, enabled=log_requests)
-        self._rate_limit_hits: list = []  # Timestamps von 429-Hits
+        dlog = instance_config.dialog_logging()
+        self.logger = RequestResponseLogger(
+            self.provider_name, log_dir, enabled=log_requests,
+            background=bool(dlog["background"]),
+            max_queue=int(dlog["max_queue"]),
+            max_queue_bytes=int(dlog["max_queue_mb"]) * 1024 * 1024,
+            blob_store=bool(dlog["blob_store"]),
+            blob_min_bytes=int(dlog["blob_min_bytes"]),
+        )
+        self._rate_limit_hits: deque = deque(maxlen=1000)  # Timestamps der letzten 429-Hits
+        self._rate_limiter = RateLimiter(config)
+        self._response_cache = ResponseCache(self.provider_name, config, log_dir)
+        self._inflight = SingleFlight(config)
+        self._extractor = DocumentExtractor(config)
+        self._embeddings = EmbeddingBatcher(self.provider_name, config, self._embed_upstream,
+                                            log_dir, max_batch=self._embedding_max_batch)
+        self._token_counter = TokenCounter(self.provider_name, config, self._count_tokens_upstream,
+                                           unavailable=(EndpointNotAvailable,))
+        # Ohne Batch-API laufen Deferred-Requests sofort als normaler /chat
+        self._deferred = DeferredQueue(
+            self, backend=self if "batches" in self._tier2_extended else None)
 
     # ─── Abstract: Jeder Provider MUSS diese implementieren ────
 
@@ -123,6 +159,8 @@ class BaseProvider(ABC):
         Passt ContentBlocks fuer diesen Provider an.
         Wird von Subklassen aufgerufen um unterstuetzte Typen zu pruefen
         und ggf. document-Blocks in Text-Extraktion umzuwandeln.
+        Im Chat-Pfad hat _extract_documents das bereits im Prozess-Pool
+        erledigt; hier greift nur noch der Content-Hash-Cache.
         """
         from file_processor import PROVIDER_NATIVE, _extract_pdf
         import base64 as _b64
@@ -141,6 +179,34 @@ class BaseProvider(ABC):
                 result.append(p)
         return result
 
+    async def _extract_documents(self, request: ChatRequest) -> ChatRequest:
+        """
+        PDF-Blocks für Provider ohne natives PDF vorab im Prozess-Pool in
+        Text umwandeln — der Event-Loop bleibt frei. Gibt den Request
+        unverändert zurück, wenn nichts zu extrahieren ist.
+        """
+        if "application/pdf" in PROVIDER_NATIVE.get(self.provider_name, set()):
+            return request
+        if not any(isinstance(m.content, list)
+                   and any(isinstance(b, DocumentBlock) for b in m.content)
+                   for m in request.messages):
+            return request
+        messages = []
+        for m in request.messages:
+            if isinstance(m.content, list):
+                blocks = []
+                for b in m.content:
+                    if isinstance(b, DocumentBlock):
+                        try:
+                            raw = await asyncio.to_thread(base64.b64decode, b.data)
+                            b = await self._extractor.text_block(raw, "dokument.pdf")
+                        except Exception as e:
+                            b = TextBlock(text=f"[PDF-Extraktion fehlgeschlagen: {e}]")
+                    blocks.append(b)
+                m = m.model_copy(update={"content": blocks})
+            messages.append(m)
+        return request.model_copy(update={"messages": messages})
+
     # ─── Hilfsmethoden ─────────────────────────────────────────
 
     def _ts(self) -> str:
@@ -164,7 +230,8 @@ class BaseProvider(ABC):
         if not self._connected or not self._client:
             self.connect()  # connect() ist sync — bewusst, kein await nötig
 
-    async def _log_cost(self, model, in_tok, out_tok, ms, ctx, status, err=None):
+    async def _log_cost(self, model, in_tok, out_tok, ms, ctx, status, err=None, **cache):
+        """cache: cache_read_tokens/cache_write_tokens (Prompt-Caching), nur wenn gemeldet."""
         ctx = ctx or RequestContext()
         try:
             await cost_logger.log_request(
@@ -172,7 +239,7 @@ class BaseProvider(ABC):
                 input_tokens=in_tok, output_tokens=out_tok,
                 latency_ms=ms, heinzel_id=ctx.heinzel_id,
                 session_id=ctx.session_id, task_id=ctx.task_id,
-                status=status, error_message=err,
+                status=status, error_message=err, **cache,
             )
         except Exception as e:
             print(f"Cost logging failed: {e}", file=sys.stderr)
@@ -181,7 +248,8 @@ class BaseProvider(ABC):
 
     def connect(self) -> ConnectionStatus:
         if not self._connected:
-            self._client = httpx.AsyncClient(timeout=120.0)
+            if self._client is None:
+                self._client = create_client(self.config)
             self._connected = True
         return ConnectionStatus(
             status="connected", provider=self.provider_name, timestamp=self._ts())
@@ -189,9 +257,83 @@ class BaseProvider(ABC):
     def disconnect(self) -> ConnectionStatus:
         if self._connected:
             self._connected = False
+        self._retire_client()
         return ConnectionStatus(
             status="disconnected", provider=self.provider_name, timestamp=self._ts())
 
+    def _retire_client(self) -> None:
+        """
+        Client abgeben und schließen sobald laufende Requests (auch Streams)
+        fertig sind. Ohne laufenden Event-Loop wird sofort geschlossen.
+        """
+        client, self._client = self._client, None
+        if client is None:
+            return
+        drain = _get_http_config(self.config)["timeout_s"]
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                asyncio.run(client.aclose())
+            except Exception as e:
+                print(f"HTTP: Client-Close fehlgeschlagen: {e}", file=sys.stderr)
+            return
+        task = loop.create_task(close_when_idle(client, drain))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def aclose(self) -> None:
+        """Trennen und warten bis alle abgegebenen Clients geschlossen sind."""
+        self.disconnect()
+        # Ausstehende Dialog-Log-Einträge schreiben — join() blockiert, daher im Thread
+        await asyncio.to_thread(self.logger.close)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        await self._response_cache.close()
+        await self._extractor.close()
+        await self._embeddings.close()
+        await self._deferred.close()
+        await self._token_counter.close()
+
+    def http_pool_stats(self) -> Optional[dict]:
+        """Pool-Statistik des aktiven Clients (None ohne Verbindung)."""
+        stats = pool_stats(self._client)
+        if stats is not None:
+            stats["config"] = _get_http_config(self.config)
+        return stats
+
+    def response_cache_stats(self) -> dict:
+        """Treffer, Fehlschläge und Einsparung des Response-Caches."""
+        return self._response_cache.stats
+
+    async def clear_response_cache(self) -> None:
+        """Response-Cache leeren (Memory- und SQLite-Stufe)."""
+        await self._response_cache.clear()
+
+    def coalescing_stats(self) -> dict:
+        """Geteilte Upstream-Calls und Streams (Single-Flight)."""
+        return self._inflight.stats
+
+    def file_extraction_stats(self) -> dict:
+        """Prozess-Pool und Content-Hash-Cache der Dokument-Extraktion."""
+        return self._extractor.stats
+
+    def embedding_stats(self) -> dict:
+        """Micro-Batching und Cache des /embeddings-Endpoints."""
+        return self._embeddings.stats
+
+    def token_count_stats(self) -> dict:
+        """/tokens/count: Cache-Treffer, Schätzungen, Upstream-Calls, Kalibrierfaktor."""
+        return self._token_counter.stats
+
+    def deferred_stats(self) -> dict:
+        """Deferred-Queue: Batches, Durchlaufzeit, eingesparte Tokens und Calls."""
+        return self._deferred.stats
+
+    def rate_limit_stats(self) -> dict:
+        """Zustand des clientseitigen Rate-Limiters pro Modell."""
+        return self._rate_limiter.stats()
+
     def reset(self) -> ConnectionStatus:
         self.disconnect()
         r = self.connect()
@@ -230,14 +372,91 @@ class BaseProvider(ABC):
         self._not_impl("GET /models/{id}")
 
     async def count_tokens(self, request: TokenCountRequest) -> TokenCountResponse:
+        """
+        /tokens/count über den TokenCounter: Präfix-Cache, Summe pro Message,
+        kalibrierte Schätzung. Provider implementieren nur _count_tokens_upstream.
+        """
+        model = request.model or self.get_default_model()
+        total, source = await self._token_counter.count(model, request)
+        return TokenCountResponse(input_tokens=total, model=model,
+                                  provider=self.provider_name, source=source)
+
+    async def _count_tokens_upstream(self, model: str, request: TokenCountRequest) -> int:
+        """Exakte Zählung (Provider-API). Ohne Override: lokale Schätzung."""
         self._not_impl("POST /tokens/count")
 
     async def chat(self, request: ChatRequest) -> ChatResponse:
+        """
+        /chat: Response-Cache, dann Coalescing identischer laufender Requests,
+        erst dann der Upstream-Call (_chat_upstream).
+        """
         await self._ensure_client()
+        model = request.model or self.get_default_model()
+        key = self._response_cache.key_for(model, request)
+        if key is not None:
+            cached = await self._response_cache.get(key)
+            if cached is not None:
+                return await self._serve_shared(request, model, CACHE_HIT_STATUS, cached)
+        flight = self._flight_key(model, request, key)
+        if flight is None:
+            return await self._chat_and_store(request, key)
+        running = self._inflight.running(flight)
+        if running is not None:
+            return await self._serve_shared(
+                request, model, COALESCED_STATUS, asyncio.shield(running))
+        task = self._inflight.start(flight, lambda: self._chat_and_store(request, key))
+        return await asyncio.shield(task)   # Abbruch dieses Clients stoppt den Call nicht
+
+    async def _chat_and_store(self, request: ChatRequest, key: Optional[str]) -> ChatResponse:
+        result = await self._chat_upstream(request)
+        if key is not None:
+            await self._response_cache.put(key, result)
+        return result
+
+    def _flight_key(self, model: str, request: ChatRequest,
+                    key: Optional[str] = None) -> Optional[str]:
+        """Coalescing-Key (gleich dem Cache-Key) oder None wenn ausgeschlossen."""
+        if not self._inflight.enabled or request.bypass_cache:
+            return None
+        if not self._inflight.shareable(request.temperature):
+            return None
+        return key or cache_key(self.provider_name, model, request)
+
+    async def _serve_shared(self, request: ChatRequest, model: str, status: str,
+                            result) -> ChatResponse:
+        """
+        Antwort ohne eigenen Upstream-Call (Cache-Treffer oder angehängt an
+        einen laufenden Call): Dialog-Log wie gewohnt, Kosten mit 0 Tokens.
+        result: ChatResponse oder Awaitable darauf.
+        """
+        start = time.perf_counter()
+        err = None
+        ctx = self._ctx(request)
+        self.logger.log_request("/chat", self._transform_request(request), **ctx)
+        try:
+            if not isinstance(result, ChatResponse):
+                result = (await result).model_copy(deep=True)
+            model = result.model
+            self.logger.log_response("/chat", 200, result.model_dump(), **ctx)
+            return result
+        except Exception as e:
+            status = "error"
+            err = str(e)
+            self.logger.log_error("/chat", err, **ctx)
+            raise
+        finally:
+            ms = int((time.perf_counter() - start) * 1000)
+            await self._log_cost(model, 0, 0, ms, request.context, status, err)
+
+    async def _chat_upstream(self, request: ChatRequest) -> ChatResponse:
+        """Ein Upstream-Call mit Retry, Rate-Limiter, Dialog-Log und Kosten."""
+        await self._ensure_client()
+        request = await self._extract_documents(request)
         start = time.perf_counter()
         status = "success"
         err = None
         in_tok = out_tok = 0
+        cache = {}
         model = request.model or self.get_default_model()
 
         ctx = self._ctx(request)
@@ -245,11 +464,16 @@ class BaseProvider(ABC):
         headers = self._get_headers()
         payload = self._transform_request(request)
         self.logger.log_request("/chat", payload, **ctx)
+        permit = None
 
         async def _do_request():
-            resp = await self._client.post(endpoint, headers=headers, json=payload)
-            resp.raise_for_status()
-            return resp
+            nonlocal permit
+            async with self._rate_limiter.acquire(model, payload) as permit:
+                resp = await self._client.post(endpoint, headers=headers, json=payload)
+                if permit is not None:
+                    permit.observe(resp)
+                resp.raise_for_status()
+                return resp
 
         try:
             resp = await with_retry(_do_request, self.config,
@@ -257,6 +481,9 @@ class BaseProvider(ABC):
             result = self._transform_response(resp.json())
             in_tok = result.usage.get("input_tokens", 0)
             out_tok = result.usage.get("output_tokens", 0)
+            cache = cache_usage(result.usage)
+            if permit is not None:
+                permit.settle(in_tok + out_tok)
             model = result.model
             self.logger.log_response("/chat", resp.status_code, result.model_dump(), **ctx)
             return result
@@ -287,14 +514,56 @@ class BaseProvider(ABC):
             raise
         finally:
             ms = int((time.perf_counter() - start) * 1000)
-            await self._log_cost(model, in_tok, out_tok, ms, request.context, status, err)
+            await self._log_cost(model, in_tok, out_tok, ms, request.context, status, err,
+                                 **cache)
 
     async def chat_stream(self, request: ChatRequest) -> AsyncGenerator[StreamChunk, None]:
+        """
+        /chat/stream mit Coalescing: ein identischer laufender Stream wird
+        geteilt — bisherige Chunks als Replay, danach live.
+        """
+        model = request.model or self.get_default_model()
+        flight = self._flight_key(model, request)
+        if flight is None:
+            async for chunk in self._chat_stream_upstream(request):
+                yield chunk
+            return
+        attached, chunks = self._inflight.subscribe(
+            "stream:" + flight, lambda: self._chat_stream_upstream(request))
+        if not attached:
+            async for chunk in chunks:
+                yield chunk
+            return
+
+        start = time.perf_counter()
+        status = COALESCED_STATUS
+        err = None
+        ctx = self._ctx(request)
+        self.logger.log_request("/chat/stream", self._transform_stream_request(request), **ctx)
+        try:
+            async for chunk in chunks:
+                if chunk.type == "error":
+                    status, err = "error", chunk.error
+                if chunk.model:
+                    model = chunk.model
+                yield chunk
+        finally:
+            ms = int((time.perf_counter() - start) * 1000)
+            self.logger.log_response("/chat/stream", 200, {
+                "model": model, "input_tokens": 0, "output_tokens": 0,
+                "latency_ms": ms, "coalesced": True,
+            }, **ctx)
+            await self._log_cost(model, 0, 0, ms, request.context, status, err)
+
+    async def _chat_stream_upstream(self, request: ChatRequest) -> AsyncGenerator[StreamChunk, None]:
+        """Ein Upstream-Stream mit Rate-Limiter, Dialog-Log und Kosten."""
         await self._ensure_client()
+        request = await self._extract_documents(request)
         start = time.perf_counter()
         status = "success"
         err = None
         in_tok = out_tok = 0
+        cache = {}
         model = request.model or self.get_default_model()
 
         ctx = self._ctx(request)
@@ -304,7 +573,10 @@ class BaseProvider(ABC):
         self.logger.log_request("/chat/stream", payload, **ctx)
 
         try:
-            async with self._client.stream("POST", endpoint, headers=headers, json=payload) as resp:
+            async with self._rate_limiter.acquire(model, payload) as permit, \
+                    self._client.stream("POST", endpoint, headers=headers, json=payload) as resp:
+                if permit is not None:
+                    permit.observe(resp)
                 resp.raise_for_status()
                 async for line in resp.aiter_lines():
                     if not line.startswith("data: "):
@@ -318,9 +590,12 @@ class BaseProvider(ABC):
                     if chunk.type == "usage" and chunk.usage:
                         in_tok = chunk.usage.get("input_tokens", in_tok)
                         out_tok = chunk.usage.get("output_tokens", out_tok)
+                        cache.update(cache_usage(chunk.usage))
                     if chunk.model:
                         model = chunk.model
                     yield chunk
+                if permit is not None:
+                    permit.settle(in_tok + out_tok)
         except httpx.HTTPStatusError as e:
             status = "error"
             try:
@@ -342,15 +617,35 @@ class BaseProvider(ABC):
             ms = int((time.perf_counter() - start) * 1000)
             self.logger.log_response("/chat/stream", 200, {
                 "model": model, "input_tokens": in_tok,
-                "output_tokens": out_tok, "latency_ms": ms,
+                "output_tokens": out_tok, "latency_ms": ms, **cache,
             }, **ctx)
-            await self._log_cost(model, in_tok, out_tok, ms, request.context, status, err)
+            await self._log_cost(model, in_tok, out_tok, ms, request.context, status, err,
+                                 **cache)
 
     # ═══════════════════════════════════════════════════════════
     # TIER 2: EXTENDED
     # ═══════════════════════════════════════════════════════════
 
     async def create_embedding(self, request: EmbeddingRequest) -> EmbeddingResponse:
+        """
+        /embeddings über Content-Hash-Cache und Micro-Batcher. Provider mit
+        Embeddings implementieren nur _embed_upstream. Vektoren kommen immer
+        als float-Liste (encoding_format wird nicht weitergereicht).
+        """
+        if "embeddings" not in self._tier2_extended:
+            self._not_impl("POST /embeddings")
+        await self._ensure_client()
+        model = request.model or self.config.get("embedding_model", self._embedding_model)
+        texts = request.input if isinstance(request.input, list) else [request.input]
+        vectors, usage = await self._embeddings.embed(model, texts, request.dimensions)
+        return EmbeddingResponse(
+            data=[EmbeddingData(index=i, embedding=v) for i, v in enumerate(vectors)],
+            model=model, usage=usage, provider=self.provider_name,
+        )
+
+    async def _embed_upstream(self, model: str, texts: list[str],
+                              dimensions: Optional[int]) -> tuple[list[list[float]], int]:
+        """Ein Upstream-Call für mehrere Texte → (Vektoren in Reihenfolge, Prompt-Tokens)."""
         self._not_impl("POST /embeddings")
 
     async def create_batch(self, request: BatchCreateRequest) -> BatchStatus:
@@ -368,6 +663,27 @@ class BaseProvider(ABC):
     async def get_batch_results(self, batch_id: str) -> BatchResultsResponse:
         self._not_impl("GET /batches/{id}/results")
 
+    def _parse_batch_result(self, item: BatchResultItem) -> ChatResponse:
+        """
+        Batch-Ergebnis → ChatResponse. Anthropic verpackt die Message in
+        {"type": "succeeded", "message": ...}, OpenAI liefert den Body direkt.
+        """
+        result = item.result or {}
+        if item.error or result.get("type") in ("errored", "canceled", "expired"):
+            raise RuntimeError(f"Batch-Request {item.custom_id} fehlgeschlagen: "
+                               f"{item.error or result.get('error') or result.get('type')}")
+        return self._transform_response(result.get("message", result))
+
+    # ─── Deferred: nicht eilige Chats über die Batch-API ───────
+
+    async def chat_deferred(self, request: DeferredChatRequest) -> DeferredTicket:
+        """Request in die Deferred-Queue — Ticket sofort, Ergebnis später."""
+        return await self._deferred.submit(request.request, request.max_delay_s,
+                                           request.webhook_url)
+
+    def get_deferred(self, ticket_id: str) -> Optional[DeferredTicket]:
+        return self._deferred.get(ticket_id)
+
     # ═══════════════════════════════════════════════════════════
     # TIER 3: SPECIALIZED
     # ═══════════════════════════════════════════════════════════
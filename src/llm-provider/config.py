@@ -89,6 +89,28 @@ class InstanceConfig:
         yaml_val = self._data.get("retention") or {}
         return {**defaults, **yaml_val}
 
+    def dialog_logging(self) -> dict:
+        """Hintergrund-Writer und Blob-Store fuer die Dialog-Logs."""
+        defaults = {
+            "background": True,         # Serialisierung + I/O im Thread
+            "max_queue": 1000,          # Eintraege; voll = verwerfen und zaehlen
+            "max_queue_mb": 64,         # geschaetzte Payload-Groesse in der Queue
+            "blob_store": False,        # Base64-Blobs per Hash statt inline
+            "blob_min_bytes": 4096,     # kleinere Strings bleiben inline
+        }
+        yaml_val = self._data.get("dialog_logging") or {}
+        return {**defaults, **yaml_val}
+
+    def cost_logging(self) -> dict:
+        """Write-Behind-Parameter fuer den CostLogger."""
+        defaults = {
+            "batch_size": 200,          # so viele Eintraege loesen sofort einen Flush aus
+            "flush_interval_ms": 500,   # spaetestens nach dieser Zeit schreiben
+            "max_queue": 10000,         # voll = Aufrufer flusht selbst (Backpressure)
+        }
+        yaml_val = self._data.get("cost_logging") or {}
+        return {**defaults, **yaml_val}
+
 
 def _normalize_sqlite_url(url: str, data_dir: str = "/data") -> str:
     """Macht relative sqlite-Pfade absolut."""
@@ -8,10 +8,18 @@ Auswahl über DATABASE_URL:
   - sqlite:///path/to/db   → SQLite an explizitem Pfad
 
 Die costs-Tabelle wird beim Start automatisch angelegt falls nicht vorhanden.
+
+Rollups: costs_rollup hält pro Minute/Stunde/Tag × provider × model ×
+heinzel_id Zähler, Token-Summen und ein Latenz-Histogramm. Die Zeilen
+werden beim Flush inkrementell mitgeschrieben (gleiche Transaktion wie die
+Rohdaten) — summary() liest daraus statt die costs-Tabelle zu scannen.
 """
 
+import asyncio
 import os
 import sys
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from config import instance_config
@@ -30,22 +38,250 @@ CREATE TABLE IF NOT EXISTS costs (
     session_id  TEXT,
     task_id     TEXT,
     status      TEXT DEFAULT 'success',
-    error_message TEXT
+    error_message TEXT,
+    cache_read_tokens  INTEGER DEFAULT 0,
+    cache_write_tokens INTEGER DEFAULT 0
 )
 """
 
 INSERT_SQL = """
 INSERT INTO costs (
-    provider, model, input_tokens, output_tokens,
+    ts, provider, model, input_tokens, output_tokens,
     latency_ms, heinzel_id, session_id, task_id,
-    status, error_message
-) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    status, error_message, cache_read_tokens, cache_write_tokens
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
 """
 
-# PostgreSQL nutzt $1..$N statt ?
-INSERT_SQL_PG = INSERT_SQL.replace("?", "{}").format(
-    "$1","$2","$3","$4","$5","$6","$7","$8","$9","$10"
+# Spalten, die nach dem ersten Release dazukamen — bestehende DBs werden
+# beim Connect per ALTER TABLE nachgezogen
+MIGRATION_COLUMNS = {
+    "costs": ["cache_read_tokens INTEGER DEFAULT 0", "cache_write_tokens INTEGER DEFAULT 0"],
+    "costs_rollup": ["cache_read_tokens BIGINT DEFAULT 0", "cache_write_tokens BIGINT DEFAULT 0"],
+}
+
+# Dashboards filtern fast immer nach Zeitraum, oft zusätzlich nach Dimension
+INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_costs_ts ON costs (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_costs_session_ts ON costs (session_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_costs_heinzel_ts ON costs (heinzel_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_costs_model_ts ON costs (model, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_costs_provider_ts ON costs (provider, ts)",
+]
+
+# Obere Grenzen der Latenz-Buckets (ms). Der letzte Bucket ist offen.
+LATENCY_BUCKETS_MS = (
+    50, 100, 250, 500, 750, 1000, 1500, 2000, 3000,
+    5000, 7500, 10000, 15000, 20000, 30000, 60000, 120000,
 )
+HIST_COLUMNS = [f"lat_{i:02d}" for i in range(len(LATENCY_BUCKETS_MS) + 1)]
+
+ROLLUP_GRANULARITIES = ("minute", "hour", "day")
+
+CREATE_ROLLUP_SQL = f"""
+CREATE TABLE IF NOT EXISTS costs_rollup (
+    granularity   TEXT NOT NULL,
+    bucket        TEXT NOT NULL,
+    provider      TEXT NOT NULL,
+    model         TEXT NOT NULL,
+    heinzel_id    TEXT NOT NULL DEFAULT '',
+    requests      INTEGER DEFAULT 0,
+    input_tokens  BIGINT DEFAULT 0,
+    output_tokens BIGINT DEFAULT 0,
+    latency_sum   BIGINT DEFAULT 0,
+    latency_max   INTEGER DEFAULT 0,
+    error_count   INTEGER DEFAULT 0,
+    cache_read_tokens  BIGINT DEFAULT 0,
+    cache_write_tokens BIGINT DEFAULT 0,
+    {", ".join(f"{c} INTEGER DEFAULT 0" for c in HIST_COLUMNS)},
+    PRIMARY KEY (granularity, bucket, provider, model, heinzel_id)
+)
+"""
+
+_SUMMARY_TOTALS = ("requests", "input_tokens", "output_tokens", "latency_sum",
+                   "latency_max", "error_count", "cache_read_tokens", "cache_write_tokens")
+
+_ROLLUP_KEYS = ["granularity", "bucket", "provider", "model", "heinzel_id"]
+_ROLLUP_SUMS = ["requests", "input_tokens", "output_tokens", "latency_sum",
+                "error_count", "cache_read_tokens", "cache_write_tokens"] + HIST_COLUMNS
+
+
+def _rollup_upsert_sql(db_type: str) -> str:
+    """Inkrementelles Upsert — Zähler addieren, Maximum nachziehen."""
+    cols = _ROLLUP_KEYS + _ROLLUP_SUMS + ["latency_max"]
+    greatest = "GREATEST" if db_type == "postgresql" else "MAX"
+    updates = [f"{c} = costs_rollup.{c} + excluded.{c}" for c in _ROLLUP_SUMS]
+    updates.append(f"latency_max = {greatest}(costs_rollup.latency_max, excluded.latency_max)")
+    return (
+        f"INSERT INTO costs_rollup ({', '.join(cols)}) "
+        f"VALUES ({', '.join('?' for _ in cols)}) "
+        f"ON CONFLICT ({', '.join(_ROLLUP_KEYS)}) DO UPDATE SET {', '.join(updates)}"
+    )
+
+
+def _to_pg(sql: str) -> str:
+    """? → $1..$N (PostgreSQL)."""
+    parts = sql.split("?")
+    out = [parts[0]]
+    for i, part in enumerate(parts[1:], start=1):
+        out.append(f"${i}{part}")
+    return "".join(out)
+
+
+# PostgreSQL nutzt $1..$N statt ?
+INSERT_SQL_PG = _to_pg(INSERT_SQL)
+
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _utcnow() -> datetime:
+    """UTC ohne tzinfo — passt zu CURRENT_TIMESTAMP (SQLite) und TIMESTAMP (PG)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _latency_bucket(latency_ms: int) -> int:
+    for i, upper in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= upper:
+            return i
+    return len(LATENCY_BUCKETS_MS)
+
+
+def _parse_ts(value) -> Optional[datetime]:
+    """ISO-String/datetime → naive UTC. None wenn nicht lesbar."""
+    if isinstance(value, datetime):
+        ts = value
+    else:
+        try:
+            ts = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def aggregate_rollups(rows) -> list[tuple]:
+    """
+    Rohzeilen → Rollup-Deltas für alle Granularitäten.
+    rows: Iterable von (ts, provider, model, heinzel_id, input_tokens,
+          output_tokens, latency_ms, status, cache_read_tokens,
+          cache_write_tokens). Reihenfolge der Ergebnis-Tupel passt zu
+          _rollup_upsert_sql().
+    """
+    acc: dict[tuple, list] = {}
+    width = 7 + len(HIST_COLUMNS) + 1
+    for ts, provider, model, heinzel_id, inp, out, latency, status, c_read, c_write in rows:
+        ts = _parse_ts(ts)
+        if ts is None:
+            continue
+        latency = int(latency or 0)
+        hist = 7 + _latency_bucket(latency)
+        for gran in ROLLUP_GRANULARITIES:
+            key = (gran, _bucket_start(ts, gran).strftime(_TS_FORMAT),
+                   provider, model, heinzel_id or "")
+            v = acc.get(key)
+            if v is None:
+                v = acc[key] = [0] * width
+            v[0] += 1
+            v[1] += int(inp or 0)
+            v[2] += int(out or 0)
+            v[3] += latency
+            v[4] += 1 if status == "error" else 0
+            v[5] += int(c_read or 0)
+            v[6] += int(c_write or 0)
+            v[hist] += 1
+            v[-1] = max(v[-1], latency)
+    return [key + tuple(v) for key, v in acc.items()]
+
+
+def latency_percentiles(
+    hist: list[int], latency_max: Optional[int] = None,
+    quantiles: tuple[float, ...] = (0.5, 0.95, 0.99),
+) -> dict[float, Optional[float]]:
+    """
+    Perzentile aus Histogramm-Buckets (lineare Interpolation im Bucket).
+    Der offene letzte Bucket liefert latency_max. Leer → None.
+    """
+    total = sum(hist)
+    result: dict[float, Optional[float]] = {}
+    for q in quantiles:
+        if total == 0:
+            result[q] = None
+            continue
+        rank = q * total
+        cum = 0
+        value = None
+        for i, count in enumerate(hist):
+            if count and cum + count >= rank:
+                if i == len(LATENCY_BUCKETS_MS):
+                    value = float(latency_max or LATENCY_BUCKETS_MS[-1])
+                else:
+                    lower = LATENCY_BUCKETS_MS[i - 1] if i else 0
+                    upper = LATENCY_BUCKETS_MS[i]
+                    value = lower + (upper - lower) * (rank - cum) / count
+                break
+            cum += count
+        if value is not None and latency_max:
+            value = min(value, float(latency_max))
+        result[q] = round(value, 1) if value is not None else None
+    return result
+
+
+def rollup_plan(
+    since: Optional[datetime], until: Optional[datetime],
+) -> list[tuple[str, Optional[str], Optional[str]]]:
+    """
+    Zerlegt [since, until] in möglichst grobe Rollup-Bereiche.
+    Rückgabe: [(granularity, bucket_von, bucket_bis_exklusiv), ...].
+    Auflösung ist die Minute: die Minute von since zählt voll mit,
+    ebenso die Minute von until.
+    """
+    lo = _bucket_start(since, "minute") if since else None
+    end = _bucket_start(until, "minute") + timedelta(minutes=1) if until else None
+    if lo is not None and end is not None and lo >= end:
+        return []
+    if lo is None and end is None:
+        return [("day", None, None)]
+
+    fmt = lambda d: d.strftime(_TS_FORMAT) if d is not None else None
+    floors = {
+        "day":    lambda d: _bucket_start(d, "day"),
+        "hour":   lambda d: _bucket_start(d, "hour"),
+        "minute": lambda d: d,
+    }
+    plan = []
+
+    def descend(top: str, start):
+        levels = ROLLUP_GRANULARITIES[::-1]
+        for gran in levels[levels.index(top):]:
+            stop = floors[gran](end)
+            if start is None or start < stop:
+                plan.append((gran, fmt(start), fmt(stop)))
+                start = stop
+        return plan
+
+    if lo is not None:
+        # Aufwärts: Minuten bis zur vollen Stunde, Stunden bis zum vollen Tag
+        for gran, upper in (("minute", "hour"), ("hour", "day")):
+            stop = _bucket_start(lo, upper)
+            if stop < lo:
+                stop += timedelta(hours=1) if upper == "hour" else timedelta(days=1)
+            if end is not None and stop >= end:
+                return descend(gran, lo)
+            if lo < stop:
+                plan.append((gran, fmt(lo), fmt(stop)))
+                lo = stop
+    if end is None:
+        plan.append(("day", fmt(lo), None))
+        return plan
+    return descend("day", lo)
 
 
 def _resolve_db_url() -> tuple[str, str]:
@@ -66,12 +302,57 @@ class CostLogger:
     """
     Async Cost-Logger. Unterstützt SQLite (Default) und PostgreSQL.
     Fällt bei DB-Fehler still zurück — Provider-Betrieb wird nie blockiert.
+
+    Write-Behind: log_request() legt den Eintrag nur in eine Queue. Ein
+    Hintergrund-Task schreibt gesammelt per executemany — sobald
+    batch_size Einträge anstehen oder spätestens nach flush_interval_ms.
+    SQLite nutzt eine langlebige Verbindung im WAL-Modus, PostgreSQL den
+    asyncpg-Pool. Ist die Queue voll (max_queue), flusht der aufrufende
+    Request selbst (Backpressure); hängt die DB, werden die ältesten
+    Einträge verworfen und gezählt. query()/summary() flushen vorher.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[float] = None,
+        max_queue: Optional[int] = None,
+    ):
         self._db_type, self._db_url = _resolve_db_url()
         self._pool = None        # asyncpg pool (PostgreSQL)
         self._sqlite_path = None # Pfad (SQLite)
+        self._conn = None        # aiosqlite-Verbindung (SQLite, langlebig)
+
+        cfg = instance_config.cost_logging()
+        self._batch_size = max(1, int(batch_size or cfg["batch_size"]))
+        interval = cfg["flush_interval_ms"] if flush_interval_ms is None else flush_interval_ms
+        self._flush_interval = max(0.0, float(interval)) / 1000
+        self._max_queue = max(self._batch_size, int(max_queue or cfg["max_queue"]))
+
+        self._queue: list[tuple] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stats = {
+            "enqueued": 0, "written": 0, "dropped": 0,
+            "batches": 0, "failed_batches": 0, "backpressure_flushes": 0,
+            "flush_ms_last": 0.0, "flush_ms_max": 0.0, "flush_ms_total": 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self._pool is not None or self._conn is not None
+
+    @property
+    def stats(self) -> dict:
+        """Queue-Tiefe, Durchsatz und Flush-Latenz (Kopie)."""
+        s = dict(self._stats)
+        batches = s.pop("flush_ms_total")
+        s["flush_ms_avg"] = round(batches / s["batches"], 3) if s["batches"] else 0.0
+        s["queue_depth"] = len(self._queue)
+        s["batch_size"] = self._batch_size
+        s["max_queue"] = self._max_queue
+        return s
 
     async def connect(self):
         if self._db_type == "postgresql":
@@ -90,6 +371,10 @@ class CostLogger:
                     "INTEGER PRIMARY KEY AUTOINCREMENT",
                     "SERIAL PRIMARY KEY"
                 ))
+                for stmt in INDEX_SQL + [CREATE_ROLLUP_SQL]:
+                    await conn.execute(stmt)
+            await self._migrate_columns()
+            await self._backfill_rollups()
             print(f"CostLogger: PostgreSQL verbunden ({self._db_url[:30]}...)", file=sys.stderr)
         except Exception as e:
             print(f"CostLogger: PostgreSQL Fehler, deaktiviert: {e}", file=sys.stderr)
@@ -99,16 +384,36 @@ class CostLogger:
         try:
             import aiosqlite
             self._sqlite_path = self._db_url
-            # Tabelle anlegen
-            async with aiosqlite.connect(self._sqlite_path) as db:
-                await db.execute(CREATE_TABLE_SQL)
-                await db.commit()
+            self._conn = await aiosqlite.connect(self._sqlite_path)
+            self._conn.row_factory = aiosqlite.Row
+            # WAL: Leser blockieren den Writer nicht, Commit ohne fsync pro Batch
+            await self._conn.execute("PRAGMA journal_mode=WAL")
+            await self._conn.execute("PRAGMA synchronous=NORMAL")
+            await self._conn.execute(CREATE_TABLE_SQL)
+            for stmt in INDEX_SQL + [CREATE_ROLLUP_SQL]:
+                await self._conn.execute(stmt)
+            await self._conn.commit()
+            await self._migrate_columns()
+            await self._backfill_rollups()
             print(f"CostLogger: SQLite verbunden ({self._sqlite_path})", file=sys.stderr)
         except Exception as e:
             print(f"CostLogger: SQLite Fehler, deaktiviert: {e}", file=sys.stderr)
             self._sqlite_path = None
+            self._conn = None
 
     async def disconnect(self):
+        """Hintergrund-Flush stoppen, Queue schreiben, Verbindungen schließen."""
+        task, self._flush_task = self._flush_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
         if self._pool:
             await self._pool.close()
             self._pool = None
@@ -125,21 +430,157 @@ class CostLogger:
         task_id: Optional[str] = None,
         status: str = "success",
         error_message: Optional[str] = None,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
     ):
-        args = (provider, model, input_tokens, output_tokens,
-                latency_ms, heinzel_id, session_id, task_id,
-                status, error_message)
+        """
+        Eintrag vormerken — kein DB-Roundtrip außer bei voller Queue.
+        cache_read/write_tokens: Prompt-Caching des Providers (Anthropic),
+        zusätzlich zu input_tokens abgerechnet.
+        """
+        if not self.enabled:
+            return
+        self._queue.append((_utcnow(), provider, model, input_tokens, output_tokens,
+                            latency_ms, heinzel_id, session_id, task_id,
+                            status, error_message, cache_read_tokens, cache_write_tokens))
+        self._stats["enqueued"] += 1
+        if len(self._queue) >= self._max_queue:
+            # Backpressure: dieser Request wartet bis die Queue geschrieben ist
+            self._stats["backpressure_flushes"] += 1
+            await self.flush()
+            return
+        self._schedule_flush()
+
+    async def flush(self):
+        """Alle anstehenden Einträge schreiben. Fehler: Einträge bleiben vorgemerkt."""
+        async with self._flush_lock:
+            if not self._queue or not self.enabled:
+                return
+            batch, self._queue = self._queue, []
+            start = time.perf_counter()
+            try:
+                await self._write_batch(batch)
+            except Exception as e:
+                self._stats["failed_batches"] += 1
+                self._queue[:0] = batch
+                overflow = len(self._queue) - self._max_queue
+                if overflow > 0:
+                    del self._queue[:overflow]
+                    self._stats["dropped"] += overflow
+                print(f"CostLogger: Log-Fehler (nicht kritisch, {len(batch)} "
+                      f"Einträge vorgemerkt): {e}", file=sys.stderr)
+                return
+            ms = (time.perf_counter() - start) * 1000
+            self._stats["batches"] += 1
+            self._stats["written"] += len(batch)
+            self._stats["flush_ms_last"] = round(ms, 3)
+            self._stats["flush_ms_max"] = round(max(self._stats["flush_ms_max"], ms), 3)
+            self._stats["flush_ms_total"] += ms
+
+    async def _write_batch(self, rows: list[tuple]):
+        """Rohzeilen + Rollup-Deltas in einer Transaktion."""
+        rollups = aggregate_rollups(
+            (r[0], r[1], r[2], r[6], r[3], r[4], r[5], r[9], r[11], r[12]) for r in rows)
+        if self._db_type == "postgresql" and self._pool:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.executemany(INSERT_SQL_PG, rows)
+                    await conn.executemany(
+                        _to_pg(_rollup_upsert_sql(self._db_type)), rollups)
+        elif self._conn is not None:
+            sqlite_rows = [(r[0].strftime(_TS_FORMAT),) + r[1:] for r in rows]
+            try:
+                await self._conn.executemany(INSERT_SQL, sqlite_rows)
+                await self._conn.executemany(_rollup_upsert_sql(self._db_type), rollups)
+                await self._conn.commit()
+            except Exception:
+                await self._conn.rollback()
+                raise
+
+    async def _backfill_rollups(self):
+        """
+        Einmalig nach Upgrade: Rollups aus vorhandenen costs-Zeilen aufbauen.
+        Läuft nur wenn costs Daten hat, costs_rollup aber leer ist.
+        """
         try:
+            if not await self._fetchval("SELECT 1 FROM costs LIMIT 1"):
+                return
+            if await self._fetchval("SELECT 1 FROM costs_rollup LIMIT 1"):
+                return
+            rows = await self._fetchall(
+                "SELECT ts, provider, model, heinzel_id, input_tokens, "
+                "output_tokens, latency_ms, status, cache_read_tokens, "
+                "cache_write_tokens FROM costs", [])
+            rollups = aggregate_rollups(tuple(r.values()) for r in rows)
+            sql = _rollup_upsert_sql(self._db_type)
             if self._db_type == "postgresql" and self._pool:
                 async with self._pool.acquire() as conn:
-                    await conn.execute(INSERT_SQL_PG, *args)
-            elif self._db_type == "sqlite" and self._sqlite_path:
-                import aiosqlite
-                async with aiosqlite.connect(self._sqlite_path) as db:
-                    await db.execute(INSERT_SQL, args)
-                    await db.commit()
+                    await conn.executemany(_to_pg(sql), rollups)
+            elif self._conn is not None:
+                await self._conn.executemany(sql, rollups)
+                await self._conn.commit()
+            print(f"CostLogger: Rollups aus {len(rows)} Einträgen aufgebaut", file=sys.stderr)
         except Exception as e:
-            print(f"CostLogger: Log-Fehler (nicht kritisch): {e}", file=sys.stderr)
+            print(f"CostLogger: Rollup-Backfill Fehler: {e}", file=sys.stderr)
+
+    async def _migrate_columns(self):
+        """Fehlende Spalten (MIGRATION_COLUMNS) in bestehenden Tabellen anlegen."""
+        for table, columns in MIGRATION_COLUMNS.items():
+            try:
+                if self._db_type == "postgresql":
+                    rows = await self._fetchall(
+                        "SELECT column_name AS name FROM information_schema.columns "
+                        "WHERE table_name = ?", [table])
+                else:
+                    rows = await self._fetchall(f"PRAGMA table_info({table})", [])
+                existing = {r["name"] for r in rows}
+                for column in columns:
+                    if column.split()[0] in existing:
+                        continue
+                    if self._db_type == "postgresql" and self._pool:
+                        async with self._pool.acquire() as conn:
+                            await conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+                    elif self._conn is not None:
+                        await self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+                        await self._conn.commit()
+                    print(f"CostLogger: Spalte {table}.{column.split()[0]} ergänzt",
+                          file=sys.stderr)
+            except Exception as e:
+                print(f"CostLogger: Migration {table} fehlgeschlagen: {e}", file=sys.stderr)
+
+    async def _fetchall(self, sql: str, params: list) -> list[dict]:
+        if self._db_type == "postgresql" and self._pool:
+            async with self._pool.acquire() as conn:
+                return [dict(r) for r in await conn.fetch(_to_pg(sql), *params)]
+        if self._conn is not None:
+            async with self._conn.execute(sql, params) as cur:
+                return [dict(r) for r in await cur.fetchall()]
+        return []
+
+    async def _fetchval(self, sql: str, params: Optional[list] = None):
+        rows = await self._fetchall(sql, params or [])
+        return next(iter(rows[0].values())) if rows else None
+
+    def _schedule_flush(self):
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if len(self._queue) >= self._batch_size:
+            self._wake.set()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """Schreibt bis die Queue leer ist — nach Intervall oder vollem Batch."""
+        while self._queue:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            failed = self._stats["failed_batches"]
+            await self.flush()
+            if self._stats["failed_batches"] > failed:
+                return  # DB hängt — nächster log_request() startet neu
 
     async def query(
         self,
@@ -164,20 +605,9 @@ class CostLogger:
         where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         sql = f"SELECT * FROM costs {where} ORDER BY ts DESC LIMIT ?"
         params.append(min(limit, 1000))
+        await self.flush()
         try:
-            if self._db_type == "postgresql" and self._pool:
-                pg_sql = sql
-                for i in range(len(params)):
-                    pg_sql = pg_sql.replace("?", f"${i+1}", 1)
-                async with self._pool.acquire() as conn:
-                    rows = await conn.fetch(pg_sql, *params)
-                    return [dict(r) for r in rows]
-            elif self._db_type == "sqlite" and self._sqlite_path:
-                import aiosqlite
-                async with aiosqlite.connect(self._sqlite_path) as db:
-                    db.row_factory = aiosqlite.Row
-                    async with db.execute(sql, params) as cur:
-                        return [dict(r) for r in await cur.fetchall()]
+            return await self._fetchall(sql, params)
         except Exception as e:
             print(f"CostLogger: Query-Fehler: {e}", file=sys.stderr)
         return []
@@ -189,39 +619,157 @@ class CostLogger:
         since:      Optional[str] = None,
         until:      Optional[str] = None,
     ) -> dict:
-        """Aggregierte Metriken: Tokens gesamt, Latenz-Avg, Fehleranzahl."""
+        """
+        Aggregierte Metriken: Tokens gesamt, Latenz-Avg/-Perzentile, Fehleranzahl.
+
+        Ohne session_id aus costs_rollup (Auflösung: Minute), mit session_id
+        aus den Rohdaten über den (session_id, ts)-Index.
+        """
+        await self.flush()
+        since_ts = _parse_ts(since) if since else None
+        until_ts = _parse_ts(until) if until else None
+        use_rollup = (not session_id
+                      and (since is None or since_ts is not None)
+                      and (until is None or until_ts is not None))
+        try:
+            if use_rollup:
+                return await self._summary_rollup(heinzel_id, since_ts, until_ts)
+            return await self._summary_raw(session_id, heinzel_id, since, until)
+        except Exception as e:
+            print(f"CostLogger: Summary-Fehler: {e}", file=sys.stderr)
+        return {}
+
+    async def _summary_rollup(self, heinzel_id, since_ts, until_ts) -> dict:
+        plan = rollup_plan(since_ts, until_ts)
+        totals = {"requests": 0, "input_tokens": 0, "output_tokens": 0,
+                  "latency_sum": 0, "latency_max": 0, "error_count": 0,
+                  "cache_read_tokens": 0, "cache_write_tokens": 0}
+        hist = [0] * len(HIST_COLUMNS)
+        for gran, lo, hi in plan:
+            conditions, params = ["granularity = ?"], [gran]
+            if lo is not None: conditions.append("bucket >= ?"); params.append(lo)
+            if hi is not None: conditions.append("bucket < ?");  params.append(hi)
+            if heinzel_id:     conditions.append("heinzel_id = ?"); params.append(heinzel_id)
+            sql = (
+                "SELECT SUM(requests) AS requests, SUM(input_tokens) AS input_tokens, "
+                "SUM(output_tokens) AS output_tokens, SUM(latency_sum) AS latency_sum, "
+                "MAX(latency_max) AS latency_max, SUM(error_count) AS error_count, "
+                "SUM(cache_read_tokens) AS cache_read_tokens, "
+                "SUM(cache_write_tokens) AS cache_write_tokens, "
+                + ", ".join(f"SUM({c}) AS {c}" for c in HIST_COLUMNS)
+                + f" FROM costs_rollup WHERE {' AND '.join(conditions)}"
+            )
+            rows = await self._fetchall(sql, params)
+            row = rows[0] if rows else {}
+            for key in totals:
+                val = int(row.get(key) or 0)
+                totals[key] = max(totals[key], val) if key == "latency_max" else totals[key] + val
+            for i, c in enumerate(HIST_COLUMNS):
+                hist[i] += int(row.get(c) or 0)
+        return self._summary_result(totals, hist, source="rollup")
+
+    async def _summary_raw(self, session_id, heinzel_id, since, until) -> dict:
         conditions, params = [], []
         if session_id: conditions.append("session_id = ?"); params.append(session_id)
         if heinzel_id: conditions.append("heinzel_id = ?"); params.append(heinzel_id)
         if since:      conditions.append("ts >= ?");        params.append(since)
         if until:      conditions.append("ts <= ?");        params.append(until)
         where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        hist_cols = []
+        for i, col in enumerate(HIST_COLUMNS):
+            cond = []
+            if i > 0:
+                cond.append(f"latency_ms > {LATENCY_BUCKETS_MS[i - 1]}")
+            if i < len(LATENCY_BUCKETS_MS):
+                cond.append(f"latency_ms <= {LATENCY_BUCKETS_MS[i]}")
+            hist_cols.append(f"SUM(CASE WHEN {' AND '.join(cond)} THEN 1 ELSE 0 END) AS {col}")
         sql = f"""
-            SELECT COUNT(*) as total_requests,
-                   SUM(input_tokens) as total_input_tokens,
-                   SUM(output_tokens) as total_output_tokens,
-                   AVG(latency_ms) as avg_latency_ms,
-                   SUM(CASE WHEN status='error' THEN 1 ELSE 0 END) as error_count
+            SELECT COUNT(*) as requests,
+                   SUM(input_tokens) as input_tokens,
+                   SUM(output_tokens) as output_tokens,
+                   SUM(latency_ms) as latency_sum,
+                   MAX(latency_ms) as latency_max,
+                   SUM(CASE WHEN status='error' THEN 1 ELSE 0 END) as error_count,
+                   SUM(cache_read_tokens) as cache_read_tokens,
+                   SUM(cache_write_tokens) as cache_write_tokens,
+                   {", ".join(hist_cols)}
             FROM costs {where}
         """
+        rows = await self._fetchall(sql, params)
+        row = rows[0] if rows else {}
+        totals = {k: int(row.get(k) or 0) for k in _SUMMARY_TOTALS}
+        hist = [int(row.get(c) or 0) for c in HIST_COLUMNS]
+        return self._summary_result(totals, hist, source="raw")
+
+    @staticmethod
+    def _summary_result(totals: dict, hist: list[int], source: str) -> dict:
+        n = totals["requests"]
+        pct = latency_percentiles(hist, totals["latency_max"])
+        c_read, c_write = totals["cache_read_tokens"], totals["cache_write_tokens"]
+        prompt = totals["input_tokens"] + c_read + c_write
+        return {
+            "total_requests":      n,
+            "total_input_tokens":  totals["input_tokens"],
+            "total_output_tokens": totals["output_tokens"],
+            "avg_latency_ms":      totals["latency_sum"] / n if n else None,
+            "p50_latency_ms":      pct[0.5],
+            "p95_latency_ms":      pct[0.95],
+            "p99_latency_ms":      pct[0.99],
+            "max_latency_ms":      totals["latency_max"] if n else None,
+            "error_count":         totals["error_count"],
+            "total_cache_read_tokens":  c_read,
+            "total_cache_write_tokens": c_write,
+            "cache_hit_rate":      round(c_read / prompt, 4) if prompt else None,
+            "source":              source,
+        }
+
+    async def timeseries(
+        self,
+        granularity: str = "hour",
+        heinzel_id:  Optional[str] = None,
+        provider:    Optional[str] = None,
+        model:       Optional[str] = None,
+        since:       Optional[str] = None,
+        until:       Optional[str] = None,
+        limit:       int = 500,
+    ) -> list[dict]:
+        """Zeitreihe aus costs_rollup: ein Eintrag pro Bucket, älteste zuerst."""
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"granularity muss eins von {ROLLUP_GRANULARITIES} sein")
+        await self.flush()
+        conditions, params = ["granularity = ?"], [granularity]
+        since_ts = _parse_ts(since) if since else None
+        until_ts = _parse_ts(until) if until else None
+        if since_ts: conditions.append("bucket >= ?"); params.append(
+            _bucket_start(since_ts, granularity).strftime(_TS_FORMAT))
+        if until_ts: conditions.append("bucket <= ?"); params.append(until_ts.strftime(_TS_FORMAT))
+        if heinzel_id: conditions.append("heinzel_id = ?"); params.append(heinzel_id)
+        if provider:   conditions.append("provider = ?");   params.append(provider)
+        if model:      conditions.append("model = ?");      params.append(model)
+        sql = (
+            "SELECT bucket, SUM(requests) AS requests, SUM(input_tokens) AS input_tokens, "
+            "SUM(output_tokens) AS output_tokens, SUM(latency_sum) AS latency_sum, "
+            "MAX(latency_max) AS latency_max, SUM(error_count) AS error_count, "
+            "SUM(cache_read_tokens) AS cache_read_tokens, "
+            "SUM(cache_write_tokens) AS cache_write_tokens, "
+            + ", ".join(f"SUM({c}) AS {c}" for c in HIST_COLUMNS)
+            + f" FROM costs_rollup WHERE {' AND '.join(conditions)}"
+            " GROUP BY bucket ORDER BY bucket DESC LIMIT ?"
+        )
+        params.append(min(limit, 5000))
         try:
-            if self._db_type == "postgresql" and self._pool:
-                pg_sql = sql
-                for i in range(len(params)):
-                    pg_sql = pg_sql.replace("?", f"${i+1}", 1)
-                async with self._pool.acquire() as conn:
-                    row = await conn.fetchrow(pg_sql, *params)
-                    return dict(row) if row else {}
-            elif self._db_type == "sqlite" and self._sqlite_path:
-                import aiosqlite
-                async with aiosqlite.connect(self._sqlite_path) as db:
-                    db.row_factory = aiosqlite.Row
-                    async with db.execute(sql, params) as cur:
-                        row = await cur.fetchone()
-                        return dict(row) if row else {}
+            rows = await self._fetchall(sql, params)
         except Exception as e:
-            print(f"CostLogger: Summary-Fehler: {e}", file=sys.stderr)
-        return {}
+            print(f"CostLogger: Timeseries-Fehler: {e}", file=sys.stderr)
+            return []
+        series = []
+        for row in reversed(rows):
+            totals = {k: int(row.get(k) or 0) for k in _SUMMARY_TOTALS}
+            hist = [int(row.get(c) or 0) for c in HIST_COLUMNS]
+            entry = self._summary_result(totals, hist, source="rollup")
+            entry.pop("source")
+            series.append({"bucket": row["bucket"], **entry})
+        return series
 
 
 # Singleton
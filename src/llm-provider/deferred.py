@@ -0,0 +1,431 @@
+"""
+H.E.I.N.Z.E.L. Provider — Deferred-Queue: nicht eilige Chats ueber die Batch-API
+
+Scheduler-Jobs, Compaction-Summaries oder Feedback-Analysen brauchen keine
+Antwort in Sekunden. Solche Requests kommen mit einer Latenz-Toleranz
+(max_delay_s) in die Queue; das Gateway sammelt sie pro Modell und reicht
+sie als Provider-Batch ein (Anthropic/OpenAI: ca. 50% guenstiger), sobald
+
+  - min_batch Requests fuer ein Modell warten, oder
+  - die Deadline des aeltesten Requests abzueglich batch_turnaround_s naht.
+
+Laufende Batches werden alle poll_interval_s abgefragt. Ergebnisse loesen
+den Future des Aufrufers (im Prozess) bzw. einen Webhook (POST mit dem
+Ticket als JSON) aus und koennen per GET /deferred/{id} abgeholt werden.
+Ist die Toleranz kuerzer als batch_turnaround_s, kann der Provider keine
+Batches oder scheitert ein Batch, laeuft der Request als normaler /chat.
+
+Konfigurierbar per provider.yaml:
+  deferred:
+    enabled: true
+    min_batch: 20
+    max_batch: 1000
+    batch_turnaround_s: 900      # erwartete Batch-Laufzeit
+    poll_interval_s: 30
+    batch_discount: 0.5          # Preisnachlass fuer die Einsparungs-Metrik
+    max_tickets: 10000           # erledigte Tickets im Speicher
+    webhook_allow: []            # erlaubte Webhook-Ziele (URL-Praefixe)
+
+webhook_url wird nur angenommen, wenn sie zu einem Eintrag in webhook_allow
+passt (gleiches Schema und Host:Port, Pfad beginnt mit dem Eintrags-Pfad).
+Ohne Allowlist lehnt submit() jeden Webhook ab — sonst koennte jeder
+API-Aufrufer das Gateway volle Completions an beliebige URLs posten lassen.
+
+Tickets leben nur im Speicher — nach einem Neustart sind offene Requests
+verloren (die Provider-Batches selbst laufen weiter).
+"""
+import asyncio
+import itertools
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from models import (
+    ChatRequest, ChatResponse, BatchCreateRequest, BatchRequestItem, BatchStatus,
+    BatchResultsResponse, BatchResultItem, DeferredTicket,
+)
+from prompt_cache import cache_usage
+
+
+# Defaults (ueberschreibbar via provider.yaml deferred-Sektion)
+DEFAULT_DEFERRED_CONFIG = {
+    "enabled": True,
+    "min_batch": 20,
+    "max_batch": 1000,
+    "batch_turnaround_s": 900,
+    "poll_interval_s": 30,
+    "batch_discount": 0.5,
+    "max_tickets": 10000,
+    "webhook_allow": [],
+}
+
+BATCH_STATUS = "batch"   # Status in der costs-Tabelle
+
+# Endzustaende der Provider (Anthropic: ended, OpenAI: completed/failed/...)
+_TERMINAL = {"ended", "completed", "failed", "expired", "cancelled", "canceled"}
+_FAILED = {"failed", "expired", "cancelled", "canceled"}
+
+
+def _get_deferred_config(provider_config: dict) -> dict:
+    """Liest Deferred-Config aus provider.yaml, faellt auf Defaults zurueck."""
+    yaml_cfg = provider_config.get("deferred") or {}
+    return {**DEFAULT_DEFERRED_CONFIG, **yaml_cfg}
+
+
+def _webhook_target(url: str) -> tuple[str, str, str]:
+    """(Schema, Host:Port, Pfad) einer URL — Vergleichsform fuer die Allowlist."""
+    parts = urlsplit(url.strip())
+    return parts.scheme.lower(), parts.netloc.lower(), parts.path or "/"
+
+
+class _Job:
+    """Ein Request in der Queue — Ticket plus interner Zustand."""
+
+    def __init__(self, ticket: DeferredTicket, request: ChatRequest,
+                 webhook_url: Optional[str], deadline: float):
+        self.ticket = ticket
+        self.request = request
+        self.webhook_url = webhook_url
+        self.deadline = deadline
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class _Submitted:
+    """Ein eingereichter Provider-Batch."""
+
+    def __init__(self, batch_id: str, model: str, jobs: list[_Job]):
+        self.batch_id = batch_id
+        self.model = model
+        self.jobs = {j.ticket.id: j for j in jobs}
+        self.submitted_at = time.monotonic()
+        self.next_poll = 0.0
+
+
+class DeferredQueue:
+    """
+    Sammelt Deferred-Requests pro Modell und reicht sie als Batch ein.
+    provider: BaseProvider (chat, _transform_request, _parse_batch_result,
+    _log_cost). backend: Objekt mit create_batch/get_batch/get_batch_results
+    — der Provider selbst oder FakeBatchBackend; None = immer synchron.
+    """
+
+    def __init__(self, provider, backend=None, webhook_client: Optional[httpx.AsyncClient] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        cfg = _get_deferred_config(provider.config)
+        self.provider = provider
+        self.backend = backend
+        self.enabled = bool(cfg["enabled"])
+        self.min_batch = max(1, int(cfg["min_batch"]))
+        self.max_batch = max(1, int(cfg["max_batch"]))
+        self.turnaround_s = float(cfg["batch_turnaround_s"])
+        self.poll_interval_s = float(cfg["poll_interval_s"])
+        self.discount = float(cfg["batch_discount"])
+        self.max_tickets = max(1, int(cfg["max_tickets"]))
+        self.webhook_allow = [_webhook_target(u) for u in cfg["webhook_allow"] or []]
+        self._clock = clock
+        self._webhook_client = webhook_client
+        self._queued: dict[str, list[_Job]] = {}
+        self._submitted: dict[str, _Submitted] = {}
+        self._tickets: "OrderedDict[str, _Job]" = OrderedDict()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._background: set[asyncio.Task] = set()
+        self._stats = {
+            "submitted": 0, "completed": 0, "failed": 0, "sync": 0,
+            "batches": 0, "batched_requests": 0, "batches_failed": 0,
+            "webhooks": 0, "webhook_errors": 0, "webhooks_rejected": 0,
+            "batch_input_tokens": 0, "batch_output_tokens": 0, "turnaround_s_total": 0.0,
+        }
+
+    # ─── API ───────────────────────────────────────────────────
+
+    async def submit(self, request: ChatRequest, max_delay_s: float,
+                     webhook_url: Optional[str] = None) -> DeferredTicket:
+        """Request einreihen. Das Ticket kommt sofort zurueck, das Ergebnis spaeter.
+
+        ValueError, wenn webhook_url nicht in deferred.webhook_allow steht.
+        """
+        if webhook_url is not None and not self.webhook_allowed(webhook_url):
+            self._stats["webhooks_rejected"] += 1
+            raise ValueError(f"webhook_url nicht erlaubt (deferred.webhook_allow): {webhook_url}")
+        model = request.model or self.provider.get_default_model()
+        now = self._clock()
+        ticket = DeferredTicket(id=f"dfr_{uuid.uuid4().hex[:16]}", status="queued",
+                                model=model, provider=self.provider.provider_name,
+                                max_delay_s=max_delay_s)
+        job = _Job(ticket, request.model_copy(update={"model": model}), webhook_url,
+                   now + max_delay_s)
+        self._remember(job)
+        self._stats["submitted"] += 1
+        if not self.enabled or self.backend is None or max_delay_s < self.turnaround_s:
+            ticket.status = "sync"
+            self._spawn(self._run_sync([job]))
+            return ticket
+        self._queued.setdefault(model, []).append(job)
+        self._ensure_loop()
+        if len(self._queued[model]) >= self.min_batch:
+            self._wake.set()
+        return ticket
+
+    def webhook_allowed(self, url: str) -> bool:
+        """Passt url zu einem Eintrag der Allowlist?"""
+        scheme, netloc, path = _webhook_target(url)
+        if scheme not in ("http", "https") or not netloc:
+            return False
+        return any(scheme == a_scheme and netloc == a_netloc and path.startswith(a_path)
+                   for a_scheme, a_netloc, a_path in self.webhook_allow)
+
+    def get(self, ticket_id: str) -> Optional[DeferredTicket]:
+        job = self._tickets.get(ticket_id)
+        return job.ticket if job else None
+
+    async def wait(self, ticket_id: str) -> DeferredTicket:
+        """Auf das Ergebnis warten (fuer Aufrufer im Gateway-Prozess)."""
+        job = self._tickets[ticket_id]
+        await asyncio.shield(job.future)
+        return job.ticket
+
+    @property
+    def stats(self) -> dict:
+        s = dict(self._stats)
+        turnaround = s.pop("turnaround_s_total")
+        batched = s["batch_input_tokens"] + s["batch_output_tokens"]
+        s["queued"] = sum(len(q) for q in self._queued.values())
+        s["batches_running"] = len(self._submitted)
+        s["avg_batch_size"] = round(s["batched_requests"] / s["batches"], 1) if s["batches"] else 0.0
+        s["avg_turnaround_s"] = round(turnaround / s["batches"], 1) if s["batches"] else 0.0
+        # Einsparung: Batch-Tokens zum Rabattsatz, eingesparte Einzel-Calls
+        s["tokens_saved_equivalent"] = int(batched * self.discount)
+        s["upstream_calls_saved"] = max(0, s["batched_requests"] - s["batches"])
+        s["backend"] = type(self.backend).__name__ if self.backend is not None else None
+        return s
+
+    async def close(self) -> None:
+        task, self._loop_task = self._loop_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    # ─── Hintergrund-Loop ──────────────────────────────────────
+
+    def _ensure_loop(self) -> None:
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        while self._queued or self._submitted:
+            self._wake.clear()
+            try:
+                await self._tick()
+            except Exception as e:
+                print(f"Deferred: Fehler im Queue-Loop: {e}", file=sys.stderr)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._sleep_time())
+            except asyncio.TimeoutError:
+                pass
+
+    def _sleep_time(self) -> float:
+        now = self._clock()
+        due = [min(j.deadline for j in q) - self.turnaround_s for q in self._queued.values() if q]
+        due += [b.next_poll for b in self._submitted.values()]
+        if not due:
+            return self.poll_interval_s
+        return max(0.0, min(min(due) - now, self.poll_interval_s))
+
+    async def _tick(self) -> None:
+        now = self._clock()
+        for model in list(self._queued):
+            queue = self._queued[model]
+            queue.sort(key=lambda j: j.deadline)
+            while queue and (len(queue) >= self.min_batch
+                             or queue[0].deadline - self.turnaround_s <= now):
+                jobs, self._queued[model] = queue[:self.max_batch], queue[self.max_batch:]
+                queue = self._queued[model]
+                await self._submit_batch(model, jobs)
+            if not queue:
+                del self._queued[model]
+        for sub in list(self._submitted.values()):
+            if sub.next_poll <= now:
+                await self._poll(sub)
+
+    async def _submit_batch(self, model: str, jobs: list[_Job]) -> None:
+        try:
+            items = []
+            for j in jobs:
+                request = await self.provider._extract_documents(j.request)
+                items.append(BatchRequestItem(custom_id=j.ticket.id,
+                                              params=self.provider._transform_request(request)))
+            status = await self.backend.create_batch(BatchCreateRequest(requests=items, model=model))
+        except Exception as e:
+            print(f"Deferred: Batch-Einreichung fehlgeschlagen ({len(jobs)} Requests, "
+                  f"Fallback /chat): {e}", file=sys.stderr)
+            self._stats["batches_failed"] += 1
+            self._spawn(self._run_sync(jobs))
+            return
+        sub = _Submitted(status.id, model, jobs)
+        sub.next_poll = self._clock() + self.poll_interval_s
+        self._submitted[status.id] = sub
+        self._stats["batches"] += 1
+        self._stats["batched_requests"] += len(jobs)
+        for j in jobs:
+            j.ticket.status = "submitted"
+            j.ticket.batch_id = status.id
+
+    async def _poll(self, sub: _Submitted) -> None:
+        sub.next_poll = self._clock() + self.poll_interval_s
+        try:
+            status = await self.backend.get_batch(sub.batch_id)
+        except Exception as e:
+            print(f"Deferred: Batch {sub.batch_id} nicht abfragbar: {e}", file=sys.stderr)
+            return
+        if status.status not in _TERMINAL:
+            return
+        del self._submitted[sub.batch_id]
+        self._stats["turnaround_s_total"] += time.monotonic() - sub.submitted_at
+        results: list[BatchResultItem] = []
+        if status.status not in _FAILED:
+            try:
+                results = (await self.backend.get_batch_results(sub.batch_id)).results
+            except Exception as e:
+                print(f"Deferred: Ergebnisse von {sub.batch_id} nicht lesbar: {e}", file=sys.stderr)
+        else:
+            self._stats["batches_failed"] += 1
+        for item in results:
+            job = sub.jobs.pop(item.custom_id, None)
+            if job is None:
+                continue
+            try:
+                response = self.provider._parse_batch_result(item)
+            except Exception as e:
+                self._fail(job, str(e))
+                continue
+            await self._log_batch_cost(job, response, sub)
+            self._complete(job, response)
+        if sub.jobs:
+            # Batch gescheitert oder Ergebnisse fehlen → einzeln nachholen
+            self._spawn(self._run_sync(list(sub.jobs.values())))
+
+    # ─── Abschluss ─────────────────────────────────────────────
+
+    async def _run_sync(self, jobs: list[_Job]) -> None:
+        for job in jobs:
+            self._stats["sync"] += 1
+            try:
+                response = await self.provider.chat(job.request)
+            except Exception as e:
+                self._fail(job, str(e))
+            else:
+                self._complete(job, response)
+
+    async def _log_batch_cost(self, job: _Job, response: ChatResponse, sub: _Submitted) -> None:
+        in_tok = int(response.usage.get("input_tokens", 0) or 0)
+        out_tok = int(response.usage.get("output_tokens", 0) or 0)
+        self._stats["batch_input_tokens"] += in_tok
+        self._stats["batch_output_tokens"] += out_tok
+        ms = int((time.monotonic() - sub.submitted_at) * 1000)
+        await self.provider._log_cost(response.model or job.ticket.model, in_tok, out_tok,
+                                      ms, job.request.context, BATCH_STATUS,
+                                      **cache_usage(response.usage))
+
+    def _complete(self, job: _Job, response: ChatResponse) -> None:
+        job.ticket.status = "completed"
+        job.ticket.result = response
+        self._stats["completed"] += 1
+        self._resolve(job)
+
+    def _fail(self, job: _Job, error: str) -> None:
+        job.ticket.status = "failed"
+        job.ticket.error = error
+        self._stats["failed"] += 1
+        self._resolve(job)
+
+    def _resolve(self, job: _Job) -> None:
+        if not job.future.done():
+            job.future.set_result(job.ticket)
+        if job.webhook_url:
+            self._spawn(self._post_webhook(job))
+
+    async def _post_webhook(self, job: _Job) -> None:
+        client = self._webhook_client
+        own = client is None
+        if own:
+            client = httpx.AsyncClient(timeout=10.0)
+        try:
+            resp = await client.post(job.webhook_url, json=job.ticket.model_dump())
+            resp.raise_for_status()
+            self._stats["webhooks"] += 1
+        except Exception as e:
+            self._stats["webhook_errors"] += 1
+            print(f"Deferred: Webhook {job.webhook_url} fehlgeschlagen: {e}", file=sys.stderr)
+        finally:
+            if own:
+                await client.aclose()
+
+    # ─── intern ────────────────────────────────────────────────
+
+    def _remember(self, job: _Job) -> None:
+        self._tickets[job.ticket.id] = job
+        # Nur erledigte Tickets verdraengen — offene werden noch gebraucht
+        excess = len(self._tickets) - self.max_tickets
+        if excess > 0:
+            for tid in [t for t, j in self._tickets.items() if j.future.done()][:excess]:
+                del self._tickets[tid]
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+
+
+class FakeBatchBackend:
+    """
+    Lokales Batch-Backend fuer Tests und Entwicklung ohne Provider-Batches:
+    ein Batch ist nach complete_after Abfragen fertig, jedes Item wird mit
+    respond(params) beantwortet (Ergebnis im Anthropic-Format).
+    """
+
+    def __init__(self, respond: Callable[[dict], dict], complete_after: int = 1,
+                 fail: bool = False):
+        self.respond = respond
+        self.complete_after = complete_after
+        self.fail = fail
+        self.batches: dict[str, dict] = {}
+        self._ids = itertools.count(1)
+
+    async def create_batch(self, request: BatchCreateRequest) -> BatchStatus:
+        batch_id = f"fake_batch_{next(self._ids)}"
+        self.batches[batch_id] = {"requests": request.requests, "polls": 0}
+        return self._status(batch_id)
+
+    async def get_batch(self, batch_id: str) -> BatchStatus:
+        self.batches[batch_id]["polls"] += 1
+        return self._status(batch_id)
+
+    async def get_batch_results(self, batch_id: str) -> BatchResultsResponse:
+        results = []
+        for item in self.batches[batch_id]["requests"]:
+            try:
+                message = self.respond(item.params)
+                results.append(BatchResultItem(custom_id=item.custom_id,
+                                               result={"type": "succeeded", "message": message}))
+            except Exception as e:
+                results.append(BatchResultItem(custom_id=item.custom_id,
+                                               error={"message": str(e)}))
+        return BatchResultsResponse(batch_id=batch_id, results=results, provider="fake")
+
+    def _status(self, batch_id: str) -> BatchStatus:
+        b = self.batches[batch_id]
+        done = b["polls"] >= self.complete_after
+        status = ("failed" if self.fail else "ended") if done else "in_progress"
+        return BatchStatus(id=batch_id, status=status, total_requests=len(b["requests"]),
+                           provider="fake")
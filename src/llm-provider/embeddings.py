@@ -0,0 +1,358 @@
+"""
+H.E.I.N.Z.E.L. Provider — Embeddings: Micro-Batching und Content-Hash-Cache
+
+Add-ons (Skills, Memory-Fakten, Such-Snippets) betten viele kurze Texte
+einzeln ein. Zwei Stufen sparen Round-Trips:
+
+  cache     — SHA-256 ueber (Provider, Modell, Dimensionen, Text) → Vektor.
+              Memory-LRU vor SQLite ($LOG_DIR/embedding_cache.db), Vektoren
+              als float64-Blob. Ein Text geht nie zweimal zum Provider.
+  batching  — Cache-Fehlschlaege gleicher (Modell, Dimensionen), die
+              innerhalb von window_ms eintreffen, werden zu einem Upstream-
+              Call zusammengefasst (bis max_batch Texte, doppelte Texte nur
+              einmal) und danach pro Aufrufer wieder aufgeteilt.
+
+Konfigurierbar per provider.yaml:
+  embeddings:
+    batching: true
+    window_ms: 5
+    max_batch: 2048          # hoechstens das Provider-Limit (OpenAI 2048, Google 100)
+    cache: true
+    cache_path: null         # Default: $LOG_DIR/embedding_cache.db
+    cache_max_entries: 100000
+    memory_max_entries: 10000
+
+Die Blobs sind float64 in Maschinen-Byte-Order (array("d")) — verlustfrei
+wie Python-floats, damit jede Stufe (Provider, Memory, SQLite) exakt
+denselben Vektor liefert. Lesbar auch mit numpy.frombuffer(blob,
+dtype=numpy.float64).
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+
+# Defaults (ueberschreibbar via provider.yaml embeddings-Sektion)
+DEFAULT_EMBEDDING_CONFIG = {
+    "batching": True,
+    "window_ms": 5,
+    "max_batch": 2048,
+    "cache": True,
+    "cache_path": None,
+    "cache_max_entries": 100_000,
+    "memory_max_entries": 10_000,
+}
+
+CREATE_EMBEDDING_SQL = """
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key         TEXT PRIMARY KEY,
+    vector      BLOB NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+
+_PRUNE_EVERY = 1000   # SQLite-LRU nach so vielen geschriebenen Vektoren kuerzen
+
+# (model, texts, dimensions) → (Vektoren in Reihenfolge der Texte, Prompt-Tokens)
+EmbedFn = Callable[[str, list[str], Optional[int]], Awaitable[tuple[list[list[float]], int]]]
+
+
+def _get_embedding_config(provider_config: dict) -> dict:
+    """Liest Embedding-Config aus provider.yaml, faellt auf Defaults zurueck."""
+    yaml_cfg = provider_config.get("embeddings") or {}
+    return {**DEFAULT_EMBEDDING_CONFIG, **yaml_cfg}
+
+
+def embedding_key(provider: str, model: str, dimensions: Optional[int], text: str) -> str:
+    raw = f"{provider}\x00{model}\x00{dimensions or ''}\x00{text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _to_blob(vector: list[float]) -> bytes:
+    return array("d", vector).tobytes()
+
+
+def _from_blob(blob: bytes) -> list[float]:
+    values = array("d")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """Memory-LRU vor optionaler SQLite-Stufe. Fehler der SQLite-Stufe sind nie fatal."""
+
+    def __init__(self, cfg: dict, data_dir: Optional[str] = None):
+        self.enabled = bool(cfg["cache"])
+        self.max_entries = max(1, int(cfg["cache_max_entries"]))
+        self.memory_max_entries = max(1, int(cfg["memory_max_entries"]))
+        self._path = None
+        if self.enabled:
+            self._path = cfg["cache_path"] or os.path.join(
+                data_dir or os.environ.get("LOG_DIR", "/data"), "embedding_cache.db")
+        self._memory: "OrderedDict[str, list[float]]" = OrderedDict()
+        self._conn = None
+        self._open_lock = asyncio.Lock()
+        self._writes = 0
+        self.stats = {"hits_memory": 0, "hits_sqlite": 0, "misses": 0,
+                      "stores": 0, "sqlite_errors": 0}
+
+    async def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        """Gefundene Vektoren pro Key (fehlende Keys fehlen im Ergebnis)."""
+        if not self.enabled:
+            return {}
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                found[key] = vector
+                self.stats["hits_memory"] += 1
+            else:
+                missing.append(key)
+        if missing:
+            from_db = await self._sqlite_get(missing)
+            self.stats["hits_sqlite"] += len(from_db)
+            self.stats["misses"] += len(missing) - len(from_db)
+            for key, vector in from_db.items():
+                self._remember(key, vector)
+            found.update(from_db)
+        return found
+
+    async def put_many(self, items: dict[str, list[float]]) -> None:
+        if not self.enabled or not items:
+            return
+        for key, vector in items.items():
+            self._remember(key, vector)
+        self.stats["stores"] += len(items)
+        conn = await self._connection()
+        if conn is None:
+            return
+        now = time.time()
+        try:
+            await conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, vector, last_access) VALUES (?, ?, ?)",
+                [(k, _to_blob(v), now) for k, v in items.items()])
+            before, self._writes = self._writes, self._writes + len(items)
+            if before // _PRUNE_EVERY != self._writes // _PRUNE_EVERY:
+                await conn.execute(
+                    "DELETE FROM embedding_cache WHERE key IN (SELECT key FROM embedding_cache "
+                    "ORDER BY last_access DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            await conn.commit()
+        except Exception as e:
+            self._sqlite_failed(e)
+
+    async def clear(self) -> None:
+        self._memory.clear()
+        conn = await self._connection()
+        if conn is not None:
+            try:
+                await conn.execute("DELETE FROM embedding_cache")
+                await conn.commit()
+            except Exception as e:
+                self._sqlite_failed(e)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            try:
+                await conn.close()
+            except Exception as e:
+                print(f"EmbeddingCache: Close fehlgeschlagen: {e}", file=sys.stderr)
+
+    # ─── intern ────────────────────────────────────────────────
+
+    def _remember(self, key: str, vector: list[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+
+    async def _connection(self):
+        if self._path is None:
+            return None
+        if self._conn is not None:
+            return self._conn
+        async with self._open_lock:
+            if self._conn is None and self._path is not None:
+                try:
+                    import aiosqlite
+                    os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+                    conn = await aiosqlite.connect(self._path)
+                    await conn.execute("PRAGMA journal_mode=WAL")
+                    await conn.execute("PRAGMA synchronous=NORMAL")
+                    await conn.execute(CREATE_EMBEDDING_SQL)
+                    await conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_access "
+                                       "ON embedding_cache (last_access)")
+                    await conn.commit()
+                    self._conn = conn
+                except Exception as e:
+                    print(f"EmbeddingCache: SQLite Fehler, nur Memory-Stufe: {e}",
+                          file=sys.stderr)
+                    self._path = None
+        return self._conn
+
+    async def _sqlite_get(self, keys: list[str]) -> dict[str, list[float]]:
+        conn = await self._connection()
+        if conn is None:
+            return {}
+        found = {}
+        try:
+            for i in range(0, len(keys), 500):   # SQLite-Parameterlimit
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" for _ in chunk)
+                async with conn.execute(
+                        f"SELECT key, vector FROM embedding_cache WHERE key IN ({marks})",
+                        chunk) as cur:
+                    for key, blob in await cur.fetchall():
+                        found[key] = _from_blob(blob)
+            if found:
+                now = time.time()
+                await conn.executemany("UPDATE embedding_cache SET last_access = ? WHERE key = ?",
+                                       [(now, k) for k in found])
+                await conn.commit()
+        except Exception as e:
+            self._sqlite_failed(e)
+        return found
+
+    def _sqlite_failed(self, e: Exception) -> None:
+        self.stats["sqlite_errors"] += 1
+        print(f"EmbeddingCache: SQLite-Fehler (nicht kritisch): {e}", file=sys.stderr)
+
+
+class _Pending:
+    """Gesammelte Texte einer (Modell, Dimensionen)-Gruppe bis zum Flush."""
+
+    def __init__(self):
+        self.texts: dict[str, None] = {}              # geordnet, ohne Duplikate
+        self.waiters: list[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class EmbeddingBatcher:
+    """
+    Fasst gleichzeitige Embedding-Anfragen zu Upstream-Calls zusammen und
+    cacht die Vektoren. embed_fn ist der eigentliche Provider-Call.
+    """
+
+    def __init__(self, provider_name: str, provider_config: dict, embed_fn: EmbedFn,
+                 data_dir: Optional[str] = None, max_batch: Optional[int] = None):
+        cfg = _get_embedding_config(provider_config)
+        self.provider_name = provider_name
+        self.batching = bool(cfg["batching"])
+        self.window_s = max(0.0, float(cfg["window_ms"])) / 1000
+        # max_batch: Limit des Providers, die Config kann nur verkleinern
+        self.max_batch = max(1, min(int(cfg["max_batch"]), max_batch or int(cfg["max_batch"])))
+        self.cache = EmbeddingCache(cfg, data_dir)
+        self._embed_fn = embed_fn
+        self._pending: dict[tuple, _Pending] = {}
+        self._batches: set[asyncio.Task] = set()   # laufende _run_batch-Tasks
+        self._stats = {"requests": 0, "texts": 0, "upstream_calls": 0,
+                       "upstream_texts": 0, "deduplicated": 0, "batch_max": 0}
+
+    @property
+    def stats(self) -> dict:
+        s = dict(self._stats)
+        s["cache"] = {**self.cache.stats, "enabled": self.cache.enabled,
+                      "entries_memory": len(self.cache._memory)}
+        s["pending"] = sum(len(p.texts) for p in self._pending.values())
+        return s
+
+    async def embed(self, model: str, texts: list[str],
+                    dimensions: Optional[int] = None) -> tuple[list[list[float]], dict]:
+        """Vektoren in Reihenfolge von texts plus usage (nur Upstream-Anteil)."""
+        self._stats["requests"] += 1
+        self._stats["texts"] += len(texts)
+        keys = [embedding_key(self.provider_name, model, dimensions, t) for t in texts]
+        found = await self.cache.get_many(keys)
+        cached = sum(1 for k in keys if k in found)
+        missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in found))
+        tokens = 0
+        if missing:
+            vectors, tokens = await self._fetch(model, dimensions, missing)
+            fresh = {embedding_key(self.provider_name, model, dimensions, t): v
+                     for t, v in zip(missing, vectors)}
+            await self.cache.put_many(fresh)
+            found.update(fresh)
+        usage = {"prompt_tokens": tokens, "total_tokens": tokens, "cached_inputs": cached}
+        return [found[k] for k in keys], usage
+
+    async def close(self) -> None:
+        # Offene Fenster sofort abschicken, dann auf alle Batches warten —
+        # sonst haengen Aufrufer oder der Cache schliesst unter ihnen.
+        for group in list(self._pending):
+            self._pending[group].timer.cancel()
+            self._flush(group)
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        await self.cache.close()
+
+    # ─── intern ────────────────────────────────────────────────
+
+    async def _fetch(self, model: str, dimensions: Optional[int],
+                     texts: list[str]) -> tuple[list[list[float]], int]:
+        """Cache-Fehlschlaege ueber den Batcher (oder direkt) holen."""
+        if not self.batching:
+            return await self._call(model, dimensions, texts)
+        group = (model, dimensions)
+        pending = self._pending.get(group)
+        if pending is None:
+            pending = self._pending[group] = _Pending()
+            loop = asyncio.get_running_loop()
+            pending.timer = loop.call_later(self.window_s, self._flush, group)
+        for t in texts:
+            if t in pending.texts:
+                self._stats["deduplicated"] += 1
+            pending.texts[t] = None
+        fut = asyncio.get_running_loop().create_future()
+        pending.waiters.append(fut)
+        if len(pending.texts) >= self.max_batch:
+            pending.timer.cancel()
+            self._flush(group)
+        by_text, tokens_per_char = await asyncio.shield(fut)
+        vectors = [by_text[t] for t in texts]
+        return vectors, round(tokens_per_char * sum(len(t) for t in texts))
+
+    def _flush(self, group: tuple) -> None:
+        pending = self._pending.pop(group, None)
+        if pending is not None:
+            task = asyncio.ensure_future(self._run_batch(group, pending))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, group: tuple, pending: _Pending) -> None:
+        model, dimensions = group
+        texts = list(pending.texts)
+        try:
+            chunks = [texts[i:i + self.max_batch] for i in range(0, len(texts), self.max_batch)]
+            results = await asyncio.gather(*(self._call(model, dimensions, c) for c in chunks))
+            by_text = {}
+            tokens = 0
+            for chunk, (vectors, chunk_tokens) in zip(chunks, results):
+                by_text.update(zip(chunk, vectors))
+                tokens += chunk_tokens
+            # Upstream-Tokens nach Textlaenge auf die Aufrufer verteilen
+            chars = sum(len(t) for t in texts) or 1
+            outcome = (by_text, tokens / chars)
+            for fut in pending.waiters:
+                if not fut.done():
+                    fut.set_result(outcome)
+        except Exception as e:
+            for fut in pending.waiters:
+                if not fut.done():
+                    fut.set_exception(e)
+
+    async def _call(self, model: str, dimensions: Optional[int],
+                    texts: list[str]) -> tuple[list[list[float]], int]:
+        vectors, tokens = await self._embed_fn(model, texts, dimensions)
+        if len(vectors) != len(texts):
+            raise ValueError(f"Embedding-Antwort mit {len(vectors)} statt {len(texts)} Vektoren")
+        self._stats["upstream_calls"] += 1
+        self._stats["upstream_texts"] += len(texts)
+        self._stats["batch_max"] = max(self._stats["batch_max"], len(texts))
+        return vectors, tokens
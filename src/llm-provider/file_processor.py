@@ -10,13 +10,26 @@ Unterstuetzte Strategien:
   text      → Inhalt als TextBlock (JSON, XML, CSV, Code, ...)
   extract   → Text-Extraktion (PDF, DOCX, XLSX, PPTX)
   error     → klare Fehlermeldung als TextBlock (Video, Audio, ...)
+
+Extraktionen werden nach SHA-256 der Dateibytes gecacht (Seiten- und
+Byte-Zahl inklusive) — ein Dokument, das in jedem Gesprächs-Turn erneut
+mitgeschickt wird, wird nur einmal geparst. Im Gateway läuft die
+Extraktion über DocumentExtractor in einem begrenzten Prozess-Pool.
 """
 from __future__ import annotations
 
+import asyncio
 import base64
+import hashlib
 import io
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass, field
-from typing import Literal
+from typing import Literal, Optional
 
 from models import TextBlock, ImageBlock, DocumentBlock, ContentBlock
 
@@ -148,86 +161,387 @@ def process_file(
 
 
 # ─── Extraktoren ──────────────────────────────────────────────────────────────
+#
+# Die *_pages-Funktionen laufen im Worker-Prozess (siehe DocumentExtractor)
+# oder synchron über _extract_cached. Sie liefern Abschnitte — PDF-Seiten,
+# Folien, Tabellenblätter, DOCX-Absätze —, damit große Dokumente seitenweise
+# gekürzt werden können.
+
+def _pdf_pages(data: bytes) -> list[str]:
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(data))
+    pages = []
+    for i, page in enumerate(reader.pages, 1):
+        text = page.extract_text() or ""
+        if text.strip():
+            pages.append(f"--- Seite {i} ---\n{text.strip()}")
+    return pages
+
+
+def _docx_pages(data: bytes) -> list[str]:
+    from docx import Document
+    doc = Document(io.BytesIO(data))
+    return [p.text for p in doc.paragraphs if p.text.strip()]
+
+
+def _xlsx_pages(data: bytes) -> list[str]:
+    import openpyxl
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    sheets = []
+    for sheet_name in wb.sheetnames:
+        ws = wb[sheet_name]
+        rows = []
+        for row in ws.iter_rows(values_only=True):
+            row_vals = [str(c) if c is not None else "" for c in row]
+            if any(v.strip() for v in row_vals):
+                rows.append("\t".join(row_vals))
+        if rows:
+            sheets.append(f"=== Tabelle: {sheet_name} ===\n" + "\n".join(rows))
+    return sheets
+
+
+def _pptx_pages(data: bytes) -> list[str]:
+    from pptx import Presentation
+    prs = Presentation(io.BytesIO(data))
+    slides = []
+    for i, slide in enumerate(prs.slides, 1):
+        texts = []
+        for shape in slide.shapes:
+            if hasattr(shape, "text") and shape.text.strip():
+                texts.append(shape.text.strip())
+        if texts:
+            slides.append(f"--- Folie {i} ---\n" + "\n".join(texts))
+    return slides
+
+
+# kind → (Extraktor, Kopf-Label, Trenner, Text bei leerem Ergebnis, Paketname)
+_EXTRACTORS = {
+    "pdf":  (_pdf_pages, "PDF-Inhalt", "\n\n", None, "pypdf"),
+    "docx": (_docx_pages, "Word-Dokument", "\n", "", "python-docx"),
+    "xlsx": (_xlsx_pages, "Excel", "\n\n", "(leer)", "openpyxl"),
+    "pptx": (_pptx_pages, "PowerPoint", "\n\n", "(keine Texte gefunden)", "python-pptx"),
+}
 
-def _extract_pdf(data: bytes, filename: str) -> TextBlock:
-    """PDF → Text via pypdf."""
+
+@dataclass
+class Extraction:
+    """Ergebnis einer Extraktion — so auch im Cache abgelegt."""
+    kind: str
+    pages: list[str] = field(default_factory=list)
+    byte_count: int = 0                  # Größe der Originaldatei
+    error: Optional[str] = None          # Meldung ohne Dateinamen
+    timed_out: bool = False              # bewusster Abbruch nach timeout_s
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def text_bytes(self) -> int:
+        return sum(len(p.encode("utf-8")) for p in self.pages)
+
+
+def extract_pages(kind: str, data: bytes) -> Extraction:
+    """Extraktion ohne Exceptions — läuft im Worker-Prozess, muss picklebar bleiben."""
+    fn, _, _, _, package = _EXTRACTORS[kind]
     try:
-        from pypdf import PdfReader
-        reader = PdfReader(io.BytesIO(data))
-        pages = []
-        for i, page in enumerate(reader.pages, 1):
-            text = page.extract_text() or ""
-            if text.strip():
-                pages.append(f"--- Seite {i} ---\n{text.strip()}")
-        if not pages:
-            return TextBlock(
-                text=f"[{filename}] PDF konnte nicht als Text extrahiert werden "
-                     f"(möglicherweise rein bildbasiert). Bitte einen Provider mit "
-                     f"nativem PDF-Support verwenden (Anthropic, Google)."
-            )
-        return TextBlock(text=f"[{filename} — PDF-Inhalt]\n\n" + "\n\n".join(pages))
+        return Extraction(kind=kind, pages=fn(data), byte_count=len(data))
     except ImportError:
-        return TextBlock(text=f"[{filename}] pypdf nicht installiert — PDF-Extraktion nicht verfügbar.")
+        msg = (f"{package} nicht installiert — PDF-Extraktion nicht verfügbar."
+               if kind == "pdf" else f"{package} nicht installiert.")
+        return Extraction(kind=kind, byte_count=len(data), error=msg)
     except Exception as e:
-        return TextBlock(text=f"[{filename}] PDF-Extraktion fehlgeschlagen: {e}")
+        return Extraction(kind=kind, byte_count=len(data),
+                          error=f"{kind.upper()}-Extraktion fehlgeschlagen: {e}")
+
+
+def render_extraction(ex: Extraction, filename: str,
+                      max_pages: int = 0, max_chars: int = 0) -> TextBlock:
+    """
+    Extraction → TextBlock. max_pages/max_chars (0 = unbegrenzt) kürzen
+    seitenweise; der Rest wird mit einem Hinweis ausgelassen.
+    """
+    if ex.error:
+        return TextBlock(text=f"[{filename}] {ex.error}")
+    _, label, sep, empty, _ = _EXTRACTORS[ex.kind]
+    if not ex.pages and empty is None:
+        return TextBlock(
+            text=f"[{filename}] PDF konnte nicht als Text extrahiert werden "
+                 f"(möglicherweise rein bildbasiert). Bitte einen Provider mit "
+                 f"nativem PDF-Support verwenden (Anthropic, Google)."
+        )
+    kept, size = [], 0
+    for page in ex.pages:
+        if max_pages and len(kept) >= max_pages:
+            break
+        if max_chars and kept and size + len(page) > max_chars:
+            break
+        kept.append(page)
+        size += len(page) + len(sep)
+    text = sep.join(kept) if kept else empty
+    if len(kept) < ex.page_count:
+        text += (f"\n\n[... {ex.page_count - len(kept)} von {ex.page_count} Abschnitten "
+                 f"gekürzt]")
+    return TextBlock(text=f"[{filename} — {label}]\n\n{text}")
+
+
+def _extract_cached(kind: str, data: bytes) -> Extraction:
+    """Synchrone Extraktion mit Content-Hash-Cache (für process_file)."""
+    digest = hashlib.sha256(data).hexdigest()
+    ex = extraction_cache.get(digest)
+    if ex is None:
+        ex = extract_pages(kind, data)
+        extraction_cache.put(digest, ex)
+    return ex
+
+
+def _extract_pdf(data: bytes, filename: str) -> TextBlock:
+    """PDF → Text via pypdf."""
+    return render_extraction(_extract_cached("pdf", data), filename)
 
 
 def _extract_docx(data: bytes, filename: str) -> TextBlock:
     """DOCX → Text via python-docx."""
-    try:
-        from docx import Document
-        doc = Document(io.BytesIO(data))
-        paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-        text = "\n".join(paragraphs)
-        return TextBlock(text=f"[{filename} — Word-Dokument]\n\n{text}")
-    except ImportError:
-        return TextBlock(text=f"[{filename}] python-docx nicht installiert.")
-    except Exception as e:
-        return TextBlock(text=f"[{filename}] DOCX-Extraktion fehlgeschlagen: {e}")
+    return render_extraction(_extract_cached("docx", data), filename)
 
 
 def _extract_xlsx(data: bytes, filename: str) -> TextBlock:
     """XLSX → CSV-ähnlicher Text via openpyxl."""
-    try:
-        import openpyxl
-        wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
-        sheets = []
-        for sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            rows = []
-            for row in ws.iter_rows(values_only=True):
-                row_vals = [str(c) if c is not None else "" for c in row]
-                if any(v.strip() for v in row_vals):
-                    rows.append("\t".join(row_vals))
-            if rows:
-                sheets.append(f"=== Tabelle: {sheet_name} ===\n" + "\n".join(rows))
-        text = "\n\n".join(sheets) if sheets else "(leer)"
-        return TextBlock(text=f"[{filename} — Excel]\n\n{text}")
-    except ImportError:
-        return TextBlock(text=f"[{filename}] openpyxl nicht installiert.")
-    except Exception as e:
-        return TextBlock(text=f"[{filename}] XLSX-Extraktion fehlgeschlagen: {e}")
+    return render_extraction(_extract_cached("xlsx", data), filename)
 
 
 def _extract_pptx(data: bytes, filename: str) -> TextBlock:
     """PPTX → Text pro Folie via python-pptx."""
-    try:
-        from pptx import Presentation
-        prs = Presentation(io.BytesIO(data))
-        slides = []
-        for i, slide in enumerate(prs.slides, 1):
-            texts = []
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text.strip():
-                    texts.append(shape.text.strip())
-            if texts:
-                slides.append(f"--- Folie {i} ---\n" + "\n".join(texts))
-        text = "\n\n".join(slides) if slides else "(keine Texte gefunden)"
-        return TextBlock(text=f"[{filename} — PowerPoint]\n\n{text}")
-    except ImportError:
-        return TextBlock(text=f"[{filename}] python-pptx nicht installiert.")
-    except Exception as e:
-        return TextBlock(text=f"[{filename}] PPTX-Extraktion fehlgeschlagen: {e}")
+    return render_extraction(_extract_cached("pptx", data), filename)
+
+
+# ─── Cache ────────────────────────────────────────────────────────────────────
+
+class ExtractionCache:
+    """LRU über SHA-256 der Dateibytes, begrenzt durch Einträge und Textgröße."""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Extraction]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()   # auch aus to_thread/Frontend genutzt
+
+    def get(self, digest: str) -> Optional[Extraction]:
+        with self._lock:
+            ex = self._entries.get(digest)
+            if ex is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return ex
+
+    def put(self, digest: str, ex: Extraction) -> None:
+        size = ex.text_bytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(digest, None)
+            if old is not None:
+                self._bytes -= old.text_bytes
+            self._entries[digest] = ex
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                _, dropped = self._entries.popitem(last=False)
+                self._bytes -= dropped.text_bytes
+
+    def resize(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        with self._lock:
+            while self._entries and (len(self._entries) > max_entries
+                                     or self._bytes > max_bytes):
+                _, dropped = self._entries.popitem(last=False)
+                self._bytes -= dropped.text_bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "text_bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+extraction_cache = ExtractionCache()
+
+
+# ─── Prozess-Pool ─────────────────────────────────────────────────────────────
+
+# Defaults (überschreibbar via provider.yaml file_extraction-Sektion)
+DEFAULT_EXTRACTION_CONFIG = {
+    "workers": 2,              # 0 = Thread statt Prozess-Pool
+    "timeout_s": 60.0,         # pro Datei
+    "max_inflight_mb": 64,     # gleichzeitig in Arbeit (größere Dateien laufen allein)
+    "max_queued_mb": 256,      # darüber wird sofort abgelehnt
+    "cache_max_entries": 256,
+    "cache_max_mb": 256,
+    "max_pages": 0,            # 0 = unbegrenzt
+    "max_chars": 0,
+}
+
+_HASH_IN_THREAD_BYTES = 1024 * 1024
+_QUEUE_FULL = "Warteschlange der Dokument-Extraktion voll — später erneut senden."
+
+
+def _get_extraction_config(provider_config: dict) -> dict:
+    """Liest Extraktions-Config aus provider.yaml, fällt auf Defaults zurück."""
+    yaml_cfg = provider_config.get("file_extraction") or {}
+    return {**DEFAULT_EXTRACTION_CONFIG, **yaml_cfg}
+
+
+class DocumentExtractor:
+    """
+    Async-Extraktion in einem begrenzten Prozess-Pool — der Event-Loop des
+    Gateways bleibt frei, während ein 200-Seiten-PDF geparst wird.
+
+    Warteschlange nach Größe: solange max_inflight_mb belegt ist, warten
+    weitere Dateien (eine einzelne größere Datei läuft allein); übersteigt
+    die wartende Menge max_queued_mb, wird sofort mit Fehlertext geantwortet.
+    Überschreitet eine Datei timeout_s, wird der Pool neu gestartet — der
+    Worker lässt sich nicht einzeln abbrechen. Gleichzeitige Anfragen für
+    dieselbe Datei teilen sich eine Extraktion.
+    """
+
+    def __init__(self, provider_config: Optional[dict] = None,
+                 cache: Optional[ExtractionCache] = None):
+        cfg = _get_extraction_config(provider_config or {})
+        self.workers = max(0, int(cfg["workers"]))
+        self.timeout_s = float(cfg["timeout_s"])
+        self.max_inflight = int(float(cfg["max_inflight_mb"]) * 1024 * 1024)
+        self.max_queued = int(float(cfg["max_queued_mb"]) * 1024 * 1024)
+        self.max_pages = int(cfg["max_pages"])
+        self.max_chars = int(cfg["max_chars"])
+        self.cache = cache or extraction_cache
+        self.cache.resize(int(cfg["cache_max_entries"]),
+                          int(float(cfg["cache_max_mb"]) * 1024 * 1024))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight = 0
+        self._queued = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._pending: dict[str, asyncio.Future] = {}
+        self._stats = {"extracted": 0, "timeouts": 0, "rejected": 0,
+                       "pool_restarts": 0, "shared": 0, "extract_ms_max": 0.0}
+
+    @property
+    def stats(self) -> dict:
+        return {**self._stats, "inflight_bytes": self._inflight,
+                "queued_bytes": self._queued, "cache": self.cache.stats()}
+
+    async def extract(self, data: bytes, kind: str) -> Extraction:
+        """Extraction für die Datei — aus dem Cache oder frisch aus dem Pool."""
+        if len(data) > _HASH_IN_THREAD_BYTES:
+            digest = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+        else:
+            digest = hashlib.sha256(data).hexdigest()
+        ex = self.cache.get(digest)
+        if ex is not None:
+            return ex
+        pending = self._pending.get(digest)
+        if pending is not None:
+            self._stats["shared"] += 1
+            return await asyncio.shield(pending)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[digest] = fut
+        try:
+            ex = await self._extract_queued(data, kind)
+            # Nur Erfolge und Timeouts cachen — ein Timeout-Dokument killte sonst
+            # jeden Turn den Pool neu. Volle Queue, Pool-Neustart durch einen
+            # fremden Timeout usw. sind vorübergehend und dürfen nicht kleben.
+            if not ex.error or ex.timed_out:
+                self.cache.put(digest, ex)
+            fut.set_result(ex)
+            return ex
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()   # Wartende bekommen sie über shield; sonst nicht melden
+            raise
+        finally:
+            del self._pending[digest]
+
+    async def text_block(self, data: bytes, filename: str, kind: str = "pdf") -> TextBlock:
+        """Wie _extract_pdf & Co., aber nicht blockierend und gekürzt nach Config."""
+        ex = await self.extract(data, kind)
+        return render_extraction(ex, filename, self.max_pages, self.max_chars)
+
+    async def close(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            await asyncio.to_thread(pool.shutdown, True, cancel_futures=True)
+
+    # ─── intern ────────────────────────────────────────────────
+
+    async def _extract_queued(self, data: bytes, kind: str) -> Extraction:
+        size = len(data)
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        if self._queued + size > self.max_queued and self._inflight > 0:
+            self._stats["rejected"] += 1
+            return Extraction(kind=kind, byte_count=size, error=_QUEUE_FULL)
+        self._queued += size
+        try:
+            async with self._cond:
+                await self._cond.wait_for(
+                    lambda: self._inflight == 0 or self._inflight + size <= self.max_inflight)
+                self._inflight += size
+        finally:
+            self._queued -= size
+        try:
+            return await self._run(data, kind)
+        finally:
+            async with self._cond:
+                self._inflight -= size
+                self._cond.notify_all()
+
+    async def _run(self, data: bytes, kind: str, retry: bool = True) -> Extraction:
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        if self.workers == 0:
+            job = asyncio.to_thread(extract_pages, kind, data)
+        else:
+            job = loop.run_in_executor(self._get_pool(), extract_pages, kind, data)
+        try:
+            ex = await asyncio.wait_for(job, self.timeout_s)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            self._restart_pool()
+            return Extraction(kind=kind, byte_count=len(data), timed_out=True,
+                              error=f"Extraktion nach {self.timeout_s:g}s abgebrochen "
+                                    f"(Datei zu groß oder zu komplex).")
+        except BrokenProcessPool:
+            # Ein anderer Job hat den Pool per Timeout neu gestartet
+            self._restart_pool()
+            if retry:
+                return await self._run(data, kind, retry=False)
+            return Extraction(kind=kind, byte_count=len(data),
+                              error="Extraktion fehlgeschlagen: Worker-Prozess beendet.")
+        ms = (time.perf_counter() - start) * 1000
+        self._stats["extracted"] += 1
+        self._stats["extract_ms_max"] = round(max(self._stats["extract_ms_max"], ms), 1)
+        return ex
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn statt fork: der Gateway-Prozess hat Threads (Logger, aiosqlite)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _restart_pool(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        self._stats["pool_restarts"] += 1
+        # Laufende Worker hart beenden — ProcessPoolExecutor kann einzelne Jobs nicht abbrechen
+        for proc in list(getattr(pool, "_processes", {}).values()):
+            proc.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 # ─── Hilfsfunktionen ──────────────────────────────────────────────────────────
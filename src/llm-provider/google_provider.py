@@ -18,9 +18,7 @@ import sys
 
 from base import BaseProvider
 from models import (
-    ChatRequest, ChatResponse, StreamChunk, TokenCountRequest,
-    TokenCountResponse, ModelDetail, EmbeddingRequest, EmbeddingResponse,
-    EmbeddingData,
+    ChatRequest, ChatResponse, StreamChunk, TokenCountRequest, ModelDetail,
 )
 
 
@@ -30,6 +28,9 @@ class GoogleProvider(BaseProvider):
     _tier2_extended = ["embeddings"]
     _tier3_specialized = []
 
+    _embedding_model = "text-embedding-004"
+    _embedding_max_batch = 100        # batchEmbedContents-Limit
+
     _features = {
         "tool_use": True, "vision": True, "web_search": True,
         "citations": False, "thinking": True, "cache_control": False,
@@ -58,9 +59,9 @@ class GoogleProvider(BaseProvider):
         base = self.config.get("api_base", "https://generativelanguage.googleapis.com/v1beta")
         return f"{base}/models/{model}:countTokens?key={self._api_key()}"
 
-    def _get_embed_endpoint(self, model: str) -> str:
+    def _get_batch_embed_endpoint(self, model: str) -> str:
         base = self.config.get("api_base", "https://generativelanguage.googleapis.com/v1beta")
-        return f"{base}/models/{model}:embedContent?key={self._api_key()}"
+        return f"{base}/models/{model}:batchEmbedContents?key={self._api_key()}"
 
     def _role(self, role: str) -> str:
         """Anthropic/OpenAI roles → Gemini roles."""
@@ -194,7 +195,7 @@ class GoogleProvider(BaseProvider):
 
     # ─── Tier 1: Chat (Override wegen Modell im Endpoint) ──────
 
-    async def chat(self, request: ChatRequest) -> ChatResponse:
+    async def _chat_upstream(self, request: ChatRequest) -> ChatResponse:
         await self._ensure_client()
         start = time.perf_counter()
         status = "success"
@@ -204,12 +205,17 @@ class GoogleProvider(BaseProvider):
         payload = self._build_payload(request)
         self.logger.log_request("/chat", payload)
         try:
-            resp = await self._client.post(
-                self._get_endpoint(model), headers=self._get_headers(), json=payload)
+            async with self._rate_limiter.acquire(model, payload) as permit:
+                resp = await self._client.post(
+                    self._get_endpoint(model), headers=self._get_headers(), json=payload)
+                if permit is not None:
+                    permit.observe(resp)
             resp.raise_for_status()
             result = self._transform_response(resp.json())
             in_tok = result.usage.get("input_tokens", 0)
             out_tok = result.usage.get("output_tokens", 0)
+            if permit is not None:
+                permit.settle(in_tok + out_tok)
             self.logger.log_response("/chat", resp.status_code, result.model_dump())
             return result
         except Exception as e:
@@ -221,7 +227,7 @@ class GoogleProvider(BaseProvider):
             ms = int((time.perf_counter() - start) * 1000)
             await self._log_cost(model, in_tok, out_tok, ms, request.context, status, err)
 
-    async def chat_stream(self, request: ChatRequest):
+    async def _chat_stream_upstream(self, request: ChatRequest):
         await self._ensure_client()
         start = time.perf_counter()
         status = "success"
@@ -231,10 +237,12 @@ class GoogleProvider(BaseProvider):
         payload = self._build_payload(request)
         self.logger.log_request("/chat/stream", payload)
         try:
-            async with self._client.stream(
+            async with self._rate_limiter.acquire(model, payload) as permit, self._client.stream(
                 "POST", self._get_stream_endpoint(model),
                 headers=self._get_headers(), json=payload
             ) as resp:
+                if permit is not None:
+                    permit.observe(resp)
                 resp.raise_for_status()
                 async for line in resp.aiter_lines():
                     if not line.startswith("data: "):
@@ -249,6 +257,8 @@ class GoogleProvider(BaseProvider):
                         in_tok = chunk.usage.get("input_tokens", in_tok)
                         out_tok = chunk.usage.get("output_tokens", out_tok)
                     yield chunk
+                if permit is not None:
+                    permit.settle(in_tok + out_tok)
         except Exception as e:
             status = "error"
             err = str(e)
@@ -281,9 +291,8 @@ class GoogleProvider(BaseProvider):
 
     # ─── Tier 1: Token Count ───────────────────────────────────
 
-    async def count_tokens(self, request: TokenCountRequest) -> TokenCountResponse:
+    async def _count_tokens_upstream(self, model: str, request: TokenCountRequest) -> int:
         await self._ensure_client()
-        model = request.model or self.config.get("default_model", "gemini-2.0-flash")
         payload = {"contents": self._to_contents(request.messages)}
         if request.system:
             payload["system_instruction"] = {"parts": [{"text": request.system}]}
@@ -292,30 +301,23 @@ class GoogleProvider(BaseProvider):
             headers=self._get_headers(), json=payload,
         )
         resp.raise_for_status()
-        return TokenCountResponse(
-            input_tokens=resp.json().get("totalTokens", 0),
-            model=model, provider=self.provider_name,
-        )
+        return resp.json().get("totalTokens", 0)
 
     # ─── Tier 2: Embeddings ────────────────────────────────────
 
-    async def create_embedding(self, request: EmbeddingRequest) -> EmbeddingResponse:
-        await self._ensure_client()
-        model = request.model or self.config.get(
-            "embedding_model", "text-embedding-004")
-        texts = request.input if isinstance(request.input, list) else [request.input]
-        data = []
-        for i, text in enumerate(texts):
-            payload = {"content": {"parts": [{"text": text}]}}
-            resp = await self._client.post(
-                self._get_embed_endpoint(model),
-                headers=self._get_headers(), json=payload,
-            )
-            resp.raise_for_status()
-            values = resp.json().get("embedding", {}).get("values", [])
-            data.append(EmbeddingData(index=i, embedding=values))
-        return EmbeddingResponse(
-            data=data, model=model,
-            usage={"prompt_tokens": len(texts), "total_tokens": len(texts)},
-            provider=self.provider_name,
+    async def _embed_upstream(self, model: str, texts: list[str],
+                              dimensions: int | None) -> tuple[list[list[float]], int]:
+        """batchEmbedContents: ein Call für alle Texte (max. 100, siehe embeddings.max_batch)."""
+        requests = []
+        for text in texts:
+            r = {"model": f"models/{model}", "content": {"parts": [{"text": text}]}}
+            if dimensions:
+                r["outputDimensionality"] = dimensions
+            requests.append(r)
+        resp = await self._client.post(
+            self._get_batch_embed_endpoint(model),
+            headers=self._get_headers(), json={"requests": requests},
         )
+        resp.raise_for_status()
+        vectors = [e.get("values", []) for e in resp.json().get("embeddings", [])]
+        return vectors, len(texts)   # Gemini meldet keine Tokens für Embeddings
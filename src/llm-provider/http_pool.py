@@ -0,0 +1,239 @@
+"""
+H.E.I.N.Z.E.L. Provider — HTTP-Client mit konfigurierbarem Pool
+
+Konfigurierbar per provider.yaml:
+  http:
+    max_connections: 100
+    max_keepalive_connections: 20
+    keepalive_expiry_s: 30.0
+    http2: false
+    timeout_s: 120.0
+    connect_timeout_s: 10.0
+    pool_timeout_s: 30.0
+
+HTTP/2 braucht das Paket h2 (pip install "httpx[http2]"). Fehlt es, wird
+mit Warnung auf HTTP/1.1 zurueckgefallen.
+
+InstrumentedTransport misst pro Request ueber die httpcore-Trace-Events:
+  pool_wait   — Eintritt in den Transport bis Verbindung verfuegbar
+                (lokales Warten auf einen freien Pool-Slot)
+  connect     — TCP/TLS-Aufbau bei neuer Verbindung
+  upstream    — Request-Header gesendet bis Response-Header da
+Damit laesst sich in /status lokale Warteschlange von Upstream-Latenz
+trennen.
+"""
+import asyncio
+import sys
+import time
+from collections import deque
+from typing import Optional
+
+import httpx
+
+
+# Defaults (ueberschreibbar via provider.yaml http-Sektion)
+DEFAULT_HTTP_CONFIG = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry_s": 30.0,
+    "http2": False,
+    "timeout_s": 120.0,
+    "connect_timeout_s": 10.0,
+    "pool_timeout_s": 30.0,
+}
+
+_SAMPLES = 512   # Fenster fuer Perzentile
+
+
+def _get_http_config(provider_config: dict) -> dict:
+    """Liest HTTP-Config aus provider.yaml, faellt auf Defaults zurueck."""
+    yaml_http = provider_config.get("http") or {}
+    return {**DEFAULT_HTTP_CONFIG, **yaml_http}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _percentile(samples, q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+
+class PoolStats:
+    """Zaehler und Latenz-Fenster eines Transports."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.waiting = 0          # gestartet, aber noch ohne Verbindung
+        self.peak_in_flight = 0
+        self.peak_waiting = 0
+        self.new_connections = 0
+        self.pool_timeouts = 0
+        self.pool_wait_ms: deque = deque(maxlen=_SAMPLES)
+        self.connect_ms: deque = deque(maxlen=_SAMPLES)
+        self.upstream_ms: deque = deque(maxlen=_SAMPLES)
+
+    def snapshot(self) -> dict:
+        def summary(samples):
+            return {
+                "avg": round(sum(samples) / len(samples), 2) if samples else None,
+                "p50": _percentile(samples, 0.5),
+                "p95": _percentile(samples, 0.95),
+                "max": round(max(samples), 2) if samples else None,
+            }
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "waiting_for_connection": self.waiting,
+            "peak_in_flight": self.peak_in_flight,
+            "peak_waiting": self.peak_waiting,
+            "new_connections": self.new_connections,
+            "pool_timeouts": self.pool_timeouts,
+            "pool_wait_ms": summary(self.pool_wait_ms),
+            "connect_ms": summary(self.connect_ms),
+            "upstream_headers_ms": summary(self.upstream_ms),
+        }
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response-Body, der beim Schliessen den Request als beendet meldet."""
+
+    def __init__(self, inner, on_close):
+        self._inner = inner
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._inner:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._inner.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Wrapper um einen httpx-Transport, der Pool-Wartezeit und Upstream-Latenz
+    misst. in_flight zaehlt bis der Response-Body geschlossen ist (Streaming).
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, stats: Optional[PoolStats] = None):
+        self._inner = inner
+        self.stats = stats or PoolStats()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self.stats
+        start = time.perf_counter()
+        marks: dict[str, float] = {}
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(name: str, info: dict):
+            now = time.perf_counter()
+            if name == "connection.connect_tcp.started":
+                marks.setdefault("connect", now)
+                stats.new_connections += 1
+            elif name.endswith(".send_request_headers.started"):
+                marks.setdefault("headers", now)
+            elif name.endswith(".receive_response_headers.complete"):
+                marks.setdefault("response", now)
+            if "acquired" not in marks and ("connect" in marks or "headers" in marks):
+                marks["acquired"] = now
+                stats.waiting -= 1
+            if outer_trace is not None:
+                await outer_trace(name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.waiting += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        stats.peak_waiting = max(stats.peak_waiting, stats.waiting)
+
+        def done():
+            stats.in_flight -= 1
+
+        try:
+            response = await self._inner.handle_async_request(request)
+        except httpx.PoolTimeout:
+            stats.pool_timeouts += 1
+            stats.errors += 1
+            done()
+            raise
+        except Exception:
+            stats.errors += 1
+            done()
+            raise
+        else:
+            if response.is_closed:
+                done()   # Body schon vollstaendig gelesen (z.B. MockTransport)
+            else:
+                response.stream = _TrackedStream(response.stream, done)
+            return response
+        finally:
+            if "acquired" in marks:
+                stats.pool_wait_ms.append((marks["acquired"] - start) * 1000)
+                if "connect" in marks and "headers" in marks:
+                    stats.connect_ms.append((marks["headers"] - marks["connect"]) * 1000)
+                if "headers" in marks and "response" in marks:
+                    stats.upstream_ms.append((marks["response"] - marks["headers"]) * 1000)
+            else:
+                stats.waiting -= 1   # ohne Trace-Events (z.B. MockTransport)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def create_client(
+    provider_config: dict, inner: Optional[httpx.AsyncBaseTransport] = None,
+) -> httpx.AsyncClient:
+    """AsyncClient mit Pool-Limits, optional HTTP/2, instrumentiertem Transport."""
+    cfg = _get_http_config(provider_config)
+    http2 = bool(cfg["http2"])
+    if http2 and not _http2_available():
+        print("HTTP: http2 konfiguriert, aber Paket 'h2' fehlt — nutze HTTP/1.1",
+              file=sys.stderr)
+        http2 = False
+    if inner is None:
+        inner = httpx.AsyncHTTPTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=cfg["max_connections"],
+                max_keepalive_connections=cfg["max_keepalive_connections"],
+                keepalive_expiry=cfg["keepalive_expiry_s"],
+            ),
+        )
+    timeout = httpx.Timeout(
+        cfg["timeout_s"], connect=cfg["connect_timeout_s"], pool=cfg["pool_timeout_s"])
+    return httpx.AsyncClient(transport=InstrumentedTransport(inner), timeout=timeout)
+
+
+def pool_stats(client: Optional[httpx.AsyncClient]) -> Optional[dict]:
+    """Snapshot der Pool-Statistik eines mit create_client erzeugten Clients."""
+    transport = getattr(client, "_transport", None)
+    if isinstance(transport, InstrumentedTransport):
+        return transport.stats.snapshot()
+    return None
+
+
+async def close_when_idle(client: httpx.AsyncClient, drain_timeout_s: float = 120.0) -> None:
+    """Client schliessen sobald keine Requests mehr laufen (max. drain_timeout_s)."""
+    transport = getattr(client, "_transport", None)
+    if isinstance(transport, InstrumentedTransport):
+        deadline = time.monotonic() + drain_timeout_s
+        while transport.stats.in_flight > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+    await client.aclose()
@@ -4,30 +4,242 @@ H.E.I.N.Z.E.L. Provider — Log-Reader
 Liest und filtert Dialog-Logs aus JSONL-Files.
 Unterstützt Filter nach session_id, heinzel_id, Zeitraum, Typ.
 
-Alle rotierten Dateien (.jsonl, .jsonl.1 bis .jsonl.5) werden einbezogen.
+Alle rotierten Dateien (.jsonl, .jsonl.1 bis .jsonl.5) werden einbezogen,
+auch von der Retention komprimierte (.gz).
+
+Zugriff über den Sidecar-Index (siehe logger.py): passende Einträge werden
+über Posting-Listen (session/heinzel/task) und Zeit-Bisect bestimmt und per
+seek direkt gelesen. Bereiche ohne Index (Altdaten, noch nicht indexierter
+Rest) liest ein rückwärts laufender Chunk-Scanner — neueste Einträge zuerst,
+ohne die Datei komplett zu laden. iter_logs() liefert die Treffer als
+Generator; read_logs() sammelt bis limit.
 """
+import bisect
+import glob
+import gzip
 import json
 import os
-import glob
+import re
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Iterator, Optional
+
+from logger import format_index_line, index_path
+
+_CHUNK_SIZE = 64 * 1024
+_INDEX_CACHE_MAX = 16
+_ROTATION_RE = re.compile(r"^(?:\.(\d+))?(\.gz)?$")
 
 
 def _log_files(log_dir: str, provider: str) -> list[str]:
-    """Alle JSONL-Dateien für einen Provider, neueste zuerst."""
+    """Alle JSONL-Dateien für einen Provider, neueste zuerst (.jsonl, .1, .2, ...)."""
     base = os.path.join(log_dir, f"{provider}.jsonl")
-    files = sorted(glob.glob(base + "*"), reverse=True)
-    # Hauptdatei zuerst, dann .1, .2 ...
-    result = []
-    if os.path.exists(base):
-        result.append(base)
-    for f in files:
-        if f != base:
-            result.append(f)
-    return result
+    ranked = []
+    for f in glob.glob(glob.escape(base) + "*"):
+        m = _ROTATION_RE.match(f[len(base):])
+        if m:
+            ranked.append((int(m.group(1) or 0), bool(m.group(2)), f))
+    return [f for _, _, f in sorted(ranked)]
 
 
-def read_logs(
+# =============================================================================
+# Sidecar-Index
+# =============================================================================
+
+class _FileIndex:
+    """Index einer Log-Datei im Speicher, inkrementell nachladbar."""
+
+    __slots__ = ("inode", "read_bytes", "offsets", "lengths", "times", "types",
+                 "sessions", "heinzels", "tasks", "postings")
+
+    def __init__(self, inode: int):
+        self.inode = inode
+        self.read_bytes = 0
+        self.offsets: list[int] = []
+        self.lengths: list[int] = []
+        self.times: list[float] = []
+        self.types: list[Optional[str]] = []
+        self.sessions: list[Optional[str]] = []
+        self.heinzels: list[Optional[str]] = []
+        self.tasks: list[Optional[str]] = []
+        self.postings: dict[str, dict[str, list[int]]] = {
+            "session_id": {}, "heinzel_id": {}, "task_id": {}}
+
+    def extend(self, data: bytes) -> None:
+        for raw in data.splitlines():
+            try:
+                offset, length, epoch, etype, sid, hid, tid = json.loads(raw)
+            except (ValueError, TypeError):
+                continue
+            pos = len(self.offsets)
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            self.times.append(epoch or 0.0)
+            self.types.append(etype)
+            self.sessions.append(sid)
+            self.heinzels.append(hid)
+            self.tasks.append(tid)
+            for field, value in (("session_id", sid), ("heinzel_id", hid), ("task_id", tid)):
+                if value is not None:
+                    self.postings[field].setdefault(value, []).append(pos)
+
+    @property
+    def end(self) -> int:
+        """Byte-Position hinter dem letzten indexierten Eintrag."""
+        return self.offsets[-1] + self.lengths[-1] if self.offsets else 0
+
+    def select(self, filters: dict, since: Optional[float], until: Optional[float]) -> list[int]:
+        """Positionen passender Einträge, aufsteigend."""
+        candidates = None
+        for field in ("session_id", "heinzel_id", "task_id"):
+            if filters.get(field):
+                plist = self.postings[field].get(filters[field], [])
+                if candidates is None or len(plist) < len(candidates):
+                    candidates = plist
+        lo = bisect.bisect_left(self.times, since) if since is not None else 0
+        hi = bisect.bisect_right(self.times, until) if until is not None else len(self.times)
+        if candidates is None:
+            positions = range(lo, hi)
+        else:
+            positions = candidates[bisect.bisect_left(candidates, lo):bisect.bisect_left(candidates, hi)]
+        columns = (("session_id", self.sessions), ("heinzel_id", self.heinzels),
+                   ("task_id", self.tasks), ("type", self.types))
+        active = [(filters[f], col) for f, col in columns if filters.get(f)]
+        return [p for p in positions if all(col[p] == want for want, col in active)]
+
+
+_index_cache: "OrderedDict[str, _FileIndex]" = OrderedDict()
+
+
+def _load_index(log_file: str) -> Optional[_FileIndex]:
+    """Index zur Log-Datei laden — aus dem Cache, nur neue Zeilen nachlesen."""
+    path = index_path(log_file)
+    try:
+        st = os.stat(path)
+    except OSError:
+        _index_cache.pop(path, None)
+        return None
+    idx = _index_cache.get(path)
+    if idx is None or idx.inode != st.st_ino or idx.read_bytes > st.st_size:
+        idx = _FileIndex(st.st_ino)
+    if idx.read_bytes < st.st_size:
+        try:
+            with open(path, "rb") as f:
+                f.seek(idx.read_bytes)
+                data = f.read()
+        except OSError:
+            return None
+        complete = data.rfind(b"\n") + 1   # unvollständige letzte Zeile später
+        idx.extend(data[:complete])
+        idx.read_bytes += complete
+    _index_cache[path] = idx
+    _index_cache.move_to_end(path)
+    while len(_index_cache) > _INDEX_CACHE_MAX:
+        _index_cache.popitem(last=False)
+    return idx
+
+
+def _build_gz_index(log_file: str) -> Optional[_FileIndex]:
+    """Einmaliger Vorwärts-Durchlauf über eine .gz ohne Index — Sidecar anlegen."""
+    path = index_path(log_file)
+    tmp = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(log_file, "rb") as f, open(tmp, "w", encoding="utf-8") as out:
+            offset = 0
+            for line in f:
+                try:
+                    e = json.loads(line)
+                    ts = _parse_dt(e.get("timestamp"))
+                    out.write(format_index_line(offset, len(line), (
+                        ts.timestamp() if ts else None, e.get("type"),
+                        e.get("session_id"), e.get("heinzel_id"), e.get("task_id"))))
+                except (ValueError, AttributeError):
+                    pass
+                offset += len(line)
+        os.replace(tmp, path)
+    except (OSError, EOFError):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+    return _load_index(log_file)
+
+
+# =============================================================================
+# Lesen
+# =============================================================================
+
+def _reverse_lines(f, start: int, end: int) -> Iterator[bytes]:
+    """Zeilen im Bereich [start, end) rückwärts, in Chunks von hinten gelesen."""
+    pos, rest = end, b""
+    while pos > start:
+        size = min(_CHUNK_SIZE, pos - start)
+        pos -= size
+        f.seek(pos)
+        lines = (f.read(size) + rest).split(b"\n")
+        rest = lines[0]
+        for line in reversed(lines[1:]):
+            if line.strip():
+                yield line
+    if rest.strip():
+        yield rest
+
+
+def _decode(raw: bytes) -> Optional[dict]:
+    try:
+        entry = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+def _scan_region(f, start: int, end: int, match) -> Iterator[dict]:
+    for raw in _reverse_lines(f, start, end):
+        entry = _decode(raw)
+        if entry is not None and match(entry):
+            yield entry
+
+
+def _iter_plain(filepath: str, filters: dict, since, until, match) -> Iterator[dict]:
+    size = os.path.getsize(filepath)
+    idx = _load_index(filepath)
+    if idx is not None and (not idx.offsets or idx.end > size):
+        idx = None   # leer oder veraltet (Datei kleiner als Index) → scannen
+    with open(filepath, "rb") as f:
+        if idx is None:
+            yield from _scan_region(f, 0, size, match)
+            return
+        # Neuester Teil: noch nicht indexiert (Schreib-Race, Altbestand)
+        yield from _scan_region(f, idx.end, size, match)
+        for pos in reversed(idx.select(filters, since, until)):
+            f.seek(idx.offsets[pos])
+            entry = _decode(f.read(idx.lengths[pos]))
+            if entry is not None and match(entry):
+                yield entry
+        # Ältester Teil: vor Einführung des Index geschrieben
+        yield from _scan_region(f, 0, idx.offsets[0], match)
+
+
+def _iter_gz(filepath: str, filters: dict, since, until, match,
+             limit: Optional[int]) -> Iterator[dict]:
+    idx = _load_index(filepath) or _build_gz_index(filepath)
+    if idx is None:
+        return
+    positions = idx.select(filters, since, until)
+    if limit:
+        positions = positions[-limit:]
+    # gzip kann nur vorwärts effizient seeken → aufsteigend lesen, umgekehrt liefern
+    found = []
+    with gzip.open(filepath, "rb") as f:
+        for pos in positions:
+            f.seek(idx.offsets[pos])
+            entry = _decode(f.read(idx.lengths[pos]))
+            if entry is not None and match(entry):
+                found.append(entry)
+    yield from reversed(found)
+
+
+def iter_logs(
     log_dir: str,
     provider: str,
     session_id: Optional[str] = None,
@@ -36,59 +248,83 @@ def read_logs(
     entry_type: Optional[str] = None,   # request|response|error
     since: Optional[str] = None,        # ISO-Datetime
     until: Optional[str] = None,        # ISO-Datetime
-    limit: int = 100,
-) -> list[dict]:
+    limit: Optional[int] = None,
+) -> Iterator[dict]:
     """
-    Liest und filtert Log-Einträge.
-    Gibt maximal `limit` Einträge zurück, neueste zuerst.
+    Passende Log-Einträge als Generator, neueste zuerst.
+    Mit limit endet der Generator nach `limit` Einträgen.
     """
     since_dt = _parse_dt(since)
     until_dt = _parse_dt(until)
-    results = []
+    since_ts = since_dt.timestamp() if since_dt else None
+    until_ts = until_dt.timestamp() if until_dt else None
+    filters = {"session_id": session_id, "heinzel_id": heinzel_id,
+               "task_id": task_id, "type": entry_type}
+
+    def match(entry: dict) -> bool:
+        if session_id and entry.get("session_id") != session_id:
+            return False
+        if heinzel_id and entry.get("heinzel_id") != heinzel_id:
+            return False
+        if task_id and entry.get("task_id") != task_id:
+            return False
+        if entry_type and entry.get("type") != entry_type:
+            return False
+        ts = _parse_dt(entry.get("timestamp"))
+        if since_dt and ts and ts < since_dt:
+            return False
+        if until_dt and ts and ts > until_dt:
+            return False
+        return True
 
+    count = 0
     for filepath in _log_files(log_dir, provider):
-        if not os.path.exists(filepath):
-            continue
         try:
-            lines = open(filepath, encoding="utf-8").readlines()
-        except Exception:
-            continue
-        # Neueste zuerst innerhalb der Datei
-        for line in reversed(lines):
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                entry = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-
-            # Filter
-            if session_id and entry.get("session_id") != session_id:
-                continue
-            if heinzel_id and entry.get("heinzel_id") != heinzel_id:
-                continue
-            if task_id and entry.get("task_id") != task_id:
-                continue
-            if entry_type and entry.get("type") != entry_type:
-                continue
-            ts = _parse_dt(entry.get("timestamp"))
-            if since_dt and ts and ts < since_dt:
-                continue
-            if until_dt and ts and ts > until_dt:
+            # mtime ist obere Schranke für den neuesten Eintrag der Datei
+            if since_ts is not None and os.path.getmtime(filepath) < since_ts:
                 continue
+            if filepath.endswith(".gz"):
+                remaining = limit - count if limit else None
+                entries = _iter_gz(filepath, filters, since_ts, until_ts, match, remaining)
+            else:
+                entries = _iter_plain(filepath, filters, since_ts, until_ts, match)
+            for entry in entries:
+                yield entry
+                count += 1
+                if limit and count >= limit:
+                    return
+        except OSError:
+            continue
 
-            results.append(entry)
-            if len(results) >= limit:
-                return results
 
-    return results
+def read_logs(
+    log_dir: str,
+    provider: str,
+    session_id: Optional[str] = None,
+    heinzel_id: Optional[str] = None,
+    task_id: Optional[str] = None,
+    entry_type: Optional[str] = None,   # request|response|error
+    since: Optional[str] = None,        # ISO-Datetime
+    until: Optional[str] = None,        # ISO-Datetime
+    limit: int = 100,
+) -> list[dict]:
+    """
+    Liest und filtert Log-Einträge.
+    Gibt maximal `limit` Einträge zurück, neueste zuerst.
+    """
+    return list(iter_logs(
+        log_dir, provider, session_id=session_id, heinzel_id=heinzel_id,
+        task_id=task_id, entry_type=entry_type, since=since, until=until,
+        limit=limit,
+    ))
 
 
 def _parse_dt(s: Optional[str]) -> Optional[datetime]:
     if not s:
         return None
     try:
-        return datetime.fromisoformat(s.replace("Z", "+00:00"))
+        dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
     except Exception:
         return None
+    # Naive Zeitangaben als UTC — Log-Zeitstempel sind immer UTC
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
@@ -8,22 +8,153 @@ heinzel_id, task_id, endpoint, payload/content.
 Speicherformat: JSONL, eine Zeile pro Eintrag.
 Rotation: 10 MB pro Datei, 5 Backups.
 Dateipfad: {log_dir}/{provider_name}.jsonl
+
+Sidecar-Index: pro Log-Datei {log_dir}/.logindex/{dateiname}.idx, eine
+JSON-Zeile pro Eintrag: [offset, länge, epoch, type, session_id,
+heinzel_id, task_id]. Wird beim Schreiben mitgeführt und bei der Rotation
+mit umbenannt — log_reader springt damit direkt zu passenden Einträgen.
+
+Hintergrund-Modus (background=True): _log_entry() legt den Eintrag nur in
+eine begrenzte Queue; Serialisierung und Datei-I/O laufen in einem Thread.
+Ist die Queue voll (Anzahl oder geschätzte Bytes), wird der Eintrag
+verworfen und gezählt — der Event-Loop wartet nie auf die Platte.
+
+Blob-Store (blob_store=True): große Base64-Strings (Bilder, PDFs) landen
+einmalig unter {log_dir}/blobs/{sha[:2]}/{sha}; im Log steht nur
+"blob:sha256:{sha}" (Data-URLs behalten ihr Präfix).
 """
+import atexit
+import hashlib
 import logging
 import json
 import os
+import queue
+import re
+import threading
 from logging.handlers import RotatingFileHandler
 from datetime import datetime, timezone
 from typing import Any, Optional
 
+INDEX_DIR = ".logindex"
+
+
+def index_path(log_file: str) -> str:
+    """Pfad der Sidecar-Index-Datei zu einer Log-Datei (auch .gz)."""
+    head, name = os.path.split(log_file)
+    return os.path.join(head, INDEX_DIR, name + ".idx")
+
+
+def format_index_line(offset: int, length: int, meta: tuple) -> str:
+    """Eine Index-Zeile: [offset, länge, epoch, type, session, heinzel, task]."""
+    return json.dumps([offset, length, *meta], ensure_ascii=False) + "\n"
+
+
+BLOB_DIR = "blobs"
+BLOB_PREFIX = "blob:sha256:"
+_BASE64_RE = re.compile(r"[A-Za-z0-9+/]+={0,2}")
+_DATA_URL_RE = re.compile(r"^data:[^;,]*;base64,")
+
+
+def blob_path(log_dir: str, digest: str) -> str:
+    """Ablageort eines Blobs (Base64-Text) zum SHA-256-Hex-Digest."""
+    return os.path.join(log_dir, BLOB_DIR, digest[:2], digest)
+
+
+def _approx_size(obj: Any, _depth: int = 0) -> int:
+    """Grobe Größe eines JSON-artigen Objekts in Bytes, ohne zu serialisieren."""
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    if _depth > 32:
+        return 64
+    if isinstance(obj, dict):
+        return 16 + sum(len(str(k)) + _approx_size(v, _depth + 1) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return 16 + sum(_approx_size(v, _depth + 1) for v in obj)
+    return 8
+
+
+class IndexedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler, der pro Eintrag Byte-Offset und Metadaten in den
+    Sidecar-Index schreibt. Die Metadaten kommen über extra={"log_index": ...};
+    Einträge ohne log_index landen nur im Log.
+    Bei der Rotation wandern die Index-Dateien mit (.idx → .1.idx → ...).
+    """
+
+    def __init__(self, filename, *args, **kwargs):
+        super().__init__(filename, *args, **kwargs)
+        self._index_stream = None
+        os.makedirs(os.path.dirname(index_path(self.baseFilename)), exist_ok=True)
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            offset = self.stream.tell()
+            logging.FileHandler.emit(self, record)
+            meta = getattr(record, "log_index", None)
+            if meta is not None:
+                length = self.stream.tell() - offset
+                if self._index_stream is None:
+                    self._index_stream = open(
+                        index_path(self.baseFilename), "a", encoding="utf-8")
+                self._index_stream.write(format_index_line(offset, length, meta))
+                self._index_stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def _close_index(self):
+        if self._index_stream is not None:
+            self._index_stream.close()
+            self._index_stream = None
+
+    def doRollover(self):
+        self._close_index()
+        base = self.baseFilename
+        if self.backupCount > 0:
+            for i in range(self.backupCount, 0, -1):
+                src = index_path(self.rotation_filename(f"{base}.{i - 1}") if i > 1 else base)
+                dst = index_path(self.rotation_filename(f"{base}.{i}"))
+                if os.path.exists(src):
+                    os.replace(src, dst)
+                elif os.path.exists(dst):
+                    os.remove(dst)   # Index ohne passende Datei wäre falsch
+        elif os.path.exists(index_path(base)):
+            os.remove(index_path(base))
+        super().doRollover()
+
+    def close(self):
+        self.acquire()
+        try:
+            self._close_index()
+        finally:
+            self.release()
+        super().close()
+
 
 class RequestResponseLogger:
-    def __init__(self, provider_name: str, log_dir: str = "/data", enabled: bool = True):
+    def __init__(self, provider_name: str, log_dir: str = "/data", enabled: bool = True,
+                 background: bool = False, max_queue: int = 1000,
+                 max_queue_bytes: int = 64 * 1024 * 1024,
+                 blob_store: bool = False, blob_min_bytes: int = 4096):
         self.provider_name = provider_name
         self.log_dir = log_dir
         self.enabled = enabled
         self.logger: Optional[logging.Logger] = None
 
+        self.background = background
+        self.blob_store = blob_store
+        self.blob_min_bytes = blob_min_bytes
+        self._max_queue_bytes = max_queue_bytes
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_queue))
+        self._queued_bytes = 0
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "errors": 0,
+                       "blobs_stored": 0, "blobs_deduplicated": 0, "max_queue_depth": 0}
+
         if not enabled:
             return
 
@@ -32,19 +163,32 @@ class RequestResponseLogger:
         self.logger.setLevel(logging.INFO)
         if not self.logger.handlers:
             log_file = os.path.join(log_dir, f"{provider_name}.jsonl")
-            handler = RotatingFileHandler(
-                log_file, maxBytes=10 * 1024 * 1024, backupCount=5)
+            handler = IndexedRotatingFileHandler(
+                log_file, maxBytes=10 * 1024 * 1024, backupCount=5,
+                encoding="utf-8")
             handler.setFormatter(logging.Formatter("%(message)s"))
             self.logger.addHandler(handler)
 
+    @property
+    def stats(self) -> dict:
+        """Zähler des Hintergrund-Writers (Kopie)."""
+        with self._lock:
+            s = dict(self._stats)
+            s["queue_depth"] = self._queue.qsize()
+            s["queued_bytes"] = self._queued_bytes
+        s["background"] = self.background
+        s["blob_store"] = self.blob_store
+        return s
+
     def _log_entry(self, entry_type: str, data: Any,
                    session_id: Optional[str] = None,
                    heinzel_id: Optional[str] = None,
                    task_id: Optional[str] = None) -> None:
         if not self.enabled or self.logger is None:
             return
+        now = datetime.now(timezone.utc)
         entry = {
-            "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            "timestamp": now.isoformat().replace("+00:00", "Z"),
             "provider": self.provider_name,
             "type": entry_type,
             "session_id": session_id,
@@ -52,7 +196,115 @@ class RequestResponseLogger:
             "task_id": task_id,
             "data": data,
         }
-        self.logger.info(json.dumps(entry, ensure_ascii=False))
+        meta = (now.timestamp(), entry_type, session_id, heinzel_id, task_id)
+        if not self.background:
+            self._write(entry, meta)
+            return
+        size = _approx_size(data)
+        with self._lock:
+            if self._queued_bytes + size > self._max_queue_bytes:
+                self._stats["dropped"] += 1
+                return
+            try:
+                self._queue.put_nowait((entry, meta, size))
+            except queue.Full:
+                self._stats["dropped"] += 1
+                return
+            self._queued_bytes += size
+            self._stats["enqueued"] += 1
+            depth = self._queue.qsize()
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name=f"dialog-log-{self.provider_name}", daemon=True)
+                self._worker.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                entry, meta, size = item
+                with self._lock:
+                    self._queued_bytes -= size
+                self._write(entry, meta)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, entry: dict, meta: tuple) -> None:
+        try:
+            if self.blob_store:
+                entry["data"] = self._externalize(entry["data"])
+            line = json.dumps(entry, ensure_ascii=False)
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            return
+        self.logger.info(line, extra={"log_index": meta})
+        with self._lock:
+            self._stats["written"] += 1
+
+    def _externalize(self, obj: Any) -> Any:
+        """Große Base64-Strings durch Blob-Referenzen ersetzen (Kopie, Original bleibt)."""
+        if isinstance(obj, str):
+            if len(obj) < self.blob_min_bytes:
+                return obj
+            m = _DATA_URL_RE.match(obj)
+            prefix = m.group(0) if m else ""
+            body = obj[len(prefix):]
+            if not _BASE64_RE.fullmatch(body):
+                return obj
+            return prefix + BLOB_PREFIX + self._store_blob(body)
+        if isinstance(obj, dict):
+            return {k: self._externalize(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self._externalize(v) for v in obj]
+        return obj
+
+    def _store_blob(self, body: str) -> str:
+        raw = body.encode("ascii")
+        digest = hashlib.sha256(raw).hexdigest()
+        path = blob_path(self.log_dir, digest)
+        if os.path.exists(path):
+            os.utime(path)   # mtime = letzte Referenz, maßgeblich für die Retention
+            with self._lock:
+                self._stats["blobs_deduplicated"] += 1
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(raw)
+        os.replace(tmp, path)
+        with self._lock:
+            self._stats["blobs_stored"] += 1
+        return digest
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Warten bis die Queue abgearbeitet ist. False bei Timeout."""
+        if self._worker is None:
+            return True
+        if timeout is None:
+            self._queue.join()
+            return True
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Hintergrund-Thread nach Abarbeitung der Queue beenden."""
+        worker = self._worker
+        if worker is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        worker.join(timeout)
+        self._worker = None
+        atexit.unregister(self.close)
 
     def log_request(self, endpoint: str, payload: dict,
                     session_id: Optional[str] = None,
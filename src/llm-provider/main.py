@@ -2,8 +2,10 @@
 H.E.I.N.Z.E.L. Provider Gateway – FastAPI App
 Version 2.0.0 – Alle Endpoints, alle Tiers.
 """
+import json
 import logging
 import os
+import re
 import yaml
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
@@ -13,6 +15,7 @@ from models import (
     ChatRequest, ChatResponse, TokenCountRequest, TokenCountResponse,
     ModelsResponse, ModelDetailResponse, EmbeddingRequest, EmbeddingResponse,
     BatchCreateRequest, BatchStatus, BatchListResponse, BatchResultsResponse,
+    DeferredChatRequest, DeferredTicket,
     ModerationRequest, ModerationResponse, AudioSpeechRequest,
     AudioResponse, ImageGenerationRequest, ImageResponse,
     ImageEditRequest, ImageVariationRequest,
@@ -96,7 +99,7 @@ async def lifespan(app: FastAPI):
     )
     yield
     if provider:
-        provider.disconnect()
+        await provider.aclose()
         await cost_logger.disconnect()
 
 
@@ -130,7 +133,7 @@ async def logging_disable():
 
 @app.get("/logging/status")
 async def logging_status():
-    return {"dialog_logging": provider.logger.enabled}
+    return {"dialog_logging": provider.logger.enabled, "writer": provider.logger.stats}
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -160,7 +163,8 @@ async def retention_run():
 # LOG ABRUF (Dialog-Logs)
 # ═══════════════════════════════════════════════════════════════
 
-from log_reader import read_logs
+from log_reader import iter_logs, read_logs
+from logger import blob_path
 from typing import Optional
 from commands import is_command, extract_command, execute_command
 from retention import cleanup_logs, cleanup_metrics_db
@@ -194,6 +198,41 @@ async def logs(
     return {"count": len(entries), "entries": entries}
 
 
+@app.get("/logs/blobs/{digest}")
+async def logs_blob(digest: str):
+    """Base64-Inhalt eines ausgelagerten Blobs (Referenz "blob:sha256:<digest>")."""
+    if not re.fullmatch(r"[0-9a-f]{64}", digest):
+        raise HTTPException(status_code=400, detail="Ungültiger Digest")
+    path = blob_path(os.environ.get("LOG_DIR", "/data"), digest)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Blob nicht gefunden")
+    with open(path, "rb") as f:
+        return Response(content=f.read(), media_type="text/plain")
+
+
+@app.get("/logs/stream")
+async def logs_stream(
+    session_id: Optional[str] = None,
+    heinzel_id: Optional[str] = None,
+    task_id:    Optional[str] = None,
+    type:       Optional[str] = None,
+    since:      Optional[str] = None,
+    until:      Optional[str] = None,
+    limit:      int = 1000,
+):
+    """Wie /logs, aber als NDJSON-Stream — Einträge gehen raus sobald gefunden."""
+    log_dir = os.environ.get("LOG_DIR", "/data")
+    entries = iter_logs(
+        log_dir=log_dir, provider=provider.provider_name,
+        session_id=session_id, heinzel_id=heinzel_id, task_id=task_id,
+        entry_type=type, since=since, until=until, limit=limit,
+    )
+    return StreamingResponse(
+        (json.dumps(e, ensure_ascii=False) + "\n" for e in entries),
+        media_type="application/x-ndjson",
+    )
+
+
 # ═══════════════════════════════════════════════════════════════
 # METRIKEN (Cost/Token-DB)
 # ═══════════════════════════════════════════════════════════════
@@ -219,12 +258,13 @@ async def metrics(
 
 @app.get("/metrics/rate-limits")
 async def metrics_rate_limits():
-    """Anzahl der Rate-Limit-Hits (429) seit Provider-Start."""
+    """Rate-Limit-Hits (429, letzte 1000) und Zustand des Limiters pro Modell."""
     hits = getattr(provider, "_rate_limit_hits", [])
     return {
         "total_hits": len(hits),
         "last_hit": hits[-1] if hits else None,
         "retry_config": provider.config.get("retry", {}),
+        "limiter": provider.rate_limit_stats(),
     }
 
 
@@ -235,13 +275,82 @@ async def metrics_summary(
     since:      Optional[str] = None,
     until:      Optional[str] = None,
 ):
-    """Aggregierte Metriken: Requests, Tokens, Latenz, Fehler."""
+    """Aggregierte Metriken: Requests, Tokens, Latenz (avg/p50/p95/p99), Fehler."""
     return await cost_logger.summary(
         session_id=session_id, heinzel_id=heinzel_id,
         since=since, until=until,
     )
 
 
+@app.get("/metrics/timeseries")
+async def metrics_timeseries(
+    granularity: str = "hour",
+    heinzel_id:  Optional[str] = None,
+    model:       Optional[str] = None,
+    since:       Optional[str] = None,
+    until:       Optional[str] = None,
+    limit:       int = 500,
+):
+    """Zeitreihe aus den Rollups (minute/hour/day) für Dashboards."""
+    try:
+        series = await cost_logger.timeseries(
+            granularity=granularity, heinzel_id=heinzel_id,
+            provider=provider.provider_name, model=model,
+            since=since, until=until, limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"granularity": granularity, "count": len(series), "buckets": series}
+
+
+@app.get("/metrics/cost-logger")
+async def metrics_cost_logger():
+    """Write-Behind-Status: Queue-Tiefe, Batches, Flush-Latenz, Verluste."""
+    return cost_logger.stats
+
+
+@app.get("/metrics/response-cache")
+async def metrics_response_cache():
+    """Response-Cache: Treffer (memory/sqlite), Misses, Trefferquote, eingesparte Tokens."""
+    return provider.response_cache_stats()
+
+
+@app.get("/metrics/coalescing")
+async def metrics_coalescing():
+    """Single-Flight: geteilte /chat-Calls und /chat/stream-Streams."""
+    return provider.coalescing_stats()
+
+
+@app.get("/metrics/embeddings")
+async def metrics_embeddings():
+    """Embeddings: Micro-Batching (Upstream-Calls, Batchgrößen) und Vektor-Cache."""
+    return provider.embedding_stats()
+
+
+@app.get("/metrics/token-count")
+async def metrics_token_count():
+    """/tokens/count: Cache-Treffer, summierte/geschätzte Antworten, Upstream-Calls."""
+    return provider.token_count_stats()
+
+
+@app.get("/metrics/deferred")
+async def metrics_deferred():
+    """Deferred-Queue: Batches, Batchgrößen, Durchlaufzeit, eingesparte Tokens/Calls."""
+    return provider.deferred_stats()
+
+
+@app.get("/metrics/file-extraction")
+async def metrics_file_extraction():
+    """Dokument-Extraktion: Prozess-Pool, Warteschlange, Content-Hash-Cache."""
+    return provider.file_extraction_stats()
+
+
+@app.post("/response-cache/clear")
+async def response_cache_clear():
+    """Response-Cache leeren (beide Stufen)."""
+    await provider.clear_response_cache()
+    return {"cleared": True}
+
 
 
 @app.get("/status")
@@ -256,6 +365,7 @@ async def status():
         "dialog_logging":   provider.logger.enabled,
         "rate_limit_hits":  len(getattr(provider, "_rate_limit_hits", [])),
         "retry_config":     provider.config.get("retry", {}),
+        "http_pool":        provider.http_pool_stats(),
     }
 
 
@@ -400,6 +510,23 @@ async def batch_results(batch_id: str):
     except Exception as e:
         _handle(e, "GET /batches/{id}/results")
 
+@app.post("/deferred/chat", response_model=DeferredTicket)
+async def deferred_chat(request: DeferredChatRequest):
+    """Nicht eiliger Chat — Ticket sofort, Ergebnis per GET /deferred/{id} oder Webhook."""
+    try:
+        return await provider.chat_deferred(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        _handle(e, "POST /deferred/chat")
+
+@app.get("/deferred/{ticket_id}", response_model=DeferredTicket)
+async def deferred_get(ticket_id: str):
+    ticket = provider.get_deferred(ticket_id)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail=f"Ticket '{ticket_id}' nicht gefunden")
+    return ticket
+
 
 # ═══════════════════════════════════════════════════════════════
 # TIER 3: SPECIALIZED
@@ -60,6 +60,10 @@ class ChatRequest(BaseModel):
     stop_sequences: Optional[list[str]] = None
     tools: Optional[list[dict]] = None
     context: Optional[RequestContext] = None
+    bypass_cache: bool = False   # Response-Cache und Coalescing für diesen Request umgehen
+    # Prompt-Caching (Anthropic): None = automatisch nach Config, [] = aus,
+    # sonst Auswahl aus "tools", "system", "history"
+    cache_breakpoints: Optional[list[Literal["tools", "system", "history"]]] = None
 
 
 class ChatResponse(BaseModel):
@@ -86,12 +90,14 @@ class TokenCountRequest(BaseModel):
     model: Optional[str] = None
     system: Optional[str] = None
     tools: Optional[list[dict]] = None
+    allow_estimate: bool = False  # Hot-Path: lokal zählen, exakt im Hintergrund
 
 
 class TokenCountResponse(BaseModel):
     input_tokens: int
     model: str
     provider: str
+    source: Literal["upstream", "cache", "summed", "estimate"] = "upstream"
 
 
 class ModelDetail(BaseModel):
@@ -177,6 +183,24 @@ class BatchResultsResponse(BaseModel):
     provider: str
 
 
+class DeferredChatRequest(BaseModel):
+    """Nicht eiliger Chat: darf bis max_delay_s warten und läuft dann als Batch."""
+    request: ChatRequest
+    max_delay_s: float = Field(default=86400, gt=0)
+    webhook_url: Optional[str] = None
+
+
+class DeferredTicket(BaseModel):
+    id: str
+    status: Literal["queued", "submitted", "sync", "completed", "failed"]
+    model: str
+    provider: str
+    max_delay_s: float
+    batch_id: Optional[str] = None
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
+
 # ─── Tier 3: Specialized ──────────────────────────────────────────
 
 class ModerationRequest(BaseModel):
@@ -11,8 +11,7 @@ import os
 from base import BaseProvider
 from models import (
     ChatRequest, ChatResponse, StreamChunk, TokenCountRequest,
-    TokenCountResponse, ModelDetail, EmbeddingRequest, EmbeddingResponse,
-    EmbeddingData, BatchCreateRequest, BatchStatus, BatchListResponse,
+    ModelDetail, BatchCreateRequest, BatchStatus, BatchListResponse,
     BatchResultsResponse, BatchResultItem, ModerationRequest,
     ModerationResponse, ModerationResult, AudioSpeechRequest,
     AudioResponse, ImageGenerationRequest, ImageResponse, ImageData,
@@ -29,6 +28,8 @@ class OpenAIProvider(BaseProvider):
         "audio_speech", "image_generation", "image_edit", "image_variation",
     ]
 
+    _embedding_model = "text-embedding-3-small"
+
     _features = {
         "tool_use": True, "vision": True, "web_search": False,
         "citations": False, "thinking": True, "cache_control": False,
@@ -205,8 +206,8 @@ class OpenAIProvider(BaseProvider):
 
     # ─── Tier 1: Token Count ───────────────────────────────────
 
-    async def count_tokens(self, request: TokenCountRequest) -> TokenCountResponse:
-        model = request.model or self.get_default_model()
+    async def _count_tokens_upstream(self, model: str, request: TokenCountRequest) -> int:
+        """Lokal per tiktoken — kein Upstream-Call, aber gecacht wie die anderen."""
         try:
             import tiktoken
             enc = tiktoken.encoding_for_model(model)
@@ -219,31 +220,23 @@ class OpenAIProvider(BaseProvider):
         if request.system:
             total += 4 + len(enc.encode(request.system))
         total += 2
-        return TokenCountResponse(input_tokens=total, model=model, provider=self.provider_name)
+        return total
 
     # ═══════════════════════════════════════════════════════════
     # TIER 2: EXTENDED
     # ═══════════════════════════════════════════════════════════
 
-    async def create_embedding(self, request: EmbeddingRequest) -> EmbeddingResponse:
-        await self._ensure_client()
-        model = request.model or self.config.get("embedding_model", "text-embedding-3-small")
-        payload = {"model": model, "input": request.input}
-        if request.encoding_format:
-            payload["encoding_format"] = request.encoding_format
-        if request.dimensions:
-            payload["dimensions"] = request.dimensions
+    async def _embed_upstream(self, model: str, texts: list[str],
+                              dimensions: int | None) -> tuple[list[list[float]], int]:
+        payload = {"model": model, "input": texts}
+        if dimensions:
+            payload["dimensions"] = dimensions
         resp = await self._client.post(
             self._get_endpoint("/embeddings"), headers=self._get_headers(), json=payload)
         resp.raise_for_status()
         raw = resp.json()
-        data = [EmbeddingData(index=i["index"], embedding=i["embedding"]) for i in raw.get("data", [])]
-        return EmbeddingResponse(
-            data=data, model=raw.get("model", model),
-            usage={"prompt_tokens": raw.get("usage", {}).get("prompt_tokens", 0),
-                   "total_tokens": raw.get("usage", {}).get("total_tokens", 0)},
-            provider=self.provider_name,
-        )
+        items = sorted(raw.get("data", []), key=lambda i: i["index"])
+        return [i["embedding"] for i in items], raw.get("usage", {}).get("prompt_tokens", 0)
 
     # ─── Batches ───────────────────────────────────────────────
 
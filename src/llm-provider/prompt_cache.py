@@ -0,0 +1,151 @@
+"""
+H.E.I.N.Z.E.L. Provider — Prompt-Caching (Anthropic cache_control)
+
+Heinzel-Turns schicken jedes Mal denselben grossen System-Prompt, dieselben
+Tool-Schemas und den bisherigen Gespraechsverlauf. Mit cache_control-
+Breakpoints rechnet Anthropic diesen Praefix beim naechsten Turn als
+Cache-Read ab (ca. 10% des Input-Preises, deutlich kuerzere Latenz).
+
+Breakpoints (max. 4 pro Request, Reihenfolge wie im Prompt):
+  tools    — letztes Tool-Schema: cacht alle Tools
+  system   — Ende des System-Prompts: cacht Tools + System
+  history  — letzter Block der letzten Message: cacht den ganzen Verlauf,
+             der naechste Turn liest ihn (erst ab der zweiten Message)
+
+Ein Breakpoint wird nur gesetzt, wenn der Praefix bis dorthin geschaetzt
+min_tokens erreicht — kuerzere Praefixe cacht Anthropic ohnehin nicht
+(Minimum 1024 Tokens, Haiku 2048).
+
+ChatRequest.cache_breakpoints waehlt pro Request: None = automatisch nach
+Config, [] = kein Caching, sonst die Liste der gewuenschten Breakpoints.
+
+Konfigurierbar per provider.yaml:
+  prompt_cache:
+    enabled: true
+    ttl: "5m"          # oder "1h" (teurere Writes, laengere Lebensdauer)
+    min_tokens: 1024
+    tools: true
+    system: true
+    history: true
+
+Cache-Read/-Write-Tokens landen in usage (cache_read_input_tokens,
+cache_creation_input_tokens) und in der costs-Tabelle.
+"""
+from typing import Optional
+
+from models import ChatRequest
+from rate_limit import estimate_payload_tokens
+
+
+# Defaults (ueberschreibbar via provider.yaml prompt_cache-Sektion)
+DEFAULT_PROMPT_CACHE_CONFIG = {
+    "enabled": True,
+    "ttl": "5m",
+    "min_tokens": 1024,
+    "tools": True,
+    "system": True,
+    "history": True,
+}
+
+BREAKPOINTS = ("tools", "system", "history")
+MAX_BREAKPOINTS = 4   # Anthropic-Limit pro Request
+
+
+def _get_prompt_cache_config(provider_config: dict) -> dict:
+    """Liest Prompt-Cache-Config aus provider.yaml, faellt auf Defaults zurueck."""
+    yaml_cfg = provider_config.get("prompt_cache") or {}
+    return {**DEFAULT_PROMPT_CACHE_CONFIG, **yaml_cfg}
+
+
+def choose_breakpoints(request: ChatRequest, cfg: dict) -> list[str]:
+    """Breakpoints fuer diesen Request — explizit aus dem Request oder automatisch."""
+    if request.cache_breakpoints is not None:
+        wanted = set(request.cache_breakpoints)
+    elif not cfg["enabled"]:
+        return []
+    else:
+        wanted = {b for b in BREAKPOINTS if cfg.get(b)}
+    chosen = []
+    if "tools" in wanted and request.tools:
+        chosen.append("tools")
+    if "system" in wanted and request.system:
+        chosen.append("system")
+    if "history" in wanted and len(request.messages) > 1:
+        chosen.append("history")
+    return chosen
+
+
+def _marker(ttl: str) -> dict:
+    return {"type": "ephemeral", "ttl": ttl} if ttl and ttl != "5m" else {"type": "ephemeral"}
+
+
+def _count_markers(payload: dict) -> int:
+    """Bereits vom Client gesetzte cache_control-Marker (zaehlen zum Limit)."""
+    n = sum(1 for t in payload.get("tools") or [] if "cache_control" in t)
+    system = payload.get("system")
+    if isinstance(system, list):
+        n += sum(1 for b in system if isinstance(b, dict) and "cache_control" in b)
+    for m in payload.get("messages", []):
+        if isinstance(m.get("content"), list):
+            n += sum(1 for b in m["content"] if isinstance(b, dict) and "cache_control" in b)
+    return n
+
+
+def apply_breakpoints(payload: dict, breakpoints: list[str], ttl: str = "5m",
+                      min_tokens: int = 0) -> list[str]:
+    """
+    cache_control-Marker in ein Anthropic-Payload setzen (in place, ohne die
+    Objekte des ChatRequest zu veraendern). Returns die gesetzten Breakpoints.
+    """
+    free = MAX_BREAKPOINTS - _count_markers(payload)
+    marker = _marker(ttl)
+    # Geschaetzte Praefix-Laenge bis einschliesslich des jeweiligen Breakpoints
+    prefix = {"tools": estimate_payload_tokens(payload.get("tools") or [])}
+    prefix["system"] = prefix["tools"] + estimate_payload_tokens(payload.get("system") or "")
+    prefix["history"] = prefix["system"] + estimate_payload_tokens(payload.get("messages") or [])
+    applied = []
+    for bp in breakpoints:
+        if free <= 0:
+            break
+        if prefix.get(bp, 0) < min_tokens:
+            continue
+        if bp == "tools" and payload.get("tools"):
+            tools = [dict(t) for t in payload["tools"]]
+            tools[-1]["cache_control"] = marker
+            payload["tools"] = tools
+        elif bp == "system" and payload.get("system"):
+            system = payload["system"]
+            if isinstance(system, str):
+                system = [{"type": "text", "text": system}]
+            system = [dict(b) for b in system]
+            system[-1]["cache_control"] = marker
+            payload["system"] = system
+        elif bp == "history" and payload.get("messages"):
+            last = dict(payload["messages"][-1])
+            content = last.get("content")
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            if not content:
+                continue
+            content = [dict(b) for b in content]
+            content[-1]["cache_control"] = marker
+            last["content"] = content
+            payload["messages"] = payload["messages"][:-1] + [last]
+        else:
+            continue
+        applied.append(bp)
+        free -= 1
+    return applied
+
+
+def cache_usage(usage: Optional[dict]) -> dict:
+    """Cache-Token-Zahlen aus einem usage-Dict als CostLogger-Argumente."""
+    usage = usage or {}
+    out = {}
+    read = int(usage.get("cache_read_input_tokens", 0) or 0)
+    write = int(usage.get("cache_creation_input_tokens", 0) or 0)
+    if read:
+        out["cache_read_tokens"] = read
+    if write:
+        out["cache_write_tokens"] = write
+    return out
@@ -13,7 +13,7 @@ from typing import AsyncGenerator, Optional
 from base import BaseProvider
 from models import (
     ChatRequest, ChatResponse, StreamChunk,
-    TokenCountRequest, TokenCountResponse,
+    TokenCountRequest,
 )
 
 
@@ -109,14 +109,11 @@ class TemplateProvider(BaseProvider):
     # OPTIONAL: Token-Zaehlung
     # ═══════════════════════════════════════
 
-    async def count_tokens(self, request: TokenCountRequest) -> TokenCountResponse:
+    async def _count_tokens_upstream(self, model: str, request: TokenCountRequest) -> int:
         """
-        Tokens zaehlen. Default-Implementierung: grobe Schaetzung (4 Zeichen = 1 Token).
-        Fuer echte Zaehlung: Provider-API nutzen.
+        Exakte Zaehlung ueber die Provider-API, Rueckgabe: input_tokens.
+        Ohne Override schaetzt BaseProvider lokal (Zeichen/4, kalibriert)
+        und antwortet mit source="estimate". Caching macht BaseProvider.
         """
-        total = sum(len(str(m.content)) // 4 for m in request.messages)
-        return TokenCountResponse(
-            input_tokens=total,
-            model=request.model or self.get_default_model(),
-            provider=self.provider_name,
-        )
+        # IMPLEMENT (optional): Zaehl-Endpoint des Providers aufrufen
+        self._not_impl("POST /tokens/count")
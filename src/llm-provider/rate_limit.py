@@ -0,0 +1,411 @@
+"""
+H.E.I.N.Z.E.L. Provider — Clientseitiges Rate-Limiting (proaktiv)
+
+Statt erst nach einem 429 mit Backoff zu reagieren, wartet der Gateway
+vorher: pro Modell ein Requests/Minute- und ein Tokens/Minute-Bucket plus
+adaptive Nebenlaeufigkeit (AIMD). Wartende werden in Ankunftsreihenfolge
+bedient — kein Ansturm von Retries.
+
+Konfigurierbar per provider.yaml:
+  rate_limit:
+    enabled: true
+    requests_per_minute: 0        # 0 = unbegrenzt (bis Header Limits liefern)
+    tokens_per_minute: 0
+    initial_concurrency: 64
+    min_concurrency: 1
+    max_concurrency: 256
+    increase_step: 1.0            # additiv: +step pro "Fenster" erfolgreicher Calls
+    decrease_factor: 0.5          # multiplikativ bei 429/529
+    decrease_cooldown_s: 1.0
+    use_headers: true             # Limits/Restkontingent aus Response-Headern
+    models:
+      claude-opus-4-6:
+        requests_per_minute: 50
+        tokens_per_minute: 40000
+
+Rate-Limit-Header (Anthropic: anthropic-ratelimit-*, OpenAI: x-ratelimit-*)
+korrigieren die Buckets: Restkontingent, Limit (falls nicht konfiguriert)
+und Reset-Zeitpunkt.
+"""
+import asyncio
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+
+# Defaults (ueberschreibbar via provider.yaml rate_limit-Sektion)
+DEFAULT_RATE_LIMIT_CONFIG = {
+    "enabled": True,
+    "requests_per_minute": 0,
+    "tokens_per_minute": 0,
+    "initial_concurrency": 64,
+    "min_concurrency": 1,
+    "max_concurrency": 256,
+    "increase_step": 1.0,
+    "decrease_factor": 0.5,
+    "decrease_cooldown_s": 1.0,
+    "use_headers": True,
+    "models": {},
+}
+
+OVERLOAD_STATUS = (429, 529)
+_IMAGE_TOKEN_ESTIMATE = 1600
+_BASE64_RE = re.compile(r"[A-Za-z0-9+/]+={0,2}")
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+
+def _get_rate_limit_config(provider_config: dict) -> dict:
+    """Liest Rate-Limit-Config aus provider.yaml, faellt auf Defaults zurueck."""
+    yaml_rl = provider_config.get("rate_limit") or {}
+    return {**DEFAULT_RATE_LIMIT_CONFIG, **yaml_rl}
+
+
+def estimate_payload_tokens(payload) -> int:
+    """
+    Grobe Input-Token-Schaetzung ohne Serialisierung: Text ~4 Zeichen/Token,
+    Base64-Blobs (Bilder, PDFs) pauschal. Wird nach der Antwort mit der
+    echten Usage verrechnet.
+    """
+    chars = 0
+    blobs = 0
+    stack = [payload]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, str):
+            if len(obj) >= 1024 and _BASE64_RE.fullmatch(obj.rpartition(",")[2]):
+                blobs += 1
+            else:
+                chars += len(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return chars // 4 + blobs * _IMAGE_TOKEN_ESTIMATE + 1
+
+
+def _parse_reset(value: Optional[str], now: float) -> Optional[float]:
+    """Reset-Header → Sekunden ab jetzt. RFC 3339 (Anthropic) oder "6m0s" (OpenAI)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(n) * scale[u] for n, u in parts)
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return max(0.0, ts.timestamp() - time.time())
+
+
+def _int_header(headers, *names) -> Optional[int]:
+    for name in names:
+        raw = headers.get(name)
+        if raw is not None:
+            try:
+                return int(float(raw))
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+def parse_rate_limit_headers(headers) -> dict:
+    """
+    Normalisiert Rate-Limit-Header beider Anbieter.
+    Returns: {"requests": (limit, remaining, reset_s), "tokens": (...),
+              "retry_after": s} — fehlende Werte None.
+    """
+    now = time.monotonic()
+    out = {}
+    for kind in ("requests", "tokens"):
+        limit = _int_header(headers, f"anthropic-ratelimit-{kind}-limit",
+                            f"x-ratelimit-limit-{kind}")
+        remaining = _int_header(headers, f"anthropic-ratelimit-{kind}-remaining",
+                                f"x-ratelimit-remaining-{kind}")
+        reset = _parse_reset(headers.get(f"anthropic-ratelimit-{kind}-reset")
+                             or headers.get(f"x-ratelimit-reset-{kind}"), now)
+        out[kind] = (limit, remaining, reset)
+    out["retry_after"] = _parse_reset(headers.get("retry-after"), now)
+    return out
+
+
+# =============================================================================
+# Bausteine
+# =============================================================================
+
+class TokenBucket:
+    """
+    Bucket mit Kapazitaet = Rate pro Minute, gleichmaessig nachgefuellt.
+    rate_per_min 0 = unbegrenzt, bis sync() ein Limit aus Headern lernt.
+    """
+
+    def __init__(self, rate_per_min: float, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.capacity = float(rate_per_min)
+        self.learned = False
+        self.tokens = self.capacity
+        self._stamp = clock()
+        self.blocked_until = 0.0
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self) -> None:
+        now = self._clock()
+        if not self.unlimited:
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self._stamp) * self.capacity / 60.0)
+        self._stamp = now
+
+    def wait_time(self, amount: float) -> float:
+        """Sekunden bis amount verfuegbar ist (0 = sofort)."""
+        now = self._clock()
+        blocked = max(0.0, self.blocked_until - now)
+        if self.unlimited:
+            return blocked
+        self._refill()
+        amount = min(amount, self.capacity)   # Uebergrosse Requests nicht aussperren
+        if self.tokens >= amount:
+            return blocked
+        return max(blocked, (amount - self.tokens) * 60.0 / self.capacity)
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Nachverrechnung (positiv = Rueckgabe, negativ = Nachbelastung)."""
+        if not self.unlimited:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+    def sync(self, limit: Optional[int], remaining: Optional[int],
+             reset_s: Optional[float]) -> None:
+        """Stand aus Upstream-Headern uebernehmen — der Server zaehlt alle Clients."""
+        now = self._clock()
+        if limit and (self.unlimited or self.learned):
+            self.capacity = float(limit)
+            self.learned = True
+        if remaining is not None and not self.unlimited:
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining))
+        if remaining == 0 and reset_s:
+            self.block(now + reset_s)
+
+    def block(self, until: float) -> None:
+        self.blocked_until = max(self.blocked_until, until)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD-Limit fuer gleichzeitige Calls mit FIFO-Warteschlange.
+    Erfolg: limit += step / limit (ca. +step pro Fenster), Ueberlast: limit *= factor.
+    """
+
+    def __init__(self, initial: float, minimum: float, maximum: float,
+                 step: float = 1.0, factor: float = 0.5, cooldown_s: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.minimum = max(1.0, float(minimum))
+        self.maximum = max(self.minimum, float(maximum))
+        self.limit = min(self.maximum, max(self.minimum, float(initial)))
+        self.step = step
+        self.factor = factor
+        self.cooldown_s = cooldown_s
+        self._clock = clock
+        self._last_decrease = float("-inf")
+        self.in_flight = 0
+        self.decreases = 0
+        self._waiters: deque = deque()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for f in self._waiters if not f.done())
+
+    async def acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(None)   # Slot wurde schon vergeben → weiterreichen
+            else:
+                self._waiters.remove(fut)
+            raise
+
+    def release(self, outcome: Optional[str]) -> None:
+        """outcome: "ok" | "overload" | None (neutral, z.B. anderer Fehler)."""
+        self.in_flight -= 1
+        if outcome == "ok":
+            self.limit = min(self.maximum, self.limit + self.step / self.limit)
+        elif outcome == "overload":
+            self.on_overload()
+        self._wake()
+
+    def on_overload(self) -> None:
+        now = self._clock()
+        if now - self._last_decrease >= self.cooldown_s:
+            self.limit = max(self.minimum, self.limit * self.factor)
+            self._last_decrease = now
+            self.decreases += 1
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(None)
+
+
+# =============================================================================
+# Pro Modell
+# =============================================================================
+
+class Permit:
+    """Erlaubnis fuer einen Upstream-Call. observe() mit der Response aufrufen."""
+
+    __slots__ = ("model", "reserved", "outcome")
+
+    def __init__(self, model: "ModelLimiter", reserved: int):
+        self.model = model
+        self.reserved = reserved
+        self.outcome: Optional[str] = None
+
+    def observe(self, response) -> None:
+        """Header auswerten, 429/529 als Ueberlast melden."""
+        status = getattr(response, "status_code", 0)
+        headers = getattr(response, "headers", None)
+        info = parse_rate_limit_headers(headers) if headers is not None else {}
+        if info and self.model.use_headers:
+            self.model.requests.sync(*info["requests"])
+            self.model.tokens.sync(*info["tokens"])
+        if status in OVERLOAD_STATUS:
+            self.outcome = "overload"
+            self.model.on_overload(info.get("retry_after"))
+        elif status and status < 400:
+            self.outcome = "ok"
+
+    def settle(self, used_tokens: int) -> None:
+        """Reservierung mit der echten Usage verrechnen."""
+        if used_tokens:
+            self.model.tokens.adjust(self.reserved - used_tokens)
+            self.reserved = used_tokens
+
+
+class ModelLimiter:
+    """RPM/TPM-Buckets und AIMD-Nebenlaeufigkeit fuer ein Modell."""
+
+    def __init__(self, cfg: dict, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.use_headers = bool(cfg["use_headers"])
+        self.requests = TokenBucket(cfg["requests_per_minute"], clock)
+        self.tokens = TokenBucket(cfg["tokens_per_minute"], clock)
+        self.concurrency = AdaptiveConcurrency(
+            cfg["initial_concurrency"], cfg["min_concurrency"], cfg["max_concurrency"],
+            step=cfg["increase_step"], factor=cfg["decrease_factor"],
+            cooldown_s=cfg["decrease_cooldown_s"], clock=clock)
+        self._admission = asyncio.Lock()   # FIFO: Wartende der Reihe nach
+        self.admitted = 0
+        self.throttled = 0
+        self.overloads = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    async def acquire(self, est_tokens: int) -> Permit:
+        start = self._clock()
+        async with self._admission:
+            while True:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(est_tokens))
+                if wait <= 0:
+                    break
+                self.throttled += 1
+                await asyncio.sleep(wait)
+            self.requests.take(1)
+            self.tokens.take(est_tokens)
+        await self.concurrency.acquire()
+        waited = (self._clock() - start) * 1000
+        self.admitted += 1
+        self.wait_ms_total += waited
+        self.wait_ms_max = max(self.wait_ms_max, waited)
+        return Permit(self, est_tokens)
+
+    def on_overload(self, retry_after: Optional[float]) -> None:
+        self.overloads += 1
+        self.concurrency.on_overload()
+        pause = retry_after if retry_after else 1.0
+        until = self._clock() + pause
+        self.requests.block(until)
+        self.tokens.block(until)
+
+    def stats(self) -> dict:
+        c = self.concurrency
+        return {
+            "concurrency_limit": round(c.limit, 2),
+            "in_flight": c.in_flight,
+            "queued": c.queued,
+            "concurrency_decreases": c.decreases,
+            "requests_per_minute": self.requests.capacity or None,
+            "requests_available": None if self.requests.unlimited else round(self.requests.tokens, 1),
+            "tokens_per_minute": self.tokens.capacity or None,
+            "tokens_available": None if self.tokens.unlimited else round(self.tokens.tokens),
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "overloads": self.overloads,
+            "wait_ms_avg": round(self.wait_ms_total / self.admitted, 2) if self.admitted else 0.0,
+            "wait_ms_max": round(self.wait_ms_max, 2),
+        }
+
+
+class RateLimiter:
+    """Ein ModelLimiter pro Modell; Modell-Overrides aus rate_limit.models."""
+
+    def __init__(self, provider_config: dict, clock: Callable[[], float] = time.monotonic):
+        self._cfg = _get_rate_limit_config(provider_config)
+        self._clock = clock
+        self._models: dict[str, ModelLimiter] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._cfg["enabled"])
+
+    def for_model(self, model: str) -> ModelLimiter:
+        limiter = self._models.get(model)
+        if limiter is None:
+            overrides = (self._cfg.get("models") or {}).get(model) or {}
+            limiter = self._models[model] = ModelLimiter({**self._cfg, **overrides}, self._clock)
+        return limiter
+
+    @asynccontextmanager
+    async def acquire(self, model: str, payload=None):
+        """
+        Slot fuer einen Upstream-Call. Im Block permit.observe(resp) aufrufen.
+        Deaktiviert: liefert None ohne zu warten.
+        """
+        if not self.enabled:
+            yield None
+            return
+        limiter = self.for_model(model)
+        permit = await limiter.acquire(estimate_payload_tokens(payload) if payload else 1)
+        try:
+            yield permit
+        finally:
+            limiter.concurrency.release(permit.outcome)
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled,
+                "models": {m: l.stats() for m, l in self._models.items()}}
@@ -0,0 +1,271 @@
+"""
+H.E.I.N.Z.E.L. Provider — Response-Cache fuer deterministische /chat-Requests
+
+Exakter Treffer ueber einen kanonischen Hash aus Modell, System-Prompt,
+Messages, Tools und Sampling-Parametern. Nur Requests mit temperature
+None/0 (bzw. <= max_temperature) sind cachebar; ChatRequest.bypass_cache
+umgeht den Cache fuer einzelne Requests (weder lesen noch schreiben).
+
+Zwei Stufen:
+  memory  — LRU im Prozess (max_entries), TTL pro Eintrag
+  sqlite  — persistent ueber Neustarts (sqlite_max_entries, LRU nach
+            letztem Zugriff), Treffer werden in memory hochgezogen
+
+Opt-in per provider.yaml:
+  response_cache:
+    enabled: false
+    ttl_s: 3600
+    max_entries: 1000
+    sqlite: true
+    sqlite_path: null             # Default: $LOG_DIR/response_cache.db
+    sqlite_max_entries: 10000
+    max_temperature: 0.0
+
+Treffer werden in der costs-Tabelle mit status "cache_hit" und 0 Tokens
+verbucht — es gab keinen Upstream-Call. Die eingesparten Tokens zaehlt
+stats["tokens_saved"].
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from models import ChatRequest, ChatResponse
+
+
+# Defaults (ueberschreibbar via provider.yaml response_cache-Sektion)
+DEFAULT_CACHE_CONFIG = {
+    "enabled": False,
+    "ttl_s": 3600,
+    "max_entries": 1000,
+    "sqlite": True,
+    "sqlite_path": None,
+    "sqlite_max_entries": 10000,
+    "max_temperature": 0.0,
+}
+
+CACHE_HIT_STATUS = "cache_hit"
+
+CREATE_CACHE_SQL = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    key         TEXT PRIMARY KEY,
+    response    TEXT NOT NULL,
+    expires_at  REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+
+_PRUNE_EVERY = 100   # SQLite-LRU nach so vielen Schreibvorgaengen kuerzen
+
+
+def _get_cache_config(provider_config: dict) -> dict:
+    """Liest Cache-Config aus provider.yaml, faellt auf Defaults zurueck."""
+    yaml_cache = provider_config.get("response_cache") or {}
+    return {**DEFAULT_CACHE_CONFIG, **yaml_cache}
+
+
+def cache_key(provider: str, model: str, request: ChatRequest) -> str:
+    """Kanonischer SHA-256 ueber alle Felder, die die Antwort bestimmen."""
+    canonical = {
+        "provider": provider,
+        "model": model,
+        "system": request.system,
+        "messages": [m.model_dump(exclude_none=True) for m in request.messages],
+        "tools": request.tools,
+        "max_tokens": request.max_tokens,
+        "temperature": request.temperature,
+        "top_p": request.top_p,
+        "stop_sequences": request.stop_sequences,
+    }
+    raw = json.dumps(canonical, sort_keys=True, separators=(",", ":"),
+                     ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Memory-LRU vor optionaler SQLite-Stufe. Fehler der SQLite-Stufe sind nie fatal."""
+
+    def __init__(self, provider_name: str, provider_config: dict,
+                 data_dir: Optional[str] = None):
+        cfg = _get_cache_config(provider_config)
+        self.provider_name = provider_name
+        self.enabled = bool(cfg["enabled"])
+        self.ttl_s = float(cfg["ttl_s"])
+        self.max_entries = max(1, int(cfg["max_entries"]))
+        self.max_temperature = float(cfg["max_temperature"])
+        self.sqlite_max_entries = max(1, int(cfg["sqlite_max_entries"]))
+        self._sqlite_path = None
+        if cfg["sqlite"]:
+            self._sqlite_path = cfg["sqlite_path"] or os.path.join(
+                data_dir or os.environ.get("LOG_DIR", "/data"), "response_cache.db")
+        self._memory: "OrderedDict[str, tuple[float, ChatResponse]]" = OrderedDict()
+        self._conn = None
+        self._open_lock = asyncio.Lock()
+        self._writes = 0
+        self._stats = {
+            "hits_memory": 0, "hits_sqlite": 0, "misses": 0, "stores": 0,
+            "evictions": 0, "expired": 0, "bypassed": 0, "uncacheable": 0,
+            "tokens_saved": 0, "sqlite_errors": 0,
+        }
+
+    @property
+    def stats(self) -> dict:
+        s = dict(self._stats)
+        lookups = s["hits_memory"] + s["hits_sqlite"] + s["misses"]
+        s["hit_rate"] = round((s["hits_memory"] + s["hits_sqlite"]) / lookups, 4) if lookups else 0.0
+        s["entries_memory"] = len(self._memory)
+        s["enabled"] = self.enabled
+        s["sqlite"] = self._sqlite_path
+        return s
+
+    def key_for(self, model: str, request: ChatRequest) -> Optional[str]:
+        """Cache-Key oder None, wenn der Request nicht gecacht werden darf."""
+        if not self.enabled:
+            return None
+        if request.bypass_cache:
+            self._stats["bypassed"] += 1
+            return None
+        if (request.temperature or 0.0) > self.max_temperature:
+            self._stats["uncacheable"] += 1
+            return None
+        return cache_key(self.provider_name, model, request)
+
+    async def get(self, key: str) -> Optional[ChatResponse]:
+        now = time.time()
+        hit = self._memory.get(key)
+        if hit is not None:
+            expires_at, response = hit
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self._stats["hits_memory"] += 1
+                self._count_saved(response)
+                return response.model_copy(deep=True)
+            del self._memory[key]
+            self._stats["expired"] += 1
+        response, expires_at = await self._sqlite_get(key, now)
+        if response is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits_sqlite"] += 1
+        self._count_saved(response)
+        self._remember(key, expires_at, response)
+        return response.model_copy(deep=True)
+
+    async def put(self, key: str, response: ChatResponse) -> None:
+        expires_at = time.time() + self.ttl_s
+        response = response.model_copy(deep=True)
+        self._remember(key, expires_at, response)
+        self._stats["stores"] += 1
+        await self._sqlite_put(key, response, expires_at)
+
+    async def clear(self) -> None:
+        self._memory.clear()
+        conn = await self._connection()
+        if conn is not None:
+            try:
+                await conn.execute("DELETE FROM response_cache")
+                await conn.commit()
+            except Exception as e:
+                self._sqlite_failed(e)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            try:
+                await conn.close()
+            except Exception as e:
+                print(f"ResponseCache: Close fehlgeschlagen: {e}", file=sys.stderr)
+
+    # ─── intern ────────────────────────────────────────────────
+
+    def _count_saved(self, response: ChatResponse) -> None:
+        usage = response.usage or {}
+        self._stats["tokens_saved"] += int(usage.get("input_tokens", 0) or 0) \
+            + int(usage.get("output_tokens", 0) or 0)
+
+    def _remember(self, key: str, expires_at: float, response: ChatResponse) -> None:
+        self._memory[key] = (expires_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    async def _connection(self):
+        if self._sqlite_path is None:
+            return None
+        if self._conn is not None:
+            return self._conn
+        async with self._open_lock:
+            if self._conn is None and self._sqlite_path is not None:
+                try:
+                    import aiosqlite
+                    os.makedirs(os.path.dirname(self._sqlite_path) or ".", exist_ok=True)
+                    conn = await aiosqlite.connect(self._sqlite_path)
+                    await conn.execute("PRAGMA journal_mode=WAL")
+                    await conn.execute("PRAGMA synchronous=NORMAL")
+                    await conn.execute(CREATE_CACHE_SQL)
+                    await conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_access "
+                                       "ON response_cache (last_access)")
+                    await conn.commit()
+                    self._conn = conn
+                except Exception as e:
+                    print(f"ResponseCache: SQLite Fehler, nur Memory-Stufe: {e}",
+                          file=sys.stderr)
+                    self._sqlite_path = None
+        return self._conn
+
+    async def _sqlite_get(self, key: str, now: float):
+        conn = await self._connection()
+        if conn is None:
+            return None, 0.0
+        try:
+            async with conn.execute(
+                    "SELECT response, expires_at FROM response_cache WHERE key = ?",
+                    (key,)) as cur:
+                row = await cur.fetchone()
+            if row is None:
+                return None, 0.0
+            if row[1] <= now:
+                await conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                await conn.commit()
+                self._stats["expired"] += 1
+                return None, 0.0
+            await conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?",
+                               (now, key))
+            await conn.commit()
+            return ChatResponse.model_validate_json(row[0]), row[1]
+        except Exception as e:
+            self._sqlite_failed(e)
+            return None, 0.0
+
+    async def _sqlite_put(self, key: str, response: ChatResponse, expires_at: float) -> None:
+        conn = await self._connection()
+        if conn is None:
+            return
+        try:
+            await conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, response, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?)", (key, response.model_dump_json(), expires_at, time.time()))
+            self._writes += 1
+            if self._writes % _PRUNE_EVERY == 0:
+                await self._sqlite_prune(conn)
+            await conn.commit()
+        except Exception as e:
+            self._sqlite_failed(e)
+
+    async def _sqlite_prune(self, conn) -> None:
+        """Abgelaufene Eintraege loeschen, dann auf sqlite_max_entries (LRU) kuerzen."""
+        cur = await conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        self._stats["expired"] += max(0, cur.rowcount)
+        cur = await conn.execute(
+            "DELETE FROM response_cache WHERE key IN (SELECT key FROM response_cache "
+            "ORDER BY last_access DESC LIMIT -1 OFFSET ?)", (self.sqlite_max_entries,))
+        self._stats["evictions"] += max(0, cur.rowcount)
+
+    def _sqlite_failed(self, e: Exception) -> None:
+        self._stats["sqlite_errors"] += 1
+        print(f"ResponseCache: SQLite-Fehler (nicht kritisch): {e}", file=sys.stderr)
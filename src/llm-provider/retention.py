@@ -6,15 +6,42 @@ Policies (via instance.yaml):
   log_max_size_mb     — Gesamtgroesse begrenzen (aelteste zuerst)
   log_compress        — gzip statt loeschen
   metrics_max_age_days — Metriken-Eintraege aelter als N Tage aus DB loeschen
+
+Blobs (blobs/): geloescht wird nur, was keine verbliebene Log-Datei (auch
+.gz) mehr referenziert — unabhaengig vom Blob-Alter. blobs/ zaehlt zum
+Groessenlimit; faellt ein Log dem Limit zum Opfer, gehen seine nur dort
+referenzierten Blobs mit.
 """
-import glob, gzip, os, shutil, sys
+import glob, gzip, os, re, shutil, sys, time
+from collections import Counter
 from datetime import datetime, timedelta, timezone
 
+from logger import BLOB_DIR, BLOB_PREFIX, index_path
+
+# Frisch geschriebene Blobs schonen: der Background-Writer legt den Blob
+# an, bevor die referenzierende Log-Zeile auf der Platte steht.
+BLOB_GRACE_S = 3600
+_BLOB_REF_RE = re.compile(re.escape(BLOB_PREFIX.encode()) + rb"([0-9a-f]{64})")
+
 
 def _now():
     return datetime.now(timezone.utc)
 
 
+def _move_index(src, dst=None):
+    """Sidecar-Index mitziehen (Komprimierung) oder entfernen (Loeschung)."""
+    idx = index_path(src)
+    if not os.path.exists(idx):
+        return
+    try:
+        if dst:
+            os.replace(idx, index_path(dst))
+        else:
+            os.remove(idx)
+    except OSError as e:
+        print(f"Retention: Index-Fehler {idx}: {e}", file=sys.stderr)
+
+
 def cleanup_logs(log_dir, max_age_days=30, max_size_mb=500, compress=True):
     """
     Bereinigt JSONL-Logs in log_dir.
@@ -39,6 +66,7 @@ def cleanup_logs(log_dir, max_age_days=30, max_size_mb=500, compress=True):
                 with open(filepath, "rb") as fin, gzip.open(gz_path, "wb") as fout:
                     shutil.copyfileobj(fin, fout)
                 os.remove(filepath)
+                _move_index(filepath, gz_path)   # Offsets gelten im entpackten Strom
                 gz_size = os.path.getsize(gz_path)
                 freed_bytes += size - gz_size
                 compressed += 1
@@ -49,13 +77,23 @@ def cleanup_logs(log_dir, max_age_days=30, max_size_mb=500, compress=True):
         else:
             try:
                 os.remove(filepath)
+                _move_index(filepath)
                 freed_bytes += size
                 deleted += 1
                 print(f"Retention: geloescht {os.path.basename(filepath)}", file=sys.stderr)
             except Exception as e:
                 print(f"Retention: Loeschfehler {filepath}: {e}", file=sys.stderr)
 
-    # Groessenlimit: aelteste zuerst entfernen
+    # Blobs: Referenzen der verbliebenen Logs zaehlen, Unreferenziertes weg
+    blobs = _blob_files(log_dir)
+    refs = _blob_refs_by_file(log_dir) if blobs else {}
+    if refs is None:
+        blobs = {}      # Log nicht lesbar → Referenzen unbekannt, nichts loeschen
+        refs = {}
+    counts = Counter(d for digests in refs.values() for d in digests)
+    freed_bytes += _drop_unreferenced(blobs, counts, list(blobs))
+
+    # Groessenlimit (Logs + blobs/): aelteste Logs zuerst entfernen
     if max_size_mb > 0:
         active = sorted(
             [f for f in glob.glob(os.path.join(log_dir, "*.jsonl*"))
@@ -63,6 +101,7 @@ def cleanup_logs(log_dir, max_age_days=30, max_size_mb=500, compress=True):
             key=os.path.getmtime
         )
         total = sum(os.path.getsize(f) for f in active)
+        total += sum(size for _, size, _ in blobs.values())
         limit = max_size_mb * 1024 * 1024
         for filepath in active:
             if total <= limit:
@@ -70,17 +109,77 @@ def cleanup_logs(log_dir, max_age_days=30, max_size_mb=500, compress=True):
             size = os.path.getsize(filepath)
             try:
                 os.remove(filepath)
+                _move_index(filepath)
                 freed_bytes += size
                 total -= size
                 deleted += 1
                 print(f"Retention (size): geloescht {os.path.basename(filepath)}", file=sys.stderr)
             except Exception as e:
                 print(f"Retention: Fehler {filepath}: {e}", file=sys.stderr)
+                continue
+            released = refs.pop(filepath, set())
+            counts.subtract(released)
+            blob_freed = _drop_unreferenced(blobs, counts, released)
+            freed_bytes += blob_freed
+            total -= blob_freed
 
     return {"compressed": compressed, "deleted": deleted,
             "freed_mb": round(freed_bytes / (1024 * 1024), 2)}
 
 
+def _blob_files(log_dir):
+    """{digest: (pfad, groesse, mtime)} aller Blobs."""
+    blobs = {}
+    for path in glob.glob(os.path.join(log_dir, BLOB_DIR, "*", "*")):
+        if path.endswith(".tmp"):
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        blobs[os.path.basename(path)] = (path, st.st_size, st.st_mtime)
+    return blobs
+
+
+def _blob_refs_by_file(log_dir):
+    """{log-datei: referenzierte Digests} oder None, wenn ein Log nicht lesbar ist."""
+    refs = {}
+    for filepath in glob.glob(os.path.join(log_dir, "*.jsonl*")):
+        opener = gzip.open if filepath.endswith(".gz") else open
+        found = set()
+        try:
+            with opener(filepath, "rb") as f:
+                for line in f:
+                    found.update(d.decode() for d in _BLOB_REF_RE.findall(line))
+        except (OSError, EOFError) as e:
+            print(f"Retention: Blob-Referenzen aus {filepath} nicht lesbar, "
+                  f"Blobs bleiben: {e}", file=sys.stderr)
+            return None
+        refs[filepath] = found
+    return refs
+
+
+def _drop_unreferenced(blobs, counts, digests):
+    """Blobs ohne Referenz (und aelter als BLOB_GRACE_S) loeschen. Returns freie Bytes."""
+    freed = 0
+    grace_cutoff = time.time() - BLOB_GRACE_S
+    for digest in digests:
+        entry = blobs.get(digest)
+        if entry is None or counts[digest] > 0:
+            continue
+        path, size, mtime = entry
+        if mtime >= grace_cutoff:
+            continue
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Retention: Blob-Fehler {path}: {e}", file=sys.stderr)
+            continue
+        del blobs[digest]
+        freed += size
+    return freed
+
+
 async def cleanup_metrics_db(db_type, db_url, max_age_days=90):
     """
     Loescht Metriken-Eintraege aelter als max_age_days aus costs-Tabelle.
@@ -88,6 +187,8 @@ async def cleanup_metrics_db(db_type, db_url, max_age_days=90):
     """
     from datetime import timezone
     cutoff = (_now() - timedelta(days=max_age_days)).isoformat()
+    # Rollup-Buckets sind "YYYY-MM-DD HH:MM:SS" (UTC)
+    bucket_cutoff = (_now() - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
     deleted = 0
     try:
         if db_type == "sqlite":
@@ -95,6 +196,10 @@ async def cleanup_metrics_db(db_type, db_url, max_age_days=90):
             async with aiosqlite.connect(db_url) as db:
                 cur = await db.execute("DELETE FROM costs WHERE ts < ?", (cutoff,))
                 deleted = cur.rowcount
+                try:
+                    await db.execute("DELETE FROM costs_rollup WHERE bucket < ?", (bucket_cutoff,))
+                except Exception:
+                    pass  # Rollup-Tabelle noch nicht angelegt
                 await db.commit()
         elif db_type == "postgresql":
             import asyncpg
@@ -102,6 +207,10 @@ async def cleanup_metrics_db(db_type, db_url, max_age_days=90):
             async with pool.acquire() as conn:
                 result = await conn.execute("DELETE FROM costs WHERE ts < $1", cutoff)
                 deleted = int(result.split()[-1]) if result else 0
+                try:
+                    await conn.execute("DELETE FROM costs_rollup WHERE bucket < $1", bucket_cutoff)
+                except Exception:
+                    pass  # Rollup-Tabelle noch nicht angelegt
             await pool.close()
         print(f"Retention: {deleted} Metriken-Eintraege (>{max_age_days}d) geloescht", file=sys.stderr)
     except Exception as e:
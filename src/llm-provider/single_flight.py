@@ -0,0 +1,177 @@
+"""
+H.E.I.N.Z.E.L. Provider — Request-Coalescing (Single-Flight)
+
+Identische Requests, die gleichzeitig laufen (gleicher kanonischer Hash,
+siehe response_cache.cache_key), teilen sich einen Upstream-Call:
+
+  /chat         — der erste Request startet den Call als eigenen Task,
+                  alle weiteren warten auf dasselbe Ergebnis (oder denselben
+                  Fehler). Bricht der erste Client ab, laeuft der Call fuer
+                  die anderen weiter.
+  /chat/stream  — der Upstream-Stream wird in einen Puffer gepumpt; spaeter
+                  kommende Abonnenten bekommen die bisherigen Chunks als
+                  Replay und danach live. Verlassen alle Abonnenten den
+                  Stream, wird der Upstream-Stream abgebrochen.
+
+Geteilt werden nur deterministische Requests (temperature None/0 bzw.
+<= max_temperature, dieselbe Regel wie beim Response-Cache) — bei
+Sampling bekaeme sonst jeder Aufrufer dieselbe gezogene Antwort.
+
+Konfigurierbar per provider.yaml:
+  coalescing:
+    enabled: true
+    max_temperature: 0.0
+
+ChatRequest.bypass_cache schliesst einen Request auch vom Coalescing aus.
+"""
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+
+# Defaults (ueberschreibbar via provider.yaml coalescing-Sektion)
+DEFAULT_COALESCING_CONFIG = {
+    "enabled": True,
+    "max_temperature": 0.0,
+}
+
+COALESCED_STATUS = "coalesced"
+
+
+def _get_coalescing_config(provider_config: dict) -> dict:
+    """Liest Coalescing-Config aus provider.yaml, faellt auf Defaults zurueck."""
+    yaml_cfg = provider_config.get("coalescing") or {}
+    return {**DEFAULT_COALESCING_CONFIG, **yaml_cfg}
+
+
+class _Broadcast:
+    """Puffer eines laufenden Streams mit Replay fuer jeden Abonnenten."""
+
+    def __init__(self):
+        self.chunks: list = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.pump: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def push(self, chunk) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self) -> AsyncIterator:
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """Laufende Calls und Streams pro Key."""
+
+    def __init__(self, provider_config: Optional[dict] = None):
+        cfg = _get_coalescing_config(provider_config or {})
+        self.enabled = bool(cfg["enabled"])
+        self.max_temperature = float(cfg["max_temperature"])
+        self._calls: dict[str, asyncio.Task] = {}
+        self._streams: dict[str, _Broadcast] = {}
+        self._stats = {
+            "leaders": 0, "followers": 0,
+            "stream_leaders": 0, "stream_followers": 0, "streams_abandoned": 0,
+            "sampled": 0,
+        }
+
+    @property
+    def stats(self) -> dict:
+        s = dict(self._stats)
+        s["enabled"] = self.enabled
+        s["in_flight"] = len(self._calls)
+        s["streams_active"] = len(self._streams)
+        return s
+
+    def shareable(self, temperature: Optional[float]) -> bool:
+        """Nur deterministische Requests teilen (gleiche Regel wie ResponseCache.key_for)."""
+        if (temperature or 0.0) > self.max_temperature:
+            self._stats["sampled"] += 1
+            return False
+        return True
+
+    # ─── /chat ─────────────────────────────────────────────────
+
+    def running(self, key: str) -> Optional[asyncio.Task]:
+        """Laufender Call fuer key (zum Anhaengen) oder None."""
+        task = self._calls.get(key)
+        if task is not None and not task.done():
+            self._stats["followers"] += 1
+            return task
+        return None
+
+    def start(self, key: str, fn: Callable[[], Awaitable]) -> asyncio.Task:
+        """Call als eigenen Task starten — unabhaengig vom Client, der ihn ausloest."""
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        self._stats["leaders"] += 1
+
+        def _done(t: asyncio.Task):
+            if self._calls.get(key) is t:
+                del self._calls[key]
+            if not t.cancelled():
+                t.exception()   # als abgeholt markieren, auch ohne Wartende
+        task.add_done_callback(_done)
+        return task
+
+    # ─── /chat/stream ──────────────────────────────────────────
+
+    def subscribe(self, key: str, gen_fn: Callable[[], AsyncIterator]) -> tuple[bool, AsyncIterator]:
+        """
+        An laufenden Stream anhaengen (Replay + live) oder neuen starten.
+        Returns (angehaengt, Chunk-Iterator).
+        """
+        bc = self._streams.get(key)
+        attached = bc is not None
+        if attached:
+            self._stats["stream_followers"] += 1
+        else:
+            bc = self._streams[key] = _Broadcast()
+            bc.pump = asyncio.ensure_future(self._pump(key, bc, gen_fn))
+            self._stats["stream_leaders"] += 1
+        bc.subscribers += 1   # sofort zaehlen — sonst koennte ein Abgang dazwischen abbrechen
+        return attached, self._follow(key, bc)
+
+    async def _follow(self, key: str, bc: _Broadcast) -> AsyncIterator:
+        try:
+            async for chunk in bc.follow():
+                yield chunk
+        finally:
+            bc.subscribers -= 1
+            if bc.subscribers == 0 and not bc.done:
+                self._stats["streams_abandoned"] += 1
+                if self._streams.get(key) is bc:
+                    del self._streams[key]
+                bc.pump.cancel()
+
+    async def _pump(self, key: str, bc: _Broadcast, gen_fn) -> None:
+        gen = gen_fn()
+        try:
+            async for chunk in gen:
+                bc.push(chunk)
+        except Exception as e:
+            bc.error = e
+        finally:
+            await gen.aclose()
+            if self._streams.get(key) is bc:
+                del self._streams[key]
+            bc.finish()
@@ -0,0 +1,277 @@
+"""
+H.E.I.N.Z.E.L. Provider — Token-Count-Cache mit lokaler Schaetzung
+
+Core moechte vor jedem Turn zaehlen — ein Upstream-Call pro /tokens/count
+kostet dabei jedes Mal einen Netzwerk-Roundtrip im Hot-Path. Der
+TokenCounter vermeidet ihn auf drei Stufen:
+
+  1. Praefix-Kette: Schluessel k0 = sha256(provider, model, system, tools),
+     k_i = sha256(k_{i-1}, message_i). Jede exakte Zaehlung wird unter k_n
+     abgelegt — derselbe Request kommt aus dem Cache ("cache").
+  2. Pro-Message-Zaehlung: Liegt ein Praefix k_i im Cache, zaehlt nur der
+     neue Schwanz. Die Differenz exakter Zaehlungen ergibt die Tokens der
+     neuen Messages; sie werden pro Message-Hash gemerkt und summiert.
+  3. Lokale Schaetzung: Zeichen/4 (rate_limit.estimate_payload_tokens) mal
+     Korrekturfaktor, der aus jeder exakten Zaehlung nachgefuehrt wird.
+
+TokenCountRequest.allow_estimate=True (Hot-Path): nie Upstream im Request —
+Praefix + Schwanz-Summe bzw. Schaetzung, die exakte Zaehlung laeuft im
+Hintergrund nach und fuellt die Kette fuer den naechsten Turn. Ohne
+allow_estimate wird exakt gezaehlt (Cache oder Upstream); Provider ohne
+Zaehl-API liefern die kalibrierte Schaetzung (source="estimate").
+
+Konfigurierbar per provider.yaml:
+  token_count:
+    cache: true
+    max_entries: 50000
+    message_overhead: 4        # Rahmen-Tokens pro Message (Rolle, Trenner)
+    background_refresh: true
+    estimate_factor: 1.0       # Start-Korrekturfaktor der Schaetzung
+    alpha: 0.3                 # Glaettung des Faktors
+"""
+import asyncio
+import hashlib
+import json
+import sys
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from models import TokenCountRequest
+from rate_limit import estimate_payload_tokens
+
+
+# Defaults (ueberschreibbar via provider.yaml token_count-Sektion)
+DEFAULT_TOKEN_COUNT_CONFIG = {
+    "cache": True,
+    "max_entries": 50000,
+    "message_overhead": 4,
+    "background_refresh": True,
+    "estimate_factor": 1.0,
+    "alpha": 0.3,
+}
+
+_MIN_FACTOR = 0.25   # Ausreisser duerfen die Schaetzung nicht kippen
+_MAX_FACTOR = 4.0
+
+# source-Werte der TokenCountResponse
+SOURCE_UPSTREAM = "upstream"
+SOURCE_CACHE = "cache"
+SOURCE_SUMMED = "summed"
+SOURCE_ESTIMATE = "estimate"
+
+
+def _get_token_count_config(provider_config: dict) -> dict:
+    """Liest Token-Count-Config aus provider.yaml, faellt auf Defaults zurueck."""
+    yaml_cfg = provider_config.get("token_count") or {}
+    return {**DEFAULT_TOKEN_COUNT_CONFIG, **yaml_cfg}
+
+
+def _digest(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode())
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def prefix_keys(provider: str, model: str, request: TokenCountRequest) -> list[str]:
+    """Kette k0..k_n: k0 deckt System + Tools ab, k_i zusaetzlich Message i."""
+    keys = [_digest(provider, model, request.system or "", request.tools or [])]
+    for m in request.messages:
+        keys.append(_digest(keys[-1], m.model_dump(mode="json")))
+    return keys
+
+
+def message_key(provider: str, model: str, message) -> str:
+    return _digest(provider, model, message.model_dump(mode="json"))
+
+
+class TokenCounter:
+    """
+    Cache + Schaetzer vor der Zaehl-API eines Providers.
+    count_fn(model, request) -> int zaehlt exakt und wirft
+    EndpointNotAvailable, wenn der Provider nicht zaehlen kann.
+    """
+
+    def __init__(self, provider_name: str, config: dict,
+                 count_fn: Callable[[str, TokenCountRequest], Awaitable[int]],
+                 unavailable: tuple = ()):
+        cfg = _get_token_count_config(config)
+        self.provider_name = provider_name
+        self.enabled = bool(cfg["cache"])
+        self.max_entries = max(1, int(cfg["max_entries"]))
+        self.message_overhead = int(cfg["message_overhead"])
+        self.background_refresh = bool(cfg["background_refresh"])
+        self.alpha = float(cfg["alpha"])
+        self.factor = float(cfg["estimate_factor"])
+        self._count_fn = count_fn
+        self._unavailable = unavailable      # Exceptions = "Provider zaehlt nicht"
+        self._has_api = True
+        self._totals: "OrderedDict[str, int]" = OrderedDict()     # Praefix-Kette
+        self._messages: "OrderedDict[str, int]" = OrderedDict()   # Tokens pro Message
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._stats = {"requests": 0, "cache_hits": 0, "summed": 0, "estimated": 0,
+                       "upstream_calls": 0, "background_refreshes": 0,
+                       "calibration_samples": 0}
+
+    async def count(self, model: str, request: TokenCountRequest) -> tuple[int, str]:
+        """Tokens des Requests → (input_tokens, source)."""
+        self._stats["requests"] += 1
+        if not self.enabled:
+            return await self._upstream_or_estimate(model, request, None)
+        keys = prefix_keys(self.provider_name, model, request)
+        exact = self._get(self._totals, keys[-1])
+        if exact is not None:
+            self._stats["cache_hits"] += 1
+            return exact, SOURCE_CACHE
+        prefix = self._longest_prefix(keys)
+        if request.allow_estimate:
+            total, source = self._local(model, request, prefix)
+            if self._has_api and self.background_refresh:
+                self._refresh(model, request, keys, prefix)
+            return total, source
+        return await self._upstream_or_estimate(model, request, keys, prefix)
+
+    @property
+    def stats(self) -> dict:
+        s = dict(self._stats)
+        served = s["requests"]
+        s["upstream_avoided_rate"] = (
+            round(1 - s["upstream_calls"] / served, 4) if served else 0.0)
+        s["estimate_factor"] = round(self.factor, 4)
+        s["has_count_api"] = self._has_api
+        s["cached_prefixes"] = len(self._totals)
+        s["cached_messages"] = len(self._messages)
+        return s
+
+    async def close(self) -> None:
+        tasks = list(self._refreshing.values())
+        for t in tasks:
+            t.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._refreshing.clear()
+
+    # ─── Upstream ──────────────────────────────────────────────
+
+    async def _upstream_or_estimate(self, model: str, request: TokenCountRequest,
+                                    keys: Optional[list[str]],
+                                    prefix: Optional[tuple[int, int]] = None) -> tuple[int, str]:
+        if self._has_api:
+            try:
+                self._stats["upstream_calls"] += 1
+                total = await self._upstream(model, request, keys, prefix)
+                return total, SOURCE_UPSTREAM
+            except self._unavailable:
+                self._has_api = False
+                print(f"TokenCount: {self.provider_name} hat keine Zaehl-API — "
+                      f"lokale Schaetzung", file=sys.stderr)
+        total, _ = self._local(model, request, prefix)
+        return total, SOURCE_ESTIMATE
+
+    async def _upstream(self, model: str, request: TokenCountRequest,
+                        keys: Optional[list[str]], prefix: Optional[tuple[int, int]]) -> int:
+        total = int(await self._count_fn(model, request))
+        if keys is not None:
+            self._learn(model, request, keys, prefix, total)
+        return total
+
+    def _refresh(self, model: str, request: TokenCountRequest, keys: list[str],
+                 prefix: Optional[tuple[int, int]]) -> None:
+        """Exakte Zaehlung im Hintergrund — fuellt die Kette fuer den naechsten Turn."""
+        key = keys[-1]
+        if key in self._refreshing:
+            return
+        self._stats["background_refreshes"] += 1
+
+        async def run():
+            try:
+                await self._upstream(model, request, keys, prefix)
+            except self._unavailable:
+                self._has_api = False
+            except Exception as e:
+                print(f"TokenCount: Hintergrund-Zaehlung fehlgeschlagen: {e}", file=sys.stderr)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.ensure_future(run())
+
+    # ─── Cache / Schaetzung ────────────────────────────────────
+
+    def _longest_prefix(self, keys: list[str]) -> Optional[tuple[int, int]]:
+        """(Anzahl Messages im Praefix, Tokens) des laengsten bekannten Praefix."""
+        for i in range(len(keys) - 2, -1, -1):
+            total = self._get(self._totals, keys[i])
+            if total is not None:
+                return i, total
+        return None
+
+    @staticmethod
+    def _raw_message(message) -> int:
+        """Unkalibrierte Schaetzung des Message-Inhalts (ohne Rahmen)."""
+        return estimate_payload_tokens(message.model_dump(mode="json")["content"])
+
+    @staticmethod
+    def _raw_base(request: TokenCountRequest) -> int:
+        return estimate_payload_tokens(request.system or "") + estimate_payload_tokens(
+            request.tools or [])
+
+    def _estimate_message(self, message) -> int:
+        return round(self._raw_message(message) * self.factor) + self.message_overhead
+
+    def _local(self, model: str, request: TokenCountRequest,
+               prefix: Optional[tuple[int, int]]) -> tuple[int, str]:
+        """Bekannter Praefix + Summe der Schwanz-Messages (gemerkt oder geschaetzt)."""
+        start, total = prefix if prefix else (0, round(self._raw_base(request) * self.factor))
+        guessed = prefix is None
+        for m in request.messages[start:]:
+            known = self._get(self._messages, message_key(self.provider_name, model, m))
+            if known is None:
+                known = self._estimate_message(m)
+                guessed = True
+            total += known
+        if guessed:
+            self._stats["estimated"] += 1
+            return total, SOURCE_ESTIMATE
+        self._stats["summed"] += 1
+        return total, SOURCE_SUMMED
+
+    def _learn(self, model: str, request: TokenCountRequest, keys: list[str],
+               prefix: Optional[tuple[int, int]], total: int) -> None:
+        """Exakte Zaehlung merken, Schwanz auf Messages verteilen, Faktor nachfuehren."""
+        self._put(self._totals, keys[-1], total)
+        start, base = prefix if prefix else (0, 0)
+        tail = request.messages[start:]
+        raws = [self._raw_message(m) for m in tail]
+        local = sum(raws) + (self._raw_base(request) if prefix is None else 0)
+        self._calibrate(local, total - base - self.message_overhead * len(tail))
+        if prefix is None or not tail or total <= base:
+            return
+        # Schwanz anteilig nach Schaetzung auf die neuen Messages verteilen
+        weights = [r + self.message_overhead for r in raws]
+        for m, w in zip(tail, weights):
+            self._put(self._messages, message_key(self.provider_name, model, m),
+                      max(1, round((total - base) * w / sum(weights))))
+
+    def _calibrate(self, local: float, remote: float) -> None:
+        if local <= 0 or remote <= 0:
+            return
+        ratio = remote / local
+        if self._stats["calibration_samples"] == 0:
+            factor = ratio
+        else:
+            factor = (1 - self.alpha) * self.factor + self.alpha * ratio
+        self.factor = min(_MAX_FACTOR, max(_MIN_FACTOR, factor))
+        self._stats["calibration_samples"] += 1
+
+    def _get(self, store: OrderedDict, key: str) -> Optional[int]:
+        value = store.get(key)
+        if value is not None:
+            store.move_to_end(key)
+        return value
+
+    def _put(self, store: OrderedDict, key: str, value: int) -> None:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
@@ -208,3 +208,31 @@ def test_adapt_schema_replaces_autoincrement():
     adapted = _adapt_schema_for_postgres(SCHEMA_SQL)
     assert "SERIAL PRIMARY KEY" in adapted
     assert "AUTOINCREMENT" not in adapted
+
+
+# =============================================================================
+# Migration — Spalten für SqlSessionManager nachrüsten
+# =============================================================================
+
+
+@pytest.mark.asyncio
+async def test_migrate_ruestet_spalten_nach(tmp_path):
+    import aiosqlite
+
+    path = str(tmp_path / "alt.db")
+    async with aiosqlite.connect(path) as conn:
+        await conn.executescript(
+            "CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " heinzel_id TEXT NOT NULL);"
+            "CREATE TABLE exchanges (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " session_id INTEGER, role TEXT NOT NULL, content TEXT NOT NULL);"
+        )
+        await conn.commit()
+
+    addon = SQLiteAddOn(path=path)
+    await addon.on_attach(_FakeHeinzel())
+    cols = {r["name"] for r in await addon.fetch("PRAGMA table_info(sessions)")}
+    assert {"uid", "turn_count", "metadata"} <= cols
+    cols = {r["name"] for r in await addon.fetch("PRAGMA table_info(exchanges)")}
+    assert {"turn_id", "tokens_used"} <= cols
+    await addon.on_detach(_FakeHeinzel())
@@ -247,6 +247,22 @@ async def test_dispatch_strips_mention_before_llm():
     assert "asyncio" in call_text
 
 
+@pytest.mark.asyncio
+async def test_dispatch_nutzt_session_pro_channel():
+    """Jeder Channel laeuft in einer eigenen Runner-Session."""
+    addon = _make_addon()
+    runner = _make_runner()
+    addon._runner = runner
+
+    msg = MattermostMessage(
+        message_id="1", channel_id="channel-abc", user_id="u",
+        username="user", text="@heinzel-1 hallo"
+    )
+    await addon._dispatch(msg)
+
+    assert runner.chat.call_args.kwargs["session_id"] == "mattermost:channel-abc"
+
+
 @pytest.mark.asyncio
 async def test_dispatch_posts_reply():
     """Antwort vom runner wird in Mattermost gepostet."""
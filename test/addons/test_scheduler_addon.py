@@ -131,7 +131,7 @@ async def test_run_job_calls_runner_chat():
 
     job = ScheduledJob(name="t", schedule="* * * * *", prompt="Test-Prompt")
     await addon._run_job(job)
-    runner.chat.assert_called_once_with("Test-Prompt")
+    runner.chat.assert_called_once_with("Test-Prompt", session_id="scheduler:t")
 
 
 @pytest.mark.asyncio
@@ -178,7 +178,7 @@ async def test_loop_executes_due_job():
     """Job mit 'jede Minute' wird innerhalb 2s aufgerufen."""
     called = asyncio.Event()
 
-    async def fake_chat(prompt):
+    async def fake_chat(prompt, session_id=None):
         called.set()
         return "ok"
 
@@ -0,0 +1,247 @@
+"""Tests für SqlSessionManager — Persistenz, Write-Behind, Nachladen."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from addons.database import SQLiteAddOn, SqlSessionManager
+from addons.database.session_manager import _numeric_placeholders
+from core.exceptions import SessionNotFoundError
+from core.runner import LLMProvider, Runner
+from core.session import SessionStatus, Turn
+from core.tokens import CharRatioEstimator
+
+
+class _FakeHeinzel:
+    pass
+
+
+class _EchoProvider(LLMProvider):
+    async def chat(self, messages, system_prompt="", model="") -> str:
+        return "antwort"
+
+    async def stream(self, messages, system_prompt="", model=""):
+        yield "antwort"
+
+
+def _turn(session_id: str, i: int) -> Turn:
+    return Turn(session_id=session_id, raw_input=f"frage {i}", final_response=f"antwort {i}")
+
+
+@pytest.fixture
+async def db(tmp_path):
+    addon = SQLiteAddOn(path=str(tmp_path / "sessions.db"))
+    await addon.on_attach(_FakeHeinzel())
+    yield addon
+    await addon.on_detach(_FakeHeinzel())
+
+
+# =============================================================================
+# Write-Behind
+# =============================================================================
+
+
+@pytest.mark.asyncio
+async def test_add_turn_schreibt_nicht_sofort(db):
+    sm = SqlSessionManager(db, flush_interval_ms=10_000)
+    session = await sm.create_session("riker")
+    await sm.add_turn(session.id, _turn(session.id, 1))
+
+    assert await db.fetch("SELECT * FROM exchanges") == []
+    assert sm.stats["pending_turns"] == 1
+    await sm.aclose()
+
+
+@pytest.mark.asyncio
+async def test_group_commit_nach_intervall(db):
+    sm = SqlSessionManager(db, flush_interval_ms=20)
+    session = await sm.create_session("riker")
+    for i in range(10):
+        await sm.add_turn(session.id, _turn(session.id, i))
+
+    await asyncio.sleep(0.1)
+
+    rows = await db.fetch("SELECT * FROM exchanges")
+    assert len(rows) == 20
+    assert sm.stats["batches"] == 1
+    assert sm.stats["turns_written"] == 10
+    await sm.aclose()
+
+
+@pytest.mark.asyncio
+async def test_voller_batch_flusht_sofort(db):
+    sm = SqlSessionManager(db, flush_interval_ms=10_000, batch_size=3)
+    session = await sm.create_session("riker")
+    for i in range(3):
+        await sm.add_turn(session.id, _turn(session.id, i))
+
+    await asyncio.sleep(0.05)
+
+    assert sm.stats["turns_written"] == 3
+    await sm.aclose()
+
+
+@pytest.mark.asyncio
+async def test_fehlgeschlagener_flush_bleibt_vorgemerkt(db):
+    sm = SqlSessionManager(db, flush_interval_ms=10_000)
+    session = await sm.create_session("riker")
+    await sm.add_turn(session.id, _turn(session.id, 1))
+
+    original = db.execute_batch
+
+    async def broken(statements):
+        raise OSError("disk full")
+
+    db.execute_batch = broken
+    await sm.flush()
+    assert sm.stats["failed_batches"] == 1
+    assert sm.stats["pending_turns"] == 1
+
+    db.execute_batch = original
+    await sm.aclose()
+    assert len(await db.fetch("SELECT * FROM exchanges")) == 2
+
+
+# =============================================================================
+# Persistenz + Nachladen
+# =============================================================================
+
+
+@pytest.mark.asyncio
+async def test_resume_nach_neustart_laedt_turns_nach(db):
+    sm = SqlSessionManager(db)
+    session = await sm.create_session("riker", user_id="u1")
+    for i in range(5):
+        await sm.add_turn(session.id, _turn(session.id, i))
+    await sm.end_session(session.id)
+    await sm.aclose()
+
+    # Neuer Manager auf derselben DB — simuliert Neustart
+    fresh = SqlSessionManager(db, estimator=CharRatioEstimator(), page_turns=3)
+    resumed = await fresh.resume_session(session.id)
+    assert resumed.user_id == "u1"
+    assert resumed.turn_count == 5
+    assert resumed.status == SessionStatus.ended
+    assert fresh.active_session.id == session.id
+
+    wm = await fresh.get_working_memory(session.id)
+    turns = await wm.get_recent_turns(10)
+    assert [t.raw_input for t in turns] == ["frage 2", "frage 3", "frage 4"]
+    assert fresh.stats["page_ins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_resume_unbekannt_wirft(db):
+    sm = SqlSessionManager(db)
+    with pytest.raises(SessionNotFoundError):
+        await sm.resume_session("gibt-es-nicht")
+
+
+@pytest.mark.asyncio
+async def test_get_turns_und_list_sessions_sehen_ungeflushte_daten(db):
+    sm = SqlSessionManager(db, flush_interval_ms=10_000)
+    a = await sm.create_session("riker")
+    b = await sm.create_session("riker", activate=False)
+    await sm.add_turn(a.id, _turn(a.id, 1))
+    await sm.add_turn(a.id, _turn(a.id, 2))
+
+    turns = await sm.get_turns(a.id, limit=1)
+    assert [t.raw_input for t in turns] == ["frage 2"]
+    sessions = await sm.list_sessions("riker")
+    assert [s.id for s in sessions] == [b.id, a.id]
+    assert sm.active_session.id == a.id
+    await sm.aclose()
+
+
+@pytest.mark.asyncio
+async def test_hot_set_ist_begrenzt(db):
+    sm = SqlSessionManager(db, max_hot_sessions=2)
+    for _ in range(3):
+        s = await sm.create_session("riker")
+        await sm.get_working_memory(s.id)
+    assert len(sm._memories) == 2
+    await sm.aclose()
+
+
+@pytest.mark.asyncio
+async def test_verdraengte_neue_session_behaelt_ungeflushte_turns(db):
+    sm = SqlSessionManager(db, flush_interval_ms=10_000, max_hot_sessions=1)
+    a = await sm.create_session("riker")
+    b = await sm.create_session("riker", activate=False)
+    wm_a = await sm.get_working_memory(a.id)
+    await wm_a.add_turn(_turn(a.id, 1))
+    await sm.add_turn(a.id, _turn(a.id, 1))
+    await sm.get_working_memory(b.id)           # verdraengt a vor dem ersten Flush
+
+    wm_a = await sm.get_working_memory(a.id)
+    assert [t.raw_input for t in await wm_a.get_recent_turns(10)] == ["frage 1"]
+    assert sm.stats["pending_turns"] == 0
+    await sm.aclose()
+
+
+# =============================================================================
+# Runner-Integration
+# =============================================================================
+
+
+@pytest.mark.asyncio
+async def test_runner_disconnect_flusht(db):
+    runner = Runner(provider=_EchoProvider(), name="t")
+    runner.set_session_manager(SqlSessionManager(db, flush_interval_ms=10_000))
+    await runner.connect()
+    await runner.chat("hallo", session_id="kanal-1")
+    await runner.disconnect()
+
+    row = await db.fetchrow("SELECT * FROM sessions WHERE uid = ?", "kanal-1")
+    assert row["turn_count"] == 1
+    rows = await db.fetch("SELECT role, content FROM exchanges ORDER BY id")
+    assert [(r["role"], r["content"]) for r in rows] == [
+        ("user", "hallo"), ("assistant", "antwort"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rolling_session_persistiert_handover(db):
+    runner = Runner(provider=_EchoProvider(), name="t")
+    runner.set_session_manager(SqlSessionManager(db, flush_interval_ms=10_000))
+    await runner.connect()
+    await runner.chat("hallo", session_id="kanal-1")
+    sm = runner._session_manager
+    wm = await sm.get_working_memory("kanal-1")
+    handover = await runner._initiate_rolling_session(wm, "kanal-1")
+    new_id = runner._session_routes["kanal-1"]
+    await runner.disconnect()
+
+    fresh = SqlSessionManager(db)
+    reloaded = await fresh.get_session(new_id)
+    assert reloaded.metadata["handover"]["summary"] == handover.summary
+    assert reloaded.metadata["handover"]["from_session_id"] == "kanal-1"
+
+
+# =============================================================================
+# SQLiteAddOn — Transaktionen
+# =============================================================================
+
+
+@pytest.mark.asyncio
+async def test_fehlgeschlagener_batch_rollt_fremdes_execute_nicht_zurueck(db):
+    insert = "INSERT INTO sessions (uid, heinzel_id, status) VALUES (?, ?, ?)"
+    batch = [
+        (insert, [("batch-1", "riker", "active")]),
+        ("INSERT INTO gibt_es_nicht VALUES (?)", [(1,)]),
+    ]
+    results = await asyncio.gather(
+        db.execute_batch(batch),
+        db.execute(insert, "einzeln", "riker", "active"),
+        return_exceptions=True,
+    )
+
+    assert results[1] is None and isinstance(results[0], Exception)
+    rows = await db.fetch("SELECT uid FROM sessions ORDER BY uid")
+    assert [r["uid"] for r in rows] == ["einzeln"]
+
+
+def test_numeric_placeholders():
+    assert _numeric_placeholders("a = ? AND b = ?") == "a = $1 AND b = $2"
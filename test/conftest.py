@@ -6,3 +6,9 @@ import pytest
 def set_log_dir(tmp_path, monkeypatch):
     monkeypatch.setenv("LOG_DIR", str(tmp_path))
     monkeypatch.delenv("DATABASE_URL", raising=False)
+
+
+@pytest.fixture(autouse=True)
+def run_in_tmp_path(tmp_path, monkeypatch):
+    """Relative Pfade (./logs des Runners, logs/selector_feedback.db) im tmp_path."""
+    monkeypatch.chdir(tmp_path)
@@ -22,6 +22,7 @@ from src.core.models import (
     PipelineContext,
     ContextDiff,
     ContextHistory,
+    HistoryRetention,
 )
 from src.core.exceptions import (
     HeinzelError,
@@ -114,6 +115,39 @@ class TestPipelineContext:
         ids = {PipelineContext().snapshot_id for _ in range(100)}
         assert len(ids) == 100
 
+    def test_evolve_shares_unchanged_fields_by_reference(self):
+        msgs = tuple(Message(role="user", content=f"m{i}") for i in range(50))
+        ctx = PipelineContext(messages=msgs, metadata={"k": "v"})
+        ctx2 = ctx.evolve(phase=HookPoint.ON_LLM_REQUEST)
+        assert ctx2.messages is ctx.messages
+        assert ctx2.metadata is ctx.metadata
+        assert ctx2.budget is ctx.budget
+
+    def test_evolve_validates_changed_fields(self):
+        ctx = PipelineContext()
+        ctx2 = ctx.evolve(
+            phase="on_output",
+            messages=[{"role": "user", "content": "hi"}],
+        )
+        assert ctx2.phase == HookPoint.ON_OUTPUT
+        assert isinstance(ctx2.messages, tuple)
+        assert isinstance(ctx2.messages[0], Message)
+        with pytest.raises(ValidationError):
+            ctx.evolve(loop_iteration="keine Zahl")
+
+    def test_evolve_ignores_managed_and_unknown_fields(self):
+        ctx = PipelineContext()
+        other = PipelineContext()
+        ctx2 = ctx.evolve(previous=other, snapshot_id="fix", unbekannt=1)
+        assert ctx2.previous is ctx
+        assert ctx2.snapshot_id != "fix"
+        assert not hasattr(ctx2, "unbekannt")
+
+    def test_evolve_result_is_frozen(self):
+        ctx2 = PipelineContext().evolve(phase=HookPoint.ON_INPUT_PARSED)
+        with pytest.raises((ValidationError, TypeError)):
+            ctx2.response = "geändert"
+
 
 # ─── ContextHistory ───────────────────────────────────────────────────────────
 
@@ -170,6 +204,115 @@ class TestContextHistory:
         assert any("Hallo" in line for line in trace)
 
 
+# ─── ContextHistory Retention ─────────────────────────────────────────────────
+
+def _loop_snapshots(n: int) -> list[PipelineContext]:
+    """Simulierter Tool-Loop: jede Iteration haengt eine Message an."""
+    ctx = PipelineContext(raw_input="Hallo", phase=HookPoint.ON_INPUT)
+    snaps = [ctx]
+    for i in range(1, n):
+        ctx = ctx.evolve(
+            phase=HookPoint.ON_LOOP_ITERATION if i % 2 else HookPoint.ON_LLM_REQUEST,
+            loop_iteration=i,
+            messages=ctx.messages + (Message(role="user", content=f"m{i}"),),
+        )
+        snaps.append(ctx)
+    return snaps
+
+
+class TestContextHistoryRetention:
+    def test_default_is_full(self):
+        history = ContextHistory()
+        assert history.retention == HistoryRetention.FULL
+        snaps = _loop_snapshots(10)
+        for snap in snaps:
+            history.push(snap)
+        assert history._snapshots == snaps
+        assert len(history) == 10
+
+    def test_invalid_max_snapshots_raises(self):
+        with pytest.raises(ValueError):
+            ContextHistory(retention="ring", max_snapshots=0)
+
+    def test_ring_keeps_last_n_full(self):
+        history = ContextHistory(retention="ring", max_snapshots=3)
+        snaps = _loop_snapshots(10)
+        for snap in snaps:
+            history.push(snap)
+        ids = [s.snapshot_id for s in snaps[-3:]]
+        assert [s.snapshot_id for s in history._snapshots] == ids
+        assert len(history) == 10
+        assert history.current.snapshot_id == snaps[-1].snapshot_id
+
+    def test_ring_rebuilds_compacted_snapshots(self):
+        history = ContextHistory(retention=HistoryRetention.RING, max_snapshots=2)
+        snaps = _loop_snapshots(8)
+        expected = [s.model_dump(exclude={"previous"}) for s in snaps]
+        for snap in snaps:
+            history.push(snap)
+        rebuilt = history.snapshots
+        assert [s.model_dump(exclude={"previous"}) for s in rebuilt] == expected
+        assert history.initial.raw_input == "Hallo"
+
+    def test_ring_stores_message_appends_as_tail(self):
+        from src.core.models.context import _TupleAppend
+        history = ContextHistory(retention="ring", max_snapshots=1)
+        for snap in _loop_snapshots(6):
+            history.push(snap)
+        for delta in history._deltas:
+            assert isinstance(delta["messages"], _TupleAppend)
+            assert len(delta["messages"].tail) == 1
+
+    def test_ring_queries_see_compacted_snapshots(self):
+        history = ContextHistory(retention="ring", max_snapshots=2)
+        snaps = _loop_snapshots(8)
+        for snap in snaps:
+            history.push(snap)
+        assert history.at_phase(HookPoint.ON_INPUT).snapshot_id == snaps[0].snapshot_id
+        between = history.between(HookPoint.ON_INPUT, HookPoint.ON_LLM_REQUEST)
+        assert [s.snapshot_id for s in between] == [s.snapshot_id for s in snaps[:3]]
+        diff = history.diff(history.snapshots[1], snaps[-1])
+        assert len(diff.phases_between) == 7
+        assert len(history.to_reasoning_trace()) == 8
+
+    def test_ring_releases_evicted_snapshots(self):
+        import gc
+        import weakref
+        history = ContextHistory(retention="ring", max_snapshots=2)
+        snaps = _loop_snapshots(6)
+        refs = [weakref.ref(s) for s in snaps]
+        for snap in snaps:
+            history.push(snap)
+        del snaps, snap
+        gc.collect()
+        # Die History haelt eigene Kopien ohne previous-Kette — nur der
+        # Initial-Snapshot (previous=None) braucht keine und bleibt die Basis
+        assert [r() is not None for r in refs] == [True] + [False] * 5
+        held = [history._base, *history._snapshots]
+        assert [s.previous for s in held] == [None, None, None]
+        assert len(history.snapshots) == 6
+
+    def test_phases_keeps_latest_per_phase(self):
+        history = ContextHistory(retention="phases")
+        snaps = _loop_snapshots(9)
+        for snap in snaps:
+            history.push(snap)
+        assert len(history) == 3
+        loop = history.at_phase(HookPoint.ON_LOOP_ITERATION)
+        assert loop.snapshot_id == snaps[7].snapshot_id
+        assert history.at_phase(HookPoint.ON_LLM_REQUEST).snapshot_id == snaps[8].snapshot_id
+        assert history.current.previous is None
+
+    def test_push_leaves_callers_snapshot_untouched(self):
+        for retention in ("phases", "ring"):
+            history = ContextHistory(retention=retention, max_snapshots=1)
+            snaps = _loop_snapshots(4)
+            for snap in snaps:
+                history.push(snap)
+            assert [s.previous for s in snaps[1:]] == snaps[:-1]
+            assert history.current.previous is None
+
+
 # ─── ContextDiff ──────────────────────────────────────────────────────────────
 
 class TestContextDiff:
@@ -181,6 +181,177 @@ async def test_list_models_raises_on_connect_error(provider: HttpLLMProvider) ->
             await provider.list_models()
 
 
+# =============================================================================
+# HttpLLMProvider — Verbindungs-Pool
+# =============================================================================
+
+@pytest.mark.asyncio
+async def test_client_wird_ueber_calls_wiederverwendet(provider: HttpLLMProvider) -> None:
+    resp = _json_resp({"status": "ok", "models": []})
+    client = _make_client_mock(get_resp=resp)
+    with patch("core.provider.httpx.AsyncClient", return_value=client) as factory:
+        await provider.health()
+        await provider.list_models()
+        await provider.health()
+    assert factory.call_count == 1
+    assert client.get.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_client_bekommt_pool_limits() -> None:
+    p = HttpLLMProvider(
+        name="x", base_url="http://fake:1",
+        max_connections=5, max_keepalive_connections=2, keepalive_expiry=7.0,
+    )
+    resp = _json_resp({"status": "ok"})
+    with patch("core.provider.httpx.AsyncClient", return_value=_make_client_mock(get_resp=resp)) as factory:
+        await p.health()
+    limits = factory.call_args.kwargs["limits"]
+    assert limits.max_connections == 5
+    assert limits.max_keepalive_connections == 2
+    assert limits.keepalive_expiry == 7.0
+    assert factory.call_args.kwargs["http2"] is False
+
+
+@pytest.mark.asyncio
+async def test_aclose_schliesst_client_und_baut_neu_auf(provider: HttpLLMProvider) -> None:
+    resp = _json_resp({"status": "ok"})
+    first, second = _make_client_mock(get_resp=resp), _make_client_mock(get_resp=resp)
+    with patch("core.provider.httpx.AsyncClient", side_effect=[first, second]):
+        await provider.health()
+        await provider.aclose()
+        first.aclose.assert_awaited_once()
+        await provider.health()
+    assert second.get.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_aclose_ohne_client_ist_noop(provider: HttpLLMProvider) -> None:
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_connection_stats_zaehlt_reuse(provider: HttpLLMProvider) -> None:
+    for i in range(3):
+        request = httpx.Request("GET", "http://fake:12101/health")
+        await provider._on_request(request)
+        if i == 0:
+            await request.extensions["trace"]("connection.connect_tcp.complete", {})
+        await request.extensions["trace"]("http11.send_request_headers.complete", {})
+    assert provider.connection_stats == {
+        "requests": 3, "connections_opened": 1, "connections_reused": 2,
+    }
+
+
+def test_loop_wechsel_schliesst_alten_client() -> None:
+    p = HttpLLMProvider(name="x", base_url="http://fake:1")
+
+    async def client_of_loop() -> httpx.AsyncClient:
+        return p._get_client()
+
+    def run(coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    first = run(client_of_loop())
+
+    async def second_loop() -> httpx.AsyncClient:
+        client = p._get_client()
+        await p.aclose()
+        return client
+
+    second = run(second_loop())
+    assert second is not first
+    assert first.is_closed and second.is_closed
+    assert p._retiring == set()
+
+
+def test_http2_ohne_h2_faellt_auf_http11_zurueck() -> None:
+    with patch("core.provider.importlib.util.find_spec", return_value=None):
+        p = HttpLLMProvider(name="x", base_url="http://fake:1", http2=True)
+    assert p._http2 is False
+
+
+def test_registry_liest_pool_optionen(tmp_path: Path) -> None:
+    cfg = tmp_path / "providers.yaml"
+    cfg.write_text(textwrap.dedent("""\
+        providers:
+          - name: openai
+            url: http://fake:12101
+            max_connections: 4
+            keepalive_expiry: 5
+    """))
+    reg = ProviderRegistry(config_path=str(cfg))
+    reg.load_config()
+    limits = reg.providers[0]._limits
+    assert limits.max_connections == 4
+    assert limits.keepalive_expiry == 5.0
+
+
+@pytest.mark.asyncio
+async def test_runner_disconnect_schliesst_provider() -> None:
+    provider = HttpLLMProvider(name="x", base_url="http://fake:1")
+    provider.aclose = AsyncMock()
+    heinzel = Runner(provider=provider, name="test")
+    await heinzel.connect()
+    await heinzel.disconnect()
+    provider.aclose.assert_awaited_once()
+
+
+# =============================================================================
+# HttpLLMProvider — count_tokens
+# =============================================================================
+
+@pytest.mark.asyncio
+async def test_count_tokens_ok(provider: HttpLLMProvider) -> None:
+    resp = _json_resp({"input_tokens": 42, "model": "gpt-4o", "provider": "openai"})
+    client = _make_client_mock(post_resp=resp)
+    with patch("core.provider.httpx.AsyncClient", return_value=client):
+        tokens = await provider.count_tokens([{"role": "user", "content": "hi"}])
+    assert tokens == 42
+    url = client.post.call_args.args[0]
+    assert url == "http://fake:12101/tokens/count"
+    assert client.post.call_args.kwargs["json"]["model"] == "gpt-4o"
+
+
+@pytest.mark.asyncio
+async def test_count_tokens_501_gibt_none(provider: HttpLLMProvider) -> None:
+    resp = _json_resp({"detail": "not available"}, status=501)
+    with patch("core.provider.httpx.AsyncClient", return_value=_make_client_mock(post_resp=resp)):
+        assert await provider.count_tokens([{"role": "user", "content": "hi"}]) is None
+
+
+@pytest.mark.asyncio
+async def test_count_tokens_schaetzung_gibt_none(provider: HttpLLMProvider) -> None:
+    resp = _json_resp({"input_tokens": 40, "model": "m", "provider": "x", "source": "estimate"})
+    with patch("core.provider.httpx.AsyncClient", return_value=_make_client_mock(post_resp=resp)):
+        assert await provider.count_tokens([{"role": "user", "content": "hi"}]) is None
+
+
+@pytest.mark.asyncio
+async def test_model_context_window_wird_gecacht(provider: HttpLLMProvider) -> None:
+    resp = _json_resp({"model": {"id": "gpt-4o", "context_window": 128000}})
+    client = _make_client_mock(get_resp=resp)
+    with patch("core.provider.httpx.AsyncClient", return_value=client):
+        assert await provider.model_context_window() == 128000
+        assert await provider.model_context_window("gpt-4o") == 128000
+    assert client.get.call_count == 1
+    assert client.get.call_args.args[0] == "http://fake:12101/models/gpt-4o"
+
+
+@pytest.mark.asyncio
+async def test_model_context_window_unbekanntes_modell_gibt_none(provider: HttpLLMProvider) -> None:
+    resp = _json_resp({"detail": "not found"}, status=404)
+    client = _make_client_mock(get_resp=resp)
+    with patch("core.provider.httpx.AsyncClient", return_value=client):
+        assert await provider.model_context_window("foo") is None
+        assert await provider.model_context_window("foo") is None
+    assert client.get.call_count == 1
+
+
 # =============================================================================
 # HttpLLMProvider — chat
 # =============================================================================
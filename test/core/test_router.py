@@ -7,6 +7,8 @@ Abdeckung:
     - dispatch(): Reihenfolge (priority + reg_order), halt-Flag, Context-Kette
     - Fehler-Isolation: Exception → AddOnError in results → ON_ERROR dispatcht
     - Concurrency: parallele dispatch()-Aufrufe
+    - Dispatch-Tabelle: has_subscribers(), Neuaufbau bei register()/unregister()
+    - Beobachter (observe_only): concurrent, background, sequential
 """
 
 import asyncio
@@ -16,7 +18,7 @@ import pytest
 from src.core.addon import AddOn, AddOnState
 from src.core.exceptions import AddOnDependencyError, AddOnError
 from src.core.models import AddOnResult, HookPoint, PipelineContext
-from src.core.router import AddOnRouter
+from src.core.router import AddOnRouter, ObserverMode
 
 
 # =============================================================================
@@ -450,6 +452,209 @@ async def test_dispatch_concurrent_calls():
         assert results[-1].modified_ctx.raw_input == f"msg{i}_x"
 
 
+# =============================================================================
+# Dispatch-Tabelle
+# =============================================================================
+
+
+def test_has_subscribers_empty_router():
+    router = AddOnRouter()
+    assert not any(router.has_subscribers(hp) for hp in HookPoint)
+
+
+def test_has_subscribers_follows_register_and_unregister():
+    router = AddOnRouter()
+    a = TrackingAddOn("tab_a")
+    router.register(a, hooks=[HookPoint.ON_INPUT])
+    assert router.has_subscribers(HookPoint.ON_INPUT)
+    assert not router.has_subscribers(HookPoint.ON_OUTPUT)
+
+    router.unregister("tab_a")
+    assert not router.has_subscribers(HookPoint.ON_INPUT)
+
+
+def test_dispatch_table_holds_bound_hooks_in_order():
+    router = AddOnRouter()
+    late = TrackingAddOn("tab_late")
+    early = TrackingAddOn("tab_early")
+    router.register(late, hooks=[HookPoint.ON_INPUT, HookPoint.ON_OUTPUT], priority=10)
+    router.register(early, hooks=[HookPoint.ON_INPUT], priority=1)
+
+    entries = router._dispatch_table[HookPoint.ON_INPUT]
+    assert [addon for addon, _ in entries] == [early, late]
+    assert entries[0][1] == early.on_input
+    assert [addon for addon, _ in router._dispatch_table[HookPoint.ON_OUTPUT]] == [late]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_uses_table_after_unregister():
+    router = AddOnRouter()
+    a = TrackingAddOn("tab_x")
+    b = TrackingAddOn("tab_y")
+    router.register(a, hooks=[HookPoint.ON_INPUT])
+    router.register(b, hooks=[HookPoint.ON_INPUT])
+    router.unregister("tab_x")
+
+    await router.dispatch(HookPoint.ON_INPUT, make_ctx())
+    assert a.calls == []
+    assert b.calls == ["tab_y:on_input"]
+
+
+# =============================================================================
+# Beobachter (observe_only)
+# =============================================================================
+
+
+class ObserverAddOn(AddOn):
+    """Beobachtet ON_INPUT, wartet kurz und zeichnet den gesehenen ctx auf."""
+
+    observe_only = frozenset({HookPoint.ON_INPUT})
+
+    def __init__(self, tag: str, delay: float = 0.0, fail: bool = False) -> None:
+        self.__class__ = type(tag, (ObserverAddOn,), {"name": tag})
+        super().__init__()
+        self.delay = delay
+        self.fail = fail
+        self.seen: list[str] = []
+
+    async def on_input(self, ctx: PipelineContext, history=None) -> AddOnResult:
+        ObserverAddOn._active = getattr(ObserverAddOn, "_active", 0) + 1
+        ObserverAddOn._peak = max(getattr(ObserverAddOn, "_peak", 0), ObserverAddOn._active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("Beobachter kaputt")
+            self.seen.append(ctx.raw_input)
+            # Versuch den ctx zu aendern wird ignoriert
+            return AddOnResult(
+                modified_ctx=ctx.model_copy(update={"raw_input": "ignoriert"}),
+                halt=True,
+            )
+        finally:
+            ObserverAddOn._active -= 1
+
+
+@pytest.mark.asyncio
+async def test_observers_run_concurrently_after_chain():
+    ObserverAddOn._peak = 0
+    router = AddOnRouter()
+    obs_a = ObserverAddOn("obs_a", delay=0.02)
+    obs_b = ObserverAddOn("obs_b", delay=0.02)
+    router.register(obs_a, hooks=[HookPoint.ON_INPUT], priority=-10)
+    router.register(obs_b, hooks=[HookPoint.ON_INPUT], priority=-10)
+    router.register(MutatingAddOn("_m"), hooks=[HookPoint.ON_INPUT], priority=5)
+
+    results = await router.dispatch(HookPoint.ON_INPUT, make_ctx(raw_input="x"))
+
+    assert ObserverAddOn._peak == 2
+    # Beobachter sehen den finalen ctx der mutierenden Chain
+    assert obs_a.seen == ["x_m"] and obs_b.seen == ["x_m"]
+    assert results[0].modified_ctx.raw_input == "x_m"
+    assert all(r.modified_ctx is None and not r.halt for r in results[1:])
+
+
+@pytest.mark.asyncio
+async def test_observer_error_isolated_and_triggers_on_error():
+    router = AddOnRouter()
+    tracker = TrackingAddOn("obs_err_tracker")
+    router.register(ObserverAddOn("obs_fail", fail=True), hooks=[HookPoint.ON_INPUT])
+    router.register(tracker, hooks=[HookPoint.ON_ERROR])
+
+    results = await router.dispatch(HookPoint.ON_INPUT, make_ctx())
+
+    assert len(results) == 1
+    assert results[0].ack is False
+    assert "obs_fail" in results[0].error
+    assert tracker.calls == ["obs_err_tracker:on_error"]
+
+
+@pytest.mark.asyncio
+async def test_observers_background_off_critical_path():
+    router = AddOnRouter(observer_mode="background")
+    obs = ObserverAddOn("obs_bg", delay=0.05)
+    router.register(obs, hooks=[HookPoint.ON_INPUT])
+    router.register(MutatingAddOn("_m"), hooks=[HookPoint.ON_INPUT])
+
+    results = await router.dispatch(HookPoint.ON_INPUT, make_ctx(raw_input="y"))
+
+    assert [r.modified_ctx.raw_input for r in results] == ["y_m"]
+    assert obs.seen == []
+    await router.drain()
+    assert obs.seen == ["y_m"]
+    assert router.observer_stats["completed"] == 1
+    await router.aclose()
+
+
+@pytest.mark.asyncio
+async def test_observers_background_see_history_at_enqueue():
+    from src.core.models import ContextHistory
+
+    class HistoryObserver(AddOn):
+        name = "obs_hist"
+        observe_only = frozenset({HookPoint.ON_INPUT})
+
+        def __init__(self) -> None:
+            super().__init__()
+            self.seen: list[list[str]] = []
+
+        async def on_input(self, ctx: PipelineContext, history=None) -> AddOnResult:
+            self.seen.append([s.raw_input for s in history.snapshots])
+            return AddOnResult(modified_ctx=ctx)
+
+    router = AddOnRouter(observer_mode="background")
+    obs = HistoryObserver()
+    router.register(obs, hooks=[HookPoint.ON_INPUT])
+
+    history = ContextHistory()
+    ctx = make_ctx(raw_input="a")
+    history.push(ctx)
+    await router.dispatch(HookPoint.ON_INPUT, ctx, history)
+    # Pipeline laeuft weiter, bevor der Worker drankommt
+    history.push(ctx.evolve(phase=HookPoint.ON_OUTPUT, raw_input="b"))
+    await router.drain()
+
+    assert obs.seen == [["a"]]
+    assert len(history) == 2
+    await router.aclose()
+
+
+@pytest.mark.asyncio
+async def test_observers_background_counts_errors():
+    router = AddOnRouter(observer_mode=ObserverMode.BACKGROUND)
+    router.register(ObserverAddOn("obs_bg_fail", fail=True), hooks=[HookPoint.ON_INPUT])
+
+    await router.dispatch(HookPoint.ON_INPUT, make_ctx())
+    await router.aclose()
+
+    stats = router.observer_stats
+    assert stats["enqueued"] == 1
+    assert stats["errors"] == 1
+    assert stats["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_observers_sequential_mode_keeps_chain_order():
+    router = AddOnRouter(observer_mode="sequential")
+    obs = ObserverAddOn("obs_seq")
+    router.register(obs, hooks=[HookPoint.ON_INPUT], priority=-1)
+    router.register(MutatingAddOn("_m"), hooks=[HookPoint.ON_INPUT])
+
+    results = await router.dispatch(HookPoint.ON_INPUT, make_ctx(raw_input="z"))
+
+    # Wie bisher: Teil der Chain, sieht den ctx vor dem Mutierer
+    assert obs.seen == ["z"]
+    assert results[0].halt is True
+    assert len(results) == 1
+
+
+def test_observer_only_for_registered_hooks():
+    router = AddOnRouter()
+    router.register(ObserverAddOn("obs_scope"), hooks=[HookPoint.ON_OUTPUT])
+    assert router.has_subscribers(HookPoint.ON_OUTPUT)
+    assert not router.has_subscribers(HookPoint.ON_INPUT)
+    assert HookPoint.ON_OUTPUT in router._dispatch_table
+
+
 # =============================================================================
 # Performance
 # =============================================================================
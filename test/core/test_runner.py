@@ -13,6 +13,8 @@ Testet:
 
 from __future__ import annotations
 
+import asyncio
+
 import pytest
 from typing import Any, AsyncGenerator
 from unittest.mock import AsyncMock
@@ -124,6 +126,10 @@ def make_runner(response="test response", **kwargs) -> tuple[Runner, MockProvide
     return heinzel, provider
 
 
+# Vollstaendige Phasen-Spur: auch Phasen ohne AddOns als Snapshot aufzeichnen
+FULL_TRACE = {"history": {"record_idle_phases": True}}
+
+
 # =============================================================================
 # Lifecycle Tests
 # =============================================================================
@@ -179,7 +185,7 @@ class TestPipelineSequenz:
     @pytest.mark.asyncio
     async def test_jede_phase_erzeugt_neuen_snapshot(self):
         """Kernprinzip: immutable context — jede Phase neuer snapshot_id."""
-        heinzel, _ = make_runner()
+        heinzel, _ = make_runner(config=FULL_TRACE)
         await heinzel.connect()
 
         # Direkt _run_pipeline aufrufen um history zu inspizieren
@@ -193,7 +199,7 @@ class TestPipelineSequenz:
     @pytest.mark.asyncio
     async def test_pipeline_phasen_reihenfolge(self):
         """Kritische Phasen müssen in der richtigen Reihenfolge auftreten."""
-        heinzel, _ = make_runner()
+        heinzel, _ = make_runner(config=FULL_TRACE)
         await heinzel.connect()
         history, _ = await heinzel._run_pipeline("test", None)
 
@@ -214,7 +220,7 @@ class TestPipelineSequenz:
 
     @pytest.mark.asyncio
     async def test_memory_miss_wenn_keine_results(self):
-        heinzel, _ = make_runner()
+        heinzel, _ = make_runner(config=FULL_TRACE)
         await heinzel.connect()
         history, _ = await heinzel._run_pipeline("test", None)
 
@@ -225,7 +231,7 @@ class TestPipelineSequenz:
 
     @pytest.mark.asyncio
     async def test_at_phase_findet_snapshot(self):
-        heinzel, _ = make_runner()
+        heinzel, _ = make_runner(config=FULL_TRACE)
         await heinzel.connect()
         history, _ = await heinzel._run_pipeline("Hallo", None)
 
@@ -235,7 +241,7 @@ class TestPipelineSequenz:
 
     @pytest.mark.asyncio
     async def test_to_reasoning_trace_aufrufbar(self):
-        heinzel, _ = make_runner()
+        heinzel, _ = make_runner(config=FULL_TRACE)
         await heinzel.connect()
         history, _ = await heinzel._run_pipeline("test", None)
 
@@ -243,6 +249,30 @@ class TestPipelineSequenz:
         assert isinstance(trace, list)
         assert len(trace) > 0
 
+    @pytest.mark.asyncio
+    async def test_phasen_ohne_addons_werden_uebersprungen(self):
+        """Ohne Abonnenten: kein Snapshot fuer die Phase."""
+        heinzel, _ = make_runner()
+        heinzel.register_addon(RecordingAddOn(), hooks={HookPoint.ON_INPUT})
+        await heinzel.connect()
+        history, _ = await heinzel._run_pipeline("test", None)
+
+        phases = [s.phase for s in history._snapshots]
+        assert HookPoint.ON_INPUT in phases
+        assert HookPoint.ON_INPUT_PARSED not in phases
+        assert HookPoint.ON_OUTPUT not in phases
+        # Direkt gepushte Snapshots (Start, LLM-Response) bleiben
+        assert HookPoint.ON_SESSION_START in phases
+        assert HookPoint.ON_LLM_RESPONSE in phases
+
+    @pytest.mark.asyncio
+    async def test_uebersprungene_phasen_aendern_ergebnis_nicht(self):
+        heinzel, _ = make_runner("antwort")
+        full, _ = make_runner("antwort", config=FULL_TRACE)
+        for runner in (heinzel, full):
+            await runner.connect()
+        assert await heinzel.chat("hallo") == await full.chat("hallo") == "antwort"
+
 
 # =============================================================================
 # Loop Tests
@@ -276,6 +306,27 @@ class TestLoop:
         loop_iters = [s for s in history._snapshots if s.phase == HookPoint.ON_LOOP_ITERATION]
         assert len(loop_iters) == 2  # Iteration 1 und 2 (nach Call 1 und 2)
 
+    @pytest.mark.asyncio
+    async def test_history_ring_begrenzt_volle_snapshots(self):
+        """history.retention=ring: nur max_snapshots voll, Rest als Delta."""
+        heinzel, provider = make_runner(
+            config={"history": {"retention": "ring", "max_snapshots": 4}}
+        )
+        heinzel.register_addon(
+            LoopControlAddOn(max_iterations=5), hooks={HookPoint.ON_LLM_RESPONSE}
+        )
+        await heinzel.connect()
+
+        history, _ = await heinzel._run_pipeline("test", None)
+
+        assert provider.call_count == 5
+        assert len(history._snapshots) == 4
+        loop_iters = [
+            s for s in history.snapshots if s.phase == HookPoint.ON_LOOP_ITERATION
+        ]
+        assert [s.loop_iteration for s in loop_iters] == [1, 2, 3, 4]
+        assert history.at_phase(HookPoint.ON_SESSION_START).raw_input == "test"
+
 
 # =============================================================================
 # Chat API Tests
@@ -324,7 +375,7 @@ class TestChatAPI:
     @pytest.mark.asyncio
     async def test_fallback_parsed_input(self):
         """Ohne ParserAddOn: parsed_input == raw_input."""
-        heinzel, _ = make_runner()
+        heinzel, _ = make_runner(config=FULL_TRACE)
         await heinzel.connect()
         history, _ = await heinzel._run_pipeline("original message", None)
 
@@ -375,7 +426,7 @@ class TestAddOnIntegration:
     @pytest.mark.asyncio
     async def test_addon_kann_context_modifizieren(self):
         """AddOn via modified_ctx: system_prompt wird übernommen."""
-        heinzel, _ = make_runner()
+        heinzel, _ = make_runner(config=FULL_TRACE)
         mutator = ContextMutatorAddOn()
         heinzel.register_addon(mutator, hooks={HookPoint.ON_CONTEXT_BUILD})
         await heinzel.connect()
@@ -470,6 +521,36 @@ class TestChatStream:
         async for _ in heinzel.chat_stream("test"):
             pass
 
+    @pytest.mark.asyncio
+    async def test_stream_chunk_hook_bekommt_fenster(self):
+        """ON_STREAM_CHUNK wird pro Fenster dispatcht, nicht pro Token."""
+        windows: list[tuple[str, str]] = []
+
+        class ChunkAddOn(AddOn):
+            name = "chunks"
+
+            async def on_stream_chunk(self, ctx, history=None) -> AddOnResult:
+                assert ctx.stream_buffer == ""
+                windows.append((
+                    ctx.metadata["hnz_stream_chunk"],
+                    ctx.metadata["hnz_stream_text"](),
+                ))
+                return AddOnResult(modified_ctx=ctx)
+
+        heinzel, _ = make_runner(
+            "aaaa bbbb cccc d",
+            config={"streaming": {"chunk_window_chars": 8, "chunk_window_ms": 0}},
+        )
+        heinzel.register_addon(ChunkAddOn(), hooks={HookPoint.ON_STREAM_CHUNK})
+        await heinzel.connect()
+        chunks = [c async for c in heinzel.chat_stream("test")]
+
+        assert "".join(chunks) == "aaaabbbbccccd"
+        assert windows == [
+            ("aaaabbbb", "aaaabbbb"),
+            ("ccccd", "aaaabbbbccccd"),
+        ]
+
     @pytest.mark.asyncio
     async def test_config_path_parameter_vorhanden(self):
         """config_path=None ist akzeptierter Parameter."""
@@ -572,3 +653,221 @@ class TestDialogLogger:
         assert "von h1" in logs["id-001.log"]
         assert "von h2" in logs["id-002.log"]
         assert "von h1" not in logs["id-002.log"]
+
+
+# =============================================================================
+# Kontextfenster-Preflight
+# =============================================================================
+
+
+class WindowProvider(MockProvider):
+    """Provider mit /models/{id}-Fenster und Mitschnitt der gesendeten Messages."""
+
+    def __init__(self, response: str, window: int | None = None) -> None:
+        super().__init__(response)
+        self.window = window
+        self.context_window: int | None = None
+        self.sent: list[list[dict]] = []
+        self.fail_first_with: Exception | None = None
+
+    async def model_context_window(self, model: str = "") -> int | None:
+        return self.window
+
+    async def chat(self, messages, system_prompt="", model="") -> str:
+        self.sent.append(messages)
+        if self.fail_first_with is not None:
+            exc, self.fail_first_with = self.fail_first_with, None
+            raise exc
+        return await super().chat(messages, system_prompt, model)
+
+
+PREFLIGHT_EXACT = {"preflight": {"reserve_tokens": 0, "safety_margin": 0.0}}
+
+
+class TestPreflight:
+
+    @pytest.mark.asyncio
+    async def test_ohne_fenster_keine_pruefung(self):
+        provider = WindowProvider("antwort")
+        h = Runner(provider=provider, name="t", config=PREFLIGHT_EXACT)
+        await h.connect()
+        await h.chat("hallo")
+        assert h.preflight_stats["checks"] == 0
+
+    @pytest.mark.asyncio
+    async def test_passender_request_bleibt_unveraendert(self):
+        provider = WindowProvider("antwort", window=100_000)
+        h = Runner(provider=provider, name="t", config=PREFLIGHT_EXACT)
+        await h.connect()
+        await h.chat("eins")
+        await h.chat("zwei")
+        assert len(provider.sent[-1]) == 3   # 1 Memory-Paar + aktuelle Frage
+        stats = h.preflight_stats
+        assert stats["checks"] == 2
+        assert stats["trimmed"] == 0
+
+    @pytest.mark.asyncio
+    async def test_zu_grosser_request_wird_vor_dem_senden_gekuerzt(self):
+        provider = WindowProvider("wort " * 200)
+        h = Runner(provider=provider, name="t", config=PREFLIGHT_EXACT)
+        await h.connect()
+        for i in range(5):
+            await h.chat(f"frage {i}")
+        assert len(provider.sent[-1]) == 9
+
+        provider.window = 700
+        await h.chat("letzte frage")
+
+        sent = provider.sent[-1]
+        assert len(sent) < 11
+        assert sent[0]["role"] == "user"          # keine verwaiste Antwort
+        assert sent[-1]["content"] == "letzte frage"
+        stats = h.preflight_stats
+        assert stats["trimmed"] == 1
+        assert stats["messages_dropped"] == 11 - len(sent)
+        assert len(provider.sent) == 6             # kein zweiter Roundtrip
+
+    @pytest.mark.asyncio
+    async def test_overflow_kuerzt_beim_retry_mit_entdecktem_limit(self):
+        from core.exceptions import ContextLengthExceededError
+        provider = WindowProvider("wort " * 200)
+        h = Runner(provider=provider, name="t", config=PREFLIGHT_EXACT)
+        await h.connect()
+        for i in range(3):
+            await h.chat(f"frage {i}")
+
+        provider.fail_first_with = ContextLengthExceededError(
+            "zu lang", tokens_sent=900, limit_discovered=400
+        )
+        response = await h.chat("noch eine")
+
+        assert "Provider-Fehler" not in response
+        assert provider.context_window == 400
+        assert len(provider.sent[-1]) < len(provider.sent[-2])
+        assert h.preflight_stats["overflows"] == 1
+
+
+# =============================================================================
+# Nebenlaeufige Sessions
+# =============================================================================
+
+
+class SlowProvider(MockProvider):
+    """Provider mit Latenz — zaehlt gleichzeitig laufende Calls."""
+
+    def __init__(self, response: str = "ok", delay: float = 0.05) -> None:
+        super().__init__(response)
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+        self.sent: list[list[dict]] = []
+
+    async def chat(self, messages, system_prompt="", model="") -> str:
+        self.sent.append(messages)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        return await super().chat(messages, system_prompt, model)
+
+
+class TestConcurrentSessions:
+
+    @pytest.mark.asyncio
+    async def test_verschiedene_sessions_laufen_parallel(self):
+        provider = SlowProvider(delay=0.05)
+        h = Runner(provider=provider, name="t")
+        await h.connect()
+        await asyncio.gather(*(h.chat("hallo", session_id=f"s{i}") for i in range(4)))
+        assert provider.peak == 4
+        assert h.concurrency_stats["peak_in_flight"] == 4
+
+    @pytest.mark.asyncio
+    async def test_gleiche_session_wird_serialisiert(self):
+        provider = SlowProvider(delay=0.02)
+        h = Runner(provider=provider, name="t")
+        await h.connect()
+        await asyncio.gather(h.chat("eins", session_id="s"), h.chat("zwei", session_id="s"))
+        assert provider.peak == 1
+        # Zweiter Turn sieht den ersten in der Working Memory
+        assert len(provider.sent[1]) == 3
+
+    @pytest.mark.asyncio
+    async def test_ohne_session_id_teilen_sich_aufrufer_eine_session(self):
+        provider = SlowProvider(delay=0.01)
+        h = Runner(provider=provider, name="t")
+        await h.connect()
+        await asyncio.gather(h.chat("a"), h.chat("b"), h.chat("c"))
+        sessions = await h.session_manager.list_sessions(h.agent_id)
+        assert len(sessions) == 1
+        assert sessions[0].turn_count == 3
+        assert provider.peak == 1
+
+    @pytest.mark.asyncio
+    async def test_explizite_session_aendert_aktive_session_nicht(self):
+        h = Runner(provider=MockProvider(), name="t")
+        await h.connect()
+        await h.chat("interaktiv")
+        active = h.session_manager.active_session
+        await h.chat("kanal", session_id="mattermost:c1")
+        assert h.session_manager.active_session.id == active.id
+        assert await h.session_manager.get_session("mattermost:c1") is not None
+
+    @pytest.mark.asyncio
+    async def test_limit_begrenzt_parallele_llm_calls(self):
+        provider = SlowProvider(delay=0.02)
+        h = Runner(
+            provider=provider, name="t",
+            config={"concurrency": {"max_inflight_llm_calls": 2}},
+        )
+        await h.connect()
+        await asyncio.gather(*(h.chat("x", session_id=f"s{i}") for i in range(5)))
+        stats = h.concurrency_stats
+        assert provider.peak == 2
+        assert stats["limit"] == 2
+        assert stats["waited"] >= 1
+        assert stats["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_provider_swap_erst_nach_letztem_parallelen_call(self):
+        slow = SlowProvider(delay=0.05)
+        new = MockProvider("neu")
+        h = Runner(provider=slow, name="t")
+        await h.connect()
+        tasks = [
+            asyncio.create_task(h.chat("x", session_id=f"s{i}")) for i in range(2)
+        ]
+        await asyncio.sleep(0.01)
+        assert await h.set_provider(new) is True
+        assert h.provider is slow
+        await asyncio.gather(*tasks)
+        assert h.provider is new
+
+    @pytest.mark.asyncio
+    async def test_rolling_routes_sind_komprimiert(self):
+        h = Runner(provider=MockProvider(), name="t")
+        await h.connect()
+        await h.chat("hallo", session_id="mm:kanal")
+        for _ in range(3):
+            current = h._route_session("mm:kanal")
+            wm = await h.session_manager.get_working_memory(current)
+            await h._initiate_rolling_session(wm, current)
+
+        newest = h._route_session("mm:kanal")
+        assert newest != current
+        assert h._session_routes == {"mm:kanal": newest}
+        assert h._session_origins == {newest: "mm:kanal"}
+        await h.chat("weiter", session_id="mm:kanal")
+        assert (await h.session_manager.get_session(newest)).turn_count == 1
+
+    @pytest.mark.asyncio
+    async def test_session_lock_ist_reentrant_pro_task(self):
+        from core._concurrency import SessionLocks
+        locks = SessionLocks()
+        async with locks.hold("s"):
+            async with locks.hold("s"):
+                assert locks.is_busy("s")
+        assert not locks.is_busy("s")
+        assert locks._entries == {}
@@ -21,6 +21,7 @@ from core.exceptions import SessionNotFoundError
 from core.models import PipelineContext, HookPoint
 from core.session import Session, SessionStatus, Turn
 from core.session_noop import NoopMemoryGate, NoopSessionManager, NoopWorkingMemory
+from core.tokens import CharRatioEstimator
 
 
 # =============================================================================
@@ -158,6 +159,46 @@ class TestNoopWorkingMemory:
         assert len(msgs) == 2
         assert msgs[0].content == "kurz"
 
+    @pytest.mark.asyncio
+    async def test_get_context_messages_budget_wie_lineare_suche(self):
+        # Binaersuche muss exakt das Fenster der linearen Suche liefern —
+        # auch nach vielen Verdraengungen (toter Praefix wird bereinigt)
+        import random
+        rng = random.Random(7)
+        wm = NoopWorkingMemory(max_tokens=10**9, max_turns=150, estimator=CharRatioEstimator())
+        for i in range(400):
+            await wm.add_turn(make_turn(raw_input="u" * rng.randint(0, 40), response=f"r{i}"))
+        turns = await wm.get_recent_turns(1000)
+        for budget in (-1, 0, 1, 5, 37, 200, 10**6):
+            expected, used = [], 0
+            for t in reversed(turns):
+                cost = (len(t.raw_input) + len(t.final_response)) // 4
+                if used + cost > budget:
+                    break
+                expected[:0] = [t.raw_input, t.final_response]
+                used += cost
+            msgs = await wm.get_context_messages(max_tokens=budget)
+            assert [m.content for m in msgs] == expected
+
+    @pytest.mark.asyncio
+    async def test_get_context_messages_cached(self):
+        wm = NoopWorkingMemory()
+        await wm.add_turn(make_turn(raw_input="a"))
+        first = await wm.get_context_messages()
+        assert await wm.get_context_messages() is first
+        await wm.add_turn(make_turn(raw_input="b"))
+        second = await wm.get_context_messages()
+        assert len(second) == 4
+        assert second[0] is first[0]   # Messages werden nicht neu gebaut
+
+    @pytest.mark.asyncio
+    async def test_turn_count(self):
+        wm = NoopWorkingMemory(max_turns=3)
+        assert await wm.turn_count() == 0
+        for i in range(5):
+            await wm.add_turn(make_turn(raw_input=f"m{i}"))
+        assert await wm.turn_count() == 3
+
     @pytest.mark.asyncio
     async def test_clear_leert_working_memory(self):
         wm = NoopWorkingMemory()
@@ -172,11 +213,47 @@ class TestNoopWorkingMemory:
 
     @pytest.mark.asyncio
     async def test_estimated_tokens_nach_add(self):
-        wm = NoopWorkingMemory()
+        wm = NoopWorkingMemory(estimator=CharRatioEstimator())
         await wm.add_turn(make_turn(raw_input="a" * 40, response="b" * 40))
         # (40+40) / 4 = 20
         assert wm.estimated_tokens() == 20
 
+    @pytest.mark.asyncio
+    async def test_estimated_tokens_folgt_verdraengung(self):
+        # Laufender Zaehler muss nach Trimmen der Summe der Rest-Turns entsprechen
+        wm = NoopWorkingMemory(max_tokens=50, max_turns=4, estimator=CharRatioEstimator())
+        for i in range(20):
+            await wm.add_turn(make_turn(raw_input="u" * (i * 3), response="r" * 7))
+            turns = await wm.get_recent_turns(100)
+            expected = sum((len(t.raw_input) + len(t.final_response)) // 4 for t in turns)
+            assert wm.estimated_tokens() == expected
+            assert len(turns) <= 4
+
+    @pytest.mark.asyncio
+    async def test_estimated_tokens_nach_clear_und_compact(self):
+        from core.compaction import CompactionRegistry, TruncationCompactionStrategy
+        wm = NoopWorkingMemory(max_turns=100, estimator=CharRatioEstimator())
+        for i in range(6):
+            await wm.add_turn(make_turn(raw_input="a" * 40, response="b" * 40))
+        CompactionRegistry.register(TruncationCompactionStrategy(keep_last=2))
+        CompactionRegistry.set_default("truncation")
+        try:
+            await wm.compact()
+        finally:
+            CompactionRegistry.set_default("summarizing")
+        assert wm.estimated_tokens() == 40
+        await wm.clear()
+        assert wm.estimated_tokens() == 0
+
+    @pytest.mark.asyncio
+    async def test_get_recent_turns_chronologisch(self):
+        wm = NoopWorkingMemory()
+        for i in range(5):
+            await wm.add_turn(make_turn(raw_input=f"m{i}"))
+        turns = await wm.get_recent_turns(3)
+        assert [t.raw_input for t in turns] == ["m2", "m3", "m4"]
+        assert await wm.get_recent_turns(0) == []
+
     @pytest.mark.asyncio
     async def test_compact_nutzt_compaction_strategy(self):
         # compact() nutzt SummarizingCompactionStrategy (recency_window=10)
@@ -218,6 +295,23 @@ class TestNoopWorkingMemory:
 # =============================================================================
 
 
+class TestSessionManagerDefaults:
+    def test_update_metadata_ist_nicht_abstrakt(self):
+        from core.session import SessionManager
+        assert "update_metadata" not in SessionManager.__abstractmethods__
+
+    @pytest.mark.asyncio
+    async def test_update_metadata_default_merged_kopie(self):
+        from core.session import SessionManager
+        sm = NoopSessionManager()
+        session = await sm.create_session("h1")
+        await sm.update_metadata(session.id, {"a": 1})
+
+        updated = await SessionManager.update_metadata(sm, session.id, {"b": 2})
+        assert updated.metadata == {"a": 1, "b": 2}
+        assert await SessionManager.update_metadata(sm, "unbekannt", {}) is None
+
+
 class TestNoopSessionManager:
     @pytest.mark.asyncio
     async def test_create_session_setzt_active(self):
@@ -107,6 +107,26 @@ addons:
     assert any(a.name == "database" for a in runner._addons)
 
 
+def test_database_sessions_setzt_sql_session_manager(tmp_path):
+    from addons.database import SqlSessionManager
+    cfg = _write_yaml(tmp_path, """
+addons:
+  database:
+    backend: sqlite
+    path: ":memory:"
+    sessions:
+      enabled: true
+      batch_size: 7
+""")
+    reset_config()
+    loader = HeinzelLoader(config_path=cfg)
+    loader._config = get_config(cfg)
+    runner = loader._build_runner()
+    loader._register_addons(runner)
+    assert isinstance(runner.session_manager, SqlSessionManager)
+    assert runner.session_manager._batch_size == 7
+
+
 def test_register_addons_order(tmp_path):
     """database muss vor dialog_logger registriert sein."""
     cfg = _write_yaml(tmp_path, """
@@ -0,0 +1,114 @@
+"""Tests fuer _streaming — StreamAccumulator und StreamChunkBatcher."""
+
+from __future__ import annotations
+
+import pytest
+
+from core._streaming import StreamAccumulator, StreamChunkBatcher
+
+
+# =============================================================================
+# StreamAccumulator
+# =============================================================================
+
+
+def test_accumulator_sammelt_chunks():
+    acc = StreamAccumulator()
+    for chunk in ("Hal", "lo", "", " Welt"):
+        acc.append(chunk)
+    assert acc.text == "Hallo Welt"
+    assert len(acc) == 10
+    assert str(acc) == "Hallo Welt"
+
+
+def test_accumulator_leer():
+    acc = StreamAccumulator()
+    assert acc.text == ""
+    assert len(acc) == 0
+    assert not acc
+
+
+def test_accumulator_text_nach_join_weiter_erweiterbar():
+    acc = StreamAccumulator()
+    acc.append("a")
+    acc.append("b")
+    assert acc.text == "ab"
+    acc.append("c")
+    assert acc.text == "abc"
+    assert len(acc) == 3
+
+
+def test_accumulator_reset():
+    acc = StreamAccumulator()
+    acc.append("weg")
+    acc.reset("[Fehler]")
+    assert acc.text == "[Fehler]"
+    assert len(acc) == 8
+
+
+# =============================================================================
+# StreamChunkBatcher
+# =============================================================================
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_batcher_fenster_nach_groesse():
+    windows: list[str] = []
+
+    async def on_window(text: str) -> None:
+        windows.append(text)
+
+    batcher = StreamChunkBatcher(on_window, max_chars=4, max_interval=0)
+    for chunk in ("ab", "c", "de", "f", "g"):
+        await batcher.feed(chunk)
+    assert windows == ["abcde"]
+    await batcher.flush()
+    assert windows == ["abcde", "fg"]
+    assert batcher.windows_flushed == 2
+
+
+@pytest.mark.asyncio
+async def test_batcher_fenster_nach_zeit():
+    windows: list[str] = []
+    clock = _Clock()
+
+    async def on_window(text: str) -> None:
+        windows.append(text)
+
+    batcher = StreamChunkBatcher(on_window, max_chars=1000, max_interval=0.1, clock=clock)
+    await batcher.feed("a")
+    clock.now = 0.05
+    await batcher.feed("b")
+    assert windows == []
+    clock.now = 0.15
+    await batcher.feed("c")
+    assert windows == ["abc"]
+
+
+@pytest.mark.asyncio
+async def test_batcher_flush_leer_ist_noop():
+    called = []
+
+    async def on_window(text: str) -> None:
+        called.append(text)
+
+    batcher = StreamChunkBatcher(on_window)
+    await batcher.feed("")
+    await batcher.flush()
+    assert called == []
+
+
+def test_batcher_max_chars_validiert():
+    async def on_window(text: str) -> None:
+        pass
+
+    with pytest.raises(ValueError):
+        StreamChunkBatcher(on_window, max_chars=0)
@@ -0,0 +1,224 @@
+"""Tests fuer core.tokens — TokenEstimator, Cache, Kalibrierung, Registry."""
+
+from __future__ import annotations
+
+import pytest
+
+from core.exceptions import ProviderError
+from core.runner import Runner
+from core.session import Turn
+from core.tokens import (
+    BpeApproxEstimator,
+    CachedTokenEstimator,
+    CalibratedTokenEstimator,
+    CharRatioEstimator,
+    RemoteTokenCalibrator,
+    TokenEstimator,
+    TokenEstimatorRegistry,
+    build_token_estimator,
+)
+
+
+class CountingEstimator(TokenEstimator):
+    """Zaehlt Aufrufe, 1 Token pro Zeichen."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return "counting"
+
+    def count(self, text: str) -> int:
+        self.calls += 1
+        return len(text)
+
+
+class CountingProvider:
+    """Minimaler Provider mit count_tokens: 1 Token pro 2 Zeichen + 5 Overhead."""
+
+    def __init__(self, result=None, error: Exception | None = None) -> None:
+        self.calls = 0
+        self._result = result
+        self._error = error
+
+    async def count_tokens(self, messages, system_prompt="", model=""):
+        self.calls += 1
+        if self._error is not None:
+            raise self._error
+        if self._result == "none":
+            return None
+        return len(messages[0]["content"]) // 2 + 5
+
+
+# =============================================================================
+# Estimatoren
+# =============================================================================
+
+
+def test_char_ratio_wie_bisher():
+    est = CharRatioEstimator()
+    assert est.count("a" * 41) == 10
+    turn = Turn(session_id="s", raw_input="a" * 3, final_response="b" * 5)
+    assert est.count_turn(turn) == 2   # (3 + 5) // 4, nicht 0 + 1
+
+
+def test_bpe_leer_und_einfach():
+    est = BpeApproxEstimator()
+    assert est.count("") == 0
+    assert est.count("Hallo Welt") == 2
+
+
+def test_bpe_umlaute_und_code_teurer_als_len4():
+    est = BpeApproxEstimator()
+    german = "Größenänderung übermittelt"
+    code = "if (x[0] == 42) { return y; }"
+    assert est.count(german) > len(german) // 4
+    assert est.count(code) > len(code) // 4
+
+
+def test_bpe_zahlen_in_dreiergruppen():
+    assert BpeApproxEstimator().count("123456789") == 3
+
+
+# =============================================================================
+# CachedTokenEstimator
+# =============================================================================
+
+
+def test_cache_trifft_bei_gleichem_inhalt():
+    inner = CountingEstimator()
+    est = CachedTokenEstimator(inner, max_entries=8, min_chars=4)
+    text = "x" * 100
+    assert est.count(text) == 100
+    assert est.count("".join(["x"] * 100)) == 100   # anderes Objekt, gleicher Inhalt
+    assert inner.calls == 1
+    assert (est.hits, est.misses) == (1, 1)
+
+
+def test_cache_kurze_texte_ungecacht():
+    inner = CountingEstimator()
+    est = CachedTokenEstimator(inner, min_chars=10)
+    est.count("kurz")
+    est.count("kurz")
+    assert inner.calls == 2
+    assert est.hits == est.misses == 0
+
+
+def test_cache_lru_verdraengt_aeltesten():
+    inner = CountingEstimator()
+    est = CachedTokenEstimator(inner, max_entries=2, min_chars=1)
+    est.count("aa")
+    est.count("bb")
+    est.count("aa")   # aa wird juengster Eintrag
+    est.count("cc")   # verdraengt bb
+    est.count("aa")
+    assert inner.calls == 3
+    est.count("bb")
+    assert inner.calls == 4
+
+
+# =============================================================================
+# Kalibrierung
+# =============================================================================
+
+
+def test_calibrated_faktor_und_clamp():
+    est = CalibratedTokenEstimator(CountingEstimator(), alpha=0.5, max_factor=4.0)
+    est.update(100, 150)
+    assert est.factor == pytest.approx(1.5)
+    assert est.count("x" * 10) == 15
+    est.update(100, 100_000)
+    assert est.factor == 4.0
+    est.update(0, 10)   # ungueltiges Paar ignoriert
+    assert est.samples == 2
+
+
+@pytest.mark.asyncio
+async def test_calibrator_zieht_overhead_ab():
+    est = CalibratedTokenEstimator(CountingEstimator())
+    calibrator = RemoteTokenCalibrator(est, min_chars=10, max_samples=2)
+    provider = CountingProvider()
+    assert await calibrator.observe(provider, "kurz") is False
+    assert await calibrator.observe(provider, "x" * 400) is True
+    # remote 200 + 5 Overhead, Probe "." ergibt 5 -> Overhead 4 -> 201 / 400
+    assert est.factor == pytest.approx(201 / 400)
+    await calibrator.observe(provider, "y" * 400)
+    assert calibrator.done
+    calls = provider.calls
+    await calibrator.observe(provider, "z" * 400)
+    assert provider.calls == calls
+
+
+@pytest.mark.asyncio
+async def test_calibrator_schaltet_ab_ohne_provider_support():
+    est = CalibratedTokenEstimator(CountingEstimator())
+    calibrator = RemoteTokenCalibrator(est, min_chars=1)
+    assert await calibrator.observe(CountingProvider(result="none"), "text") is False
+    assert calibrator.done
+    assert est.samples == 0
+
+
+@pytest.mark.asyncio
+async def test_calibrator_schaltet_ab_bei_provider_error():
+    est = CalibratedTokenEstimator(CountingEstimator())
+    calibrator = RemoteTokenCalibrator(est, min_chars=1)
+    provider = CountingProvider(error=ProviderError("weg"))
+    assert await calibrator.observe(provider, "text") is False
+    assert calibrator.done
+
+
+# =============================================================================
+# Registry + Config
+# =============================================================================
+
+
+def test_registry_defaults():
+    assert TokenEstimatorRegistry.get_default().name == "bpe"
+    assert {"bpe", "chars"} <= set(TokenEstimatorRegistry.list_available())
+    with pytest.raises(KeyError):
+        TokenEstimatorRegistry.set_default("gibtsnicht")
+
+
+def test_build_token_estimator_aus_config():
+    est = build_token_estimator({})
+    assert isinstance(est, CachedTokenEstimator)
+    assert isinstance(est.inner, BpeApproxEstimator)
+
+    est = build_token_estimator({"estimator": "chars", "cache_size": 0, "calibrate": True})
+    assert isinstance(est, CalibratedTokenEstimator)
+    assert isinstance(est.inner, CharRatioEstimator)
+
+    est = build_token_estimator({"estimator": "gibtsnicht"})
+    assert est.name == "bpe"
+
+
+@pytest.mark.asyncio
+async def test_runner_nutzt_estimator_im_working_memory():
+    class _Provider:
+        async def chat(self, messages, system_prompt="", model=""):
+            return "antwort"
+
+    runner = Runner(provider=_Provider(), name="t", config={"tokens": {"estimator": "chars"}})
+    assert runner.token_estimator.name == "chars"
+    wm = await runner.session_manager.get_working_memory("s1")
+    assert wm.estimator is runner.token_estimator
+
+
+@pytest.mark.asyncio
+async def test_runner_kalibriert_im_hintergrund():
+    class _Provider(CountingProvider):
+        async def chat(self, messages, system_prompt="", model=""):
+            return "antwort " * 100
+
+    provider = _Provider()
+    runner = Runner(
+        provider=provider, name="t",
+        config={"tokens": {"calibrate": True, "calibration_samples": 1}},
+    )
+    await runner.connect()
+    await runner.chat("frage")
+    await runner._calibration_task
+    assert isinstance(runner.token_estimator, CalibratedTokenEstimator)
+    assert runner.token_estimator.samples == 1
+    await runner.disconnect()
@@ -14,6 +14,7 @@ from core.compaction import (
 )
 from core.models.placeholders import ResourceBudget
 from core.session import Turn, Session
+from core.tokens import TokenEstimator
 
 
 # ---------------------------------------------------------------------------
@@ -194,6 +195,56 @@ class TestTruncationCompactionStrategy:
         assert result.kept_turns == ()
 
 
+# ---------------------------------------------------------------------------
+# TokenEstimator der Working Memory
+# ---------------------------------------------------------------------------
+
+
+class FixedEstimator(TokenEstimator):
+    """Zaehlt jeden Text als 7 Tokens — unterscheidbar vom Default."""
+
+    @property
+    def name(self) -> str:
+        return "fixed"
+
+    def count(self, text: str) -> int:
+        return 7
+
+
+class TestCompactionEstimator:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("strategy", [
+        SummarizingCompactionStrategy(recency_window=2),
+        TruncationCompactionStrategy(keep_last=2),
+    ])
+    async def test_nutzt_uebergebenen_estimator(self, strategy):
+        turns = [make_turn(f"m{i}") for i in range(5)]
+        result = await strategy.compact(turns, BUDGET, estimator=FixedEstimator())
+        assert result.tokens_before == 5 * 2 * 7
+        assert result.tokens_after == 2 * 2 * 7
+
+    @pytest.mark.asyncio
+    async def test_working_memory_reicht_estimator_durch(self, monkeypatch):
+        from core.session_noop import NoopWorkingMemory
+        seen = []
+        strategy = TruncationCompactionStrategy(keep_last=1)
+        original = strategy.compact
+
+        async def spy(turns, budget, estimator=None):
+            seen.append(estimator)
+            return await original(turns, budget, estimator=estimator)
+
+        monkeypatch.setattr(strategy, "compact", spy)
+        monkeypatch.setattr(NoopWorkingMemory, "compaction_strategy", strategy)
+        estimator = FixedEstimator()
+        wm = NoopWorkingMemory(estimator=estimator)
+        for i in range(3):
+            await wm.add_turn(make_turn(f"m{i}"))
+        await wm.compact()
+        assert seen == [estimator]
+        assert wm.estimated_tokens() == 2 * 7
+
+
 # ---------------------------------------------------------------------------
 # NoopRollingSessionPolicy
 # ---------------------------------------------------------------------------
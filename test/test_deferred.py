@@ -0,0 +1,261 @@
+"""
+Tests fuer die Deferred-Queue: Sammeln pro Modell, Einreichen als Batch
+(lokales FakeBatchBackend), Polling, Futures/Webhooks und Sync-Fallback.
+"""
+import sys, os, asyncio, json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src/llm-provider"))
+
+import httpx
+import pytest
+
+from models import ChatRequest, ChatResponse, BatchResultItem
+
+
+def run(coro):
+    """Eigener Loop pro Aufruf — laesst den globalen Event-Loop unangetastet."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def anthropic_message(params):
+    """Antwort im Anthropic-Format: Echo der letzten User-Message."""
+    text = params["messages"][-1]["content"]
+    return {"id": "m", "model": params["model"], "role": "assistant",
+            "content": [{"type": "text", "text": f"echo: {text}"}],
+            "stop_reason": "end_turn", "usage": {"input_tokens": 10, "output_tokens": 4}}
+
+
+def provider(monkeypatch, **deferred):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    from anthropic_provider import AnthropicProvider
+    cfg = {"poll_interval_s": 0.01, "batch_turnaround_s": 0, "min_batch": 3, **deferred}
+    p = AnthropicProvider({"name": "anthropic", "api_base": "https://api.anthropic.com/v1",
+                           "default_model": "claude-sonnet-4-6", "deferred": cfg})
+    costs, sync_calls = [], []
+
+    async def record_cost(model, in_tok, out_tok, ms, ctx, status, err=None, **cache):
+        costs.append((model, in_tok, out_tok, status))
+
+    async def sync_chat(request):
+        sync_calls.append(request)
+        return ChatResponse(content="sync", model=request.model, usage={},
+                            provider="anthropic")
+
+    monkeypatch.setattr(p, "_log_cost", record_cost)
+    monkeypatch.setattr(p, "chat", sync_chat)
+    return p, costs, sync_calls
+
+
+def queue(p, backend, webhook_client=None):
+    from deferred import DeferredQueue
+    p._deferred = DeferredQueue(p, backend=backend, webhook_client=webhook_client)
+    return p._deferred
+
+
+def req(text, model=None):
+    return ChatRequest(messages=[{"role": "user", "content": text}], model=model)
+
+
+# ─── Batching ─────────────────────────────────────────────────
+
+def test_requests_collected_into_one_batch(monkeypatch):
+    from deferred import FakeBatchBackend
+    p, costs, sync_calls = provider(monkeypatch)
+    backend = FakeBatchBackend(anthropic_message, complete_after=2)
+    q = queue(p, backend)
+
+    async def scenario():
+        tickets = [await q.submit(req(f"t{i}"), max_delay_s=3600) for i in range(3)]
+        done = await asyncio.wait_for(
+            asyncio.gather(*(q.wait(t.id) for t in tickets)), 5)
+        await q.close()
+        return done
+
+    done = run(scenario())
+    assert len(backend.batches) == 1
+    [batch] = backend.batches.values()
+    assert [i.params["messages"][-1]["content"] for i in batch["requests"]] == ["t0", "t1", "t2"]
+    assert [t.status for t in done] == ["completed"] * 3
+    assert done[1].result.content == "echo: t1" and done[1].batch_id == "fake_batch_1"
+    assert costs == [("claude-sonnet-4-6", 10, 4, "batch")] * 3
+    assert sync_calls == []
+    s = q.stats
+    assert s["batches"] == 1 and s["avg_batch_size"] == 3.0
+    assert s["upstream_calls_saved"] == 2
+    assert s["tokens_saved_equivalent"] == 21
+
+
+def test_deadline_submits_partial_batch(monkeypatch):
+    from deferred import FakeBatchBackend
+    p, _, _ = provider(monkeypatch, min_batch=100, batch_turnaround_s=0.05)
+    backend = FakeBatchBackend(anthropic_message)
+    q = queue(p, backend)
+
+    async def scenario():
+        t = await q.submit(req("eilt bald"), max_delay_s=0.1)
+        await asyncio.sleep(0.02)
+        early = len(backend.batches)
+        done = await asyncio.wait_for(q.wait(t.id), 5)
+        await q.close()
+        return early, done
+
+    early, done = run(scenario())
+    assert early == 0
+    assert done.status == "completed" and len(backend.batches) == 1
+
+
+def test_batches_split_per_model(monkeypatch):
+    from deferred import FakeBatchBackend
+    p, _, _ = provider(monkeypatch, min_batch=2)
+    backend = FakeBatchBackend(anthropic_message)
+    q = queue(p, backend)
+
+    async def scenario():
+        tickets = [await q.submit(req("a", m), max_delay_s=3600)
+                   for m in ("m1", "m2", "m1", "m2")]
+        await asyncio.wait_for(asyncio.gather(*(q.wait(t.id) for t in tickets)), 5)
+        await q.close()
+
+    run(scenario())
+    models = sorted({i.params["model"] for i in b["requests"]} for b in backend.batches.values())
+    assert models == [{"m1"}, {"m2"}]
+
+
+# ─── Fallbacks ────────────────────────────────────────────────
+
+def test_short_tolerance_runs_sync(monkeypatch):
+    from deferred import FakeBatchBackend
+    p, _, sync_calls = provider(monkeypatch, batch_turnaround_s=600)
+    backend = FakeBatchBackend(anthropic_message)
+    q = queue(p, backend)
+
+    async def scenario():
+        t = await q.submit(req("jetzt"), max_delay_s=60)
+        status = t.status
+        done = await q.wait(t.id)
+        await q.close()
+        return status, done
+
+    status, done = run(scenario())
+    assert status == "sync" and done.result.content == "sync"
+    assert len(sync_calls) == 1 and backend.batches == {}
+
+
+def test_failed_batch_falls_back_to_chat(monkeypatch):
+    from deferred import FakeBatchBackend
+    p, costs, sync_calls = provider(monkeypatch, min_batch=2)
+    q = queue(p, FakeBatchBackend(anthropic_message, fail=True))
+
+    async def scenario():
+        tickets = [await q.submit(req(x), max_delay_s=3600) for x in ("a", "b")]
+        done = await asyncio.wait_for(asyncio.gather(*(q.wait(t.id) for t in tickets)), 5)
+        await q.close()
+        return done
+
+    done = run(scenario())
+    assert [t.result.content for t in done] == ["sync", "sync"]
+    assert len(sync_calls) == 2 and costs == []
+    assert q.stats["batches_failed"] == 1
+
+
+def test_errored_item_marks_ticket_failed(monkeypatch):
+    from deferred import FakeBatchBackend
+    p, _, _ = provider(monkeypatch, min_batch=2)
+
+    def respond(params):
+        if params["messages"][-1]["content"] == "kaputt":
+            raise ValueError("invalid_request")
+        return anthropic_message(params)
+
+    q = queue(p, FakeBatchBackend(respond))
+
+    async def scenario():
+        tickets = [await q.submit(req(x), max_delay_s=3600) for x in ("gut", "kaputt")]
+        done = await asyncio.wait_for(asyncio.gather(*(q.wait(t.id) for t in tickets)), 5)
+        await q.close()
+        return done
+
+    ok, bad = run(scenario())
+    assert ok.status == "completed"
+    assert bad.status == "failed" and "invalid_request" in bad.error
+
+
+def test_provider_without_batches_runs_sync(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    from google_provider import GoogleProvider
+    p = GoogleProvider({"name": "google", "api_base": "https://example.invalid",
+                        "default_model": "gemini-2.0-flash"})
+    assert p._deferred.backend is None
+
+
+# ─── Webhook / Parsing ────────────────────────────────────────
+
+def test_webhook_receives_ticket(monkeypatch):
+    from deferred import FakeBatchBackend
+    p, _, _ = provider(monkeypatch, min_batch=1, webhook_allow=["http://heinzel.local/"])
+    hooks = []
+
+    def handler(request):
+        hooks.append((str(request.url), json.loads(request.content)))
+        return httpx.Response(204)
+
+    async def scenario():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        q = queue(p, FakeBatchBackend(anthropic_message), webhook_client=client)
+        t = await q.submit(req("hook"), max_delay_s=3600,
+                           webhook_url="http://heinzel.local/done")
+        await asyncio.wait_for(q.wait(t.id), 5)
+        await q.close()
+        await client.aclose()
+        return t, q.stats
+
+    t, stats = run(scenario())
+    assert hooks == [("http://heinzel.local/done", t.model_dump())]
+    assert hooks[0][1]["result"]["content"] == "echo: hook"
+    assert stats["webhooks"] == 1
+
+
+def test_webhook_outside_allowlist_rejected(monkeypatch):
+    from deferred import FakeBatchBackend
+    p, _, _ = provider(monkeypatch, webhook_allow=["https://heinzel.local/hooks/"])
+    q = queue(p, FakeBatchBackend(anthropic_message))
+    assert q.webhook_allowed("https://heinzel.local/hooks/done")
+    assert not q.webhook_allowed("https://heinzel.local.evil.com/hooks/done")
+    assert not q.webhook_allowed("http://heinzel.local/hooks/done")
+    assert not q.webhook_allowed("https://heinzel.local/admin")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await q.submit(req("x"), max_delay_s=3600,
+                           webhook_url="http://169.254.169.254/latest")
+        await q.close()
+
+    run(scenario())
+    assert q.stats["submitted"] == 0 and q.stats["webhooks_rejected"] == 1
+
+    p2, _, _ = provider(monkeypatch)                 # ohne Allowlist: kein Webhook
+    assert not queue(p2, None).webhook_allowed("https://heinzel.local/hooks/done")
+
+
+def test_parse_batch_result_formats(monkeypatch):
+    p, _, _ = provider(monkeypatch)
+    raw = anthropic_message({"model": "claude-sonnet-4-6",
+                             "messages": [{"role": "user", "content": "x"}]})
+    ok = p._parse_batch_result(BatchResultItem(
+        custom_id="a", result={"type": "succeeded", "message": raw}))
+    assert ok.content == "echo: x"
+    with pytest.raises(RuntimeError):
+        p._parse_batch_result(BatchResultItem(
+            custom_id="b", result={"type": "errored", "error": {"type": "overloaded"}}))
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    from openai_provider import OpenAIProvider
+    o = OpenAIProvider({"name": "openai", "api_base": "https://api.openai.com/v1",
+                        "default_model": "gpt-4o"})
+    body = {"id": "c", "model": "gpt-4o", "choices": [{"index": 0, "finish_reason": "stop",
+            "message": {"role": "assistant", "content": "hallo"}}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": 1}}
+    assert o._parse_batch_result(BatchResultItem(custom_id="c", result=body)).content == "hallo"
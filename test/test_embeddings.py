@@ -0,0 +1,226 @@
+"""
+Tests fuer /embeddings: Micro-Batching gleichzeitiger Requests und
+persistenter Content-Hash-Cache.
+"""
+import sys, os, asyncio, json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src/llm-provider"))
+
+import httpx
+import pytest
+
+from models import EmbeddingRequest
+
+
+def run(coro):
+    """Eigener Loop pro Aufruf — laesst den globalen Event-Loop unangetastet."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def fake_vector(text):
+    return [float(len(text)), float(ord(text[0])) if text else 0.0, 0.5]
+
+
+class FakeUpstream:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, model, texts, dimensions):
+        self.calls.append((model, list(texts), dimensions))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("upstream kaputt")
+        return [fake_vector(t) for t in texts], sum(len(t) for t in texts)
+
+
+def batcher(upstream, tmp_path, **cfg):
+    from embeddings import EmbeddingBatcher
+    config = {"embeddings": {"cache_path": str(tmp_path / "emb.db"), **cfg}}
+    return EmbeddingBatcher("p", config, upstream)
+
+
+# ─── Batching ─────────────────────────────────────────────────
+
+def test_concurrent_requests_merged_into_one_call(tmp_path):
+    up = FakeUpstream()
+    b = batcher(up, tmp_path, cache=False)
+
+    async def scenario():
+        return await asyncio.gather(
+            b.embed("m", ["alpha", "beta"]), b.embed("m", ["gamma"]),
+            b.embed("m", ["beta", "delta"]))
+
+    results = run(scenario())
+    assert len(up.calls) == 1
+    assert up.calls[0][1] == ["alpha", "beta", "gamma", "delta"]
+    assert [v for v in results[2][0]] == [fake_vector("beta"), fake_vector("delta")]
+    # Tokens nach Textlaenge verteilt
+    assert results[1][1]["prompt_tokens"] == len("gamma")
+    assert b.stats["deduplicated"] == 1
+
+
+def test_groups_split_by_model_and_dimensions(tmp_path):
+    up = FakeUpstream()
+    b = batcher(up, tmp_path, cache=False)
+
+    async def scenario():
+        await asyncio.gather(b.embed("m", ["a"]), b.embed("m2", ["a"]),
+                             b.embed("m", ["a"], dimensions=256))
+
+    run(scenario())
+    assert sorted((m, d or 0) for m, _, d in up.calls) == [("m", 0), ("m", 256), ("m2", 0)]
+
+
+def test_batch_split_at_max_batch(tmp_path):
+    up = FakeUpstream()
+    b = batcher(up, tmp_path, cache=False, max_batch=3)
+
+    async def scenario():
+        return await b.embed("m", [f"t{i}" for i in range(7)])
+
+    vectors, _ = run(scenario())
+    assert [len(texts) for _, texts, _ in up.calls] == [3, 3, 1]
+    assert vectors[6] == fake_vector("t6")
+
+
+def test_upstream_error_reaches_every_caller(tmp_path):
+    b = batcher(FakeUpstream(fail=True), tmp_path, cache=False)
+
+    async def scenario():
+        return await asyncio.gather(b.embed("m", ["a"]), b.embed("m", ["b"]),
+                                    return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in run(scenario()))
+
+
+def test_close_flushes_open_window_and_awaits_batches(tmp_path):
+    up = FakeUpstream()
+    b = batcher(up, tmp_path, cache=False, window_ms=60_000)
+
+    async def scenario():
+        waiting = asyncio.ensure_future(b.embed("m", ["spaet"]))
+        await asyncio.sleep(0.01)
+        await b.close()
+        assert len(up.calls) == 1 and not b._batches
+        return await waiting
+
+    vectors, _ = run(scenario())
+    assert vectors == [fake_vector("spaet")]
+
+
+# ─── Cache ────────────────────────────────────────────────────
+
+def test_cached_texts_never_sent_twice(tmp_path):
+    up = FakeUpstream()
+    b = batcher(up, tmp_path)
+
+    async def scenario():
+        await b.embed("m", ["eins", "zwei"])
+        second = await b.embed("m", ["zwei", "drei"])
+        await b.close()
+        return second
+
+    vectors, usage = run(scenario())
+    assert [texts for _, texts, _ in up.calls] == [["eins", "zwei"], ["drei"]]
+    assert vectors == [fake_vector("zwei"), fake_vector("drei")]
+    assert usage == {"prompt_tokens": 4, "total_tokens": 4, "cached_inputs": 1}
+
+
+def test_sqlite_cache_survives_restart(tmp_path):
+    up = FakeUpstream()
+
+    async def first():
+        b = batcher(up, tmp_path)
+        await b.embed("m", ["persistiert"])
+        await b.close()
+
+    async def second():
+        b = batcher(up, tmp_path)
+        result = await b.embed("m", ["persistiert"])
+        await b.close()
+        return b, result
+
+    run(first())
+    b, (vectors, _) = run(second())
+    assert len(up.calls) == 1
+    assert vectors == [fake_vector("persistiert")]
+    assert b.stats["cache"]["hits_sqlite"] == 1
+
+
+def test_blob_is_float64():
+    from embeddings import _to_blob, _from_blob
+    blob = _to_blob([0.25, -1.5, 3.0])
+    assert len(blob) == 24
+    assert _from_blob(blob) == [0.25, -1.5, 3.0]
+
+
+def test_tiers_return_identical_vectors(tmp_path):
+    from embeddings import EmbeddingBatcher
+
+    async def upstream(model, texts, dimensions):
+        return [[0.1, 1 / 3, 2 ** 0.5] for _ in texts], len(texts)
+
+    async def scenario(memory_max_entries):
+        b = EmbeddingBatcher("p", {"embeddings": {
+            "cache_path": str(tmp_path / "emb.db"),
+            "memory_max_entries": memory_max_entries}}, upstream)
+        fresh = await b.embed("m", ["a", "b"])
+        from_memory = await b.embed("m", ["b"])
+        from_sqlite = await b.embed("m", ["a"])      # aus Memory verdraengt
+        await b.close()
+        return fresh[0], from_memory[0], from_sqlite[0], b.stats["cache"]
+
+    fresh, from_memory, from_sqlite, stats = run(scenario(1))
+    assert stats["hits_sqlite"] == 1
+    assert fresh[0] == from_memory[0] == from_sqlite[0] == [0.1, 1 / 3, 2 ** 0.5]
+
+
+# ─── Provider ─────────────────────────────────────────────────
+
+def test_openai_embeddings_batched_and_cached(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    from openai_provider import OpenAIProvider
+    import http_pool
+    calls = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        calls.append(body)
+        data = [{"index": i, "embedding": fake_vector(t)} for i, t in enumerate(body["input"])]
+        return httpx.Response(200, json={"model": body["model"], "data": data[::-1],
+                                         "usage": {"prompt_tokens": 9, "total_tokens": 9}})
+
+    p = OpenAIProvider({"name": "openai", "api_base": "https://api.openai.com/v1",
+                        "default_model": "gpt-4o",
+                        "embeddings": {"cache_path": str(tmp_path / "emb.db")}})
+
+    async def scenario():
+        p._client = http_pool.create_client({}, inner=httpx.MockTransport(handler))
+        p._connected = True
+        first = await asyncio.gather(p.create_embedding(EmbeddingRequest(input="hallo")),
+                                     p.create_embedding(EmbeddingRequest(input=["welt", "x"])))
+        again = await p.create_embedding(EmbeddingRequest(input=["x", "hallo"]))
+        await p.aclose()
+        return first, again
+
+    (one, two), again = run(scenario())
+    assert len(calls) == 1 and calls[0]["input"] == ["hallo", "welt", "x"]
+    assert calls[0]["model"] == "text-embedding-3-small"
+    assert one.data[0].embedding == fake_vector("hallo")
+    assert [d.embedding for d in two.data] == [fake_vector("welt"), fake_vector("x")]
+    assert again.usage["cached_inputs"] == 2 and again.usage["prompt_tokens"] == 0
+    assert p.embedding_stats()["upstream_calls"] == 1
+
+
+def test_provider_without_embeddings_not_available(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    from anthropic_provider import AnthropicProvider
+    from base import EndpointNotAvailable
+    p = AnthropicProvider({"name": "anthropic", "api_base": "https://api.anthropic.com/v1",
+                           "default_model": "claude-sonnet-4-6"})
+    with pytest.raises(EndpointNotAvailable):
+        run(p.create_embedding(EmbeddingRequest(input="x")))
@@ -0,0 +1,205 @@
+"""
+Tests fuer die Dokument-Extraktion: Content-Hash-Cache, seitenweises
+Kuerzen, Prozess-Pool mit Timeout und Warteschlange, Provider-Pfad.
+"""
+import sys, os, io, asyncio, base64, time
+os.environ.setdefault("LOG_DIR", "/tmp")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src/llm-provider"))
+
+from models import ChatRequest, DocumentBlock
+
+
+def run(coro):
+    """Eigener Loop pro Aufruf — laesst den globalen Event-Loop unangetastet."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def make_docx(*paragraphs):
+    from docx import Document
+    doc = Document()
+    for text in paragraphs:
+        doc.add_paragraph(text)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def extraction_config(**overrides):
+    return {"file_extraction": {"workers": 0, **overrides}}
+
+
+# ─── Cache / Rendering ────────────────────────────────────────
+
+def test_sync_extraction_cached_by_content_hash():
+    from file_processor import _extract_docx, extraction_cache
+    data = make_docx("Cache-Absatz", "noch einer")
+    first = _extract_docx(data, "a.docx")
+    hits = extraction_cache.hits
+    second = _extract_docx(data, "b.docx")
+    assert extraction_cache.hits == hits + 1
+    assert first.text.replace("a.docx", "b.docx") == second.text
+
+
+def test_extraction_records_pages_and_bytes():
+    from file_processor import extract_pages
+    data = make_docx("eins", "zwei", "drei")
+    ex = extract_pages("docx", data)
+    assert ex.page_count == 3 and ex.byte_count == len(data)
+    assert ex.text_bytes == len("einszweidrei")
+
+
+def test_render_truncates_by_pages_and_chars():
+    from file_processor import Extraction, render_extraction
+    ex = Extraction(kind="pdf", pages=[f"--- Seite {i} ---\n" + "x" * 100 for i in range(1, 6)])
+    full = render_extraction(ex, "r.pdf").text
+    assert "Seite 5" in full and "gekürzt" not in full
+    by_pages = render_extraction(ex, "r.pdf", max_pages=2).text
+    assert "Seite 2" in by_pages and "Seite 3" not in by_pages
+    assert "3 von 5 Abschnitten gekürzt" in by_pages
+    by_chars = render_extraction(ex, "r.pdf", max_chars=250).text
+    assert "Seite 2" in by_chars and "Seite 3" not in by_chars
+
+
+def test_cache_bounded_by_text_bytes():
+    from file_processor import Extraction, ExtractionCache
+    c = ExtractionCache(max_entries=10, max_bytes=250)
+    for key in ("a", "b", "c"):
+        c.put(key, Extraction(kind="docx", pages=["x" * 100]))
+    assert c.get("a") is None and c.get("c") is not None
+    assert c.stats()["text_bytes"] == 200
+
+
+# ─── DocumentExtractor ────────────────────────────────────────
+
+def test_extractor_timeout_returns_text_and_is_cached(monkeypatch):
+    import file_processor
+    from file_processor import DocumentExtractor, ExtractionCache, Extraction
+
+    def slow(kind, data):
+        time.sleep(0.3)
+        return Extraction(kind=kind, pages=["zu spaet"])
+    monkeypatch.setattr(file_processor, "extract_pages", slow)
+    ext = DocumentExtractor(extraction_config(timeout_s=0.02), cache=ExtractionCache())
+
+    async def scenario():
+        first = await ext.text_block(b"gross", "g.pdf")
+        second = await ext.text_block(b"gross", "g.pdf")
+        return first, second
+
+    first, second = run(scenario())
+    assert "abgebrochen" in first.text and first.text == second.text
+    assert ext.stats["timeouts"] == 1 and ext.stats["cache"]["hits"] == 1
+
+
+def test_extractor_does_not_cache_lost_worker(monkeypatch):
+    from file_processor import DocumentExtractor, ExtractionCache, Extraction
+    ext = DocumentExtractor(extraction_config(), cache=ExtractionCache())
+    results = [Extraction(kind="pdf", error="Extraktion fehlgeschlagen: Worker-Prozess beendet."),
+               Extraction(kind="pdf", pages=["wieder da"])]
+
+    async def flaky(data, kind, retry=True):
+        return results.pop(0)
+    monkeypatch.setattr(ext, "_run", flaky)
+
+    async def scenario():
+        return await ext.extract(b"doc", "pdf"), await ext.extract(b"doc", "pdf")
+
+    first, second = run(scenario())
+    assert "Worker-Prozess" in first.error
+    assert second.pages == ["wieder da"] and ext.stats["cache"]["hits"] == 0
+
+
+def test_extractor_shares_concurrent_identical_files(monkeypatch):
+    import file_processor
+    from file_processor import DocumentExtractor, ExtractionCache, Extraction
+    calls = []
+
+    def counted(kind, data):
+        calls.append(kind)
+        time.sleep(0.02)
+        return Extraction(kind=kind, pages=["--- Seite 1 ---\ninhalt"], byte_count=len(data))
+    monkeypatch.setattr(file_processor, "extract_pages", counted)
+    ext = DocumentExtractor(extraction_config(), cache=ExtractionCache())
+
+    async def scenario():
+        return await asyncio.gather(*(ext.text_block(b"same", "s.pdf") for _ in range(4)))
+
+    blocks = run(scenario())
+    assert len(calls) == 1
+    assert all("inhalt" in b.text for b in blocks)
+    assert ext.stats["shared"] == 3
+
+
+def test_extractor_rejects_when_queue_full(monkeypatch):
+    import file_processor
+    from file_processor import DocumentExtractor, ExtractionCache, Extraction
+
+    def slow(kind, data):
+        time.sleep(0.05)
+        return Extraction(kind=kind, pages=["ok"], byte_count=len(data))
+    monkeypatch.setattr(file_processor, "extract_pages", slow)
+    mb = 1024 * 1024
+    ext = DocumentExtractor(extraction_config(max_inflight_mb=1, max_queued_mb=1),
+                            cache=ExtractionCache())
+
+    async def scenario():
+        first = asyncio.ensure_future(ext.extract(b"a" * mb, "pdf"))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(ext.extract(b"b" * (mb // 2), "pdf"))
+        await asyncio.sleep(0)
+        third = await ext.extract(b"c" * (mb // 2 + 1), "pdf")
+        return await first, await second, third
+
+    first, second, third = run(scenario())
+    assert first.pages == second.pages == ["ok"]
+    assert "Warteschlange" in third.error
+    assert ext.stats["rejected"] == 1 and ext.stats["inflight_bytes"] == 0
+
+
+def test_extractor_process_pool_extracts_real_docx():
+    from file_processor import DocumentExtractor, ExtractionCache
+    ext = DocumentExtractor({"file_extraction": {"workers": 1}}, cache=ExtractionCache())
+    data = make_docx("Aus dem Worker")
+
+    async def scenario():
+        try:
+            return await ext.extract(data, "docx")
+        finally:
+            await ext.close()
+
+    ex = run(scenario())
+    assert ex.pages == ["Aus dem Worker"] and ex.error is None
+    assert ext.stats["extracted"] == 1
+
+
+# ─── Provider ─────────────────────────────────────────────────
+
+def test_openai_documents_extracted_before_transform(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    from openai_provider import OpenAIProvider
+    p = OpenAIProvider({"name": "openai", "api_base": "http://x", "default_model": "gpt-4o",
+                        "file_extraction": {"workers": 0}})
+    pdf = DocumentBlock(data=base64.b64encode(b"%PDF kaputt").decode())
+    request = ChatRequest(messages=[{"role": "user", "content": [
+        {"type": "text", "text": "Fasse zusammen"}, pdf.model_dump()]}])
+
+    extracted = run(p._extract_documents(request))
+    blocks = extracted.messages[0].content
+    assert [b.type for b in blocks] == ["text", "text"]
+    assert "dokument.pdf" in blocks[1].text
+    assert request.messages[0].content[1].type == "document"   # Original unveraendert
+    assert p.file_extraction_stats()["extracted"] == 1
+
+
+def test_native_pdf_provider_keeps_document(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    from anthropic_provider import AnthropicProvider
+    p = AnthropicProvider({"name": "anthropic", "api_base": "https://api.anthropic.com/v1",
+                           "default_model": "claude-sonnet-4-6"})
+    request = ChatRequest(messages=[{"role": "user", "content": [
+        {"type": "document", "data": base64.b64encode(b"%PDF").decode()}]}])
+    assert run(p._extract_documents(request)) is request
@@ -152,3 +152,201 @@ def test_read_logs_filter_heinzel_id(tmp_path):
     result = read_logs(str(tmp_path), "openai", heinzel_id="hzl-A")
     assert len(result) == 1
     assert result[0]["heinzel_id"] == "hzl-A"
+
+
+# ─── Sidecar-Index und indexiertes Lesen ───────────────────────
+
+def _indexed_logger(tmp_path, name, max_bytes=None):
+    from logger import RequestResponseLogger
+    log = RequestResponseLogger(name, str(tmp_path), enabled=True)
+    if max_bytes is not None:
+        log.logger.handlers[0].maxBytes = max_bytes
+    return log
+
+
+def _close(log):
+    for h in list(log.logger.handlers):
+        h.close()
+        log.logger.removeHandler(h)
+
+
+def test_logger_writes_sidecar_index(tmp_path):
+    from logger import index_path
+    log = _indexed_logger(tmp_path, "idx-basic")
+    log.log_request("/chat", {"msg": "hallö"}, session_id="s1")
+    log.log_response("/chat", 200, {"content": "ok"}, session_id="s2")
+    _close(log)
+    data = open(tmp_path / "idx-basic.jsonl", "rb").read()
+    rows = [json.loads(l) for l in open(index_path(str(tmp_path / "idx-basic.jsonl")))]
+    assert [r[4] for r in rows] == ["s1", "s2"]
+    for offset, length, *_ in rows:
+        assert json.loads(data[offset:offset + length])["provider"] == "idx-basic"
+
+
+def test_read_logs_uses_index(tmp_path):
+    from log_reader import read_logs
+    log = _indexed_logger(tmp_path, "idx-read")
+    for i in range(20):
+        log.log_request("/chat", {"i": i}, session_id=f"s{i % 4}", task_id=f"t{i}")
+    _close(log)
+    result = read_logs(str(tmp_path), "idx-read", session_id="s1")
+    assert [e["data"]["payload"]["i"] for e in result] == [17, 13, 9, 5, 1]
+    assert read_logs(str(tmp_path), "idx-read", task_id="t7")[0]["session_id"] == "s3"
+    assert len(read_logs(str(tmp_path), "idx-read", limit=3)) == 3
+
+
+def test_read_logs_combines_legacy_and_indexed_entries(tmp_path):
+    from log_reader import read_logs
+    _write_entries(tmp_path / "idx-mixed.jsonl", [
+        {"timestamp": "2026-02-27T10:00:00Z", "provider": "idx-mixed",
+         "type": "request", "session_id": "alt", "heinzel_id": None,
+         "task_id": None, "data": {}},
+    ])
+    log = _indexed_logger(tmp_path, "idx-mixed")
+    log.log_request("/chat", {}, session_id="neu")
+    _close(log)
+    # Nachtraeglich ohne Index angehaengt (z.B. Schreib-Race)
+    with open(tmp_path / "idx-mixed.jsonl", "a") as f:
+        f.write(json.dumps({"timestamp": "2026-10-01T10:00:00Z", "type": "request",
+                            "session_id": "tail"}) + "\n")
+    result = read_logs(str(tmp_path), "idx-mixed")
+    assert [e["session_id"] for e in result] == ["tail", "neu", "alt"]
+
+
+def test_rotation_moves_index(tmp_path):
+    from log_reader import read_logs
+    from logger import index_path
+    log = _indexed_logger(tmp_path, "idx-rot", max_bytes=400)
+    for i in range(12):
+        log.log_request("/chat", {"i": i}, session_id="s1" if i % 2 else "s0")
+    _close(log)
+    assert os.path.exists(index_path(str(tmp_path / "idx-rot.jsonl.1")))
+    result = read_logs(str(tmp_path), "idx-rot", session_id="s1", limit=100)
+    got = [e["data"]["payload"]["i"] for e in result]
+    assert got == sorted(got, reverse=True)
+    assert got[0] == 11
+
+
+def test_read_logs_searches_gzip_files(tmp_path):
+    from log_reader import read_logs
+    from retention import cleanup_logs
+    log = _indexed_logger(tmp_path, "idx-gz", max_bytes=400)
+    for i in range(12):
+        log.log_request("/chat", {"i": i}, session_id="s1" if i % 2 else "s0")
+    _close(log)
+    old = time.time() - 40 * 86400
+    for f in tmp_path.glob("idx-gz.jsonl.*"):
+        os.utime(f, (old, old))
+    cleanup_logs(str(tmp_path), max_age_days=30, max_size_mb=0, compress=True)
+    assert list(tmp_path.glob("idx-gz.jsonl.*.gz"))
+    result = read_logs(str(tmp_path), "idx-gz", session_id="s1", limit=100)
+    assert [e["data"]["payload"]["i"] for e in result] == [11, 9, 7, 5, 3, 1]
+
+
+def test_read_logs_gzip_without_index(tmp_path):
+    import gzip
+    from log_reader import read_logs
+    from logger import index_path
+    with gzip.open(tmp_path / "openai.jsonl.2.gz", "wt") as f:
+        for i in range(3):
+            f.write(json.dumps({"timestamp": f"2026-02-27T10:0{i}:00Z",
+                                "type": "request", "session_id": f"s{i}"}) + "\n")
+    result = read_logs(str(tmp_path), "openai", session_id="s2")
+    assert len(result) == 1
+    assert os.path.exists(index_path(str(tmp_path / "openai.jsonl.2.gz")))
+
+
+def test_log_files_newest_rotation_first(tmp_path):
+    from log_reader import _log_files
+    for name in ("openai.jsonl", "openai.jsonl.2", "openai.jsonl.1",
+                 "openai.jsonl.10", "openai.jsonl.3.gz", "openai.jsonl.bak"):
+        (tmp_path / name).write_text("")
+    names = [os.path.basename(f) for f in _log_files(str(tmp_path), "openai")]
+    assert names == ["openai.jsonl", "openai.jsonl.1", "openai.jsonl.2",
+                     "openai.jsonl.3.gz", "openai.jsonl.10"]
+
+
+def test_reverse_scanner_across_chunks(tmp_path, monkeypatch):
+    import log_reader
+    monkeypatch.setattr(log_reader, "_CHUNK_SIZE", 7)
+    lines = [f"zeile-{i:03d}".encode() for i in range(50)]
+    p = tmp_path / "x.jsonl"
+    p.write_bytes(b"\n".join(lines) + b"\n")
+    with open(p, "rb") as f:
+        got = list(log_reader._reverse_lines(f, 0, p.stat().st_size))
+    assert got == lines[::-1]
+
+
+# ─── Hintergrund-Writer und Blob-Store ─────────────────────────
+
+def _bg_logger(tmp_path, name, **kwargs):
+    from logger import RequestResponseLogger
+    return RequestResponseLogger(name, str(tmp_path), enabled=True,
+                                 background=True, **kwargs)
+
+
+def test_background_logger_writes_after_flush(tmp_path):
+    log = _bg_logger(tmp_path, "bg-basic")
+    for i in range(10):
+        log.log_request("/chat", {"i": i}, session_id="s1")
+    assert log.flush(timeout=5)
+    lines = open(tmp_path / "bg-basic.jsonl").readlines()
+    assert [json.loads(l)["data"]["payload"]["i"] for l in lines] == list(range(10))
+    assert log.stats["written"] == 10
+    assert log.stats["queue_depth"] == 0
+    log.close()
+    _close(log)
+
+
+def test_background_logger_does_not_serialize_on_caller(tmp_path, monkeypatch):
+    import threading
+    import logger as logger_mod
+    log = _bg_logger(tmp_path, "bg-thread")
+    threads = []
+    real_dumps = json.dumps
+
+    def spy(obj, *a, **kw):
+        threads.append(threading.current_thread().name)
+        return real_dumps(obj, *a, **kw)
+    monkeypatch.setattr(logger_mod.json, "dumps", spy)
+    log.log_request("/chat", {"msg": "x"})
+    log.flush(timeout=5)
+    assert threads and all(t.startswith("dialog-log-") for t in threads)
+    log.close()
+    _close(log)
+
+
+def test_background_logger_drops_when_full(tmp_path):
+    log = _bg_logger(tmp_path, "bg-full", max_queue_bytes=100)
+    log.log_request("/chat", {"blob": "x" * 1000})
+    stats = log.stats
+    assert stats["dropped"] == 1
+    assert stats["enqueued"] == 0
+    _close(log)
+
+
+def test_blob_store_replaces_base64_with_hash(tmp_path):
+    import base64, hashlib
+    from logger import BLOB_PREFIX, blob_path
+    data = base64.b64encode(os.urandom(6000)).decode()
+    payload = {"messages": [{"content": [
+        {"type": "image", "source": {"type": "base64", "data": data}},
+        {"type": "image_url", "image_url": {"url": "data:image/png;base64," + data}},
+        {"type": "text", "text": "kurzer Text"},
+    ]}]}
+    log = _bg_logger(tmp_path, "bg-blob", blob_store=True, blob_min_bytes=1024)
+    log.log_request("/chat", payload)
+    log.flush(timeout=5)
+    entry = json.loads(open(tmp_path / "bg-blob.jsonl").readline())
+    parts = entry["data"]["payload"]["messages"][0]["content"]
+    digest = hashlib.sha256(data.encode()).hexdigest()
+    assert parts[0]["source"]["data"] == BLOB_PREFIX + digest
+    assert parts[1]["image_url"]["url"] == "data:image/png;base64," + BLOB_PREFIX + digest
+    assert parts[2]["text"] == "kurzer Text"
+    assert open(blob_path(str(tmp_path), digest)).read() == data
+    assert log.stats["blobs_stored"] == 1
+    assert log.stats["blobs_deduplicated"] == 1
+    # Original-Payload des Aufrufers bleibt unverändert
+    assert payload["messages"][0]["content"][0]["source"]["data"] == data
+    log.close()
+    _close(log)
@@ -24,6 +24,7 @@ def db(tmp_path, monkeypatch):
     logger = db_mod.CostLogger()
     run(logger.connect())
     yield logger
+    run(logger.disconnect())
 
 
 def test_log_and_query(db):
@@ -84,3 +85,236 @@ def test_empty_db(db):
     assert rows == []
     s = run(db.summary())
     assert s.get("total_requests") == 0 or s == {}
+
+
+# --- Write-Behind -----------------------------------------------------------
+
+def _count_rows(logger):
+    async def _q():
+        async with logger._conn.execute("SELECT COUNT(*) FROM costs") as cur:
+            return (await cur.fetchone())[0]
+    return run(_q())
+
+
+def test_log_request_is_queued_not_written(db):
+    run(db.log_request("openai", "gpt-4o", 1, 1, 10))
+    assert db.stats["queue_depth"] == 1
+    assert _count_rows(db) == 0
+
+
+def test_flush_writes_one_batch(db):
+    for i in range(50):
+        run(db.log_request("openai", "gpt-4o", i, i, i))
+    run(db.flush())
+    stats = db.stats
+    assert _count_rows(db) == 50
+    assert stats["batches"] == 1
+    assert stats["written"] == 50
+    assert stats["queue_depth"] == 0
+
+
+def test_full_batch_wakes_background_flush(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_DIR", str(tmp_path))
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    import importlib, config as cfg_mod
+    importlib.reload(cfg_mod)
+    import database as db_mod
+    importlib.reload(db_mod)
+    logger = db_mod.CostLogger(batch_size=5, flush_interval_ms=60_000)
+
+    async def _scenario():
+        await logger.connect()
+        for i in range(5):
+            await logger.log_request("openai", "gpt-4o", i, i, i)
+        for _ in range(100):
+            if logger.stats["written"] == 5:
+                break
+            await asyncio.sleep(0.01)
+        stats = logger.stats
+        await logger.disconnect()
+        return stats
+
+    stats = run(_scenario())
+    assert stats["written"] == 5
+    assert stats["batches"] == 1
+
+
+def test_backpressure_flushes_inline(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_DIR", str(tmp_path))
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    import importlib, config as cfg_mod
+    importlib.reload(cfg_mod)
+    import database as db_mod
+    importlib.reload(db_mod)
+    logger = db_mod.CostLogger(batch_size=4, max_queue=4, flush_interval_ms=60_000)
+    run(logger.connect())
+    try:
+        for i in range(4):
+            run(logger.log_request("openai", "gpt-4o", i, i, i))
+        assert logger.stats["backpressure_flushes"] == 1
+        assert logger.stats["queue_depth"] == 0
+        assert _count_rows(logger) == 4
+    finally:
+        run(logger.disconnect())
+
+
+def test_failed_flush_keeps_entries(db, monkeypatch):
+    async def _boom(rows):
+        raise RuntimeError("db weg")
+    run(db.log_request("openai", "gpt-4o", 1, 1, 10))
+    monkeypatch.setattr(db, "_write_batch", _boom)
+    run(db.flush())
+    assert db.stats["failed_batches"] == 1
+    assert db.stats["queue_depth"] == 1
+    monkeypatch.undo()
+    run(db.flush())
+    assert db.stats["written"] == 1
+
+
+def test_disconnect_flushes_queue(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_DIR", str(tmp_path))
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    import importlib, config as cfg_mod
+    importlib.reload(cfg_mod)
+    import database as db_mod
+    importlib.reload(db_mod)
+    logger = db_mod.CostLogger()
+    run(logger.connect())
+    run(logger.log_request("openai", "gpt-4o", 7, 3, 10, session_id="s9"))
+    run(logger.disconnect())
+
+    reopened = db_mod.CostLogger()
+    run(reopened.connect())
+    try:
+        rows = run(reopened.query(session_id="s9"))
+        assert len(rows) == 1
+        assert rows[0]["input_tokens"] == 7
+    finally:
+        run(reopened.disconnect())
+
+
+# --- Indizes, Rollups, Perzentile -------------------------------------------
+
+def test_indexes_created(db):
+    async def _q():
+        async with db._conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='costs'") as cur:
+            return {r[0] for r in await cur.fetchall()}
+    names = run(_q())
+    assert {"idx_costs_ts", "idx_costs_session_ts", "idx_costs_heinzel_ts",
+            "idx_costs_model_ts"} <= names
+
+
+def test_rollups_maintained_on_flush(db):
+    for latency in (100, 200, 300):
+        run(db.log_request("openai", "gpt-4o", 10, 5, latency, heinzel_id="h1"))
+    run(db.flush())
+    rows = run(db._fetchall(
+        "SELECT granularity, requests, input_tokens, latency_sum, latency_max "
+        "FROM costs_rollup ORDER BY granularity", []))
+    assert [r["granularity"] for r in rows] == ["day", "hour", "minute"]
+    for r in rows:
+        assert r["requests"] == 3
+        assert r["input_tokens"] == 30
+        assert r["latency_sum"] == 600
+        assert r["latency_max"] == 300
+
+
+def test_rollups_accumulate_across_batches(db):
+    run(db.log_request("openai", "gpt-4o", 1, 1, 10))
+    run(db.flush())
+    run(db.log_request("openai", "gpt-4o", 2, 2, 20, status="error"))
+    run(db.flush())
+    rows = run(db._fetchall(
+        "SELECT requests, input_tokens, error_count FROM costs_rollup "
+        "WHERE granularity = 'day'", []))
+    assert rows == [{"requests": 2, "input_tokens": 3, "error_count": 1}]
+
+
+def test_summary_uses_rollup_and_reports_percentiles(db):
+    for i in range(100):
+        run(db.log_request("openai", "gpt-4o", 1, 1, (i + 1) * 10))
+    s = run(db.summary())
+    assert s["source"] == "rollup"
+    assert s["total_requests"] == 100
+    assert s["avg_latency_ms"] == pytest.approx(505)
+    assert s["max_latency_ms"] == 1000
+    # Histogramm-Schätzung: Bucket-genau, nicht exakt
+    assert 250 < s["p50_latency_ms"] <= 750
+    assert 750 < s["p95_latency_ms"] <= 1000
+    assert s["p50_latency_ms"] <= s["p95_latency_ms"] <= s["p99_latency_ms"] <= 1000
+
+
+def test_summary_rollup_matches_raw(db):
+    run(db.log_request("openai", "gpt-4o", 100, 50, 200, heinzel_id="h1"))
+    run(db.log_request("openai", "gpt-4o", 200, 80, 3000, heinzel_id="h2"))
+    run(db.log_request("openai", "gpt-4o", 0, 0, 50, heinzel_id="h1", status="error"))
+    rollup = run(db.summary(heinzel_id="h1", since="2000-01-01T00:00:00"))
+    raw = run(db._summary_raw(None, "h1", None, None))
+    assert rollup["source"] == "rollup"
+    for key in ("total_requests", "total_input_tokens", "total_output_tokens",
+                "avg_latency_ms", "error_count", "p50_latency_ms", "p99_latency_ms"):
+        assert rollup[key] == raw[key]
+
+
+def test_summary_session_filter_uses_raw(db):
+    run(db.log_request("openai", "gpt-4o", 1, 1, 40, session_id="s1"))
+    s = run(db.summary(session_id="s1"))
+    assert s["source"] == "raw"
+    assert s["total_requests"] == 1
+    assert s["p50_latency_ms"] == pytest.approx(25)
+
+
+def test_summary_excludes_rollups_outside_range(db):
+    run(db.log_request("openai", "gpt-4o", 1, 1, 10))
+    s = run(db.summary(until="2000-01-01T00:00:00"))
+    assert s["total_requests"] == 0
+    assert s["p50_latency_ms"] is None
+
+
+def test_backfill_builds_rollups_for_existing_rows(db):
+    async def _legacy():
+        await db._conn.execute(
+            "INSERT INTO costs (ts, provider, model, input_tokens, output_tokens, "
+            "latency_ms, status) VALUES ('2025-03-01 10:15:00', 'openai', 'gpt-4o', 5, 5, 100, 'success')")
+        await db._conn.execute("DELETE FROM costs_rollup")
+        await db._conn.commit()
+        await db._backfill_rollups()
+    run(_legacy())
+    s = run(db.summary(since="2025-03-01", until="2025-03-01T23:59:59"))
+    assert s["total_requests"] == 1
+
+
+def test_timeseries_hourly(db):
+    for _ in range(3):
+        run(db.log_request("openai", "gpt-4o", 1, 1, 100))
+    series = run(db.timeseries(granularity="hour"))
+    assert len(series) == 1
+    assert series[0]["total_requests"] == 3
+    with pytest.raises(ValueError):
+        run(db.timeseries(granularity="week"))
+
+
+def test_rollup_plan_decomposes_range():
+    import database as db_mod
+    from datetime import datetime
+    plan = db_mod.rollup_plan(datetime(2025, 3, 1, 10, 15), datetime(2025, 3, 4, 2, 30, 10))
+    assert plan == [
+        ("minute", "2025-03-01 10:15:00", "2025-03-01 11:00:00"),
+        ("hour",   "2025-03-01 11:00:00", "2025-03-02 00:00:00"),
+        ("day",    "2025-03-02 00:00:00", "2025-03-04 00:00:00"),
+        ("hour",   "2025-03-04 00:00:00", "2025-03-04 02:00:00"),
+        ("minute", "2025-03-04 02:00:00", "2025-03-04 02:31:00"),
+    ]
+    assert db_mod.rollup_plan(None, None) == [("day", None, None)]
+    assert db_mod.rollup_plan(datetime(2025, 3, 1, 10, 15), datetime(2025, 3, 1, 10, 20)) == [
+        ("minute", "2025-03-01 10:15:00", "2025-03-01 10:21:00")]
+
+
+def test_latency_percentiles_interpolates():
+    import database as db_mod
+    hist = [0] * len(db_mod.HIST_COLUMNS)
+    hist[1] = 10   # (50, 100]
+    pct = db_mod.latency_percentiles(hist, latency_max=100)
+    assert pct[0.5] == pytest.approx(75)
+    assert pct[0.99] <= 100
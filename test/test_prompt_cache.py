@@ -0,0 +1,199 @@
+"""
+Tests fuer Prompt-Caching (Anthropic cache_control): Breakpoint-Wahl,
+Marker im Payload, Cache-Tokens in usage und CostLogger.
+"""
+import sys, os, asyncio, json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src/llm-provider"))
+
+import httpx
+import pytest
+
+from models import ChatRequest
+
+
+def run(coro):
+    """Eigener Loop pro Aufruf — laesst den globalen Event-Loop unangetastet."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+LONG_SYSTEM = "Du bist ein Heinzel. " * 400          # ~2000 Tokens geschaetzt
+TOOLS = [{"name": "suche", "description": "x" * 200, "input_schema": {"type": "object"}}]
+HISTORY = [{"role": "user", "content": "Hallo"},
+           {"role": "assistant", "content": "Hi!"},
+           {"role": "user", "content": "Wie geht's?"}]
+
+
+def anthropic(monkeypatch, **config):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    from anthropic_provider import AnthropicProvider
+    return AnthropicProvider({"name": "anthropic", "api_base": "https://api.anthropic.com/v1",
+                              "default_model": "claude-sonnet-4-6", **config})
+
+
+def markers(payload):
+    found = []
+    if payload.get("tools") and "cache_control" in payload["tools"][-1]:
+        found.append("tools")
+    if isinstance(payload.get("system"), list) and "cache_control" in payload["system"][-1]:
+        found.append("system")
+    last = payload["messages"][-1]["content"]
+    if isinstance(last, list) and "cache_control" in last[-1]:
+        found.append("history")
+    return found
+
+
+# ─── Breakpoints ──────────────────────────────────────────────
+
+def test_automatic_breakpoints_on_stable_prefix(monkeypatch):
+    p = anthropic(monkeypatch)
+    req = ChatRequest(messages=HISTORY, system=LONG_SYSTEM, tools=TOOLS)
+    payload = p._transform_request(req)
+    # Tools allein sind unter min_tokens, System und Verlauf darueber
+    assert markers(payload) == ["system", "history"]
+    assert payload["system"][0]["text"] == LONG_SYSTEM
+    assert req.tools[0] == TOOLS[0] and "cache_control" not in req.tools[0]
+
+
+def test_short_prompt_left_unchanged(monkeypatch):
+    p = anthropic(monkeypatch)
+    payload = p._transform_request(ChatRequest(messages=HISTORY, system="kurz"))
+    assert payload["system"] == "kurz" and markers(payload) == []
+
+
+def test_request_chooses_breakpoints(monkeypatch):
+    p = anthropic(monkeypatch)
+    req = ChatRequest(messages=HISTORY, system="kurz", tools=TOOLS,
+                      cache_breakpoints=["tools"])
+    assert markers(p._transform_request(req)) == ["tools"]
+    off = ChatRequest(messages=HISTORY, system=LONG_SYSTEM, cache_breakpoints=[])
+    assert markers(p._transform_request(off)) == []
+
+
+def test_config_disables_and_sets_ttl(monkeypatch):
+    req = ChatRequest(messages=HISTORY, system=LONG_SYSTEM)
+    off = anthropic(monkeypatch, prompt_cache={"enabled": False})
+    assert markers(off._transform_request(req)) == []
+    hour = anthropic(monkeypatch, prompt_cache={"ttl": "1h", "history": False})
+    payload = hour._transform_request(req)
+    assert markers(payload) == ["system"]
+    assert payload["system"][-1]["cache_control"] == {"type": "ephemeral", "ttl": "1h"}
+
+
+def test_client_markers_count_towards_limit():
+    from prompt_cache import apply_breakpoints
+    mark = {"type": "ephemeral"}
+    payload = {"tools": [{"name": f"t{i}", "cache_control": mark} for i in range(3)],
+               "system": "s", "messages": [{"role": "user", "content": "a"}]}
+    assert apply_breakpoints(payload, ["system", "history"]) == ["system"]
+
+
+# ─── Usage / Kosten ───────────────────────────────────────────
+
+def fake_upstream(calls):
+    """Antwortet wie Anthropic: erster Call schreibt den Cache, weitere lesen ihn."""
+    def handler(request):
+        body = json.loads(request.content)
+        calls.append(body)
+        cached = markers(body)
+        usage = {"input_tokens": 12, "output_tokens": 3}
+        if cached:
+            key = "cache_creation_input_tokens" if len(calls) == 1 else "cache_read_input_tokens"
+            usage[key] = 2000
+        return httpx.Response(200, json={
+            "id": "m1", "model": "claude-sonnet-4-6", "role": "assistant",
+            "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn",
+            "usage": usage})
+    return handler
+
+
+def test_cache_tokens_reach_usage_and_cost_logger(monkeypatch):
+    import http_pool
+    calls, costs = [], []
+    p = anthropic(monkeypatch)
+
+    async def record_cost(model, in_tok, out_tok, ms, ctx, status, err=None, **cache):
+        costs.append((in_tok, out_tok, cache))
+    monkeypatch.setattr(p, "_log_cost", record_cost)
+
+    async def scenario():
+        p._client = http_pool.create_client({}, inner=httpx.MockTransport(fake_upstream(calls)))
+        p._connected = True
+        first = await p.chat(ChatRequest(messages=HISTORY, system=LONG_SYSTEM))
+        second = await p.chat(ChatRequest(messages=HISTORY + [
+            {"role": "assistant", "content": "Gut."}, {"role": "user", "content": "Schön."}],
+            system=LONG_SYSTEM))
+        await p.aclose()
+        return first, second
+
+    first, second = run(scenario())
+    assert first.usage["cache_creation_input_tokens"] == 2000
+    assert second.usage["cache_read_input_tokens"] == 2000
+    assert costs == [(12, 3, {"cache_write_tokens": 2000}),
+                     (12, 3, {"cache_read_tokens": 2000})]
+
+
+def test_stream_usage_carries_cache_tokens(monkeypatch):
+    p = anthropic(monkeypatch)
+    chunk = p._parse_stream_chunk(json.dumps({"type": "message_start", "message": {
+        "model": "claude-sonnet-4-6",
+        "usage": {"input_tokens": 5, "cache_read_input_tokens": 900}}}))
+    assert chunk.usage == {"input_tokens": 5, "output_tokens": 0, "cache_read_input_tokens": 900}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_DIR", str(tmp_path))
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    import importlib, config as cfg_mod
+    importlib.reload(cfg_mod)
+    import database as db_mod
+    importlib.reload(db_mod)
+    yield db_mod, tmp_path
+
+
+def test_cost_logger_summary_reports_cache_hit_rate(db):
+    db_mod, _ = db
+    logger = db_mod.CostLogger()
+
+    async def scenario():
+        await logger.connect()
+        await logger.log_request("anthropic", "m", 100, 10, 50, cache_write_tokens=900)
+        await logger.log_request("anthropic", "m", 100, 10, 50, cache_read_tokens=900)
+        rollup = await logger.summary()
+        raw = await logger._summary_raw(None, None, None, None)
+        await logger.disconnect()
+        return rollup, raw
+
+    rollup, raw = run(scenario())
+    assert rollup["source"] == "rollup" and raw["source"] == "raw"
+    for s in (rollup, raw):
+        assert s["total_cache_read_tokens"] == 900
+        assert s["total_cache_write_tokens"] == 900
+        assert s["cache_hit_rate"] == 0.45
+
+
+def test_cost_logger_migrates_existing_db(db):
+    import sqlite3
+    db_mod, tmp_path = db
+    old_schema = db_mod.CREATE_TABLE_SQL.replace(
+        ",\n    cache_read_tokens  INTEGER DEFAULT 0,\n    cache_write_tokens INTEGER DEFAULT 0", "")
+    assert "cache_read_tokens" not in old_schema
+    legacy = sqlite3.connect(tmp_path / "costs.db")
+    legacy.execute(old_schema)
+    legacy.commit()
+    legacy.close()
+    logger = db_mod.CostLogger()
+
+    async def scenario():
+        await logger.connect()
+        await logger.log_request("anthropic", "m", 1, 1, 10, cache_read_tokens=7)
+        rows = await logger.query()
+        await logger.disconnect()
+        return rows
+
+    rows = run(scenario())
+    assert rows[0]["cache_read_tokens"] == 7
@@ -258,6 +258,76 @@ def test_connect_disconnect():
     assert p._connected is False
 
 
+def test_http_pool_limits_from_config():
+    from anthropic_provider import AnthropicProvider
+    cfg = {**ANTHROPIC_CONFIG, "http": {"max_connections": 7, "pool_timeout_s": 3.0}}
+    p = AnthropicProvider(cfg)
+    p.connect()
+    pool = p._client._transport._inner._pool
+    assert pool._max_connections == 7
+    assert p._client.timeout.pool == 3.0
+    assert p.http_pool_stats()["config"]["max_connections"] == 7
+    p.disconnect()
+
+
+def test_http2_without_h2_falls_back(monkeypatch):
+    import http_pool
+    monkeypatch.setattr(http_pool, "_http2_available", lambda: False)
+    client = http_pool.create_client({"http": {"http2": True}})
+    assert client._transport._inner._pool._http2 is False
+
+
+def test_disconnect_and_reset_close_client():
+    import asyncio
+    from anthropic_provider import AnthropicProvider
+    p = AnthropicProvider(ANTHROPIC_CONFIG)
+
+    async def scenario():
+        p.connect()
+        first = p._client
+        p.reset()
+        assert p._client is not first
+        await p.aclose()
+        return first
+
+    first = asyncio.run(scenario())
+    assert first.is_closed
+    assert p._client is None
+
+
+def test_pool_wait_measured_separately_from_upstream():
+    import asyncio, http_pool
+
+    async def handler(reader, writer):
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        await asyncio.sleep(0.05)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+        await writer.drain()
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = http_pool.create_client({"http": {"max_connections": 1}})
+        try:
+            await asyncio.gather(*(client.get(f"http://127.0.0.1:{port}/") for _ in range(3)))
+            return http_pool.pool_stats(client)
+        finally:
+            await client.aclose()
+            server.close()
+            await server.wait_closed()
+
+    stats = asyncio.run(scenario())
+    assert stats["requests"] == 3
+    assert stats["in_flight"] == 0
+    assert stats["peak_waiting"] >= 2
+    # Einer bekommt sofort die Verbindung, der letzte wartet ~2 Upstream-Runden
+    assert stats["pool_wait_ms"]["max"] >= 80
+    assert stats["upstream_headers_ms"]["p50"] >= 40
+    assert stats["upstream_headers_ms"]["max"] < stats["pool_wait_ms"]["max"]
+
+
 # ─── Test: Database URL Auflösung ──────────────────────────────
 
 def test_db_url_sqlite_default(monkeypatch):
@@ -0,0 +1,264 @@
+"""
+Tests fuer den clientseitigen Rate-Limiter: Token-Buckets, Header-Sync,
+AIMD-Nebenlaeufigkeit und faire Warteschlange.
+"""
+import sys, os, asyncio
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src/llm-provider"))
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def limiter_config(**overrides):
+    return {"rate_limit": {"initial_concurrency": 4, "decrease_cooldown_s": 0.0, **overrides}}
+
+
+# ─── Token-Bucket ─────────────────────────────────────────────
+
+def test_bucket_refills_per_minute():
+    from rate_limit import TokenBucket
+    clock = FakeClock()
+    b = TokenBucket(60, clock)
+    assert b.wait_time(60) == 0
+    b.take(60)
+    assert b.wait_time(1) == 1.0
+    clock.now += 0.5
+    assert abs(b.wait_time(1) - 0.5) < 1e-9
+    clock.now += 120
+    assert b.tokens <= 60 and b.wait_time(60) == 0
+
+
+def test_bucket_oversized_request_not_locked_out():
+    from rate_limit import TokenBucket
+    b = TokenBucket(100, FakeClock())
+    assert b.wait_time(10_000) == 0
+
+
+def test_bucket_unlimited_learns_from_headers():
+    from rate_limit import TokenBucket
+    clock = FakeClock()
+    b = TokenBucket(0, clock)
+    assert b.unlimited and b.wait_time(1_000_000) == 0
+    b.sync(limit=50, remaining=0, reset_s=2.0)
+    assert b.capacity == 50
+    assert b.wait_time(1) >= 2.0
+
+
+def test_bucket_configured_limit_kept_but_remaining_applied():
+    from rate_limit import TokenBucket
+    b = TokenBucket(100, FakeClock())
+    b.sync(limit=1000, remaining=10, reset_s=None)
+    assert b.capacity == 100
+    assert b.tokens == 10
+
+
+def test_adjust_refunds_overestimate():
+    from rate_limit import TokenBucket
+    b = TokenBucket(1000, FakeClock())
+    b.take(500)
+    b.adjust(500 - 200)
+    assert b.tokens == 800
+
+
+# ─── Header ───────────────────────────────────────────────────
+
+def test_parse_anthropic_headers():
+    from rate_limit import parse_rate_limit_headers
+    reset = (datetime.now(timezone.utc) + timedelta(seconds=30)).isoformat()
+    info = parse_rate_limit_headers({
+        "anthropic-ratelimit-requests-limit": "50",
+        "anthropic-ratelimit-requests-remaining": "49",
+        "anthropic-ratelimit-requests-reset": reset,
+        "anthropic-ratelimit-tokens-limit": "40000",
+        "anthropic-ratelimit-tokens-remaining": "39000",
+    })
+    limit, remaining, reset_s = info["requests"]
+    assert (limit, remaining) == (50, 49)
+    assert 28 < reset_s <= 30
+    assert info["tokens"][:2] == (40000, 39000)
+    assert info["retry_after"] is None
+
+
+def test_parse_openai_headers():
+    from rate_limit import parse_rate_limit_headers
+    info = parse_rate_limit_headers({
+        "x-ratelimit-limit-requests": "500",
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "6m0s",
+        "x-ratelimit-reset-tokens": "20ms",
+        "retry-after": "3",
+    })
+    assert info["requests"] == (500, 0, 360.0)
+    assert info["tokens"][2] == 0.02
+    assert info["retry_after"] == 3.0
+
+
+def test_estimate_counts_blobs_flat():
+    from rate_limit import estimate_payload_tokens
+    text = {"messages": [{"role": "user", "content": "x" * 400}]}
+    image = {"messages": [{"content": [{"source": {"data": "QUJD" * 100_000}}]}]}
+    assert 100 <= estimate_payload_tokens(text) < 110
+    assert estimate_payload_tokens(image) < 2000
+
+
+# ─── AIMD ─────────────────────────────────────────────────────
+
+def test_aimd_increase_and_decrease():
+    from rate_limit import AdaptiveConcurrency
+    clock = FakeClock()
+    c = AdaptiveConcurrency(4, 1, 8, step=1.0, factor=0.5, cooldown_s=5.0, clock=clock)
+
+    async def scenario():
+        for _ in range(4):
+            await c.acquire()
+            c.release("ok")
+        assert 4.9 < c.limit < 5.1          # ca. +1 pro Fenster
+        await c.acquire()
+        c.release("overload")
+        assert 2.4 < c.limit < 2.6
+        await c.acquire()
+        c.release("overload")               # innerhalb Cooldown → keine zweite Halbierung
+        assert 2.4 < c.limit < 2.6
+        for _ in range(3):
+            clock.now += 10
+            c.on_overload()
+        assert c.limit == 1.0
+
+    asyncio.run(scenario())
+
+
+def test_concurrency_waiters_served_fifo():
+    from rate_limit import AdaptiveConcurrency
+    c = AdaptiveConcurrency(1, 1, 1)
+    order = []
+
+    async def worker(i):
+        await c.acquire()
+        order.append(i)
+        await asyncio.sleep(0)
+        c.release("ok")
+
+    async def scenario():
+        await asyncio.gather(*(worker(i) for i in range(5)))
+
+    asyncio.run(scenario())
+    assert order == [0, 1, 2, 3, 4]
+    assert c.in_flight == 0
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    from rate_limit import AdaptiveConcurrency
+    c = AdaptiveConcurrency(1, 1, 1)
+
+    async def scenario():
+        await c.acquire()
+        waiter = asyncio.create_task(c.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        c.release("ok")
+        assert c.in_flight == 0 and c.queued == 0
+        await asyncio.wait_for(c.acquire(), 1)
+
+    asyncio.run(scenario())
+
+
+# ─── RateLimiter ──────────────────────────────────────────────
+
+def test_limiter_throttles_requests_per_minute():
+    from rate_limit import RateLimiter
+    rl = RateLimiter(limiter_config(requests_per_minute=6000))   # 100/s
+
+    async def scenario():
+        rl.for_model("m").requests.tokens = 0
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(3):
+            async with rl.acquire("m", {"x": "hi"}) as permit:
+                assert permit is not None
+        return loop.time() - start
+
+    assert asyncio.run(scenario()) >= 0.025
+    stats = rl.stats()["models"]["m"]
+    assert stats["admitted"] == 3 and stats["throttled"] >= 1
+
+
+def test_limiter_model_overrides():
+    from rate_limit import RateLimiter
+    rl = RateLimiter(limiter_config(tokens_per_minute=1000,
+                                    models={"big": {"tokens_per_minute": 5000}}))
+    assert rl.for_model("big").tokens.capacity == 5000
+    assert rl.for_model("other").tokens.capacity == 1000
+
+
+def test_limiter_disabled_passes_through():
+    from rate_limit import RateLimiter
+    rl = RateLimiter({"rate_limit": {"enabled": False}})
+
+    async def scenario():
+        async with rl.acquire("m", {}) as permit:
+            return permit
+
+    assert asyncio.run(scenario()) is None
+    assert rl.stats()["models"] == {}
+
+
+def test_permit_observe_429_backs_off():
+    from rate_limit import RateLimiter
+    rl = RateLimiter(limiter_config())
+
+    async def scenario():
+        async with rl.acquire("m", {}) as permit:
+            permit.observe(httpx.Response(429, headers={"retry-after": "0.05"}))
+        async with rl.acquire("m", {}) as permit:
+            permit.observe(httpx.Response(200))
+
+    asyncio.run(scenario())
+    stats = rl.stats()["models"]["m"]
+    assert stats["overloads"] == 1
+    assert stats["concurrency_limit"] < 4
+    assert stats["wait_ms_max"] >= 40
+
+
+# ─── Provider ─────────────────────────────────────────────────
+
+def test_provider_chat_feeds_limiter_from_headers(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    from anthropic_provider import AnthropicProvider
+    from models import ChatRequest
+    import http_pool
+
+    def handler(request):
+        return httpx.Response(200, headers={
+            "anthropic-ratelimit-tokens-limit": "40000",
+            "anthropic-ratelimit-tokens-remaining": "30000",
+        }, json={"id": "m1", "model": "claude-sonnet-4-6", "role": "assistant",
+                 "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn",
+                 "usage": {"input_tokens": 10, "output_tokens": 5}})
+
+    p = AnthropicProvider({"name": "anthropic", "api_base": "https://api.anthropic.com/v1",
+                           "default_model": "claude-sonnet-4-6"})
+
+    async def no_cost(*args, **kwargs):
+        pass
+    monkeypatch.setattr(p, "_log_cost", no_cost)
+
+    async def scenario():
+        p._client = http_pool.create_client({}, inner=httpx.MockTransport(handler))
+        p._connected = True
+        await p.chat(ChatRequest(messages=[{"role": "user", "content": "hi"}]))
+        await p.aclose()
+
+    asyncio.run(scenario())
+    stats = p.rate_limit_stats()["models"]["claude-sonnet-4-6"]
+    assert stats["tokens_per_minute"] == 40000
+    assert stats["tokens_available"] <= 30000
+    assert stats["in_flight"] == 0 and stats["admitted"] == 1
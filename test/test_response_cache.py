@@ -0,0 +1,194 @@
+"""
+Tests fuer den Response-Cache: Key-Bildung, TTL/LRU, SQLite-Stufe,
+Bypass und Verbuchung im Provider.
+"""
+import sys, os, asyncio
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src/llm-provider"))
+
+import httpx
+
+from models import ChatRequest, ChatResponse
+
+
+def run(coro):
+    """Eigener Loop pro Aufruf — laesst den globalen Event-Loop unangetastet."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def make_request(**kw):
+    return ChatRequest(messages=[{"role": "user", "content": kw.pop("text", "hi")}], **kw)
+
+
+def make_response(text="ok"):
+    return ChatResponse(content=text, model="m", provider="p",
+                        usage={"input_tokens": 10, "output_tokens": 5})
+
+
+def cache_config(**overrides):
+    return {"response_cache": {"enabled": True, **overrides}}
+
+
+# ─── Key ──────────────────────────────────────────────────────
+
+def test_key_stable_and_sensitive():
+    from response_cache import cache_key
+    a = cache_key("p", "m", make_request())
+    assert a == cache_key("p", "m", make_request())
+    assert a != cache_key("p", "m2", make_request())
+    assert a != cache_key("p", "m", make_request(text="hallo"))
+    assert a != cache_key("p", "m", make_request(system="sys"))
+    assert a != cache_key("p", "m", make_request(tools=[{"name": "t"}]))
+    assert a != cache_key("p", "m", make_request(max_tokens=10))
+
+
+def test_key_ignores_request_context():
+    from response_cache import cache_key
+    a = cache_key("p", "m", make_request())
+    b = cache_key("p", "m", make_request(context={"session_id": "s1"}))
+    assert a == b
+
+
+def test_only_deterministic_requests_cacheable():
+    from response_cache import ResponseCache
+    c = ResponseCache("p", cache_config(sqlite=False))
+    assert c.key_for("m", make_request()) is not None
+    assert c.key_for("m", make_request(temperature=0)) is not None
+    assert c.key_for("m", make_request(temperature=0.7)) is None
+    assert c.key_for("m", make_request(bypass_cache=True)) is None
+    assert c.stats["uncacheable"] == 1 and c.stats["bypassed"] == 1
+
+
+def test_disabled_by_default():
+    from response_cache import ResponseCache
+    assert ResponseCache("p", {}).key_for("m", make_request()) is None
+
+
+# ─── Memory / SQLite ──────────────────────────────────────────
+
+def test_memory_lru_eviction():
+    from response_cache import ResponseCache
+    c = ResponseCache("p", cache_config(sqlite=False, max_entries=2))
+
+    async def scenario():
+        await c.put("a", make_response("a"))
+        await c.put("b", make_response("b"))
+        await c.get("a")                      # a zuletzt benutzt
+        await c.put("c", make_response("c"))
+        return [await c.get(k) for k in ("a", "b", "c")]
+
+    a, b, cc = run(scenario())
+    assert a.content == "a" and b is None and cc.content == "c"
+    assert c.stats["evictions"] == 1
+
+
+def test_ttl_expiry():
+    from response_cache import ResponseCache
+    c = ResponseCache("p", cache_config(sqlite=False, ttl_s=0))
+
+    async def scenario():
+        await c.put("a", make_response())
+        return await c.get("a")
+
+    assert run(scenario()) is None
+    assert c.stats["expired"] == 1
+
+
+def test_hit_returns_copy():
+    from response_cache import ResponseCache
+    c = ResponseCache("p", cache_config(sqlite=False))
+
+    async def scenario():
+        await c.put("a", make_response())
+        first = await c.get("a")
+        first.content = "changed"
+        return await c.get("a")
+
+    assert run(scenario()).content == "ok"
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    from response_cache import ResponseCache
+    cfg = cache_config(sqlite_path=str(tmp_path / "rc.db"))
+
+    async def write():
+        c = ResponseCache("p", cfg)
+        await c.put("k", make_response("persisted"))
+        await c.close()
+
+    async def read():
+        c = ResponseCache("p", cfg)
+        hit = await c.get("k")
+        again = await c.get("k")
+        await c.close()
+        return c, hit, again
+
+    run(write())
+    c, hit, again = run(read())
+    assert hit.content == "persisted" and again.content == "persisted"
+    assert c.stats["hits_sqlite"] == 1 and c.stats["hits_memory"] == 1
+    assert c.stats["tokens_saved"] == 30
+
+
+def test_sqlite_prune_keeps_most_recent(tmp_path, monkeypatch):
+    import response_cache
+    monkeypatch.setattr(response_cache, "_PRUNE_EVERY", 5)
+    c = response_cache.ResponseCache(
+        "p", cache_config(sqlite_path=str(tmp_path / "rc.db"), sqlite_max_entries=3))
+
+    async def scenario():
+        for i in range(5):
+            await c.put(f"k{i}", make_response(str(i)))
+        c._memory.clear()
+        found = [await c.get(f"k{i}") for i in range(5)]
+        await c.close()
+        return found
+
+    found = run(scenario())
+    assert [f is not None for f in found] == [False, False, True, True, True]
+
+
+# ─── Provider ─────────────────────────────────────────────────
+
+def test_provider_chat_served_from_cache(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    from anthropic_provider import AnthropicProvider
+    import http_pool
+    calls = []
+    costs = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={
+            "id": "m1", "model": "claude-sonnet-4-6", "role": "assistant",
+            "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn",
+            "usage": {"input_tokens": 10, "output_tokens": 5}})
+
+    p = AnthropicProvider({"name": "anthropic", "api_base": "https://api.anthropic.com/v1",
+                           "default_model": "claude-sonnet-4-6",
+                           "response_cache": {"enabled": True, "sqlite": False}})
+
+    async def record_cost(model, in_tok, out_tok, ms, ctx, status, err=None):
+        costs.append((status, in_tok, out_tok))
+    monkeypatch.setattr(p, "_log_cost", record_cost)
+
+    async def scenario():
+        p._client = http_pool.create_client({}, inner=httpx.MockTransport(handler))
+        p._connected = True
+        first = await p.chat(make_request())
+        second = await p.chat(make_request())
+        await p.chat(make_request(bypass_cache=True))
+        await p.clear_response_cache()
+        await p.chat(make_request())
+        await p.aclose()
+        return first, second
+
+    first, second = run(scenario())
+    assert second.content == first.content == "ok"
+    assert len(calls) == 3
+    assert costs == [("success", 10, 5), ("cache_hit", 0, 0), ("success", 10, 5),
+                     ("success", 10, 5)]
+    assert p.response_cache_stats()["hits_memory"] == 1
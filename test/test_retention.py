@@ -79,3 +79,39 @@ def test_skip_already_compressed(tmp_path):
     os.utime(gz_path, (ts, ts))
     result = cleanup_logs(str(tmp_path), max_age_days=1, compress=True)
     assert result["compressed"] == 0  # .gz ueberspringen
+
+
+def _blob(tmp_path, digest, size=1000, days_old=40):
+    from logger import blob_path
+    path = blob_path(str(tmp_path), digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _make_old_file(path, content=b"A" * size, days_old=days_old)
+    return path
+
+
+def test_blobs_kept_while_referenced(tmp_path):
+    from retention import cleanup_logs
+    live, orphan, fresh = "a" * 64, "b" * 64, "c" * 64
+    # Log spannt laenger als max_age_days — Blob aelter, aber noch referenziert
+    _make_old_file(tmp_path / "openai.jsonl.1",
+                   content=f'{{"data": "blob:sha256:{live}"}}\n'.encode(), days_old=40)
+    paths = [_blob(tmp_path, live), _blob(tmp_path, orphan), _blob(tmp_path, fresh, days_old=0)]
+    cleanup_logs(str(tmp_path), max_age_days=30, max_size_mb=0, compress=True)
+    assert (tmp_path / "openai.jsonl.1.gz").exists()
+    assert [os.path.exists(p) for p in paths] == [True, False, True]
+
+
+def test_size_limit_counts_blobs(tmp_path):
+    from retention import cleanup_logs
+    big, shared = "d" * 64, "e" * 64
+    _make_old_file(tmp_path / "old.jsonl",
+                   content=f"blob:sha256:{big} blob:sha256:{shared}\n".encode(), days_old=2)
+    _make_old_file(tmp_path / "new.jsonl",
+                   content=f"blob:sha256:{shared}\n".encode(), days_old=1)
+    big_path = _blob(tmp_path, big, size=1_500_000, days_old=2)
+    shared_path = _blob(tmp_path, shared, days_old=2)
+    # Logs allein sind winzig — erst blobs/ sprengt das Limit von 1 MB
+    result = cleanup_logs(str(tmp_path), max_age_days=9999, max_size_mb=1, compress=False)
+    assert result["deleted"] == 1 and not (tmp_path / "old.jsonl").exists()
+    assert not os.path.exists(big_path)
+    assert os.path.exists(shared_path) and (tmp_path / "new.jsonl").exists()
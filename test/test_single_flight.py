@@ -0,0 +1,293 @@
+"""
+Tests fuer Request-Coalescing: geteilte /chat-Calls und /chat/stream mit
+Replay fuer spaet angehaengte Abonnenten.
+"""
+import sys, os, asyncio, json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src/llm-provider"))
+
+import httpx
+
+from models import ChatRequest
+
+
+def run(coro):
+    """Eigener Loop pro Aufruf — laesst den globalen Event-Loop unangetastet."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def make_request(**kw):
+    return ChatRequest(messages=[{"role": "user", "content": kw.pop("text", "hi")}], **kw)
+
+
+# ─── SingleFlight ─────────────────────────────────────────────
+
+def test_followers_share_result():
+    from single_flight import SingleFlight
+    sf = SingleFlight()
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def call():
+        running = sf.running("k")
+        if running is not None:
+            return await asyncio.shield(running)
+        return await asyncio.shield(sf.start("k", upstream))
+
+    async def scenario():
+        return await asyncio.gather(*(call() for _ in range(5)))
+
+    results = run(scenario())
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    assert sf.stats["leaders"] == 1 and sf.stats["followers"] == 4
+    assert sf.stats["in_flight"] == 0
+
+
+def test_followers_get_leader_error():
+    from single_flight import SingleFlight
+    sf = SingleFlight()
+
+    async def upstream():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream kaputt")
+
+    async def scenario():
+        leader = asyncio.shield(sf.start("k", upstream))
+        follower = asyncio.shield(sf.running("k"))
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    results = run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_leader_cancel_does_not_stop_shared_call():
+    from single_flight import SingleFlight
+    sf = SingleFlight()
+
+    async def upstream():
+        await asyncio.sleep(0.02)
+        return "fertig"
+
+    async def scenario():
+        leader = asyncio.ensure_future(asyncio.shield(sf.start("k", upstream)))
+        await asyncio.sleep(0)
+        follower = sf.running("k")
+        leader.cancel()
+        return await asyncio.shield(follower)
+
+    assert run(scenario()) == "fertig"
+
+
+def test_stream_late_subscriber_gets_replay():
+    from single_flight import SingleFlight
+    sf = SingleFlight()
+    release = None
+
+    async def upstream():
+        yield 0
+        yield 1
+        await release.wait()
+        yield 2
+        yield 3
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        attached, first = sf.subscribe("k", upstream)
+        assert attached is False
+        got_first, got_late = [], []
+
+        async def consume(it, out):
+            async for c in it:
+                out.append(c)
+
+        t1 = asyncio.ensure_future(consume(first, got_first))
+        while len(got_first) < 2:
+            await asyncio.sleep(0)
+        attached, late = sf.subscribe("k", upstream)
+        assert attached is True
+        release.set()
+        await asyncio.gather(t1, consume(late, got_late))
+        return got_first, got_late
+
+    first, late = run(scenario())
+    assert first == late == [0, 1, 2, 3]
+    assert sf.stats["streams_active"] == 0
+
+
+def test_stream_abandoned_cancels_upstream():
+    from single_flight import SingleFlight
+    sf = SingleFlight()
+    closed = []
+
+    async def upstream():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield "x"
+        finally:
+            closed.append(True)
+
+    async def scenario():
+        _, chunks = sf.subscribe("k", upstream)
+        async for _ in chunks:
+            break
+        await chunks.aclose()
+        await asyncio.sleep(0.01)
+
+    run(scenario())
+    assert closed == [True]
+    assert sf.stats["streams_abandoned"] == 1 and sf.stats["streams_active"] == 0
+
+
+# ─── Provider ─────────────────────────────────────────────────
+
+def _provider(monkeypatch, handler, **config):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    from anthropic_provider import AnthropicProvider
+    import http_pool
+    p = AnthropicProvider({"name": "anthropic", "api_base": "https://api.anthropic.com/v1",
+                           "default_model": "claude-sonnet-4-6", **config})
+    costs = []
+
+    async def record_cost(model, in_tok, out_tok, ms, ctx, status, err=None):
+        costs.append((status, in_tok, out_tok))
+    monkeypatch.setattr(p, "_log_cost", record_cost)
+
+    def attach():
+        p._client = http_pool.create_client({}, inner=httpx.MockTransport(handler))
+        p._connected = True
+    return p, costs, attach
+
+
+def test_provider_concurrent_identical_chats_share_upstream(monkeypatch):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, json={
+            "id": "m1", "model": "claude-sonnet-4-6", "role": "assistant",
+            "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn",
+            "usage": {"input_tokens": 10, "output_tokens": 5}})
+
+    p, costs, attach = _provider(monkeypatch, handler)
+
+    async def scenario():
+        attach()
+        results = await asyncio.gather(
+            p.chat(make_request()), p.chat(make_request()), p.chat(make_request()),
+            p.chat(make_request(text="anders")))
+        await p.aclose()
+        return results
+
+    results = run(scenario())
+    assert [r.content for r in results] == ["ok"] * 4
+    assert len(calls) == 2
+    assert sorted(costs) == sorted([("success", 10, 5), ("success", 10, 5),
+                                    ("coalesced", 0, 0), ("coalesced", 0, 0)])
+    assert p.coalescing_stats()["followers"] == 2
+
+
+def test_provider_coalescing_disabled_or_bypassed(monkeypatch):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={
+            "id": "m1", "model": "claude-sonnet-4-6", "role": "assistant",
+            "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn",
+            "usage": {"input_tokens": 1, "output_tokens": 1}})
+
+    p, _, attach = _provider(monkeypatch, handler)
+
+    async def scenario():
+        attach()
+        await asyncio.gather(p.chat(make_request(bypass_cache=True)),
+                             p.chat(make_request(bypass_cache=True)))
+        await p.aclose()
+
+    run(scenario())
+    assert len(calls) == 2
+
+
+def test_provider_sampled_requests_not_coalesced(monkeypatch):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={
+            "id": "m1", "model": "claude-sonnet-4-6", "role": "assistant",
+            "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn",
+            "usage": {"input_tokens": 1, "output_tokens": 1}})
+
+    p, costs, attach = _provider(monkeypatch, handler)
+
+    async def scenario():
+        attach()
+        await asyncio.gather(p.chat(make_request(temperature=0.7)),
+                             p.chat(make_request(temperature=0.7)))
+        await p.aclose()
+
+    run(scenario())
+    assert len(calls) == 2
+    assert [c[0] for c in costs] == ["success", "success"]
+    assert p.coalescing_stats()["followers"] == 0
+
+
+def test_provider_stream_subscriber_attaches_with_replay(monkeypatch):
+    calls = []
+    release = None
+
+    def sse(ev):
+        return f"data: {json.dumps(ev)}\n\n".encode()
+
+    async def body():
+        yield sse({"type": "message_start", "message": {
+            "model": "claude-sonnet-4-6", "usage": {"input_tokens": 7}}})
+        yield sse({"type": "content_block_delta", "delta": {"text": "Hal"}})
+        await release.wait()
+        yield sse({"type": "content_block_delta", "delta": {"text": "lo"}})
+        yield sse({"type": "message_delta", "usage": {"output_tokens": 2}})
+        yield sse({"type": "message_stop"})
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, content=body())
+
+    p, costs, attach = _provider(monkeypatch, handler)
+
+    async def collect(out):
+        async for chunk in p.chat_stream(make_request()):
+            out.append((chunk.type, chunk.content))
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        attach()
+        first, second = [], []
+        t1 = asyncio.ensure_future(collect(first))
+        while ("content_delta", "Hal") not in first:
+            await asyncio.sleep(0.001)
+        t2 = asyncio.ensure_future(collect(second))
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(t1, t2)
+        await p.aclose()
+        return first, second
+
+    first, second = run(scenario())
+    assert first == second
+    assert ("content_delta", "lo") in second and second[0][0] == "usage"
+    assert len(calls) == 1
+    assert sorted(costs) == [("coalesced", 0, 0), ("success", 7, 2)]
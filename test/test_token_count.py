@@ -0,0 +1,210 @@
+"""
+Tests fuer /tokens/count: Praefix-Cache, Summe pro Message, kalibrierte
+lokale Schaetzung und Hintergrund-Zaehlung.
+"""
+import sys, os, asyncio, json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src/llm-provider"))
+
+import httpx
+import pytest
+
+from models import TokenCountRequest
+
+
+def run(coro):
+    """Eigener Loop pro Aufruf — laesst den globalen Event-Loop unangetastet."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def exact(request):
+    """Referenz-Tokenizer: 1 Token pro Wort, 3 pro Message, 5 Grundlast."""
+    words = len((request.system or "").split())
+    for m in request.messages:
+        words += len(str(m.content).split()) + 3
+    return words + 5
+
+
+class FakeUpstream:
+    def __init__(self, unavailable=False):
+        self.calls = []
+        self.unavailable = unavailable
+
+    async def __call__(self, model, request):
+        from base import EndpointNotAvailable
+        self.calls.append(len(request.messages))
+        if self.unavailable:
+            raise EndpointNotAvailable("POST /tokens/count", "p")
+        await asyncio.sleep(0)
+        return exact(request)
+
+
+def counter(upstream, **cfg):
+    from token_count import TokenCounter
+    from base import EndpointNotAvailable
+    return TokenCounter("p", {"token_count": cfg}, upstream,
+                        unavailable=(EndpointNotAvailable,))
+
+
+SYSTEM = "Du bist ein hilfreicher Heinzel"
+TURNS = ["Hallo wie geht es dir heute", "Gut danke und selbst",
+         "Auch gut erzaehl mir etwas ueber Token", "Token sind Teile von Woertern"]
+
+
+def conversation(n, allow_estimate=False):
+    msgs = [{"role": "user" if i % 2 == 0 else "assistant", "content": TURNS[i]}
+            for i in range(n)]
+    return TokenCountRequest(messages=msgs, system=SYSTEM, allow_estimate=allow_estimate)
+
+
+# ─── Cache ────────────────────────────────────────────────────
+
+def test_identical_request_served_from_cache():
+    up = FakeUpstream()
+    c = counter(up)
+
+    async def scenario():
+        first = await c.count("m", conversation(2))
+        second = await c.count("m", conversation(2))
+        other_model = await c.count("m2", conversation(2))
+        return first, second, other_model
+
+    first, second, other = run(scenario())
+    assert first == (exact(conversation(2)), "upstream")
+    assert second == (first[0], "cache")
+    assert other[1] == "upstream" and up.calls == [2, 2]
+    assert c.stats["cache_hits"] == 1
+
+
+def test_append_only_reuses_prefix_and_learns_tail():
+    from token_count import prefix_keys
+    up = FakeUpstream()
+    c = counter(up)
+
+    async def scenario():
+        await c.count("m", conversation(1))
+        await c.count("m", conversation(2))       # Praefix 1 bekannt → Schwanz gelernt
+        return c._longest_prefix(prefix_keys("p", "m", conversation(3)))
+
+    prefix = run(scenario())
+    assert prefix == (2, exact(conversation(2)))
+    assert c.stats["cached_messages"] == 1
+
+
+def test_hot_path_never_waits_for_upstream():
+    up = FakeUpstream()
+    c = counter(up, background_refresh=True)
+
+    async def scenario():
+        await c.count("m", conversation(3))
+        fast = await c.count("m", conversation(4, allow_estimate=True))
+        calls_in_request = list(up.calls)
+        await asyncio.sleep(0.01)                 # Hintergrund-Zaehlung laeuft nach
+        again = await c.count("m", conversation(4, allow_estimate=True))
+        await c.close()
+        return fast, calls_in_request, again
+
+    (tokens, source), calls_in_request, again = run(scenario())
+    assert source == "estimate" and calls_in_request == [3]
+    # Praefix exakt, nur der Schwanz geschaetzt
+    assert abs(tokens - exact(conversation(4))) <= 6
+    assert again == (exact(conversation(4)), "cache")
+    assert c.stats["upstream_calls"] == 1 and c.stats["background_refreshes"] == 1
+
+
+def test_known_messages_summed_without_upstream():
+    up = FakeUpstream()
+    c = counter(up, background_refresh=False)
+    m1, m2, m3 = conversation(3).messages
+
+    def req(*msgs, allow_estimate=False):
+        return TokenCountRequest(messages=list(msgs), system=SYSTEM,
+                                 allow_estimate=allow_estimate)
+
+    async def scenario():
+        await c.count("m", req(m1))
+        await c.count("m", req(m1, m2))           # lernt Message m2
+        await c.count("m", req(m1, m3))           # lernt Message m3
+        return await c.count("m", req(m1, m2, m3, allow_estimate=True))
+
+    assert run(scenario()) == (exact(req(m1, m2, m3)), "summed")
+    assert up.calls == [1, 2, 2]
+
+
+# ─── Fallback / Kalibrierung ──────────────────────────────────
+
+def test_provider_without_count_api_uses_estimate():
+    up = FakeUpstream(unavailable=True)
+    c = counter(up)
+
+    async def scenario():
+        first = await c.count("m", conversation(2))
+        second = await c.count("m", conversation(3))
+        return first, second
+
+    (t1, s1), (t2, s2) = run(scenario())
+    assert s1 == s2 == "estimate" and 0 < t1 < t2
+    assert up.calls == [2]                        # danach kein Versuch mehr
+    assert c.stats["has_count_api"] is False
+
+
+def test_calibration_moves_factor_towards_exact():
+    from token_count import TokenCounter
+    long_text = "ein langes Wort " * 200
+
+    async def upstream(model, request):
+        return 2 * (len(request.messages[0].content) // 4)   # Tokenizer zaehlt doppelt
+
+    c = TokenCounter("p", {"token_count": {"message_overhead": 0}}, upstream)
+    req = TokenCountRequest(messages=[{"role": "user", "content": long_text}])
+    run(c.count("m", req))
+    assert 1.9 < c.factor < 2.1
+    estimate, _ = c._local("m", TokenCountRequest(
+        messages=[{"role": "user", "content": long_text + "x"}]), None)
+    assert abs(estimate - 2 * (len(long_text) // 4)) < 10
+
+
+def test_cache_bounded():
+    up = FakeUpstream()
+    c = counter(up, max_entries=2)
+
+    async def scenario():
+        for n in (1, 2, 3, 4):
+            await c.count("m", conversation(n))
+
+    run(scenario())
+    assert c.stats["cached_prefixes"] == 2
+
+
+# ─── Provider ─────────────────────────────────────────────────
+
+def test_anthropic_count_tokens_cached(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    from anthropic_provider import AnthropicProvider
+    import http_pool
+    calls = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        calls.append(body)
+        return httpx.Response(200, json={"input_tokens": 17 + len(body["messages"])})
+
+    p = AnthropicProvider({"name": "anthropic", "api_base": "https://api.anthropic.com/v1",
+                           "default_model": "claude-sonnet-4-6"})
+
+    async def scenario():
+        p._client = http_pool.create_client({}, inner=httpx.MockTransport(handler))
+        p._connected = True
+        first = await p.count_tokens(conversation(2))
+        second = await p.count_tokens(conversation(2))
+        await p.aclose()
+        return first, second
+
+    first, second = run(scenario())
+    assert len(calls) == 1 and calls[0]["system"] == SYSTEM
+    assert (first.input_tokens, first.source) == (19, "upstream")
+    assert (second.input_tokens, second.source) == (19, "cache")
+    assert p.token_count_stats()["cache_hits"] == 1